@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sqlite3
+import zlib
+from typing import Any, AsyncIterator, Optional, Sequence, Tuple
+
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langchain_core.runnables import RunnableConfig
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    print("Checkpointing: langgraph-checkpoint-sqlite is not installed. Workflow checkpoints will be kept in memory only.")
+    SqliteSaver = None  # type: ignore
+
+DEFAULT_CHECKPOINT_PATH = "./workflow_checkpoints.sqlite3"
+COMPRESSED_TYPE_SUFFIX = "+zlib"
+
+
+class CompactStateSerializer:
+    """
+    Serializer for KnowledgeNexusState checkpoints.
+
+    Values are encoded with LangGraph's msgpack-based JsonPlusSerializer (which also understands
+    BaseMessage and pydantic objects). Large payloads - research_data/verified_data lists with
+    repeated keys and snippets - are additionally zlib-compressed at a fast level; small values
+    such as stage names and flags are stored as-is so they cost nothing extra to decode.
+    """
+    def __init__(self, compress_threshold: int = 2048, compression_level: int = 1):
+        self._inner = JsonPlusSerializer()
+        self.compress_threshold = compress_threshold
+        self.compression_level = compression_level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_name, data = self._inner.dumps_typed(obj)
+        if len(data) >= self.compress_threshold:
+            return type_name + COMPRESSED_TYPE_SUFFIX, zlib.compress(data, self.compression_level)
+        return type_name, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_name, payload = data
+        if type_name.endswith(COMPRESSED_TYPE_SUFFIX):
+            type_name = type_name[:-len(COMPRESSED_TYPE_SUFFIX)]
+            payload = zlib.decompress(payload)
+        return self._inner.loads_typed((type_name, payload))
+
+
+if SqliteSaver is not None:
+    class SqliteCheckpointSaver(SqliteSaver):
+        """
+        SqliteSaver usable from the async `astream` loop in main.py.
+
+        The upstream SqliteSaver only implements the synchronous API; the async methods LangGraph
+        calls during `astream` are delegated to the sync ones on a worker thread so checkpoint
+        I/O never blocks the event loop. The connection is shared across threads behind the
+        saver's own lock, and the database runs in WAL mode.
+        """
+        def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, serde: Optional[Any] = None):
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            super().__init__(conn, serde=serde or CompactStateSerializer())
+            self.path = path
+            self.setup()
+
+        async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                        before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                       new_versions: ChannelVersions) -> RunnableConfig:
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                              task_path: str = "") -> None:
+            await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id: str) -> None:
+            await asyncio.to_thread(self.delete_thread, thread_id)
+else:
+    SqliteCheckpointSaver = None  # type: ignore
+
+
+def create_checkpointer(backend: Optional[str] = None, path: Optional[str] = None) -> BaseCheckpointSaver:
+    """
+    Builds the workflow checkpointer selected by WORKFLOW_CHECKPOINTER ("sqlite" by default, or "memory").
+    Checkpoints are keyed by the `thread_id` in the run config, which main.py sets to the task ID.
+    """
+    backend = (backend or os.getenv("WORKFLOW_CHECKPOINTER", "sqlite")).lower()
+    if backend == "sqlite" and SqliteCheckpointSaver is not None:
+        path = path or os.getenv("WORKFLOW_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+        try:
+            saver = SqliteCheckpointSaver(path=path)
+            print(f"Checkpointing: Using SQLite workflow checkpoints at {path}.")
+            return saver
+        except Exception as e:
+            print(f"Checkpointing: Failed to open SQLite checkpoint store at {path}: {e}. Falling back to in-memory checkpoints.")
+    elif backend not in ("sqlite", "memory"):
+        print(f"Checkpointing: Unknown WORKFLOW_CHECKPOINTER '{backend}'. Falling back to in-memory checkpoints.")
+    return InMemorySaver(serde=CompactStateSerializer())
@@ -1,10 +1,59 @@
+import asyncio
 import os
-from typing import Optional, Tuple
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
+try:
+    from ..services.stage_limits import stage_limits
+    from ..services.executors import run_blocking
+    from ..services.llm_cache import LLMResponseCache, create_llm_cache, llm_cache_key
+    from ..services.llm_resilience import LLMResilience
+    from ..services.simulation import SimulatedChatModel
+    from ..services.metrics import external_call, record_llm_tokens
+except ImportError:
+    # Direct execution of this module: run without the process-wide concurrency caps.
+    print("LLMService: Could not import stage limits. External calls will not be concurrency-capped.")
+    from contextlib import nullcontext
+    class _NoStageLimits:
+        def limit(self, stage: str):
+            return nullcontext()
+        def alimit(self, stage: str):
+            return nullcontext()
+    stage_limits = _NoStageLimits()
+    run_blocking = asyncio.to_thread
+    LLMResponseCache = None # type: ignore
+    create_llm_cache = lambda: None
+    llm_cache_key = None # type: ignore
+    SimulatedChatModel = None # type: ignore
+    external_call = lambda service, provider: nullcontext()
+    record_llm_tokens = lambda provider, prompt, completion, usage=None: None
+    class _SingleAttemptPlan:
+        def __init__(self, providers):
+            self._providers = list(providers)
+            self.last_error = None
+        def next_attempt(self):
+            return self._providers[0] if self._providers else None
+        def succeeded(self):
+            pass
+        def failed(self, error):
+            self.last_error = error
+            self._providers = self._providers[1:]
+            return 0.0
+        def interrupted(self, error):
+            self.last_error = error
+            self._providers = []
+        def error_message(self):
+            return str(self.last_error or "No LLM provider available.")
+    class LLMResilience: # type: ignore
+        def plan(self, providers):
+            return _SingleAttemptPlan(providers)
+        def stats(self):
+            return {}
+
 # Load environment variables from .env file
 # Assuming .env is in the backend directory, adjust path if necessary
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
@@ -20,22 +69,49 @@ AZURE_PLACEHOLDERS = ["YOUR_AZURE_OPENAI_API_KEY", "YOUR_AZURE_OPENAI_ENDPOINT",
 OPENAI_PLACEHOLDER = "YOUR_OPENAI_API_KEY"
 COMMON_OPENAI_PLACEHOLDER = "YOUR_ACTUAL_OPENAI_API_KEY_REPLACE_ME"
 
+# With Azure as the primary provider and a standard OpenAI key configured as well, calls Azure
+# cannot serve (after retries, or while its circuit is open) fail over to OpenAI at runtime.
+LLM_FAILOVER_ENABLED = os.getenv("LLM_FAILOVER_ENABLED", "true").lower() in ("1", "true", "yes")
+# "auto" (default): Azure OpenAI or standard OpenAI, as configured above. "simulated": a local,
+# deterministic model with configurable latency and errors, for offline load tests (services/simulation.py).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "auto").lower()
+
 class LLMService:
     """
     Service for initializing and interacting with Language Models (LLMs).
     Supports Azure OpenAI and standard OpenAI models.
+
+    Completions are cached on disk (see services/llm_cache.py), keyed by model, deployment,
+    temperature and prompt, so re-runs and shared topics do not pay for identical prompts twice.
+
+    stream()/astream() yield a completion in chunks as the model generates it; invoke()/ainvoke()
+    accept an `on_chunk` callback to report those chunks while still returning the whole content.
+
+    Transient provider errors are retried with backoff, each provider has a circuit breaker, and
+    calls fail over to the configured fallback provider (see services/llm_resilience.py).
+    Responses served by a fallback provider are not cached, since cache keys name the primary model.
     """
-    def __init__(self, temperature: float = 0.2, model_name: str = "gpt-3.5-turbo"):
+    def __init__(self, temperature: float = 0.2, model_name: str = "gpt-3.5-turbo", cache: Optional["LLMResponseCache"] = None,
+                 resilience: Optional["LLMResilience"] = None, deployment_name: Optional[str] = None):
         """
         Initializes the LLMService, which identifies and prepares an LLM instance.
 
         Args:
             temperature (float): The temperature setting for the LLM.
             model_name (str): The model name to use for standard OpenAI.
+            cache (Optional[LLMResponseCache]): Response cache to use. Defaults to the one configured by LLM_CACHE_* variables.
+            resilience (Optional[LLMResilience]): Retry policy, circuit breakers and counters. Defaults to the LLM_RETRY_*/LLM_CIRCUIT_* settings.
+            deployment_name (Optional[str]): The Azure OpenAI deployment to use. Defaults to AZURE_OPENAI_DEPLOYMENT_NAME.
         """
         self.llm: Optional[BaseChatModel] = None
         self.llm_type: Optional[str] = None  # 'azure', 'openai', or None
+        self.fallback_llms: Dict[str, BaseChatModel] = {}  # Providers to fail over to, by llm_type
+        self.resilience = resilience if resilience is not None else LLMResilience()
         self.initialization_error: Optional[str] = None
+        self.temperature = temperature
+        self.model_name = model_name
+        self.deployment_name = deployment_name or AZURE_OPENAI_DEPLOYMENT_NAME
+        self.cache = cache if cache is not None else create_llm_cache()
         self._initialize_llm(temperature, model_name)
 
     def _initialize_llm(self, temperature: float, model_name: str) -> None:
@@ -43,6 +119,12 @@ class LLMService:
         Determines the LLM provider (Azure or OpenAI) based on environment variables
         and initializes the LLM instance.
         """
+        if LLM_BACKEND == "simulated" and SimulatedChatModel is not None:
+            self.llm = SimulatedChatModel.from_env(model_name=self.deployment_name or model_name)
+            self.llm_type = "simulated"
+            print(f"LLMService: Using the simulated LLM backend (model '{self.llm.model_name}').")
+            return
+
         azure_vars_present = AZURE_OPENAI_API_KEY is not None and AZURE_OPENAI_ENDPOINT is not None
 
         if azure_vars_present:
@@ -51,7 +133,7 @@ class LLMService:
                 AZURE_OPENAI_API_KEY and AZURE_OPENAI_API_KEY not in AZURE_PLACEHOLDERS and
                 AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_ENDPOINT not in AZURE_PLACEHOLDERS and
                 OPENAI_API_VERSION and
-                AZURE_OPENAI_DEPLOYMENT_NAME and AZURE_OPENAI_DEPLOYMENT_NAME not in AZURE_PLACEHOLDERS
+                self.deployment_name and self.deployment_name not in AZURE_PLACEHOLDERS
             )
             if azure_config_complete:
                 try:
@@ -59,8 +141,9 @@ class LLMService:
                         azure_endpoint=AZURE_OPENAI_ENDPOINT,
                         api_key=AZURE_OPENAI_API_KEY,
                         api_version=OPENAI_API_VERSION,
-                        azure_deployment=AZURE_OPENAI_DEPLOYMENT_NAME,
+                        azure_deployment=self.deployment_name,
                         temperature=temperature,
+                        max_retries=0, # Retries are done by this service, across providers
                     )
                     self.llm_type = "azure"
                     print("LLMService: AzureChatOpenAI LLM initialized successfully.")
@@ -73,12 +156,13 @@ class LLMService:
 
         if self.llm is None and not azure_vars_present: # Only try OpenAI if Azure was not attempted or failed AND Azure vars were not present
             print("LLMService: Azure environment variables not detected or Azure init failed and no Azure vars present. Attempting standard OpenAI.")
-            if OPENAI_API_KEY and OPENAI_API_KEY != OPENAI_PLACEHOLDER and OPENAI_API_KEY != COMMON_OPENAI_PLACEHOLDER:
+            if _openai_key_configured():
                 try:
                     self.llm = ChatOpenAI(
                         api_key=OPENAI_API_KEY,
                         model_name=model_name,
-                        temperature=temperature
+                        temperature=temperature,
+                        max_retries=0
                     )
                     self.llm_type = "openai"
                     print("LLMService: ChatOpenAI LLM initialized successfully.")
@@ -89,6 +173,13 @@ class LLMService:
                 self.initialization_error = "Standard OPENAI_API_KEY not found or is a placeholder."
                 print(f"LLMService: {self.initialization_error}")
 
+        if self.llm_type == "azure" and LLM_FAILOVER_ENABLED and _openai_key_configured():
+            try:
+                self.fallback_llms["openai"] = ChatOpenAI(api_key=OPENAI_API_KEY, model_name=model_name, temperature=temperature, max_retries=0)
+                print("LLMService: Standard OpenAI configured as failover provider.")
+            except Exception as e_fallback:
+                print(f"LLMService: Could not initialize the OpenAI failover provider: {e_fallback}")
+
         if self.llm:
             print(f"LLMService: LLM initialization successful ({self.llm_type}).")
         else:
@@ -100,12 +191,14 @@ class LLMService:
             print(f"LLMService: {final_error_message} The system may need to use simulated data or skip LLM-dependent tasks.")
 
 
-    def invoke(self, prompt: str) -> Tuple[Optional[str], Optional[str]]:
+    def invoke(self, prompt: str, use_cache: bool = True, on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], Optional[str]]:
         """
         Invokes the initialized LLM with the given prompt.
 
         Args:
             prompt (str): The prompt to send to the LLM.
+            use_cache (bool): Whether to read and write the response cache for this call.
+            on_chunk (Optional[Callable[[str], None]]): If given, the response is streamed and each chunk is passed to it as it arrives.
 
         Returns:
             Tuple[Optional[str], Optional[str]]: A tuple containing the LLM's response content (or None if an error occurred) and an error message (or None if successful).
@@ -115,20 +208,349 @@ class LLMService:
             print(f"LLMService: {error_msg}")
             return None, error_msg
 
+        if on_chunk is not None:
+            return self._collect_stream(self.stream(prompt, use_cache=use_cache), on_chunk)
+
+        cache_key = self._cache_key(prompt) if use_cache else None
+        if cache_key:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                print(f"LLMService: Response served from cache ({self.llm_type}).")
+                return cached, None
+
         try:
             print(f"LLMService: Invoking {self.llm_type} LLM...")
-            response = self.llm.invoke(prompt)
-            content = response.content if hasattr(response, 'content') else str(response)
+            content, provider = self._complete(prompt)
+            if cache_key and provider == self.llm_type:
+                self._cache_put(cache_key, content)
             return content, None
         except Exception as e:
             error_msg = f"Error during LLM invocation: {e}"
             print(f"LLMService: {error_msg}")
             return None, error_msg
 
+    async def ainvoke(self, prompt: str, use_cache: bool = True, on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Async variant of invoke(), using the chat model's native async API so a slow completion
+        does not block the event loop.
+
+        Args:
+            prompt (str): The prompt to send to the LLM.
+            use_cache (bool): Whether to read and write the response cache for this call.
+            on_chunk (Optional[Callable[[str], None]]): If given, the response is streamed and each chunk is passed to it as it arrives.
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The response content (or None) and an error message (or None).
+        """
+        if not self.llm:
+            error_msg = "LLM not initialized. Cannot invoke."
+            print(f"LLMService: {error_msg}")
+            return None, error_msg
+
+        if on_chunk is not None:
+            return await self._acollect_stream(self.astream(prompt, use_cache=use_cache), on_chunk)
+
+        cache_key = self._cache_key(prompt) if use_cache else None
+        if cache_key:
+            cached = await run_blocking(self._cache_get, cache_key)
+            if cached is not None:
+                print(f"LLMService: Response served from cache ({self.llm_type}).")
+                return cached, None
+
+        try:
+            print(f"LLMService: Invoking {self.llm_type} LLM (async)...")
+            content, provider = await self._acomplete(prompt)
+            if cache_key and provider == self.llm_type:
+                await run_blocking(self._cache_put, cache_key, content)
+            return content, None
+        except Exception as e:
+            error_msg = f"Error during LLM invocation: {e}"
+            print(f"LLMService: {error_msg}")
+            return None, error_msg
+
+    def stream(self, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        Yields the response to `prompt` in chunks as the model generates them. A cached response is
+        yielded as a single chunk; a streamed one is cached once it is complete.
+        Raises RuntimeError if the LLM is not initialized; provider errors are propagated.
+        """
+        if not self.llm:
+            raise RuntimeError("LLM not initialized. Cannot invoke.")
+
+        cache_key = self._cache_key(prompt) if use_cache else None
+        if cache_key:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                print(f"LLMService: Response served from cache ({self.llm_type}).")
+                yield cached
+                return
+
+        print(f"LLMService: Streaming from {self.llm_type} LLM...")
+        plan = self.resilience.plan(self._providers())
+        while (attempt := plan.next_attempt()) is not None:
+            provider, llm = attempt
+            parts: List[str] = []
+            usage = None
+            try:
+                # The "llm" slot is held until the stream is exhausted (or closed).
+                with stage_limits.limit("llm"), external_call("chat", provider):
+                    for chunk in llm.stream(prompt):
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        text = _chunk_text(chunk)
+                        if text:
+                            parts.append(text)
+                            yield text
+            except Exception as e:
+                if parts:
+                    # Part of the answer was already delivered, so the call can be neither repeated nor failed over.
+                    plan.interrupted(e)
+                    raise
+                time.sleep(plan.failed(e))
+                continue
+            plan.succeeded()
+            record_llm_tokens(provider, prompt, "".join(parts), usage)
+            if cache_key and provider == self.llm_type:
+                self._cache_put(cache_key, "".join(parts))
+            return
+        raise RuntimeError(plan.error_message())
+
+    async def astream(self, prompt: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Async variant of stream(), using the chat model's native async streaming API."""
+        if not self.llm:
+            raise RuntimeError("LLM not initialized. Cannot invoke.")
+
+        cache_key = self._cache_key(prompt) if use_cache else None
+        if cache_key:
+            cached = await run_blocking(self._cache_get, cache_key)
+            if cached is not None:
+                print(f"LLMService: Response served from cache ({self.llm_type}).")
+                yield cached
+                return
+
+        print(f"LLMService: Streaming from {self.llm_type} LLM (async)...")
+        plan = self.resilience.plan(self._providers())
+        while (attempt := plan.next_attempt()) is not None:
+            provider, llm = attempt
+            parts: List[str] = []
+            usage = None
+            try:
+                async with stage_limits.alimit("llm"):
+                    with external_call("chat", provider):
+                        async for chunk in llm.astream(prompt):
+                            usage = getattr(chunk, "usage_metadata", None) or usage
+                            text = _chunk_text(chunk)
+                            if text:
+                                parts.append(text)
+                                yield text
+            except Exception as e:
+                if parts:
+                    plan.interrupted(e)
+                    raise
+                await asyncio.sleep(plan.failed(e))
+                continue
+            plan.succeeded()
+            record_llm_tokens(provider, prompt, "".join(parts), usage)
+            if cache_key and provider == self.llm_type:
+                await run_blocking(self._cache_put, cache_key, "".join(parts))
+            return
+        raise RuntimeError(plan.error_message())
+
+    # --- Retries and failover ---
+
+    def _providers(self) -> List[Tuple[str, BaseChatModel]]:
+        """The primary LLM followed by the failover providers, as (llm_type, model) pairs."""
+        providers = [(self.llm_type or "llm", self.llm)]
+        providers.extend((provider, llm) for provider, llm in self.fallback_llms.items() if provider != self.llm_type)
+        return providers
+
+    def _complete(self, prompt: str) -> Tuple[str, str]:
+        """Content of the first successful completion and the provider that served it. Raises if none succeeded."""
+        plan = self.resilience.plan(self._providers())
+        while (attempt := plan.next_attempt()) is not None:
+            provider, llm = attempt
+            try:
+                with stage_limits.limit("llm"), external_call("chat", provider):
+                    response = llm.invoke(prompt)
+            except Exception as e:
+                time.sleep(plan.failed(e))
+                continue
+            plan.succeeded()
+            content = _response_text(response)
+            record_llm_tokens(provider, prompt, content, getattr(response, "usage_metadata", None))
+            return content, provider
+        raise RuntimeError(plan.error_message())
+
+    async def _acomplete(self, prompt: str) -> Tuple[str, str]:
+        """Async variant of _complete(); backoff waits do not block the event loop."""
+        plan = self.resilience.plan(self._providers())
+        while (attempt := plan.next_attempt()) is not None:
+            provider, llm = attempt
+            try:
+                async with stage_limits.alimit("llm"):
+                    with external_call("chat", provider):
+                        response = await llm.ainvoke(prompt)
+            except Exception as e:
+                await asyncio.sleep(plan.failed(e))
+                continue
+            plan.succeeded()
+            content = _response_text(response)
+            record_llm_tokens(provider, prompt, content, getattr(response, "usage_metadata", None))
+            return content, provider
+        raise RuntimeError(plan.error_message())
+
+    @staticmethod
+    def _collect_stream(chunks: Iterator[str], on_chunk: Callable[[str], None]) -> Tuple[Optional[str], Optional[str]]:
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                on_chunk(text)
+            return "".join(parts), None
+        except Exception as e:
+            error_msg = f"Error during LLM invocation: {e}"
+            print(f"LLMService: {error_msg}")
+            return None, error_msg
+
+    @staticmethod
+    async def _acollect_stream(chunks: AsyncIterator[str], on_chunk: Callable[[str], None]) -> Tuple[Optional[str], Optional[str]]:
+        parts = []
+        try:
+            async for text in chunks:
+                parts.append(text)
+                on_chunk(text)
+            return "".join(parts), None
+        except Exception as e:
+            error_msg = f"Error during LLM invocation: {e}"
+            print(f"LLMService: {error_msg}")
+            return None, error_msg
+
     def is_initialized(self) -> bool:
         """Checks if the LLM was successfully initialized."""
         return self.llm is not None
 
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Call, retry, failover, short-circuit and failure counters, and the circuit state of each provider."""
+        return self.resilience.stats()
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit/miss counters and size of the response cache, or None if caching is disabled."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def get_cached_result(self, kind: str, content_hash: str) -> Optional[str]:
+        """
+        Cached output of a derived task (e.g. kind="source_summary") for the content with the given hash,
+        produced by this service's model. Unlike responses, these entries are shared by every prompt
+        that embeds the same content, so other tasks can reuse them.
+        """
+        key = self._cache_key(f"{kind}\x1f{content_hash}")
+        return self._cache_get(key) if key else None
+
+    def put_cached_result(self, kind: str, content_hash: str, content: str) -> None:
+        key = self._cache_key(f"{kind}\x1f{content_hash}")
+        if key:
+            self._cache_put(key, content)
+
+    def get_cached_results(self, kind: str, content_hashes: Sequence[str]) -> Dict[str, str]:
+        """get_cached_result for many contents in one cache query; returns the hits by content hash."""
+        keys = {self._cache_key(f"{kind}\x1f{content_hash}"): content_hash for content_hash in content_hashes}
+        keys.pop(None, None)
+        if not keys:
+            return {}
+        try:
+            found = self.cache.get_many(list(keys))
+        except Exception as e:
+            print(f"LLMService: Response cache read failed, calling the LLM instead: {e}")
+            return {}
+        return {keys[key]: content for key, content in found.items()}
+
+    def put_cached_results(self, kind: str, contents: Dict[str, str]) -> None:
+        """put_cached_result for many contents (by content hash) in one cache transaction."""
+        entries = {self._cache_key(f"{kind}\x1f{content_hash}"): content for content_hash, content in contents.items()}
+        entries.pop(None, None)
+        if not entries:
+            return
+        model, deployment = self._cache_identity()
+        try:
+            self.cache.put_many(entries, model=model, deployment=deployment, temperature=self.temperature)
+        except Exception as e:
+            print(f"LLMService: Failed to store results in cache: {e}")
+
+    # --- Response cache ---
+
+    def _cache_identity(self) -> Tuple[str, str]:
+        """(model, deployment) of the initialized LLM, as used in cache keys."""
+        if self.llm_type == "azure":
+            return "azure", self.deployment_name or ""
+        return self.llm_type or "", getattr(self.llm, "model_name", None) or self.model_name
+
+    def _cache_key(self, prompt: str) -> Optional[str]:
+        # Only real chat models are cached; stand-ins such as test doubles never are.
+        if self.cache is None or not isinstance(self.llm, BaseChatModel):
+            return None
+        model, deployment = self._cache_identity()
+        return llm_cache_key(model, deployment, self.temperature, prompt)
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            print(f"LLMService: Response cache read failed, calling the LLM instead: {e}")
+            return None
+
+    def _cache_put(self, key: str, content: str) -> None:
+        model, deployment = self._cache_identity()
+        try:
+            self.cache.put(key, content, model=model, deployment=deployment, temperature=self.temperature)
+        except Exception as e:
+            print(f"LLMService: Failed to store response in cache: {e}")
+
+# --- Per-stage model routing ---
+# Each LLM stage of the workflow can use its own model: {STAGE}_LLM_MODEL (standard OpenAI),
+# {STAGE}_LLM_DEPLOYMENT (Azure OpenAI) and {STAGE}_LLM_TEMPERATURE, e.g. SUMMARY_LLM_DEPLOYMENT for
+# the map step of map-reduce synthesis. Stages without settings share the default LLMService.
+LLM_STAGES = ("summary", "synthesis", "document")
+
+def stage_llm_settings(stage: str) -> Dict[str, Any]:
+    """LLMService arguments configured for `stage`; empty if the stage uses the default model."""
+    prefix = stage.upper()
+    settings: Dict[str, Any] = {}
+    if os.getenv(f"{prefix}_LLM_MODEL"):
+        settings["model_name"] = os.getenv(f"{prefix}_LLM_MODEL")
+    if os.getenv(f"{prefix}_LLM_DEPLOYMENT"):
+        settings["deployment_name"] = os.getenv(f"{prefix}_LLM_DEPLOYMENT")
+    if os.getenv(f"{prefix}_LLM_TEMPERATURE"):
+        settings["temperature"] = float(os.getenv(f"{prefix}_LLM_TEMPERATURE"))
+    return settings
+
+def create_stage_llm_services(default: LLMService) -> Dict[str, LLMService]:
+    """
+    The LLMService of each stage in LLM_STAGES. Stages with their own settings get their own
+    service (and circuit breakers), sharing the default service's response cache.
+    """
+    services: Dict[str, LLMService] = {}
+    for stage in LLM_STAGES:
+        settings = stage_llm_settings(stage)
+        if not settings:
+            services[stage] = default
+            continue
+        settings.setdefault("temperature", default.temperature)
+        settings.setdefault("model_name", default.model_name)
+        settings.setdefault("deployment_name", default.deployment_name)
+        print(f"LLMService: Stage '{stage}' routed to its own model ({settings}).")
+        services[stage] = LLMService(cache=default.cache, **settings)
+    return services
+
+def _openai_key_configured() -> bool:
+    return bool(OPENAI_API_KEY) and OPENAI_API_KEY not in (OPENAI_PLACEHOLDER, COMMON_OPENAI_PLACEHOLDER)
+
+def _response_text(response: Any) -> str:
+    return response.content if hasattr(response, 'content') else str(response)
+
+def _chunk_text(chunk: Any) -> str:
+    """Text of a streamed message chunk (content can also be a list of non-text parts)."""
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else ""
+
 # Example usage (for testing this module directly)
 if __name__ == '__main__':
     print("Testing LLMService...")
@@ -146,5 +568,4 @@ if __name__ == '__main__':
         print(f"LLM could not be initialized. Error: {llm_service.initialization_error}")
 
     # Test with missing Azure keys but present OpenAI key (requires setting up .env accordingly)
-    # print("
-To test specific fallback scenarios, modify your .env file and re-run.")
+    # print("\nTo test specific fallback scenarios, modify your .env file and re-run.")
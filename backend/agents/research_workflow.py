@@ -2,19 +2,29 @@ import os
 import uuid
 from dotenv import load_dotenv
 from typing import Optional, List, Dict, Any
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from .types import KnowledgeNexusState, DataVerificationRequest, HumanApproval
-from .llm_service import LLMService
+from .llm_service import LLMService, create_stage_llm_services
 from .search_service import SearchService
 from .storage_service import StorageService
+from .checkpointing import create_checkpointer
 from .workflow_agents.research_agent import ResearchAgent
 from .workflow_agents.verification_agent import VerificationAgent
 from .workflow_agents.synthesis_agent import SynthesisAgent
 from .workflow_agents.conflict_detection_agent import ConflictDetectionAgent
 from .workflow_agents.document_generation_agent import DocumentGenerationAgent
 from .workflow_agents.human_input_agent import HumanInputAgent
+from ..services.context_selector import ContextSelector
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+# "two_pass" (default): synthesis writes a summary and document generation has the LLM format it
+# into the report. "single_call": the synthesis call writes the final report and document
+# generation renders it locally, halving the LLM tokens and latency of the last two stages.
+LLM_PIPELINE_MODE = os.getenv("LLM_PIPELINE_MODE", "two_pass").lower()
+if LLM_PIPELINE_MODE not in ("two_pass", "single_call"):
+    raise ValueError(f"Unknown LLM_PIPELINE_MODE '{LLM_PIPELINE_MODE}'. Expected 'two_pass' or 'single_call'.")
+
 def should_request_human_verification(state: KnowledgeNexusState) -> str:
     print(f"--- Conditional Edge: SHOULD_REQUEST_HUMAN_VERIFICATION --- Task ID: {state.get('task_id')}, Current Stage: {state.get('current_stage')}, Human in loop needed: {state.get('human_in_loop_needed')}, Verification request active: {state.get('current_verification_request') is not None}")
     print(f"\n--- Workflow: Conditional Edge ---") # Existing print
@@ -28,29 +38,50 @@ def should_request_human_verification(state: KnowledgeNexusState) -> str:
 
 # 4. Create build_knowledge_nexus_workflow function
 
-def build_knowledge_nexus_workflow(chroma_persist_directory: Optional[str] = None):
+def build_knowledge_nexus_workflow(chroma_persist_directory: Optional[str] = None, checkpointer: Optional[Any] = None,
+                                   chroma_service: Optional[Any] = None):
+    """
+    Builds and compiles the Knowledge Nexus graph.
+
+    Pass `chroma_service` to share an existing ChromaService (client, embedding function and
+    collection handles) with the graph's storage; otherwise the process-wide service for
+    `chroma_persist_directory` is used.
+
+    The graph is compiled with a checkpointer (SQLite by default, see checkpointing.py) keyed by the
+    `thread_id` in the run config, and interrupts before "await_human_input". After human feedback is
+    submitted the run is resumed at that node instead of restarting from "research".
+
+    LLM stages use the models routed to them by the {STAGE}_LLM_* settings (see llm_service.py),
+    and LLM_PIPELINE_MODE decides whether the report is written in one LLM call or two.
+    """
     print("Building Knowledge Nexus workflow graph with new agents and services...")
     # Initialize Services
     llm_service = LLMService()
+    stage_llm_services = create_stage_llm_services(llm_service)
     search_service = SearchService()
-    storage_service = StorageService(persist_directory=chroma_persist_directory)
+    storage_service = StorageService(persist_directory=chroma_persist_directory, chroma_service=chroma_service)
 
     # Initialize Agents with services
     research_agent = ResearchAgent(search_service=search_service, storage_service=storage_service)
     verification_agent = VerificationAgent()
-    synthesis_agent = SynthesisAgent(llm_service=llm_service)
+    # Context selection reuses the storage's embedding function, so vectors of stored snippets come from its cache.
+    context_selector = ContextSelector(embedding_function=getattr(storage_service.chroma_service, "embedding_function", None))
+    synthesis_agent = SynthesisAgent(llm_service=stage_llm_services["synthesis"], context_selector=context_selector,
+                                     summary_llm_service=stage_llm_services["summary"],
+                                     report_mode=LLM_PIPELINE_MODE == "single_call")
     conflict_agent = ConflictDetectionAgent()
-    doc_generation_agent = DocumentGenerationAgent(llm_service=llm_service)
+    doc_generation_agent = DocumentGenerationAgent(llm_service=stage_llm_services["document"])
     human_input_agent = HumanInputAgent()
 
     workflow = StateGraph(KnowledgeNexusState)
 
-    # Add nodes - using agent.execute methods
-    workflow.add_node("research", research_agent.execute)
+    # Add nodes - using agent.execute methods. Agents that call external services also provide
+    # aexecute, which LangGraph uses under astream() so those calls don't tie up executor threads.
+    workflow.add_node("research", RunnableLambda(research_agent.execute, afunc=research_agent.aexecute, name="research"))
     workflow.add_node("verify", verification_agent.execute)
-    workflow.add_node("synthesize", synthesis_agent.execute)
+    workflow.add_node("synthesize", RunnableLambda(synthesis_agent.execute, afunc=synthesis_agent.aexecute, name="synthesize"))
     workflow.add_node("detect_conflicts", conflict_agent.execute)
-    workflow.add_node("generate_document", doc_generation_agent.execute)
+    workflow.add_node("generate_document", RunnableLambda(doc_generation_agent.execute, afunc=doc_generation_agent.aexecute, name="generate_document"))
     workflow.add_node("await_human_input", human_input_agent.execute)
 
     workflow.set_entry_point("research")
@@ -69,7 +100,9 @@ def build_knowledge_nexus_workflow(chroma_persist_directory: Optional[str] = Non
     workflow.add_edge("generate_document", END)
     workflow.add_edge("await_human_input", "synthesize") # Reroute to synthesize after human input
 
-    app = workflow.compile()
+    if checkpointer is None:
+        checkpointer = create_checkpointer()
+    app = workflow.compile(checkpointer=checkpointer, interrupt_before=["await_human_input"])
     print("Knowledge Nexus workflow graph compiled successfully with new agents.")
     return app, llm_service.is_initialized()
 
@@ -100,14 +133,14 @@ if __name__ == '__main__':
         data_collected=0
     )
 
-    print(f"
-Invoking refactored workflow for task ID: {initial_state_input['task_id']} with topic: {initial_state_input['topic']}")
+    print(f"\nInvoking refactored workflow for task ID: {initial_state_input['task_id']} with topic: {initial_state_input['topic']}")
 
     print("--- First run: Potentially pausing for human input ---")
-    for event in workflow_app.stream(initial_state_input):
+    for event in workflow_app.stream(initial_state_input, config={"configurable": {"thread_id": initial_state_input['task_id']}}):
         for node_name, output_state in event.items():
-            print(f"
-Output from node: {node_name}")
+            if node_name == "__interrupt__":
+                continue
+            print(f"\nOutput from node: {node_name}")
             print(f"  Current Stage: {output_state.get('current_stage')}")
             if output_state.get('error_message'):
                 print(f"  Error: {output_state['error_message']}")
@@ -133,16 +166,14 @@ Output from node: {node_name}")
                 else:
                     print("  Warning: Awaiting human input, but no verification request found in state.")
             if node_name == END:
-                print(f"
---- Workflow Execution Finished (Refactored) for Task ID: {initial_state_input['task_id']} ---")
+                print(f"\n--- Workflow Execution Finished (Refactored) for Task ID: {initial_state_input['task_id']} ---")
                 final_doc = output_state.get('final_document', '')
                 print(f"  Final Document Preview: {str(final_doc)[:200]}...")
                 break
         if output_state.get('current_stage') == "awaiting_human_verification" or node_name == END: # type: ignore
             break
 
-    print("
-Refactored test run finished.")
+    print("\nRefactored test run finished.")
     print("REMINDER: Ensure API keys (GOOGLE, AZURE_OPENAI, OPENAI) are correctly set in backend/.env for full functionality.")
     print("Note: The __main__ block simulates only the first part of a potential human-in-the-loop interaction.")
     print("A full HITL cycle requires a mechanism to pause, receive external input, and reinvoke the workflow.")
@@ -1,27 +1,68 @@
+import asyncio
+import hashlib
 import os
-import uuid
-from typing import List, Dict, Any, Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Optional, Iterator, AsyncIterator, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+
+try:
+    from ..services.stage_limits import stage_limits
+    from ..services.executors import run_blocking
+    from ..services.simulation import SimulatedCustomSearch
+    from ..services.metrics import external_call
+except ImportError:
+    # Direct execution of this module: run without the process-wide concurrency caps.
+    print("SearchService: Could not import stage limits. External calls will not be concurrency-capped.")
+    from contextlib import nullcontext
+    class _NoStageLimits:
+        def limit(self, stage: str):
+            return nullcontext()
+        def alimit(self, stage: str):
+            return nullcontext()
+    stage_limits = _NoStageLimits()
+    run_blocking = asyncio.to_thread
+    SimulatedCustomSearch = None # type: ignore
+    external_call = lambda service, provider: nullcontext()
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
+# "google" (default): Google Custom Search. "simulated": deterministic local results served through
+# the same paginated path, with configurable latency and errors, for offline load tests (services/simulation.py).
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "google").lower()
+
+# Custom Search returns at most 10 results per request and 100 per query (start + num <= 101).
+CSE_PAGE_SIZE = 10
+MAX_CSE_RESULTS = 100
+# Result pages of one search requested at the same time (all searches together are capped by SEARCH_CONCURRENCY).
+SEARCH_PAGE_CONCURRENCY = max(1, int(os.getenv("SEARCH_PAGE_CONCURRENCY", "3")))
+TRACKING_PARAM_PREFIXES = ("utm_", "gclid", "fbclid", "msclkid", "mc_cid", "mc_eid")
 
 class SearchService:
     """
     Service for conducting internet research using Google Custom Search API.
     Provides simulated results if API keys are not configured.
     """
+    provider = "google_cse" # Label of this service's requests in the external call metrics
+
     def __init__(self):
         """Initializes the SearchService and checks for API key configuration."""
         self.service = None
         self.simulated_search = False
+        self._http_local = threading.local()
 
-        if not GOOGLE_API_KEY or GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY" or \
+        if SEARCH_BACKEND == "simulated" and SimulatedCustomSearch is not None:
+            self.service = SimulatedCustomSearch.from_env()
+            self.provider = "simulated"
+            print("SearchService: Using the simulated search backend.")
+        elif not GOOGLE_API_KEY or GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY" or \
            not GOOGLE_CSE_ID or GOOGLE_CSE_ID == "YOUR_GOOGLE_CSE_ID":
             print("SearchService Warning: GOOGLE_API_KEY or GOOGLE_CSE_ID is not set or is a placeholder.")
             print("SearchService: Using simulated Google Search data.")
@@ -41,7 +82,7 @@ class SearchService:
 
         Args:
             topic (str): The topic to search for.
-            num_results (int): The desired number of search results (max 10 for free API, up to 20).
+            num_results (int): The desired number of search results (up to 100, fetched in concurrent pages of 10).
 
         Returns:
             Tuple[List[Dict[str, Any]], Optional[str]]: A list of processed search results
@@ -55,52 +96,203 @@ class SearchService:
 
         if self.simulated_search:
             print(f"SearchService: Performing simulated search for topic: {topic}")
-            processed_results = [
-                {"id": f"sim_gs_{uuid.uuid4()}", "url": f"http://example.com/simulated_gs_source1_for_{topic.replace(' ','_')}", "title": f"Simulated Google: Overview of {topic}", "snippet": f"This is simulated Google Search content about {topic} because API keys are missing.", "raw_content": f"Simulated raw content for {topic} from Google Search.", "score": 0.8, "source_name": "Google Search Simulator"},
-                {"id": f"sim_gs_{uuid.uuid4()}", "url": f"http://example.com/simulated_gs_source2_for_{topic.replace(' ','_')}", "title": f"Simulated Google: Details on {topic}", "snippet": f"Further simulated Google Search details regarding {topic}.", "raw_content": f"Further simulated raw content for {topic} from Google Search.", "score": 0.75, "source_name": "Google Search Simulator"}
-            ]
-            if num_results == 1: # for specific test cases
-                 processed_results = [processed_results[0]]
-            elif num_results > 2: # adjust if more simulated data is needed
-                 processed_results = processed_results * (num_results // 2) + processed_results[:num_results % 2]
+            # Each simulated result has its own URL (and so its own ID), however many are requested.
+            processed_results = [self._simulated_result(topic, i) for i in range(max(1, num_results))]
 
         elif self.service:
-            try:
-                print(f"SearchService: Attempting Google Custom Search for query: '{topic}', num_results: {num_results}")
-                # Ensure num_results is within API limits (typically 1-10 per request, CSE can be configured for more)
-                # The API's 'num' parameter can go up to 10 for the free version.
-                # If you need more, you might need to make multiple requests or ensure your CSE is configured for more.
-                # For this implementation, we'll cap it at 20 as per original code, but be mindful of API limits.
-                actual_num_to_fetch = min(num_results, 10) # Adhering to typical free tier limit per call
-
-                result = self.service.cse().list(q=topic, cx=GOOGLE_CSE_ID, num=actual_num_to_fetch).execute()
-
-                google_search_items = result.get("items", [])
-                print(f"SearchService: Google Search returned {len(google_search_items)} items.")
-
-                for item in google_search_items:
-                    item_id = str(uuid.uuid4())
-                    processed_results.append({
-                        "id": item_id,
-                        "url": item.get("link"),
-                        "title": item.get("title"),
-                        "snippet": item.get("snippet"),
-                        "raw_content": item.get("snippet"), # Using snippet as raw_content for consistency
-                        "score": 0.8, # Placeholder score
-                        "source_name": "Google Search"
-                    })
-            except Exception as e:
-                error_message = f"Error during Google Custom Search for topic '{topic}': {e}"
-                print(f"SearchService: {error_message}")
-                # Optionally, fall back to simulated search here as well if a runtime API error occurs
-                # For now, just returns empty list and error
+            print(f"SearchService: Attempting Google Custom Search for query: '{topic}', num_results: {num_results}")
+            page_errors: List[str] = []
+            for page_results, page_error in self.iter_search_pages(topic, num_results):
+                processed_results.extend(page_results)
+                if page_error:
+                    page_errors.append(page_error)
+            error_message = self._summarize_page_errors(topic, processed_results, page_errors)
         else:
             error_message = "Search service not initialized and not in simulated mode. This state should not be reached."
             print(f"SearchService: {error_message}")
 
-
         return processed_results, error_message
 
+    @staticmethod
+    def _simulated_result(topic: str, index: int) -> Dict[str, Any]:
+        """Result `index` of a simulated search: alternately an overview and a details page, each at a distinct URL."""
+        url = f"http://example.com/simulated_gs_source{index + 1}_for_{topic.replace(' ','_')}"
+        if index % 2 == 0:
+            title, snippet = f"Simulated Google: Overview of {topic}", f"This is simulated Google Search content about {topic} because API keys are missing."
+            raw_content, score = f"Simulated raw content for {topic} from Google Search.", 0.8
+        else:
+            title, snippet = f"Simulated Google: Details on {topic}", f"Further simulated Google Search details regarding {topic}."
+            raw_content, score = f"Further simulated raw content for {topic} from Google Search.", 0.75
+        if index >= 2:
+            title += f" (part {index // 2 + 1})"
+        return {"id": research_item_id(url), "url": url, "title": title, "snippet": snippet, "raw_content": raw_content,
+                "score": score, "source_name": "Google Search Simulator"}
+
+    async def asearch(self, topic: str, num_results: int = 10) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Async variant of search(). Result pages are fetched concurrently on the blocking I/O
+        thread pool, since the Google API client only supports blocking calls.
+        """
+        if not topic or self.simulated_search or not self.service:
+            return await run_blocking(self.search, topic, num_results)
+        print(f"SearchService: Attempting Google Custom Search for query: '{topic}', num_results: {num_results}")
+        processed_results: List[Dict[str, Any]] = []
+        page_errors: List[str] = []
+        async for page_results, page_error in self.astream_search(topic, num_results):
+            processed_results.extend(page_results)
+            if page_error:
+                page_errors.append(page_error)
+        return processed_results, self._summarize_page_errors(topic, processed_results, page_errors)
+
+    # --- Paginated search ---
+
+    def iter_search_pages(self, topic: str, num_results: int = 10) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Fetches up to `num_results` results (at most 100, the CSE limit) as concurrent page requests
+        and yields (results, error) per page. Pages are yielded in rank order as soon as every
+        earlier page has arrived, with results whose canonical URL was already seen removed.
+        """
+        if not topic or self.simulated_search or not self.service:
+            yield self.search(topic, num_results)
+            return
+        pages = self._page_requests(num_results)
+        merger = _RankedPageMerger()
+        with ThreadPoolExecutor(max_workers=min(SEARCH_PAGE_CONCURRENCY, len(pages)), thread_name_prefix="cse-page") as pool:
+            futures = {pool.submit(self._fetch_page_safely, topic, start, num): index for index, (start, num) in enumerate(pages)}
+            for future in as_completed(futures):
+                page_results, page_error = future.result()
+                yield from merger.add(futures[future], page_results, page_error)
+
+    async def astream_search(self, topic: str, num_results: int = 10) -> AsyncIterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Async variant of iter_search_pages(), for callers that process results while later pages load."""
+        if not topic or self.simulated_search or not self.service:
+            yield await run_blocking(self.search, topic, num_results)
+            return
+        pages = self._page_requests(num_results)
+        merger = _RankedPageMerger()
+        semaphore = asyncio.Semaphore(SEARCH_PAGE_CONCURRENCY)
+
+        async def fetch(index: int, start: int, num: int):
+            async with semaphore:
+                return index, await run_blocking(self._fetch_page_safely, topic, start, num)
+
+        tasks = [asyncio.ensure_future(fetch(index, start, num)) for index, (start, num) in enumerate(pages)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, (page_results, page_error) = await next_done
+                for ready_page in merger.add(index, page_results, page_error):
+                    yield ready_page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _page_requests(num_results: int) -> List[Tuple[int, int]]:
+        """(start, num) pairs covering the first `num_results` results; CSE pages hold at most 10."""
+        total = max(1, min(num_results, MAX_CSE_RESULTS))
+        return [(start, min(CSE_PAGE_SIZE, total - start + 1)) for start in range(1, total + 1, CSE_PAGE_SIZE)]
+
+    def _fetch_page_safely(self, topic: str, start: int, num: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        try:
+            return self._fetch_page(topic, start, num), None
+        except Exception as e:
+            error_message = f"Error during Google Custom Search for topic '{topic}' (results {start}-{start + num - 1}): {e}"
+            print(f"SearchService: {error_message}")
+            return [], error_message
+
+    def _fetch_page(self, topic: str, start: int, num: int) -> List[Dict[str, Any]]:
+        with stage_limits.limit("search"), external_call("search", self.provider):
+            # httplib2 connections are not thread-safe, so concurrent pages each use their thread's own.
+            result = self.service.cse().list(q=topic, cx=GOOGLE_CSE_ID, num=num, start=start).execute(http=self._thread_http())
+
+        google_search_items = result.get("items", [])
+        print(f"SearchService: Google Search returned {len(google_search_items)} items for results {start}-{start + num - 1}.")
+
+        return [
+            {
+                "id": research_item_id(item.get("link"), item.get("snippet")),
+                "url": item.get("link"),
+                "title": item.get("title"),
+                "snippet": item.get("snippet"),
+                "raw_content": item.get("snippet"), # Using snippet as raw_content for consistency
+                "score": 0.8, # Placeholder score
+                "rank": start + offset,
+                "source_name": "Google Search"
+            }
+            for offset, item in enumerate(google_search_items)
+        ]
+
+    def _thread_http(self):
+        http = getattr(self._http_local, "http", None)
+        if http is None:
+            http = build_http()
+            self._http_local.http = http
+        return http
+
+    @staticmethod
+    def _summarize_page_errors(topic: str, results: List[Dict[str, Any]], page_errors: List[str]) -> Optional[str]:
+        """Only a search that produced nothing is an error; failed pages alongside good ones are logged."""
+        if not page_errors:
+            return None
+        if not results:
+            return page_errors[0]
+        print(f"SearchService Warning: {len(page_errors)} result page(s) failed for topic '{topic}'. Continuing with {len(results)} results.")
+        return None
+
+
+class _RankedPageMerger:
+    """Releases pages in rank order once all earlier pages have arrived, dropping URLs already released."""
+    def __init__(self):
+        self._arrived: Dict[int, Tuple[List[Dict[str, Any]], Optional[str]]] = {}
+        self._next_index = 0
+        self._seen_urls: Set[str] = set()
+
+    def add(self, index: int, results: List[Dict[str, Any]], error: Optional[str]) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        self._arrived[index] = (results, error)
+        ready = []
+        while self._next_index in self._arrived:
+            page_results, page_error = self._arrived.pop(self._next_index)
+            self._next_index += 1
+            unique_results = []
+            for item in page_results:
+                key = canonicalize_url(item.get("url") or "") or item["id"]
+                if key not in self._seen_urls:
+                    self._seen_urls.add(key)
+                    unique_results.append(item)
+            ready.append((unique_results, page_error))
+        return ready
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a URL for de-duplication: lower-cases scheme and host, drops "www.", default ports,
+    fragments, trailing slashes and tracking parameters, and sorts the remaining query parameters.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    ))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(((parts.scheme or "http").lower(), host, path, query, ""))
+
+
+def research_item_id(url: Optional[str], content: Optional[str] = None) -> str:
+    """
+    Stable ID of a search result: a hash of its canonical URL, so the same page found again (by a
+    retried search or a later page) maps to the same stored document. Results without a URL are
+    identified by a hash of their content instead.
+    """
+    key = canonicalize_url(url or "") or f"content:{content or ''}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
 # Example usage (for testing this module directly)
 if __name__ == '__main__':
     print("Testing SearchService...")
@@ -1,13 +1,24 @@
+import os
+import time
+import zlib
 from typing import List, Dict, Any, Optional, Tuple
 
+try:
+    from ..services.executors import run_blocking
+except ImportError:
+    import asyncio
+    run_blocking = asyncio.to_thread
+
 # Attempt to import ChromaService from the expected location
 try:
-    from ..services.chroma_service import ChromaService
+    from ..services.chroma_service import ChromaService, get_chroma_service
 except ImportError:
     print("StorageService: Could not perform relative import for ChromaService. Using dummy class for StorageService.")
     # Define a dummy ChromaService if the real one cannot be imported
     # This allows StorageService to be defined and tested independently to some extent
     class ChromaService: # type: ignore
+        embedding_space = "dummy"
+
         def __init__(self, persist_directory: Optional[str] = None):
             self.persist_directory = persist_directory
             print(f"Dummy ChromaService initialized (persist_directory: {persist_directory}).")
@@ -17,35 +28,109 @@ except ImportError:
             # Simulate success
             return True
 
-        def get_collection(self, collection_name: str):
-            print(f"Dummy ChromaService: Get collection '{collection_name}'.")
-            # Simulate a collection object with a count method for basic compatibility
-            class DummyCollection:
-                def count(self):
-                    return 0 # Simulate empty collection
-            return DummyCollection()
+        def upsert_documents(self, collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> Dict[str, int]:
+            print(f"Dummy ChromaService: Upsert {len(documents)} documents into collection '{collection_name}'.")
+            # Simulate success; every document counts as new
+            return {"new": len(documents), "updated": 0, "skipped": 0}
+
+        def query_documents(self, collection_name: str, query_texts: List[str], n_results: int = 5, where: Optional[Dict[str, Any]] = None):
+            print(f"Dummy ChromaService: Query collection '{collection_name}' with {len(query_texts)} queries.")
+            return {"ids": [[] for _ in query_texts], "documents": [[] for _ in query_texts], "metadatas": [[] for _ in query_texts],
+                    "distances": [[] for _ in query_texts]}
+
+        def count_documents(self, collection_name: str, where: Optional[Dict[str, Any]] = None) -> int:
+            print(f"Dummy ChromaService: Count documents in collection '{collection_name}' matching {where}.")
+            return 0 # Simulate empty collection
 
-        def delete_collection(self, collection_name: str):
-            print(f"Dummy ChromaService: Delete collection '{collection_name}'.")
+        def delete_documents(self, collection_name: str, where: Dict[str, Any]) -> bool:
+            print(f"Dummy ChromaService: Delete documents in collection '{collection_name}' matching {where}.")
             # Simulate success
             return True
 
+    def get_chroma_service(persist_directory: Optional[str] = None) -> ChromaService: # type: ignore
+        return ChromaService(persist_directory=persist_directory)
+
+
+# --- Shared collection layout ---
+# All research data lives in a few shared collections instead of one collection (and HNSW index)
+# per task. Each document carries task_id, research_topic and tenant metadata, which Chroma
+# indexes, so reads and deletes for one task or tenant are metadata-filtered. Tenants are spread
+# over RESEARCH_COLLECTION_SHARDS collections by hash; a tenant always maps to the same one.
+# Collection names include the embedding space ("<backend>_<dimensions>"), so vectors of
+# different embedding backends or sizes never end up in the same collection.
+# Existing per-task collections can be moved over with `python -m backend.migrate_collections`.
+DEFAULT_TENANT = "default"
+RESEARCH_COLLECTION_NAME = os.getenv("RESEARCH_COLLECTION_NAME", "knowledge_nexus_research")
+RESEARCH_COLLECTION_SHARDS = max(1, int(os.getenv("RESEARCH_COLLECTION_SHARDS", "1")))
+
+
+def shared_collection_name(embedding_space: str, tenant: Optional[str] = None) -> str:
+    """Name of the shared collection holding the research data of `tenant` embedded in `embedding_space`."""
+    name = f"{RESEARCH_COLLECTION_NAME}_{embedding_space}"
+    if RESEARCH_COLLECTION_SHARDS == 1:
+        return name
+    shard = zlib.crc32((tenant or DEFAULT_TENANT).encode("utf-8")) % RESEARCH_COLLECTION_SHARDS
+    return f"{name}_{shard}"
+
+
+EMPTY_UPSERT_COUNTS = {"new": 0, "updated": 0, "skipped": 0}
+
+# --- Knowledge reuse ---
+# Before searching the web, ResearchAgent asks find_reusable_research for stored items of the
+# tenant that are similar enough to the topic and were fetched (or confirmed unchanged) recently.
+KNOWLEDGE_REUSE_ENABLED = os.getenv("KNOWLEDGE_REUSE_ENABLED", "true").lower() in ("1", "true", "yes")
+KNOWLEDGE_REUSE_MIN_SIMILARITY = float(os.getenv("KNOWLEDGE_REUSE_MIN_SIMILARITY", "0.5"))
+KNOWLEDGE_REUSE_MAX_AGE_HOURS = float(os.getenv("KNOWLEDGE_REUSE_MAX_AGE_HOURS", "168"))
+
+
+def storage_document_id(task_id: str, item_id: str) -> str:
+    """
+    Document ID in a shared collection. Rows stay scoped to their task although item IDs are derived
+    from the canonical URL: Chroma metadata values are scalars, so one row cannot list several
+    tasks, and per-task counts, task-filtered synthesis queries and clear_storage_for_task all rely
+    on each task owning its rows. A source stored by several tasks therefore has one row per task;
+    find_reusable_research de-duplicates them by source.
+    """
+    return f"{task_id}:{item_id}"
+
+
+def research_data_filter(task_id: Optional[str] = None, tenant: Optional[str] = None, topic: Optional[str] = None,
+                         stored_after: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Chroma `where` filter selecting one tenant's documents, optionally narrowed to a task and/or topic,
+    and to documents stored after the `stored_after` Unix time.
+    """
+    conditions: List[Dict[str, Any]] = [{"tenant": tenant or DEFAULT_TENANT}]
+    if task_id:
+        conditions.append({"task_id": task_id})
+    if topic:
+        conditions.append({"research_topic": topic})
+    if stored_after is not None:
+        conditions.append({"stored_at": {"$gte": stored_after}})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
 
 class StorageService:
     """
     Service for interacting with a vector database (ChromaDB).
-    Manages storing and retrieving research data.
+    Manages storing and retrieving research data in the shared research collections.
     """
-    def __init__(self, persist_directory: Optional[str] = "./chroma_db_store_service"):
+    def __init__(self, persist_directory: Optional[str] = "./chroma_db_store_service", chroma_service: Optional[ChromaService] = None):
         """
         Initializes the StorageService with a ChromaService instance.
 
         Args:
             persist_directory (Optional[str]): The directory for ChromaDB to persist data.
                                                Defaults to "./chroma_db_store_service".
+            chroma_service (Optional[ChromaService]): An already initialized ChromaService to use (e.g. the
+                                                      API's), instead of the process-wide one for persist_directory.
         """
         self.chroma_service: Optional[ChromaService] = None
         self.initialization_error: Optional[str] = None
+        if chroma_service is not None:
+            self.chroma_service = chroma_service
+            print("StorageService: Using the provided ChromaService instance.")
+            return
         try:
             # Adjust the import path based on your actual project structure
             # If this script is in backend/agents/ and chroma_service.py is in backend/services/
@@ -53,16 +138,15 @@ class StorageService:
             # when this module is imported as part of the package.
             # If running this script directly, Python might struggle with relative imports.
             # The try-except block for ChromaService definition is a workaround for direct execution/testing.
-            global ChromaService
             if 'ChromaService' not in globals() or globals()['ChromaService'].__module__ == __name__:
                  # This checks if ChromaService is the dummy one defined above
                  # Re-attempt import if running in a context where it might be found
-                 from ..services.chroma_service import ChromaService as RealChromaService
-                 self.chroma_service = RealChromaService(persist_directory=persist_directory)
+                 from ..services.chroma_service import get_chroma_service as get_real_chroma_service
+                 self.chroma_service = get_real_chroma_service(persist_directory=persist_directory)
             else:
                  # ChromaService was already imported (likely the real one by a higher-level module)
                  # or it's the dummy if the import above failed and we are in the except block of the initial try-import
-                 self.chroma_service = ChromaService(persist_directory=persist_directory)
+                 self.chroma_service = get_chroma_service(persist_directory=persist_directory)
 
             print(f"StorageService: ChromaService initialized successfully (persist_directory: {persist_directory}).")
         except ImportError as e_imp:
@@ -85,28 +169,111 @@ class StorageService:
         """Checks if the underlying ChromaService was successfully initialized."""
         return self.chroma_service is not None and self.initialization_error is None
 
-    def add_research_data(self, task_id: str, research_items: List[Dict[str, Any]], topic: str) -> Tuple[bool, Optional[str]]:
+    def _collection_name(self, tenant: Optional[str]) -> str:
+        return shared_collection_name(self.chroma_service.embedding_space, tenant)
+
+    def add_research_data(self, task_id: str, research_items: List[Dict[str, Any]], topic: str,
+                          tenant: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
-        Adds processed research data to storage.
+        Adds processed research data to storage. Items that are already stored unchanged are skipped
+        (see upsert_research_data).
 
         Args:
-            task_id (str): The unique ID for the research task, used as the collection name.
+            task_id (str): The unique ID for the research task, stored as document metadata.
             research_items (List[Dict[str, Any]]): A list of research items (dictionaries).
                                                    Each item should have 'id', 'snippet', 'url', 'title'.
             topic (str): The research topic.
+            tenant (Optional[str]): Tenant owning the data. Defaults to DEFAULT_TENANT.
 
         Returns:
             Tuple[bool, Optional[str]]: A boolean indicating success, and an optional error message.
         """
+        counts, message = self.upsert_research_data(task_id, research_items, topic, tenant)
+        return counts is not None, message
+
+    async def aadd_research_data(self, task_id: str, research_items: List[Dict[str, Any]], topic: str,
+                                 tenant: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """Async variant of add_research_data."""
+        counts, message = await self.aupsert_research_data(task_id, research_items, topic, tenant)
+        return counts is not None, message
+
+    def upsert_research_data(self, task_id: str, research_items: List[Dict[str, Any]], topic: str,
+                             tenant: Optional[str] = None) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        """
+        Stores research items, embedding only those that are new or whose snippet changed. Item IDs
+        are derived from the canonical URL (see search_service.research_item_id), so a page found
+        again by a retried or repeated search replaces its stored document instead of duplicating it.
+
+        Returns:
+            Tuple[Optional[Dict[str, int]], Optional[str]]: The number of "new", "updated" and "skipped"
+                                                            items (None on failure), and an optional error message.
+        """
         if not self.is_initialized() or self.chroma_service is None:
-            return False, self.initialization_error or "ChromaService not available."
+            return None, self.initialization_error or "ChromaService not available."
+
+        if not research_items:
+            return dict(EMPTY_UPSERT_COUNTS), "No research items to add."
+
+        documents, metadatas, ids = self._prepare_documents(research_items, topic, task_id, tenant)
+        if not documents:
+            return dict(EMPTY_UPSERT_COUNTS), "No valid documents extracted from research items to add to ChromaDB."
+
+        collection_name = self._collection_name(tenant)
+        try:
+            print(f"StorageService: Attempting to upsert {len(documents)} documents into ChromaDB collection: {collection_name}")
+            counts = self.chroma_service.upsert_documents(
+                collection_name=collection_name,
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+            return self._upsert_result(task_id, counts)
+        except Exception as e:
+            error_msg = f"Error interacting with ChromaDB during add: {e}"
+            print(f"StorageService: {error_msg}")
+            return None, error_msg
+
+    async def aupsert_research_data(self, task_id: str, research_items: List[Dict[str, Any]], topic: str,
+                                    tenant: Optional[str] = None) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        """
+        Async variant of upsert_research_data. Uses ChromaService.aupsert_documents when available and
+        otherwise runs the synchronous upsert on the blocking I/O pool.
+        """
+        if not self.is_initialized() or self.chroma_service is None:
+            return None, self.initialization_error or "ChromaService not available."
 
         if not research_items:
-            return True, "No research items to add."
+            return dict(EMPTY_UPSERT_COUNTS), "No research items to add."
+
+        documents, metadatas, ids = self._prepare_documents(research_items, topic, task_id, tenant)
+        if not documents:
+            return dict(EMPTY_UPSERT_COUNTS), "No valid documents extracted from research items to add to ChromaDB."
 
+        collection_name = self._collection_name(tenant)
+        try:
+            print(f"StorageService: Attempting to upsert {len(documents)} documents into ChromaDB collection: {collection_name} (async)")
+            upsert_async = getattr(self.chroma_service, "aupsert_documents", None)
+            if upsert_async is not None:
+                counts = await upsert_async(collection_name=collection_name, documents=documents, metadatas=metadatas, ids=ids)
+            else:
+                counts = await run_blocking(
+                    self.chroma_service.upsert_documents,
+                    collection_name=collection_name, documents=documents, metadatas=metadatas, ids=ids
+                )
+            return self._upsert_result(task_id, counts)
+        except Exception as e:
+            error_msg = f"Error interacting with ChromaDB during add: {e}"
+            print(f"StorageService: {error_msg}")
+            return None, error_msg
+
+    @staticmethod
+    def _prepare_documents(research_items: List[Dict[str, Any]], topic: str, task_id: str,
+                           tenant: Optional[str] = None) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """Extracts the documents, metadata and IDs to store from research items with a snippet."""
         documents: List[str] = []
         metadatas: List[Dict[str, Any]] = []
         ids: List[str] = []
+        stored_at = time.time()
 
         for item in research_items:
             if item.get('snippet'):
@@ -115,40 +282,122 @@ class StorageService:
                     "source_url": item.get('url', ''),
                     "title": item.get('title', ''),
                     "research_topic": topic,
-                    "original_id_from_source": item.get('id')
+                    "original_id_from_source": item.get('id'),
+                    "task_id": task_id,
+                    "tenant": tenant or DEFAULT_TENANT,
+                    "stored_at": stored_at,
                 })
-                ids.append(item['id'])
+                ids.append(storage_document_id(task_id, item['id']))
+        return documents, metadatas, ids
+
+    @staticmethod
+    def _upsert_result(task_id: str, counts: Optional[Dict[str, int]]) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        if counts is not None:
+            print(f"StorageService: Stored documents for task '{task_id}': {counts['new']} new, {counts['updated']} updated, {counts['skipped']} unchanged.")
+            return counts, None
+        error_msg = f"Failed to add documents to ChromaDB for task '{task_id}' (reason unknown from ChromaService)."
+        print(f"StorageService: {error_msg}")
+        return None, error_msg
+
+    def query_research_data(self, query_texts: List[str], n_results: int = 5, tenant: Optional[str] = None,
+                            task_id: Optional[str] = None, topic: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Similarity search over a tenant's research data, across all of its tasks unless `task_id` or `topic` is given.
 
-        if not documents:
-            return True, "No valid documents extracted from research items to add to ChromaDB."
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Optional[str]]: The Chroma query result or None, and an optional error message.
+        """
+        if not self.is_initialized() or self.chroma_service is None:
+            return None, self.initialization_error or "ChromaService not available."
 
-        collection_name = task_id
-        try:
-            print(f"StorageService: Attempting to add {len(documents)} documents to ChromaDB collection: {collection_name}")
-            added_successfully = self.chroma_service.add_documents(
-                collection_name=collection_name,
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            if added_successfully:
-                print(f"StorageService: Added {len(documents)} documents to ChromaDB for task '{task_id}'.")
-                return True, None
-            else:
-                error_msg = f"Failed to add documents to ChromaDB for task '{task_id}' (reason unknown from ChromaService)."
-                print(f"StorageService: {error_msg}")
-                return False, error_msg
-        except Exception as e:
-            error_msg = f"Error interacting with ChromaDB during add: {e}"
-            print(f"StorageService: {error_msg}")
-            return False, error_msg
+        results = self.chroma_service.query_documents(
+            collection_name=self._collection_name(tenant),
+            query_texts=query_texts,
+            n_results=n_results,
+            where=research_data_filter(task_id=task_id, tenant=tenant, topic=topic),
+        )
+        if results is None:
+            return None, f"Failed to query research data for tenant '{tenant or DEFAULT_TENANT}'."
+        return results, None
+
+    def find_reusable_research(self, topic: str, n_results: int = 10, tenant: Optional[str] = None,
+                               min_similarity: Optional[float] = None,
+                               max_age_hours: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Looks up stored research items of the tenant (from any task) that can stand in for web results on `topic`.
+
+        Only items stored within `max_age_hours` and with a cosine similarity to the topic of at least
+        `min_similarity` qualify (defaults: KNOWLEDGE_REUSE_MAX_AGE_HOURS / KNOWLEDGE_REUSE_MIN_SIMILARITY).
+        The same source stored by several tasks is returned once; the query is widened until
+        `n_results` distinct sources are found or no further match qualifies.
 
-    def get_collection_item_count(self, task_id: str) -> Tuple[Optional[int], Optional[str]]:
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Research items, most similar first, and an optional error message.
         """
-        Gets the number of items in a specific collection (task).
+        if not self.is_initialized() or self.chroma_service is None:
+            return [], self.initialization_error or "ChromaService not available."
+
+        min_similarity = KNOWLEDGE_REUSE_MIN_SIMILARITY if min_similarity is None else min_similarity
+        max_age_hours = KNOWLEDGE_REUSE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+        where = research_data_filter(tenant=tenant, stored_after=time.time() - max_age_hours * 3600)
+        # Sources stored by several tasks come back once per task, so start with twice as many rows
+        # and widen the query while duplicates crowd out distinct sources.
+        fetch = n_results * 2
+        while True:
+            results = self.chroma_service.query_documents(
+                collection_name=self._collection_name(tenant), query_texts=[topic], n_results=fetch, where=where,
+            )
+            if results is None:
+                return [], f"Failed to query the knowledge base for tenant '{tenant or DEFAULT_TENANT}'."
+            items, exhausted = self._reusable_items(results, n_results, min_similarity)
+            if len(items) == n_results or exhausted or len(results["ids"][0]) < fetch:
+                return items, None
+            fetch *= 2
+
+    @staticmethod
+    def _reusable_items(results: Dict[str, Any], n_results: int,
+                        min_similarity: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Up to `n_results` distinct sources of a query result, and whether a row fell below `min_similarity`."""
+        items: List[Dict[str, Any]] = []
+        seen_sources = set()
+        for doc_id, document, metadata, distance in zip(results["ids"][0], results["documents"][0],
+                                                        results["metadatas"][0], results["distances"][0]):
+            # Collections use squared L2 distance; for the unit-length embeddings this is 2 - 2 * cosine.
+            similarity = 1.0 - distance / 2.0
+            if similarity < min_similarity:
+                return items, True  # Rows are ordered by distance; no later row qualifies either.
+            metadata = metadata or {}
+            source = metadata.get("original_id_from_source") or metadata.get("source_url") or doc_id
+            if source in seen_sources:
+                continue
+            seen_sources.add(source)
+            items.append({
+                "id": metadata.get("original_id_from_source") or doc_id,
+                "url": metadata.get("source_url", ""),
+                "title": metadata.get("title", ""),
+                "snippet": document,
+                "raw_content": document,
+                "score": round(similarity, 4),
+                "source_name": "Knowledge Base",
+                "reused_from_task": metadata.get("task_id"),
+            })
+            if len(items) == n_results:
+                break
+        return items, False
+
+    async def afind_reusable_research(self, topic: str, n_results: int = 10, tenant: Optional[str] = None,
+                                      min_similarity: Optional[float] = None,
+                                      max_age_hours: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Async variant of find_reusable_research; the query runs on the blocking I/O pool."""
+        return await run_blocking(self.find_reusable_research, topic, n_results, tenant, min_similarity, max_age_hours)
+
+    def get_collection_item_count(self, task_id: str, tenant: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Gets the number of stored items of a research task.
 
         Args:
-            task_id (str): The unique ID for the research task (collection name).
+            task_id (str): The unique ID for the research task.
+            tenant (Optional[str]): Tenant owning the task. Defaults to DEFAULT_TENANT.
 
         Returns:
             Tuple[Optional[int], Optional[str]]: Number of items or None, and an optional error message.
@@ -157,37 +406,38 @@ class StorageService:
             return None, self.initialization_error or "ChromaService not available."
 
         try:
-            collection = self.chroma_service.get_collection(collection_name=task_id)
-            if collection:
-                return collection.count(), None
-            else:
-                return 0, f"Collection '{task_id}' not found or could not be retrieved."
+            count = self.chroma_service.count_documents(self._collection_name(tenant), where=research_data_filter(task_id=task_id, tenant=tenant))
+            if count is None:
+                return None, f"Could not count the stored items of task '{task_id}'."
+            return count, None
         except Exception as e:
-            error_msg = f"Error getting collection count for '{task_id}': {e}"
+            error_msg = f"Error getting item count for task '{task_id}': {e}"
             print(f"StorageService: {error_msg}")
             return None, error_msg
 
-    def clear_storage_for_task(self, task_id: str) -> Tuple[bool, Optional[str]]:
+    def clear_storage_for_task(self, task_id: str, tenant: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
-        Deletes the collection associated with a task_id.
+        Deletes the stored items of a research task.
 
         Args:
-            task_id (str): The unique ID for the research task (collection name).
+            task_id (str): The unique ID for the research task.
+            tenant (Optional[str]): Tenant owning the task. Defaults to DEFAULT_TENANT.
 
         Returns:
-            Tuple[bool, Optional[str]]: True if deletion was successful or collection didn't exist,
+            Tuple[bool, Optional[str]]: True if deletion was successful or there was nothing to delete,
                                        False if an error occurred, and an optional error message.
         """
         if not self.is_initialized() or self.chroma_service is None:
             return False, self.initialization_error or "ChromaService not available."
 
         try:
-            print(f"StorageService: Attempting to delete collection '{task_id}' for cleanup.")
-            self.chroma_service.delete_collection(collection_name=task_id)
-            print(f"StorageService: Collection '{task_id}' deleted or did not exist.")
+            print(f"StorageService: Attempting to delete the stored items of task '{task_id}' for cleanup.")
+            if not self.chroma_service.delete_documents(self._collection_name(tenant), where=research_data_filter(task_id=task_id, tenant=tenant)):
+                return False, f"Failed to delete the stored items of task '{task_id}'."
+            print(f"StorageService: Stored items of task '{task_id}' deleted or did not exist.")
             return True, None
         except Exception as e:
-            error_msg = f"Error deleting collection '{task_id}': {e}"
+            error_msg = f"Error deleting the stored items of task '{task_id}': {e}"
             print(f"StorageService: {error_msg}")
             return False, error_msg
 
@@ -246,7 +496,7 @@ if __name__ == '__main__':
             print(f"Post-test cleanup error: {error_clean}")
         else:
             if cleaned:
-                 print(f"Collection '{test_task_id}' cleaned up successfully.")
+                 print(f"Stored items of task '{test_task_id}' cleaned up successfully.")
     else:
         print(f"StorageService could not be initialized. Error: {storage_service.initialization_error}")
 
@@ -0,0 +1,24 @@
+from typing import Callable, Optional
+
+from langgraph.config import get_stream_writer
+
+# Key of the custom stream events carrying generated text; consumed by main.run_research_workflow_async.
+PARTIAL_TEXT_EVENT = "partial_text"
+
+
+def partial_text_writer(field: str) -> Optional[Callable[[str], None]]:
+    """
+    Callback that publishes chunks of the text being generated for state `field` (e.g. "final_document")
+    as "custom" stream events of the running graph, or None when not called from a graph node.
+    """
+    try:
+        write = get_stream_writer()
+    except RuntimeError:
+        return None
+    return lambda delta: write({PARTIAL_TEXT_EVENT: {"field": field, "delta": delta}})
+
+
+def llm_call_options(field: str, use_cache: bool) -> dict:
+    """Keyword arguments for LLMService.invoke()/ainvoke() that stream the response into `field` when run in a graph."""
+    on_chunk = partial_text_writer(field)
+    return {"use_cache": use_cache, "on_chunk": on_chunk} if on_chunk else {"use_cache": use_cache}
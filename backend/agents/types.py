@@ -33,4 +33,12 @@ class KnowledgeNexusState(TypedDict):
     human_feedback: Optional[HumanApproval] # For HITL
     sources_explored: int # For progress tracking
     data_collected: int # For progress tracking
+    bypass_cache: bool # Skip cached results (e.g. LLM responses) for this task
+    tenant: Optional[str] # Owner of the task's stored research data (None: the default tenant)
+    storage_counts: Dict[str, int] # New, updated and skipped (unchanged) items written to the vector store
+    sources_reused: int # Items taken from the knowledge base instead of the web (included in sources_explored)
+    search_calls_saved: int # Web search calls avoided by reusing stored items
+    synthesis_context: Dict[str, Any] # Items selected for the synthesis prompt, and those dropped (with the reason)
+    synthesis_map_reduce: Dict[str, int] # Sources, summaries (cached ones included) and summarized chunks of a map-reduce synthesis
+    synthesis_is_report: bool # synthesized_content is already the final report (LLM_PIPELINE_MODE=single_call)
     # num_search_results: Optional[int] # Example: if we want to control this per task
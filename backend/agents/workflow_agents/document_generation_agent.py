@@ -2,14 +2,19 @@ from typing import List, Dict, Any, Optional
 
 try:
     from ..llm_service import LLMService
+    from ..streaming import llm_call_options
     # from ..research_workflow import KnowledgeNexusState # Placeholder
 except ImportError:
     print("DocumentGenerationAgent: Could not import LLMService. Using placeholder logic for LLM.")
     class LLMService: # type: ignore
         def is_initialized(self) -> bool: return False
-        def invoke(self, prompt: str) -> tuple[None | str, None | str]:
+        def invoke(self, prompt: str, use_cache: bool = True) -> tuple[None | str, None | str]:
             print(f"Dummy LLMService: Simulating LLM invoke for document formatting: {prompt[:50]}...")
             return f"Simulated formatted document based on prompt: {prompt[:50]}", None
+        async def ainvoke(self, prompt: str, use_cache: bool = True) -> tuple[None | str, None | str]:
+            return self.invoke(prompt)
+    def llm_call_options(field, use_cache): # type: ignore
+        return {"use_cache": use_cache}
 
 # If KnowledgeNexusState is not imported, provide a basic structure for type hinting.
 from ..types import KnowledgeNexusState
@@ -17,7 +22,9 @@ from ..types import KnowledgeNexusState
 class DocumentGenerationAgent:
     """
     Agent responsible for generating the final document from synthesized content.
-    It can optionally use an LLM for advanced formatting.
+    It can optionally use an LLM for advanced formatting; inside a graph run the LLM output is
+    streamed, so the document can be delivered while it is being written (/results/{task_id}/stream).
+    When the synthesis call already wrote the report (`synthesis_is_report`), it is rendered locally.
     """
     def __init__(self, llm_service: Optional[LLMService] = None):
         """
@@ -43,20 +50,23 @@ class DocumentGenerationAgent:
 
         return f"## Final Report on: {topic or 'N/A'}\n\n{synthesized_content}{conflict_section}"
 
-    def _format_document_with_llm(self, topic: Optional[str], synthesized_content: str, detected_conflicts: List[Dict[str, Any]]) -> tuple[str | None, str | None]:
+    def _render_report(self, report: str, detected_conflicts: List[Dict[str, Any]]) -> str:
         """
-        Uses the LLM to format the document.
-        Returns the formatted document and an optional error message.
+        Local template for a report written by the synthesis call. Conflicts are only detected
+        after synthesis, so they are appended here.
         """
-        if not self.llm_service or not self.llm_service.is_initialized():
-            return None, "LLM service not available for advanced formatting."
+        if not detected_conflicts:
+            return report
+        conflict_details = "\n".join([f"- {c.get('type', 'Conflict')}: {c.get('details', 'No details')}" for c in detected_conflicts])
+        return f"{report}\n\n## Detected Conflicts\n{len(detected_conflicts)} conflicts found:\n{conflict_details}"
 
+    def _build_formatting_prompt(self, topic: Optional[str], synthesized_content: str, detected_conflicts: List[Dict[str, Any]]) -> str:
         conflict_text = "No conflicts detected."
         if detected_conflicts:
             conflict_items = [f"- Type: {c.get('type', 'N/A')}, Details: {c.get('details', 'N/A')}" for c in detected_conflicts]
             conflict_text = f"The following conflicts or points of attention were noted:\n" + "\n".join(conflict_items)
 
-        prompt = (
+        return (
             f"You are a document formatting expert. Based on the following synthesized content and detected conflicts "
             f"for the topic '{topic or 'N/A'}', generate a well-structured final report. "
             f"Ensure the report is clear, professional, and presents the information logically. "
@@ -66,8 +76,29 @@ class DocumentGenerationAgent:
             f"Formatted Final Report:"
         )
 
+    def _format_document_with_llm(self, topic: Optional[str], synthesized_content: str, detected_conflicts: List[Dict[str, Any]], use_cache: bool = True) -> tuple[str | None, str | None]:
+        """
+        Uses the LLM to format the document.
+        Returns the formatted document and an optional error message.
+        """
+        if not self.llm_service or not self.llm_service.is_initialized():
+            return None, "LLM service not available for advanced formatting."
+
+        prompt = self._build_formatting_prompt(topic, synthesized_content, detected_conflicts)
         print(f"DocumentGenerationAgent: Invoking LLM for document formatting (prompt length: {len(prompt)} chars).")
-        formatted_doc, error = self.llm_service.invoke(prompt)
+        formatted_doc, error = self.llm_service.invoke(prompt, **llm_call_options('final_document', use_cache))
+        if error:
+            return None, f"LLM formatting error: {error}"
+        return formatted_doc, None
+
+    async def _aformat_document_with_llm(self, topic: Optional[str], synthesized_content: str, detected_conflicts: List[Dict[str, Any]], use_cache: bool = True) -> tuple[str | None, str | None]:
+        """Async variant of _format_document_with_llm()."""
+        if not self.llm_service or not self.llm_service.is_initialized():
+            return None, "LLM service not available for advanced formatting."
+
+        prompt = self._build_formatting_prompt(topic, synthesized_content, detected_conflicts)
+        print(f"DocumentGenerationAgent: Invoking LLM for document formatting (prompt length: {len(prompt)} chars).")
+        formatted_doc, error = await self.llm_service.ainvoke(prompt, **llm_call_options('final_document', use_cache))
         if error:
             return None, f"LLM formatting error: {error}"
         return formatted_doc, None
@@ -82,13 +113,48 @@ class DocumentGenerationAgent:
         Returns:
             The updated KnowledgeNexusState.
         """
+        if not self._prepare(state):
+            return state
+
+        formatted_document = None
+        if self._llm_available():
+            print("DocumentGenerationAgent: Attempting LLM-based document formatting.")
+            formatted_document, llm_formatting_error = self._format_document_with_llm(
+                state.get('topic'), state.get('synthesized_content', ""), state.get('detected_conflicts', []),
+                use_cache=not state.get('bypass_cache', False)
+            )
+            self._note_formatting_error(state, llm_formatting_error)
+
+        self._apply_document(state, formatted_document)
+        return state
+
+    async def aexecute(self, state: KnowledgeNexusState) -> KnowledgeNexusState:
+        """Async variant of execute(), awaiting the LLM formatting call."""
+        if not self._prepare(state):
+            return state
+
+        formatted_document = None
+        if self._llm_available():
+            print("DocumentGenerationAgent: Attempting LLM-based document formatting.")
+            formatted_document, llm_formatting_error = await self._aformat_document_with_llm(
+                state.get('topic'), state.get('synthesized_content', ""), state.get('detected_conflicts', []),
+                use_cache=not state.get('bypass_cache', False)
+            )
+            self._note_formatting_error(state, llm_formatting_error)
+
+        self._apply_document(state, formatted_document)
+        return state
+
+    def _prepare(self, state: KnowledgeNexusState) -> bool:
+        """
+        Marks the stage and handles placeholder synthesis output. Returns False when the final
+        document has already been produced with basic formatting.
+        """
         print(f"--- DocumentGenerationAgent: Executing --- Task ID: {state.get('task_id')}, Current Stage: {state.get('current_stage')}")
         state['current_stage'] = "generating_document"
         state['error_message'] = None # Clear previous document generation errors
 
-        topic = state.get('topic')
         synthesized_content = state.get('synthesized_content', "")
-        detected_conflicts = state.get('detected_conflicts', [])
 
         is_placeholder_synthesis = (
             not synthesized_content or
@@ -100,31 +166,35 @@ class DocumentGenerationAgent:
         if is_placeholder_synthesis:
             warning_msg = "Synthesized content is empty, placeholder, or indicates a prior error. Basic document will reflect this."
             print(f"DocumentGenerationAgent Warning: {warning_msg}")
-            state['final_document'] = self._format_basic_document(topic, "Content synthesis was skipped, incomplete, or failed.", detected_conflicts)
+            state['final_document'] = self._format_basic_document(state.get('topic'), "Content synthesis was skipped, incomplete, or failed.", state.get('detected_conflicts', []))
             # state['error_message'] = warning_msg # Decided against setting error for this, as it's more of a status.
-            return state
+            return False
 
-        formatted_document = None
-        llm_formatting_error = None
+        if state.get('synthesis_is_report'):
+            print("DocumentGenerationAgent: Synthesis already wrote the report. Rendering it without an LLM formatting pass.")
+            state['final_document'] = self._render_report(synthesized_content, state.get('detected_conflicts', []))
+            return False
+        return True
 
+    def _llm_available(self) -> bool:
         if self.llm_service and self.llm_service.is_initialized():
-            print("DocumentGenerationAgent: Attempting LLM-based document formatting.")
-            formatted_document, llm_formatting_error = self._format_document_with_llm(topic, synthesized_content, detected_conflicts)
-            if llm_formatting_error:
-                print(f"DocumentGenerationAgent: LLM formatting failed: {llm_formatting_error}. Falling back to basic formatting.")
-                state['error_message'] = llm_formatting_error
-        else:
-            print("DocumentGenerationAgent: LLM service not available or not initialized. Using basic formatting.")
+            return True
+        print("DocumentGenerationAgent: LLM service not available or not initialized. Using basic formatting.")
+        return False
+
+    def _note_formatting_error(self, state: KnowledgeNexusState, llm_formatting_error: Optional[str]) -> None:
+        if llm_formatting_error:
+            print(f"DocumentGenerationAgent: LLM formatting failed: {llm_formatting_error}. Falling back to basic formatting.")
+            state['error_message'] = llm_formatting_error
 
+    def _apply_document(self, state: KnowledgeNexusState, formatted_document: Optional[str]) -> None:
         if formatted_document:
             state['final_document'] = formatted_document
             print("DocumentGenerationAgent: Document generated successfully using LLM.")
         else:
-            state['final_document'] = self._format_basic_document(topic, synthesized_content, detected_conflicts)
+            state['final_document'] = self._format_basic_document(state.get('topic'), state.get('synthesized_content', ""), state.get('detected_conflicts', []))
             print("DocumentGenerationAgent: Document generated using basic formatting.")
 
-        return state
-
 if __name__ == '__main__':
     print("Testing DocumentGenerationAgent...")
 
@@ -137,7 +207,7 @@ if __name__ == '__main__':
         def is_initialized(self) -> bool:
             return self._initialized
 
-        def invoke(self, prompt: str) -> tuple[str | None, str | None]:
+        def invoke(self, prompt: str, use_cache: bool = True) -> tuple[str | None, str | None]:
             if not self._initialized:
                 return None, "LLM not initialized for DocGen"
             if self._simulate_error:
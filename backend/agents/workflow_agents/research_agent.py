@@ -1,9 +1,11 @@
+import asyncio
+import math
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 try:
-    from ..search_service import SearchService
-    from ..storage_service import StorageService
+    from ..search_service import CSE_PAGE_SIZE, SearchService
+    from ..storage_service import KNOWLEDGE_REUSE_ENABLED, StorageService
     # Assuming KnowledgeNexusState and other shared types might be moved to a common module later
     # For now, if they are defined in research_workflow.py, this import won't work directly
     # We might need to pass them or redefine simplified versions for agent's internal use if decoupled.
@@ -12,10 +14,14 @@ except ImportError:
     # Fallback for direct execution or testing if services are not found via relative imports
     # This is simplified; real testing would require mocks or stubs.
     print("ResearchAgent: Could not import SearchService or StorageService. Using placeholder logic.")
+    CSE_PAGE_SIZE = 10
+    KNOWLEDGE_REUSE_ENABLED = False
     class SearchService: # type: ignore
         def search(self, topic: str, num_results: int = 10) -> tuple[list, None]:
             print(f"Dummy SearchService: Searching for '{topic}' (num_results: {num_results})")
             return [], None
+        async def asearch(self, topic: str, num_results: int = 10) -> tuple[list, None]:
+            return self.search(topic, num_results)
     class StorageService: # type: ignore
         def __init__(self, persist_directory: Optional[str] = None): # Added persist_directory to match real class
             print(f"Dummy StorageService initialized (persist_directory: {persist_directory}).")
@@ -24,10 +30,13 @@ except ImportError:
             print("Dummy StorageService: is_initialized called.")
             return True
 
-        def add_research_data(self, task_id: str, research_items: list, topic: str) -> tuple[bool, None]:
+        def add_research_data(self, task_id: str, research_items: list, topic: str, tenant: Optional[str] = None) -> tuple[bool, None]:
             print(f"Dummy StorageService: Adding {len(research_items)} items for task '{task_id}' on topic '{topic}'")
             return True, None
 
+        async def aadd_research_data(self, task_id: str, research_items: list, topic: str, tenant: Optional[str] = None) -> tuple[bool, None]:
+            return self.add_research_data(task_id, research_items, topic, tenant)
+
 # If KnowledgeNexusState is not imported, provide a basic structure for type hinting.
 # This should ideally be imported from a shared types module.
 from ..types import KnowledgeNexusState
@@ -36,6 +45,9 @@ class ResearchAgent:
     """
     Agent responsible for conducting research using a SearchService and
     storing the results via a StorageService.
+
+    Research is retrieval-first: fresh, relevant items already in the knowledge base (stored by
+    earlier tasks of the same tenant) are reused, and only the remaining gap is searched on the web.
     """
     def __init__(self, search_service: SearchService, storage_service: StorageService):
         """
@@ -58,6 +70,77 @@ class ResearchAgent:
         Returns:
             The updated KnowledgeNexusState.
         """
+        if not self._begin(state):
+            return state
+        topic, task_id = state['topic'], state['task_id']
+
+        num_search_results = state.get('num_search_results', 10)
+        gap, reused_ids = self._apply_reused_items(state, self._find_reusable(state, num_search_results), num_search_results)
+        if gap > 0:
+            search_results, search_error = self.search_service.search(topic, num_results=gap)
+        else:
+            search_results, search_error = [], None
+        valid_search_results = self._apply_search_results(state, self._exclude_reused(search_results, reused_ids), search_error)
+
+        if valid_search_results and self.storage_service.is_initialized():
+            print(f"ResearchAgent: Storing {len(valid_search_results)} new items in DB for task '{task_id}'.")
+            stored_counts, db_error = self._store(task_id, valid_search_results, topic, state.get('tenant'))
+            self._apply_storage_result(state, stored_counts, db_error)
+        elif not self.storage_service.is_initialized():
+            self._note_storage_unavailable(state)
+
+        state['human_in_loop_needed'] = state.get('human_in_loop_needed', False)
+        return state
+
+    async def aexecute(self, state: KnowledgeNexusState) -> KnowledgeNexusState:
+        """
+        Async variant of execute(), used when the workflow is streamed with astream(). Search and
+        storage go through the services' async methods so the event loop is never blocked.
+        When the search service streams result pages, each page is stored while later pages load.
+        """
+        if not self._begin(state):
+            return state
+        topic, task_id = state['topic'], state['task_id']
+        num_search_results = state.get('num_search_results', 10)
+        storage_available = self.storage_service.is_initialized()
+        gap, reused_ids = self._apply_reused_items(state, await self._afind_reusable(state, num_search_results), num_search_results)
+
+        stream_search = getattr(self.search_service, "astream_search", None)
+        if gap <= 0:
+            search_results, search_error, page_storage = [], None, []
+        elif stream_search is None:
+            search_results, search_error = await self.search_service.asearch(topic, num_results=gap)
+            search_results = self._exclude_reused(search_results, reused_ids)
+            page_storage = []
+            if storage_available and search_results:
+                page_storage.append(asyncio.create_task(
+                    self._astore(task_id, [item for item in search_results if item], topic, state.get('tenant'))
+                ))
+        else:
+            search_results, page_errors, page_storage = [], [], []
+            async for page_results, page_error in stream_search(topic, num_results=gap):
+                page_items = self._exclude_reused(page_results, reused_ids)
+                search_results.extend(page_items)
+                if page_error:
+                    page_errors.append(page_error)
+                if storage_available and page_items:
+                    print(f"ResearchAgent: Storing {len(page_items)} new items in DB for task '{task_id}'.")
+                    page_storage.append(asyncio.create_task(self._astore(task_id, page_items, topic, state.get('tenant'))))
+            # A failed page only matters if the search produced nothing at all.
+            search_error = page_errors[0] if page_errors and not search_results else None
+
+        self._apply_search_results(state, search_results, search_error)
+        for storage_task in page_storage:
+            stored_counts, db_error = await storage_task
+            self._apply_storage_result(state, stored_counts, db_error)
+        if not storage_available:
+            self._note_storage_unavailable(state)
+
+        state['human_in_loop_needed'] = state.get('human_in_loop_needed', False)
+        return state
+
+    def _begin(self, state: KnowledgeNexusState) -> bool:
+        """Marks the stage and validates the inputs. Returns False if research cannot proceed."""
         print(f"--- ResearchAgent: Executing --- Task ID: {state.get('task_id')}, Current Stage: {state.get('current_stage')}")
         state['current_stage'] = "researching"
 
@@ -70,15 +153,68 @@ class ResearchAgent:
             state['research_data'] = state.get('research_data', [])
             state['sources_explored'] = state.get('sources_explored', 0)
             state['data_collected'] = len(state.get('research_data', []))
-            return state
+            return False
 
         print(f"ResearchAgent: Initiating research for topic: '{topic}' (Task ID: {task_id})")
         state['error_message'] = None  # Clear previous errors
-
-        # Perform search
-        num_search_results = state.get('num_search_results', 10)
-        search_results, search_error = self.search_service.search(topic, num_results=num_search_results)
-
+        return True
+
+    def _reuse_enabled(self, state: KnowledgeNexusState) -> bool:
+        """bypass_cache asks for fresh web results, so it skips the knowledge base as well."""
+        return KNOWLEDGE_REUSE_ENABLED and not state.get('bypass_cache') and self.storage_service.is_initialized()
+
+    def _find_reusable(self, state: KnowledgeNexusState, num_results: int) -> List[Dict[str, Any]]:
+        find = getattr(self.storage_service, "find_reusable_research", None)
+        if find is None or not self._reuse_enabled(state):
+            return []
+        items, error = find(state['topic'], n_results=num_results, tenant=state.get('tenant'))
+        return self._reusable_or_empty(items, error)
+
+    async def _afind_reusable(self, state: KnowledgeNexusState, num_results: int) -> List[Dict[str, Any]]:
+        find = getattr(self.storage_service, "afind_reusable_research", None)
+        if find is None or not self._reuse_enabled(state):
+            return []
+        items, error = await find(state['topic'], n_results=num_results, tenant=state.get('tenant'))
+        return self._reusable_or_empty(items, error)
+
+    @staticmethod
+    def _reusable_or_empty(items: List[Dict[str, Any]], error: Optional[str]) -> List[Dict[str, Any]]:
+        # The knowledge base is an optimization; when it cannot be queried, everything is searched.
+        if error:
+            print(f"ResearchAgent Warning: Knowledge base lookup failed, searching the web for all results: {error}")
+            return []
+        return items
+
+    def _apply_reused_items(self, state: KnowledgeNexusState, items: List[Dict[str, Any]], num_results: int) -> Tuple[int, Set[str]]:
+        """
+        Adds reused knowledge-base items to the research data and the progress metrics. Returns the
+        number of results still to be searched and the IDs of all items already collected.
+        """
+        if state.get('research_data') is None:
+            state['research_data'] = []
+        known_ids = {item.get('id') for item in state['research_data'] if item}
+        reused = [item for item in items if item.get('id') not in known_ids]
+        known_ids.update(item.get('id') for item in reused)
+        gap = max(0, num_results - len(reused))
+
+        if reused:
+            state['research_data'].extend(reused)
+            state['sources_explored'] = state.get('sources_explored', 0) + len(reused)
+            state['data_collected'] = len(state['research_data'])
+            # Google returns CSE_PAGE_SIZE results per call.
+            saved_calls = math.ceil(num_results / CSE_PAGE_SIZE) - math.ceil(gap / CSE_PAGE_SIZE)
+            state['sources_reused'] = state.get('sources_reused', 0) + len(reused)
+            state['search_calls_saved'] = state.get('search_calls_saved', 0) + saved_calls
+            print(f"ResearchAgent: Reused {len(reused)} items from the knowledge base; searching the web for {gap} more ({saved_calls} search calls saved).")
+        return gap, known_ids
+
+    @staticmethod
+    def _exclude_reused(search_results: Optional[List[Dict[str, Any]]], reused_ids: Set[str]) -> List[Dict[str, Any]]:
+        """Drops empty results and those already collected (item IDs are derived from the source URL)."""
+        return [item for item in search_results or [] if item and item.get('id') not in reused_ids]
+
+    def _apply_search_results(self, state: KnowledgeNexusState, search_results: Optional[List[Dict[str, Any]]], search_error: Optional[str]) -> List[Dict[str, Any]]:
+        """Merges search results into the state and returns the new, non-empty items."""
         current_search_sources = len(search_results) if search_results else 0
         sources_explored_count = state.get('sources_explored', 0) + current_search_sources
 
@@ -97,27 +233,45 @@ class ResearchAgent:
         state['data_collected'] = len(state['research_data'])
 
         print(f"ResearchAgent: Found {current_search_sources} new items. Total research data: {state['data_collected']} items. Total sources explored: {state['sources_explored']}.")
-
-        if valid_search_results and self.storage_service.is_initialized():
-            print(f"ResearchAgent: Storing {len(valid_search_results)} new items in DB for task '{task_id}'.")
-            added_to_db, db_error = self.storage_service.add_research_data(
-                task_id=task_id,
-                research_items=valid_search_results,
-                topic=topic
-            )
-            if db_error:
-                print(f"ResearchAgent: Error storing data in DB: {db_error}")
-                current_error = state.get('error_message', "")
-                state['error_message'] = f"{current_error} DB storage failed: {db_error}".strip()
-            elif added_to_db:
-                print(f"ResearchAgent: Successfully stored {len(valid_search_results)} items in DB.")
-        elif not self.storage_service.is_initialized():
-            print("ResearchAgent Warning: StorageService not available or not initialized. Skipping document storage.")
+        return valid_search_results
+
+    def _store(self, task_id: str, items: List[Dict[str, Any]], topic: str, tenant: Optional[str]) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        """Stores items and returns the new/updated/skipped counts (None on failure) and an optional error."""
+        upsert = getattr(self.storage_service, "upsert_research_data", None)
+        if upsert is not None:
+            return upsert(task_id=task_id, research_items=items, topic=topic, tenant=tenant)
+        added_to_db, db_error = self.storage_service.add_research_data(task_id=task_id, research_items=items, topic=topic, tenant=tenant)
+        return self._added_counts(len(items), added_to_db), db_error
+
+    async def _astore(self, task_id: str, items: List[Dict[str, Any]], topic: str, tenant: Optional[str]) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        upsert = getattr(self.storage_service, "aupsert_research_data", None)
+        if upsert is not None:
+            return await upsert(task_id=task_id, research_items=items, topic=topic, tenant=tenant)
+        added_to_db, db_error = await self.storage_service.aadd_research_data(task_id=task_id, research_items=items, topic=topic, tenant=tenant)
+        return self._added_counts(len(items), added_to_db), db_error
+
+    @staticmethod
+    def _added_counts(item_count: int, added_to_db: bool) -> Optional[Dict[str, int]]:
+        """Storage services without upsert write every item, so they all count as new."""
+        return {"new": item_count, "updated": 0, "skipped": 0} if added_to_db else None
+
+    def _apply_storage_result(self, state: KnowledgeNexusState, stored_counts: Optional[Dict[str, int]], db_error: Optional[str]) -> None:
+        if db_error:
+            print(f"ResearchAgent: Error storing data in DB: {db_error}")
             current_error = state.get('error_message', "")
-            state['error_message'] = f"{current_error} StorageService not available; data not saved to DB.".strip()
-
-        state['human_in_loop_needed'] = state.get('human_in_loop_needed', False)
-        return state
+            state['error_message'] = f"{current_error} DB storage failed: {db_error}".strip()
+        if stored_counts:
+            totals = dict(state.get('storage_counts') or {})
+            for key, value in stored_counts.items():
+                totals[key] = totals.get(key, 0) + value
+            state['storage_counts'] = totals
+            if not db_error:
+                print(f"ResearchAgent: Stored items in DB: {stored_counts['new']} new, {stored_counts['updated']} updated, {stored_counts['skipped']} unchanged.")
+
+    def _note_storage_unavailable(self, state: KnowledgeNexusState) -> None:
+        print("ResearchAgent Warning: StorageService not available or not initialized. Skipping document storage.")
+        current_error = state.get('error_message', "")
+        state['error_message'] = f"{current_error} StorageService not available; data not saved to DB.".strip()
 
 if __name__ == '__main__':
     print("Testing ResearchAgent...")
@@ -140,7 +294,7 @@ if __name__ == '__main__':
         def is_initialized(self) -> bool:
             return True
 
-        def add_research_data(self, task_id: str, research_items: list, topic: str) -> tuple[bool, Optional[str]]:
+        def add_research_data(self, task_id: str, research_items: list, topic: str, tenant: Optional[str] = None) -> tuple[bool, Optional[str]]:
             print(f"MockStorageService: Adding {len(research_items)} items for task '{task_id}'.")
             if task_id not in self.db:
                 self.db[task_id] = []
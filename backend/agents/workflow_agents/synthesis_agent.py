@@ -1,46 +1,101 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
 try:
     from ..llm_service import LLMService
+    from ...services.context_selector import ContextSelector, context_text
+    from ..streaming import llm_call_options
+    from ...services.executors import run_blocking
     # from ..research_workflow import KnowledgeNexusState # Placeholder
 except ImportError:
     print("SynthesisAgent: Could not import LLMService. Using placeholder logic.")
     class LLMService: # type: ignore
         def is_initialized(self) -> bool: return False
-        def invoke(self, prompt: str) -> tuple[None | str, None | str]:
+        def invoke(self, prompt: str, use_cache: bool = True) -> tuple[None | str, None | str]:
             print(f"Dummy LLMService: Simulating LLM invoke for prompt starting with: {prompt[:50]}...")
             return f"Simulated LLM synthesis for prompt: {prompt[:50]}", None
+        async def ainvoke(self, prompt: str, use_cache: bool = True) -> tuple[None | str, None | str]:
+            return self.invoke(prompt)
+    class ContextSelector: # type: ignore
+        def select(self, topic, items):
+            return list(items), {"selected": len(items), "dropped": []}
+        async def aselect(self, topic, items):
+            return self.select(topic, items)
+    def context_text(item): # type: ignore
+        return item.get('snippet', item.get('raw_content', item.get('content', 'No content available')))
+    def llm_call_options(field, use_cache): # type: ignore
+        return {"use_cache": use_cache}
+    run_blocking = asyncio.to_thread
 
 # If KnowledgeNexusState is not imported, provide a basic structure for type hinting.
 from ..types import KnowledgeNexusState
 
+# --- Map-reduce synthesis ---
+# From SYNTHESIS_MAP_REDUCE_MIN_SOURCES verified items on, sources are first summarized in chunks of
+# SYNTHESIS_MAP_CHUNK_SIZE, at most SYNTHESIS_MAP_CONCURRENCY chunks at a time (the "llm" stage limit
+# still applies), and the synthesis prompt quotes those summaries. Summaries are cached per source
+# content, so tasks sharing sources only summarize them once.
+SYNTHESIS_MAP_REDUCE_MIN_SOURCES = max(1, int(os.getenv("SYNTHESIS_MAP_REDUCE_MIN_SOURCES", "50")))
+SYNTHESIS_MAP_CHUNK_SIZE = max(1, int(os.getenv("SYNTHESIS_MAP_CHUNK_SIZE", "10")))
+SYNTHESIS_MAP_CONCURRENCY = max(1, int(os.getenv("SYNTHESIS_MAP_CONCURRENCY", "4")))
+# Part of the summary cache key: bump it when the map prompt changes.
+SOURCE_SUMMARY_KIND = "source_summary_v1"
+
+_SUMMARY_LINE = re.compile(r"^\s*\[(\d+)\]\s*(.+?)\s*$", re.MULTILINE)
+
+
+def source_content_hash(item: Dict[str, Any]) -> str:
+    return hashlib.sha256(" ".join(context_text(item).split()).encode("utf-8")).hexdigest()
+
 class SynthesisAgent:
     """
     Agent responsible for synthesizing content from verified data using an LLM.
+    Only the verified items chosen by the context selector (see context_selector.py) go into the prompt.
+    Inside a graph run the synthesis is streamed, so its partial text reaches the task as it is generated.
+
+    In report mode the synthesis call writes the final structured report itself and marks the state
+    with `synthesis_is_report`, so document generation only renders it locally instead of sending the
+    whole text through the LLM a second time.
     """
-    def __init__(self, llm_service: LLMService):
+    def __init__(self, llm_service: LLMService, context_selector: Optional[ContextSelector] = None,
+                 summary_llm_service: Optional[LLMService] = None, report_mode: bool = False):
         """
         Initializes the SynthesisAgent.
 
         Args:
             llm_service: An instance of LLMService for interacting with language models.
+            context_selector: Picks the items that fit the prompt's token budget. The default one
+                              has no embedding function and keeps items in their original order.
+            summary_llm_service: LLMService for the per-source summaries of map-reduce synthesis.
+                                 Defaults to `llm_service`.
+            report_mode: Let the synthesis call produce the final report (single-call pipeline).
         """
         self.llm_service = llm_service
+        self.summary_llm_service = summary_llm_service or llm_service
+        self.context_selector = context_selector or ContextSelector()
+        self.report_mode = report_mode
         print(f"SynthesisAgent initialized (LLM Service available: {self.llm_service.is_initialized()}).")
 
     def _format_data_for_llm(self, verified_data: List[Dict[str, Any]], topic: Optional[str]) -> str:
         """
-        Formats the verified data into a string prompt for the LLM.
+        Formats the verified data into a string prompt for the LLM (the report prompt in report mode).
         """
         context_parts = []
         for i, item in enumerate(verified_data):
             title = item.get('title', f"Source {i+1}")
-            snippet = item.get('snippet', item.get('raw_content', item.get('content', 'No content available'))) # More fallbacks for content
+            snippet = context_text(item)
             url = item.get('url', 'N/A')
             context_parts.append(f"Source {i+1} (Title: {title}, URL: {url}):\n{snippet}\n---")
 
         context_string = "\n\n".join(context_parts)
 
+        if self.report_mode:
+            return self._format_report_prompt(context_string, topic)
+
         prompt_text = (
             f"You are an expert research synthesizer. Your task is to create a concise, coherent summary "
             f"from the following verified data sources related to the topic: '{topic or 'Not specified'}'. "
@@ -52,6 +107,23 @@ class SynthesisAgent:
         )
         return prompt_text
 
+    @staticmethod
+    def _format_report_prompt(context_string: str, topic: Optional[str]) -> str:
+        return (
+            f"You are an expert research analyst. Write the final research report on the topic "
+            f"'{topic or 'Not specified'}' from the following verified data sources. "
+            f"Use only facts, figures and insights present in the sources; do not speculate. "
+            f"If sources disagree on something significant, say so. "
+            f"Format the report in Markdown: a '# ' title, a short executive summary, one '## ' section per "
+            f"main theme, and a brief conclusion. Refer to sources as [Source N].\n\n"
+            f"Verified Data Sources:\n{context_string}\n\n"
+            f"Final Report:"
+        )
+
+    def _stream_field(self) -> str:
+        # In report mode the synthesis is the document being written, so it streams into final_document.
+        return 'final_document' if self.report_mode else 'synthesized_content'
+
     def execute(self, state: KnowledgeNexusState) -> KnowledgeNexusState:
         """
         Executes the content synthesis process.
@@ -62,9 +134,134 @@ class SynthesisAgent:
         Returns:
             The updated KnowledgeNexusState.
         """
+        if not self._prepare(state):
+            return state
+
+        use_cache = not state.get('bypass_cache', False)
+        items = state.get('verified_data', [])
+        if len(items) >= SYNTHESIS_MAP_REDUCE_MIN_SOURCES:
+            items = self._map_sources(state, items, use_cache)
+        selected, report = self.context_selector.select(state.get('topic'), items)
+        prompt = self._build_prompt(state, selected, report)
+        print(f"SynthesisAgent: Invoking LLM for synthesis (prompt length: {len(prompt)} chars).")
+        synthesized_text, llm_error = self.llm_service.invoke(prompt, **llm_call_options(self._stream_field(), use_cache))
+        self._apply_llm_result(state, synthesized_text, llm_error)
+        return state
+
+    async def aexecute(self, state: KnowledgeNexusState) -> KnowledgeNexusState:
+        """Async variant of execute(), awaiting the LLM instead of blocking a worker thread."""
+        if not self._prepare(state):
+            return state
+
+        use_cache = not state.get('bypass_cache', False)
+        items = state.get('verified_data', [])
+        if len(items) >= SYNTHESIS_MAP_REDUCE_MIN_SOURCES:
+            items = await self._amap_sources(state, items, use_cache)
+        selected, report = await self.context_selector.aselect(state.get('topic'), items)
+        prompt = self._build_prompt(state, selected, report)
+        print(f"SynthesisAgent: Invoking LLM for synthesis (prompt length: {len(prompt)} chars).")
+        synthesized_text, llm_error = await self.llm_service.ainvoke(prompt, **llm_call_options(self._stream_field(), use_cache))
+        self._apply_llm_result(state, synthesized_text, llm_error)
+        return state
+
+    # --- Map step ---
+
+    def _map_sources(self, state: KnowledgeNexusState, items: List[Dict[str, Any]], use_cache: bool) -> List[Dict[str, Any]]:
+        """Replaces each item's content by its summary (cached or produced in chunks on a thread pool)."""
+        hashes = [source_content_hash(item) for item in items]
+        summaries = self._cached_summaries(hashes, use_cache)
+        cached = len(summaries)
+        chunks = self._plan_map(items, summaries)
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(SYNTHESIS_MAP_CONCURRENCY, len(chunks))) as pool:
+                outcomes = list(pool.map(lambda chunk: self.summary_llm_service.invoke(self._map_prompt(items, chunk), use_cache=use_cache), chunks))
+            self._store_summaries(hashes, self._collect_summaries(chunks, outcomes, summaries))
+        return self._apply_map_result(state, items, summaries, cached, len(chunks))
+
+    async def _amap_sources(self, state: KnowledgeNexusState, items: List[Dict[str, Any]], use_cache: bool) -> List[Dict[str, Any]]:
+        """Async variant of _map_sources; chunks are summarized concurrently on the event loop, cache I/O runs on the blocking I/O pool."""
+        hashes = [source_content_hash(item) for item in items]
+        summaries = await run_blocking(self._cached_summaries, hashes, use_cache)
+        cached = len(summaries)
+        chunks = self._plan_map(items, summaries)
+        if chunks:
+            semaphore = asyncio.Semaphore(SYNTHESIS_MAP_CONCURRENCY)
+
+            async def summarize(chunk: List[int]) -> Tuple[Optional[str], Optional[str]]:
+                async with semaphore:
+                    return await self.summary_llm_service.ainvoke(self._map_prompt(items, chunk), use_cache=use_cache)
+
+            outcomes = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+            await run_blocking(self._store_summaries, hashes, self._collect_summaries(chunks, outcomes, summaries))
+        return self._apply_map_result(state, items, summaries, cached, len(chunks))
+
+    def _cached_summaries(self, hashes: List[str], use_cache: bool) -> Dict[int, str]:
+        """Cached summaries by item index, looked up in one cache query."""
+        get_cached = getattr(self.summary_llm_service, "get_cached_results", None) if use_cache else None
+        if not get_cached:
+            return {}
+        found = get_cached(SOURCE_SUMMARY_KIND, hashes)
+        return {index: found[content_hash] for index, content_hash in enumerate(hashes) if found.get(content_hash)}
+
+    def _store_summaries(self, hashes: List[str], summaries: Dict[int, str]) -> None:
+        put_cached = getattr(self.summary_llm_service, "put_cached_results", None)
+        if put_cached and summaries:
+            put_cached(SOURCE_SUMMARY_KIND, {hashes[index]: summary for index, summary in summaries.items()})
+
+    @staticmethod
+    def _plan_map(items: List[Dict[str, Any]], summaries: Dict[int, str]) -> List[List[int]]:
+        """Chunks of the indices of the items still to be summarized."""
+        pending = [index for index in range(len(items)) if index not in summaries]
+        chunks = [pending[start:start + SYNTHESIS_MAP_CHUNK_SIZE] for start in range(0, len(pending), SYNTHESIS_MAP_CHUNK_SIZE)]
+        print(f"SynthesisAgent: Map-reduce synthesis over {len(items)} sources: {len(summaries)} summaries cached, {len(chunks)} chunks to summarize.")
+        return chunks
+
+    @staticmethod
+    def _map_prompt(items: List[Dict[str, Any]], chunk: List[int]) -> str:
+        # Deliberately topic-free: a source's summary can then be reused by any task.
+        sources = "\n\n".join(
+            f"[{number}] (Title: {items[index].get('title', 'N/A')})\n{context_text(items[index])}"
+            for number, index in enumerate(chunk, start=1)
+        )
+        return (
+            f"Summarize each of the following {len(chunk)} sources in one or two sentences, keeping concrete facts, "
+            f"figures, dates and names. Do not add information that is not in the source. Answer with exactly one line "
+            f"per source, starting with the source number in square brackets, e.g. \"[2] ...\".\n\n"
+            f"Sources:\n{sources}\n\n"
+            f"Summaries:"
+        )
+
+    @staticmethod
+    def _collect_summaries(chunks: List[List[int]], outcomes: List[Tuple[Optional[str], Optional[str]]],
+                           summaries: Dict[int, str]) -> Dict[int, str]:
+        """Parses the numbered summary lines of each chunk into `summaries`; returns the new summaries (to cache)."""
+        new_summaries: Dict[int, str] = {}
+        for chunk, (content, error) in zip(chunks, outcomes):
+            if error or not content:
+                print(f"SynthesisAgent Warning: Summarizing a chunk of {len(chunk)} sources failed, quoting them in full: {error}")
+                continue
+            for number, summary in _SUMMARY_LINE.findall(content):
+                position = int(number) - 1
+                if 0 <= position < len(chunk) and chunk[position] not in summaries:
+                    summaries[chunk[position]] = new_summaries[chunk[position]] = summary
+        return new_summaries
+
+    @staticmethod
+    def _apply_map_result(state: KnowledgeNexusState, items: List[Dict[str, Any]], summaries: Dict[int, str],
+                          cached: int, chunk_count: int) -> List[Dict[str, Any]]:
+        """Items for the reduce step; sources without a summary keep their full content."""
+        state['synthesis_map_reduce'] = {"sources": len(items), "summarized": len(summaries), "cached": cached, "chunks": chunk_count}
+        return [dict(item, snippet=summaries[index]) if index in summaries else item for index, item in enumerate(items)]
+
+    def _prepare(self, state: KnowledgeNexusState) -> bool:
+        """
+        Marks the stage and checks the inputs. Returns False (with the state already filled in)
+        when there is nothing to send to the LLM.
+        """
         print(f"--- SynthesisAgent: Executing --- Task ID: {state.get('task_id')}, Current Stage: {state.get('current_stage')}")
         state['current_stage'] = "synthesizing"
         state['error_message'] = None  # Clear previous synthesis errors
+        state['synthesis_is_report'] = False
 
         verified_data = state.get('verified_data', [])
         topic = state.get('topic')
@@ -73,7 +270,7 @@ class SynthesisAgent:
             print("SynthesisAgent: No verified data to synthesize.")
             state['synthesized_content'] = "No verified data available to synthesize."
             state['error_message'] = "Synthesis skipped: No verified data."
-            return state
+            return False
 
         print(f"SynthesisAgent: Synthesizing content from {len(verified_data)} verified items for topic '{topic}'.")
 
@@ -82,24 +279,29 @@ class SynthesisAgent:
             content_summary = ", ".join([item.get('snippet', 'N/A')[:30] + "..." for item in verified_data])
             state['synthesized_content'] = f"Simulated synthesis for topic '{topic}': Based on {len(verified_data)} sources. Key points might include: {content_summary}"
             state['error_message'] = "LLM not initialized; used simulated synthesis."
-            return state
+            return False
 
-        prompt = self._format_data_for_llm(verified_data, topic)
+        return True
 
-        print(f"SynthesisAgent: Invoking LLM for synthesis (prompt length: {len(prompt)} chars).")
-        synthesized_text, llm_error = self.llm_service.invoke(prompt)
+    def _build_prompt(self, state: KnowledgeNexusState, selected: List[Dict[str, Any]], report: Dict[str, Any]) -> str:
+        """Records the context selection in the state and formats the selected items."""
+        state['synthesis_context'] = report
+        if report.get('dropped'):
+            print(f"SynthesisAgent: Context budget: using {report['selected']} of {report['selected'] + len(report['dropped'])} verified items "
+                  f"({report.get('tokens')} of {report.get('token_budget')} tokens).")
+        return self._format_data_for_llm(selected, state.get('topic'))
 
+    def _apply_llm_result(self, state: KnowledgeNexusState, synthesized_text: Optional[str], llm_error: Optional[str]) -> None:
         if llm_error:
+            verified_data = state.get('verified_data', [])
             print(f"SynthesisAgent Error: LLM invocation failed: {llm_error}")
             state['error_message'] = f"LLM synthesis failed: {llm_error}"
-            content_summary = ", ".join([item.get('snippet', 'N/A')[:30] + "..." for item in verified_data])
-            state['synthesized_content'] = f"Simulated synthesis (LLM error) for topic '{topic}'. Based on {len(verified_data)} sources."
+            state['synthesized_content'] = f"Simulated synthesis (LLM error) for topic '{state.get('topic')}'. Based on {len(verified_data)} sources."
         else:
             state['synthesized_content'] = synthesized_text
+            state['synthesis_is_report'] = self.report_mode
             print("SynthesisAgent: Content synthesized successfully using LLM.")
 
-        return state
-
 if __name__ == '__main__':
     print("Testing SynthesisAgent...")
 
@@ -112,7 +314,7 @@ if __name__ == '__main__':
         def is_initialized(self) -> bool:
             return self._initialized
 
-        def invoke(self, prompt: str) -> tuple[str | None, str | None]:
+        def invoke(self, prompt: str, use_cache: bool = True) -> tuple[str | None, str | None]:
             if not self._initialized:
                 return None, "LLM not initialized"
             if self._simulate_error:
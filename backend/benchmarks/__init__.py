@@ -0,0 +1 @@
+# Benchmark scripts, run as modules from the repository root (e.g. python -m backend.benchmarks.embedding_backends).
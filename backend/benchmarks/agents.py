@@ -0,0 +1,226 @@
+"""
+Micro-benchmarks of the workflow agents' CPU work over synthetic states of growing size.
+
+Each case times one agent step on N research items, with its services stubbed out so only the
+agent's own code is measured (state merging, list copies, prompt building, feedback application):
+
+    research.execute                      merging N search results into the state
+    verification.execute                  copying research_data into verified_data
+    synthesis._format_data_for_llm        building the synthesis prompt from N items
+    human_input.execute                   applying feedback to the last of N verified items
+    document._format_basic_document       rendering N items of content and N/100 conflicts
+
+Every call gets a fresh state from an untimed setup step; calls are repeated until --min-time has
+been measured (at least --min-rounds calls), with the garbage collector paused as in timeit. The
+agents' progress output is discarded while timing. The table shows the median and p95 per call,
+the median per item, and the scaling exponent k of time ~ N^k fitted over N >= 1000.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.agents --sizes 10 100 1000 10000 100000 --output agents.json
+    python -m backend.benchmarks.agents --cases human_input.execute --baseline agents.json
+"""
+import argparse
+import contextlib
+import gc
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.agents.workflow_agents.document_generation_agent import DocumentGenerationAgent
+from backend.agents.workflow_agents.human_input_agent import HumanInputAgent
+from backend.agents.workflow_agents.research_agent import ResearchAgent
+from backend.agents.workflow_agents.synthesis_agent import SynthesisAgent
+from backend.agents.workflow_agents.verification_agent import VerificationAgent
+from backend.benchmarks.metrics import (LOWER_IS_BETTER, Gates, compare_to_baseline, environment_info, load_results,
+                                        print_regressions, summarize, write_results)
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+TOPIC = "environmental impact of grid batteries"
+TASK_ID = "benchmark-task"
+
+AGENT_GATES: Gates = {"*.*.median_ms": (LOWER_IS_BETTER, 0.05)}
+
+WORDS = ("battery storage capacity grid lithium cost per kilowatt hour deployment utility scale recycling cobalt supply "
+         "demand peak frequency regulation renewable integration emissions lifecycle mining policy subsidy market "
+         "efficiency degradation warranty safety thermal chemistry sodium iron phosphate").split()
+
+# A case prepares the agent for N items and returns (setup, run): setup() builds the argument of
+# one call outside the timing, run(argument) is the timed call.
+Case = Callable[[List[Dict[str, Any]]], Tuple[Callable[[], Any], Callable[[Any], Any]]]
+
+
+def synthetic_items(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Research items shaped like SearchService results, with ~40-word snippets."""
+    rng = random.Random(seed)
+    snippets = [" ".join(rng.choices(WORDS, k=40)) + "." for _ in range(512)]
+    return [{
+        "id": f"item-{index}",
+        "url": f"https://example.org/articles/{index}",
+        "title": f"Article {index} on {TOPIC}",
+        "snippet": snippets[index % len(snippets)],
+        "source_name": "Google Search",
+        "rank": index + 1,
+    } for index in range(count)]
+
+
+class _StaticSearchService:
+    def __init__(self, results: List[Dict[str, Any]]):
+        self.results = results
+
+    def search(self, topic: str, num_results: int = 10):
+        return self.results[:num_results], None
+
+
+class _DiscardingStorageService:
+    def is_initialized(self) -> bool:
+        return True
+
+    def upsert_research_data(self, task_id: str, research_items: list, topic: str, tenant: Optional[str] = None):
+        return {"new": len(research_items), "updated": 0, "skipped": 0}, None
+
+
+class _InitializedLLMService:
+    def is_initialized(self) -> bool:
+        return True
+
+
+def research_case(items: List[Dict[str, Any]]):
+    agent = ResearchAgent(_StaticSearchService(items), _DiscardingStorageService())
+    setup = lambda: {"topic": TOPIC, "task_id": TASK_ID, "research_data": [], "num_search_results": len(items),
+                     "bypass_cache": True}
+    return setup, agent.execute
+
+
+def verification_case(items: List[Dict[str, Any]]):
+    agent = VerificationAgent()
+    setup = lambda: {"task_id": TASK_ID, "current_stage": "researching", "research_data": items}
+    return setup, agent.execute
+
+
+def synthesis_prompt_case(items: List[Dict[str, Any]]):
+    agent = SynthesisAgent(_InitializedLLMService())
+    return (lambda: items), (lambda verified_data: agent._format_data_for_llm(verified_data, TOPIC))
+
+
+def human_input_case(items: List[Dict[str, Any]]):
+    agent = HumanInputAgent()
+    # Worst case for the lookup: the reviewed item is the last one. It is a copy, as feedback updates it.
+    verified_data = items[:-1] + [dict(items[-1])]
+    feedback = {"task_id": TASK_ID, "data_id": verified_data[-1]["id"], "approved": True, "notes": "Checked.",
+                "corrected_content": "Corrected figures from the original report."}
+    setup = lambda: {"task_id": TASK_ID, "current_stage": "awaiting_human_verification", "verified_data": verified_data,
+                     "human_in_loop_needed": True, "human_feedback": dict(feedback)}
+    return setup, agent.execute
+
+
+def document_case(items: List[Dict[str, Any]]):
+    agent = DocumentGenerationAgent()
+    content = "\n\n".join(item["snippet"] for item in items)
+    conflicts = [{"type": "Contradiction", "details": f"{item['title']} disagrees on the cost figures."} for item in items[::100]]
+    return (lambda: None), (lambda _: agent._format_basic_document(TOPIC, content, conflicts))
+
+
+CASES: Dict[str, Case] = {
+    "research.execute": research_case,
+    "verification.execute": verification_case,
+    "synthesis._format_data_for_llm": synthesis_prompt_case,
+    "human_input.execute": human_input_case,
+    "document._format_basic_document": document_case,
+}
+
+
+def measure(setup: Callable[[], Any], run: Callable[[Any], Any], min_time: float, min_rounds: int, max_rounds: int) -> List[float]:
+    """Seconds per call, for calls repeated until `min_time` is measured (within the round limits)."""
+    samples: List[float] = []
+    gc.collect()
+    while len(samples) < max_rounds and (len(samples) < min_rounds or sum(samples) < min_time):
+        argument = setup()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(argument)
+            samples.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return samples
+
+
+def scaling_exponent(sizes: Sequence[int], medians: Sequence[float]) -> Optional[float]:
+    """Slope of log(time) over log(N) for N >= 1000 (all sizes if fewer than two are that large)."""
+    points = [(size, median) for size, median in zip(sizes, medians) if size >= 1000 and median > 0]
+    if len(points) < 2:
+        points = [(size, median) for size, median in zip(sizes, medians) if median > 0]
+    if len(points) < 2:
+        return None
+    return float(np.polyfit([math.log(size) for size, _ in points], [math.log(median) for _, median in points], 1)[0])
+
+
+def run(cases: Sequence[str], sizes: Sequence[int], min_time: float, min_rounds: int, max_rounds: int) -> Dict[str, Any]:
+    all_items = synthetic_items(max(sizes))
+    metrics: Dict[str, Any] = {}
+    for name in cases:
+        rows: Dict[str, Any] = {}
+        for size in sizes:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                setup, call = CASES[name](all_items[:size])
+                samples = measure(setup, call, min_time, min_rounds, max_rounds)
+            summary = summarize(samples)
+            rows[str(size)] = {"rounds": len(samples), "median_ms": summary["p50"] * 1000.0, "p95_ms": summary["p95"] * 1000.0,
+                               "min_ms": min(samples) * 1000.0, "ns_per_item": summary["p50"] * 1e9 / size}
+        rows["scaling_exponent"] = scaling_exponent(sizes, [rows[str(size)]["median_ms"] for size in sizes])
+        metrics[name] = rows
+    return metrics
+
+
+def print_table(metrics: Dict[str, Any], sizes: Sequence[int]) -> None:
+    header = f"{'case':<34} {'items':>7} {'rounds':>7} {'median ms':>11} {'p95 ms':>11} {'ns/item':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, rows in metrics.items():
+        for size in sizes:
+            row = rows[str(size)]
+            print(f"{name:<34} {size:>7} {row['rounds']:>7} {row['median_ms']:>11.4f} {row['p95_ms']:>11.4f} {row['ns_per_item']:>10.1f}")
+        exponent = rows["scaling_exponent"]
+        print(f"{'':<34} scaling: time ~ N^{exponent:.2f}" if exponent is not None else f"{'':<34} scaling: n/a")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark the workflow agents over growing synthetic states.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="Agent steps to measure.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of research items.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to measure per case and size.")
+    parser.add_argument("--min-rounds", type=int, default=5, help="Minimum calls per case and size.")
+    parser.add_argument("--max-rounds", type=int, default=10000, help="Maximum calls per case and size.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON to compare against; regressions make the run fail.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression of the medians (0.25 = 25%%).")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(set(args.sizes))
+    metrics = run(args.cases, sizes, args.min_time, args.min_rounds, args.max_rounds)
+    print_table(metrics, sizes)
+    results = {
+        "benchmark": "agents",
+        "config": {"cases": list(args.cases), "sizes": sizes, "min_time": args.min_time, "min_rounds": args.min_rounds,
+                   "environment": environment_info()},
+        "metrics": metrics,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        regressions = compare_to_baseline(metrics, load_results(args.baseline)["metrics"], AGENT_GATES, args.tolerance)
+        results["regressions"] = regressions
+        print_regressions(regressions, args.tolerance)
+        exit_code = 1 if regressions else 0
+    if args.output:
+        write_results(args.output, results)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
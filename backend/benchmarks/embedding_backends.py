@@ -0,0 +1,118 @@
+"""
+Throughput and retrieval recall of the registered embedding backends.
+
+Every document of the corpus is embedded once (throughput = documents per second). Then each
+query, a noisy copy of one document (a random third of its words mixed with as many words from
+other documents), is matched against the corpus by cosine similarity. recall@k is the share of
+queries whose source document ranks in the top k. The synthetic corpus measures near-duplicate retrieval, the case that matters for
+overlapping research topics; pass --corpus with one real document per line for semantic content.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.embedding_backends --backends hashing azure --documents 2000
+
+The Azure backend needs the AZURE_OPENAI_EMBEDDING_* variables and is skipped without them. Its
+embedding cache is disabled unless --use-cache is given, so repeated runs measure the API.
+"""
+import argparse
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.services.chroma_service import create_embedding_function  # registers the "azure" backend too
+from backend.services.embedding_backends import EMBEDDING_BACKENDS
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "tas", "vu", "po", "shi", "dar", "el", "no", "qui", "bra", "tor", "zen", "fa"]
+
+
+def synthetic_corpus(documents: int, words_per_document: int = 40, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(8000)})
+    return [" ".join(rng.choices(vocabulary, k=words_per_document)) for _ in range(documents)]
+
+
+def noisy_queries(corpus: Sequence[str], count: int, seed: int = 11) -> List[tuple]:
+    """(query, index of its source document) pairs."""
+    rng = random.Random(seed)
+    queries = []
+    for index in rng.sample(range(len(corpus)), min(count, len(corpus))):
+        words = corpus[index].split()
+        kept = rng.sample(words, max(1, len(words) // 3))
+        distractors = [rng.choice(rng.choice(corpus).split()) for _ in kept]
+        mixed = kept + distractors
+        rng.shuffle(mixed)
+        queries.append((" ".join(mixed), index))
+    return queries
+
+
+def embed_in_batches(embedding_function, texts: Sequence[str], batch_size: int) -> np.ndarray:
+    vectors: List = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedding_function(list(texts[start:start + batch_size])))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def recall_at_k(corpus_vectors: np.ndarray, query_vectors: np.ndarray, targets: Sequence[int], ks: Sequence[int]) -> Dict[int, float]:
+    corpus_unit = corpus_vectors / np.maximum(np.linalg.norm(corpus_vectors, axis=1, keepdims=True), 1e-12)
+    query_unit = query_vectors / np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    ranking = np.argsort(-(query_unit @ corpus_unit.T), axis=1)
+    return {k: float(np.mean([target in ranking[row, :k] for row, target in enumerate(targets)])) for k in ks}
+
+
+def run(backends: Sequence[str], corpus: Sequence[str], query_count: int, batch_size: int, ks: Sequence[int]) -> List[Dict]:
+    queries = noisy_queries(corpus, query_count)
+    rows = []
+    for backend in backends:
+        try:
+            embedding_function = create_embedding_function(backend)
+        except Exception as e:
+            print(f"Skipping backend '{backend}': {e}")
+            continue
+        start = time.perf_counter()
+        corpus_vectors = embed_in_batches(embedding_function, corpus, batch_size)
+        elapsed = time.perf_counter() - start
+        query_vectors = embed_in_batches(embedding_function, [query for query, _ in queries], batch_size)
+        rows.append({
+            "backend": backend,
+            "documents": len(corpus),
+            "seconds": elapsed,
+            "docs_per_second": len(corpus) / elapsed if elapsed else float("inf"),
+            "recall": recall_at_k(corpus_vectors, query_vectors, [target for _, target in queries], ks),
+        })
+    return rows
+
+
+def print_table(rows: List[Dict], ks: Sequence[int]) -> None:
+    header = f"{'backend':<10} {'docs':>7} {'seconds':>9} {'docs/s':>10} " + " ".join(f"{f'recall@{k}':>10}" for k in ks)
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        recalls = " ".join(f"{row['recall'][k]:>10.3f}" for k in ks)
+        print(f"{row['backend']:<10} {row['documents']:>7} {row['seconds']:>9.2f} {row['docs_per_second']:>10.1f} {recalls}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare embedding backends by throughput and recall.")
+    parser.add_argument("--backends", nargs="+", default=sorted(EMBEDDING_BACKENDS), help="Registered backends to compare.")
+    parser.add_argument("--documents", type=int, default=2000, help="Size of the synthetic corpus.")
+    parser.add_argument("--corpus", help="Text file with one document per line, used instead of the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of noisy queries.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Texts per embedding call.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10], help="Cut-offs for recall@k.")
+    parser.add_argument("--use-cache", action="store_true", help="Keep the Azure embedding cache enabled.")
+    args = parser.parse_args(argv)
+
+    if not args.use_cache:
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as corpus_file:
+            corpus = [line.strip() for line in corpus_file if line.strip()]
+    else:
+        corpus = synthetic_corpus(args.documents)
+    print_table(run(args.backends, corpus, args.queries, args.batch_size, args.k), args.k)
+
+
+if __name__ == "__main__":
+    main()
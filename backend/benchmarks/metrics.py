@@ -0,0 +1,126 @@
+"""
+Measurement and reporting helpers shared by the benchmark scripts: latency summaries, peak RSS,
+event-loop lag, JSON results and the comparison against a stored baseline that fails a run on
+regressions.
+"""
+import asyncio
+import fnmatch
+import json
+import platform
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LOWER_IS_BETTER = "lower"
+HIGHER_IS_BETTER = "higher"
+
+# Gate = metric pattern (dotted path, fnmatch wildcards) -> (direction, absolute slack). A metric
+# regresses when it is worse than the baseline by more than the relative tolerance AND by more than
+# the slack, which keeps near-zero values (a 1 ms stage, an idle event loop) from flapping.
+Gates = Dict[str, Tuple[str, float]]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """count, mean, p50, p95, p99 and max of a sample (zeros for an empty one)."""
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(values, dtype=np.float64), [50, 95, 99])
+    return {"count": len(values), "mean": float(np.mean(values)), "p50": float(p50), "p95": float(p95),
+            "p99": float(p99), "max": float(max(values))}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+class EventLoopLagMonitor:
+    """
+    Samples how late the event loop wakes up a task that sleeps `interval` seconds. Lag shows
+    blocking work on the loop (synchronous I/O, CPU-bound code) that delays every other request.
+    """
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, time.perf_counter() - start - self.interval) * 1000.0)
+
+
+def environment_info() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def flatten(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a nested metrics dict, keyed by dotted path (e.g. "e2e_seconds.p95")."""
+    flat: Dict[str, float] = {}
+    for key, value in metrics.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def compare_to_baseline(metrics: Dict[str, Any], baseline: Dict[str, Any], gates: Gates,
+                        tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Gated metrics that are worse than in `baseline` by more than `tolerance` (relative, e.g. 0.1
+    for 10%) and by more than the gate's absolute slack. Metrics missing on either side are skipped.
+    """
+    current, previous = flatten(metrics), flatten(baseline)
+    regressions = []
+    for path in sorted(current.keys() & previous.keys()):
+        gate = next((gates[pattern] for pattern in gates if fnmatch.fnmatchcase(path, pattern)), None)
+        if gate is None:
+            continue
+        direction, slack = gate
+        value, reference = current[path], previous[path]
+        worse_by = value - reference if direction == LOWER_IS_BETTER else reference - value
+        if worse_by > max(abs(reference) * tolerance, slack):
+            regressions.append({"metric": path, "baseline": reference, "current": value, "direction": direction,
+                                "change": (value - reference) / reference if reference else None})
+    return regressions
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as results_file:
+        return json.load(results_file)
+
+
+def write_results(path: str, results: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
+
+
+def print_regressions(regressions: List[Dict[str, Any]], tolerance: float) -> None:
+    if not regressions:
+        print(f"No regressions against the baseline (tolerance {tolerance:.0%}).")
+        return
+    print(f"{len(regressions)} regression(s) against the baseline (tolerance {tolerance:.0%}):")
+    for regression in regressions:
+        change = f"{regression['change']:+.1%}" if regression["change"] is not None else "new"
+        print(f"  {regression['metric']:<40} {regression['baseline']:>12.4f} -> {regression['current']:>12.4f} ({change}, {regression['direction']} is better)")
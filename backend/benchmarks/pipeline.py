@@ -0,0 +1,254 @@
+"""
+End-to-end throughput and latency of the research pipeline.
+
+The FastAPI app is driven in-process over httpx's ASGI transport: `--tasks` research requests on
+distinct topics are sent by `--concurrency` clients, each waiting for its task to finish (approving
+any human verification request) and fetching the document. The LLM, search and embedding APIs are
+the simulators of services/simulation.py unless LLM_BACKEND, SEARCH_BACKEND or EMBEDDING_BACKEND
+say otherwise, and all stores live in a scratch working directory, so runs are repeatable and free.
+
+Reported: end-to-end and per-stage p50/p95/p99 latency, tasks per second, peak RSS and event-loop
+lag. Stage latencies come from the tasks' progress events (what /stream serves; the ASGI transport
+buffers whole responses, so the harness subscribes to the progress broker directly).
+
+Usage (from the repository root):
+    python -m backend.benchmarks.pipeline --tasks 50 --concurrency 10 --output results.json
+    python -m backend.benchmarks.pipeline --tasks 50 --concurrency 10 --baseline baseline.json
+
+With --baseline the run exits with status 1 when a gated metric is worse than the baseline by more
+than --tolerance; --save-baseline stores the results as the next baseline. Simulator settings
+(SIMULATION_SEED, SIM_*) and workflow settings (WORKFLOW_WORKERS, ...) are read from the environment.
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend.benchmarks.metrics import (HIGHER_IS_BETTER, LOWER_IS_BETTER, EventLoopLagMonitor, Gates, compare_to_baseline,
+                                        environment_info, load_results, peak_rss_mb, print_regressions, summarize,
+                                        write_results)
+
+SIMULATED_BACKENDS = {"LLM_BACKEND": "simulated", "SEARCH_BACKEND": "simulated", "EMBEDDING_BACKEND": "simulated"}
+REPORTED_SETTINGS = ("LLM_BACKEND", "SEARCH_BACKEND", "EMBEDDING_BACKEND", "SIMULATION_SEED", "LLM_PIPELINE_MODE",
+                     "WORKFLOW_WORKERS", "WORKFLOW_QUEUE_SIZE", "WORKFLOW_EXECUTION")
+
+PIPELINE_GATES: Gates = {
+    "tasks_per_second": (HIGHER_IS_BETTER, 0.0),
+    "tasks_failed": (LOWER_IS_BETTER, 0.0),
+    "e2e_seconds.p50": (LOWER_IS_BETTER, 0.01),
+    "e2e_seconds.p95": (LOWER_IS_BETTER, 0.01),
+    "e2e_seconds.p99": (LOWER_IS_BETTER, 0.01),
+    "stage_seconds.*.p95": (LOWER_IS_BETTER, 0.01),
+    "peak_rss_mb": (LOWER_IS_BETTER, 16.0),
+    "event_loop_lag_ms.p99": (LOWER_IS_BETTER, 5.0),
+}
+
+SUBJECTS = ["solar panels", "grid batteries", "offshore wind", "heat pumps", "urban farming", "desalination",
+            "carbon capture", "electric buses", "green hydrogen", "geothermal energy", "smart meters", "tidal power"]
+ASPECTS = ["economics", "history", "environmental impact", "regulation", "supply chains", "public adoption",
+           "recent research", "engineering challenges"]
+
+
+def default_topics(count: int) -> List[str]:
+    """Distinct, deterministic topics, so requests are neither de-duplicated nor served from the result cache."""
+    combinations = [f"{aspect} of {subject}" for aspect in ASPECTS for subject in SUBJECTS]
+    return [combinations[i % len(combinations)] + (f" ({i // len(combinations) + 1})" if i >= len(combinations) else "")
+            for i in range(count)]
+
+
+def stage_durations(submitted_at: datetime, timeline: Sequence[Tuple[datetime, str, Optional[int]]]) -> Dict[str, float]:
+    """
+    Seconds spent on each stage of one task, from its (timestamp, stage, queue_position) progress
+    events. Nodes announce their stage when they finish, so a stage lasts from the previous stage
+    change to its first event; "queued" is the wait from submission until a worker started the run.
+    """
+    durations: Dict[str, float] = {}
+    previous_time, previous_stage = submitted_at, "queued"
+    for timestamp, stage, queue_position in timeline:
+        if stage == "queued":
+            if queue_position is None and "queued" not in durations:
+                durations["queued"] = (timestamp - previous_time).total_seconds()
+                previous_time = timestamp
+            continue
+        if stage != previous_stage:
+            durations[stage] = durations.get(stage, 0.0) + (timestamp - previous_time).total_seconds()
+            previous_time, previous_stage = timestamp, stage
+    return durations
+
+
+async def run_task(client, app_module, topic: str, bypass_cache: bool, task_timeout: float) -> Dict[str, Any]:
+    """Submits one research request and follows it to the end; returns its outcome and timings."""
+    record: Dict[str, Any] = {"topic": topic, "status": None, "rejections": 0}
+    submitted_at, start = datetime.utcnow(), time.perf_counter()
+    while True:
+        response = await client.post("/research", json={"topic": topic, "bypass_cache": bypass_cache})
+        if response.status_code != 429:
+            break
+        # Backpressure: the scheduler's queue is full.
+        record["rejections"] += 1
+        await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+    if response.status_code != 202:
+        record.update(status="rejected", error=f"HTTP {response.status_code}: {response.text}")
+        return record
+
+    task_id = response.json()["task_id"]
+    timeline: List[Tuple[datetime, str, Optional[int]]] = []
+    approved = set()
+    with app_module.progress_broker.subscribe(task_id, last_event_id=0) as subscription:
+        while True:
+            event = await subscription.next_event(timeout=max(0.001, start + task_timeout - time.perf_counter()))
+            if event is None:
+                record.update(status="timeout", error=f"No result after {task_timeout:.0f}s.")
+                break
+            status = event.data
+            timeline.append((datetime.fromisoformat(status["timestamp"]), status["status"], status.get("queue_position")))
+            verification = status.get("verification_request")
+            if status["status"] == "awaiting_human_verification" and verification and verification["data_id"] not in approved:
+                approved.add(verification["data_id"])
+                await client.post(f"/submit-verification/{task_id}",
+                                  json={"task_id": task_id, "data_id": verification["data_id"], "approved": True})
+            if event.terminal:
+                break
+
+    if record["status"] is None:
+        result = await client.get(f"/results/{task_id}")
+        if result.status_code == 200 and result.json():
+            record["status"] = "completed"
+        else:
+            record.update(status="failed", error=f"HTTP {result.status_code}: {result.text}")
+    record["e2e_seconds"] = time.perf_counter() - start
+    record["stage_seconds"] = stage_durations(submitted_at, timeline)
+    return record
+
+
+async def run_benchmark(topics: Sequence[str], concurrency: int, warmup: int, bypass_cache: bool,
+                        task_timeout: float) -> Dict[str, Any]:
+    import httpx
+    # Imported here: the app reads its configuration from the environment prepared by main().
+    from backend import main as app_module
+
+    async def drain(queue: List[str], records: List[Dict[str, Any]]) -> None:
+        while queue:
+            records.append(await run_task(client, app_module, queue.pop(0), bypass_cache, task_timeout))
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # Warm-up tasks pay for one-time initialization (collections, caches, lazy imports).
+        await drain(list(topics[:warmup]), [])
+
+        queue, records = list(topics[warmup:]), []
+        monitor = EventLoopLagMonitor()
+        monitor.start()
+        start = time.perf_counter()
+        await asyncio.gather(*(drain(queue, records) for _ in range(concurrency)))
+        wall_seconds = time.perf_counter() - start
+        await monitor.stop()
+    app_module.active_tasks.close()
+
+    completed = [record for record in records if record["status"] == "completed"]
+    stages = list(dict.fromkeys(stage for record in completed for stage in record["stage_seconds"]))  # pipeline order
+    return {
+        "tasks_completed": len(completed),
+        "tasks_failed": len(records) - len(completed),
+        "requests_rejected": sum(record["rejections"] for record in records),
+        "wall_seconds": wall_seconds,
+        "tasks_per_second": len(completed) / wall_seconds if wall_seconds else 0.0,
+        "e2e_seconds": summarize([record["e2e_seconds"] for record in completed]),
+        "stage_seconds": {stage: summarize([record["stage_seconds"][stage] for record in completed if stage in record["stage_seconds"]])
+                          for stage in stages},
+        "peak_rss_mb": peak_rss_mb(),
+        "event_loop_lag_ms": summarize(monitor.samples_ms),
+        "errors": sorted({record["error"] for record in records if record.get("error")})[:10],
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    metrics = results["metrics"]
+    print(f"tasks: {metrics['tasks_completed']} completed, {metrics['tasks_failed']} failed, "
+          f"{metrics['requests_rejected']} rejections (429) in {metrics['wall_seconds']:.2f}s "
+          f"= {metrics['tasks_per_second']:.2f} tasks/s")
+    print(f"peak RSS: {metrics['peak_rss_mb']:.1f} MiB, event-loop lag p99: {metrics['event_loop_lag_ms']['p99']:.1f} ms "
+          f"(max {metrics['event_loop_lag_ms']['max']:.1f} ms)")
+    header = f"{'seconds':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = [("end-to-end", metrics["e2e_seconds"])] + [(f"  {stage}", summary) for stage, summary in metrics["stage_seconds"].items()]
+    for name, summary in rows:
+        print(f"{name:<28} {summary['p50']:>9.3f} {summary['p95']:>9.3f} {summary['p99']:>9.3f} {summary['max']:>9.3f}")
+    for error in metrics["errors"]:
+        print(f"error: {error}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the research pipeline end to end over the API.")
+    parser.add_argument("--tasks", type=int, default=20, help="Measured research tasks.")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrent clients.")
+    parser.add_argument("--warmup", type=int, default=1, help="Tasks run before measuring.")
+    parser.add_argument("--topics", help="Text file with one topic per line, used instead of generated topics.")
+    parser.add_argument("--bypass-cache", action="store_true", help="Send bypass_cache with every request.")
+    parser.add_argument("--task-timeout", type=float, default=300.0, help="Seconds after which a task counts as failed.")
+    parser.add_argument("--workdir", help="Directory for the stores (default: a temporary directory, removed afterwards).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON to compare against; regressions make the run fail.")
+    parser.add_argument("--save-baseline", help="Write the results to this file as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%).")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's output.")
+    args = parser.parse_args(argv)
+
+    # Resolve paths before moving into the working directory.
+    output, baseline, save_baseline = (os.path.abspath(path) if path else None for path in (args.output, args.baseline, args.save_baseline))
+    topics_needed = args.warmup + args.tasks
+    if args.topics:
+        with open(args.topics, encoding="utf-8") as topics_file:
+            topics = [line.strip() for line in topics_file if line.strip()]
+        topics = [topics[i % len(topics)] for i in range(topics_needed)]
+    else:
+        topics = default_topics(topics_needed)
+
+    for name, value in SIMULATED_BACKENDS.items():
+        os.environ.setdefault(name, value)
+    original_directory = os.getcwd()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="knowledge-nexus-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            metrics = asyncio.run(run_benchmark(topics, args.concurrency, args.warmup, args.bypass_cache, args.task_timeout))
+    finally:
+        os.chdir(original_directory)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "benchmark": "pipeline",
+        "config": {"tasks": args.tasks, "concurrency": args.concurrency, "warmup": args.warmup, "bypass_cache": args.bypass_cache,
+                   "settings": {name: os.getenv(name) for name in REPORTED_SETTINGS if os.getenv(name) is not None},
+                   "environment": environment_info()},
+        "metrics": metrics,
+    }
+    print_report(results)
+
+    exit_code = 0
+    if baseline:
+        regressions = compare_to_baseline(metrics, load_results(baseline)["metrics"], PIPELINE_GATES, args.tolerance)
+        results["regressions"] = regressions
+        print_regressions(regressions, args.tolerance)
+        exit_code = 1 if regressions else 0
+    if output:
+        write_results(output, results)
+    if save_baseline:
+        write_results(save_baseline, results)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
 import asyncio
+import json
+import os
+import re
+import time
 import uuid
 from typing import Dict, Any, Optional, List
 from datetime import datetime # Added for ResearchStatus timestamp
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from sse_starlette.sse import EventSourceResponse
 import uvicorn
 
 # Project-specific imports
@@ -12,7 +19,13 @@ try:
     # Added HumanApproval and DataVerificationRequest for HITL
     from .models.schemas import ResearchRequest, ResearchStatus, DocumentOutput, HumanApproval, DataVerificationRequest
     from .agents.research_workflow import build_knowledge_nexus_workflow, KnowledgeNexusState
-    from .services.chroma_service import ChromaService
+    from .agents.streaming import PARTIAL_TEXT_EVENT
+    from .services.chroma_service import ChromaService, get_chroma_service
+    from .services.task_store import TaskStore, create_task_store, TERMINAL_STATUSES
+    from .services.progress_broker import ProgressBroker, ProgressEvent
+    from .services.workflow_scheduler import QueueFullError, create_workflow_scheduler
+    from .services.task_queue import SQLiteTaskQueue, ProgressEventLog, create_task_queue, create_progress_event_log
+    from .services.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, CACHE_LOOKUPS, WORKFLOW_NODE_SECONDS, track_task_tokens
 except ImportError as e:
     # This block is a fallback for local development if 'backend' is not in PYTHONPATH
     # or if running main.py directly from within the 'backend' directory.
@@ -27,7 +40,13 @@ except ImportError as e:
     try:
         from backend.models.schemas import ResearchRequest, ResearchStatus, DocumentOutput, HumanApproval, DataVerificationRequest
         from backend.agents.research_workflow import build_knowledge_nexus_workflow, KnowledgeNexusState
-        from backend.services.chroma_service import ChromaService
+        from backend.agents.streaming import PARTIAL_TEXT_EVENT
+        from backend.services.chroma_service import ChromaService, get_chroma_service
+        from backend.services.task_store import TaskStore, create_task_store, TERMINAL_STATUSES
+        from backend.services.progress_broker import ProgressBroker, ProgressEvent
+        from backend.services.workflow_scheduler import QueueFullError, create_workflow_scheduler
+        from backend.services.task_queue import SQLiteTaskQueue, ProgressEventLog, create_task_queue, create_progress_event_log
+        from backend.services.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, CACHE_LOOKUPS, WORKFLOW_NODE_SECONDS, track_task_tokens
     except ImportError as final_e:
         print(f"Fallback imports also failed: {final_e}. Critical service or model definitions might be missing.")
         class ResearchRequest: pass
@@ -36,7 +55,9 @@ except ImportError as e:
         class HumanApproval: pass # Added dummy
         class DataVerificationRequest: pass # Added dummy
         class KnowledgeNexusState(dict): pass
+        PARTIAL_TEXT_EVENT = "partial_text"
         class ChromaService: pass
+        def get_chroma_service(persist_directory=None): return ChromaService()
         def build_knowledge_nexus_workflow(chroma_service):
             print("Dummy build_knowledge_nexus_workflow called. Real workflow could not be loaded.")
             return None
@@ -68,7 +89,9 @@ chroma_service_instance: Optional[ChromaService] = None
 knowledge_nexus_graph: Optional[Any] = None
 llm_is_available: bool = False # Initialize with a default
 try:
-    chroma_service_instance = ChromaService(persist_directory="./chroma_db_store")
+    # One process-wide ChromaService: the workflow's StorageService shares its client, embedding
+    # function and collection handles.
+    chroma_service_instance = get_chroma_service(persist_directory="./chroma_db_store")
     # Update call to receive both graph and LLM status
     knowledge_nexus_graph, llm_is_available = build_knowledge_nexus_workflow(chroma_service=chroma_service_instance)
 
@@ -105,61 +128,342 @@ except Exception as e:
     print("#" * 70 + "\n")
 
 
-# --- In-Memory Task Store ---
-active_tasks: Dict[str, Dict[str, Any]] = {}
+# --- Workflow Execution Mode ---
+# "inline" (default): workflows run on this process's event loop, so the API must run as one process.
+# "pool": this process only serves the API. Runs are put on a shared SQLite queue and executed by the
+# worker pool (`python -m backend.worker`); task records, the queue and progress events all live in
+# shared SQLite files, so any number of API processes can serve any task without sticky sessions.
+WORKFLOW_EXECUTION = os.getenv("WORKFLOW_EXECUTION", "inline").lower()
+if WORKFLOW_EXECUTION not in ("inline", "pool"):
+    raise ValueError(f"Unknown WORKFLOW_EXECUTION '{WORKFLOW_EXECUTION}'. Expected 'inline' or 'pool'.")
+
+# --- Task Store ---
+# Durable task store (SQLite/WAL by default, see services/task_store.py). It behaves like the
+# former in-memory dict of task records; in-place changes must be followed by save()/update_task().
+active_tasks: TaskStore = create_task_store(shared=WORKFLOW_EXECUTION == "pool")
+
+def _discard_checkpoints_of_removed_tasks(task_ids: List[str]) -> None:
+    """Deleted and TTL-evicted tasks can never resume, so their workflow checkpoints go with them."""
+    checkpointer = getattr(knowledge_nexus_graph, "checkpointer", None)
+    if checkpointer is None or not hasattr(checkpointer, "delete_thread"):
+        return
+    for task_id in task_ids:
+        checkpointer.delete_thread(task_id)
+
+active_tasks.add_removal_listener(_discard_checkpoints_of_removed_tasks)
+
+@app.on_event("shutdown")
+def close_task_store():
+    active_tasks.close()
+
+# --- Workflow Scheduler ---
+# Bounds how many workflows run at once (WORKFLOW_WORKERS) and how many may wait (WORKFLOW_QUEUE_SIZE).
+# Calls to search, LLM and embedding providers are additionally capped per stage (services/stage_limits.py).
+workflow_scheduler = create_workflow_scheduler()
+task_queue: Optional[SQLiteTaskQueue] = create_task_queue() if WORKFLOW_EXECUTION == "pool" else None
+
+def workflow_backlog():
+    """The component that admits and orders workflow runs: the shared queue in pool mode, else the local scheduler."""
+    return task_queue if task_queue is not None else workflow_scheduler
+
+def schedule_workflow(task_id: str, topic: str, graph_input: Optional[KnowledgeNexusState], force: bool = False) -> int:
+    """
+    Queues a workflow run and returns its queue position. `graph_input` is None to continue from
+    the task's checkpoint. In pool mode the worker reads the input from the task record, so the
+    caller must have stored it as the task's graph_state.
+    """
+    if task_queue is not None:
+        # The record must be committed before a worker can claim the run and read it.
+        active_tasks.flush()
+        return task_queue.enqueue(task_id, {"topic": topic, "from_checkpoint": graph_input is None}, force=force)
+    return workflow_scheduler.submit(task_id, run_research_workflow_async, task_id, topic, graph_input, force=force)
+
+async def aschedule_workflow(task_id: str, topic: str, graph_input: Optional[KnowledgeNexusState], force: bool = False) -> int:
+    """schedule_workflow for async callers: the pool mode flush and enqueue wait on SQLite, so they run in a thread."""
+    if task_queue is not None:
+        return await asyncio.to_thread(schedule_workflow, task_id, topic, graph_input, force)
+    # The local scheduler starts the run on the event loop, so it is called from it.
+    return schedule_workflow(task_id, topic, graph_input, force=force)
+
+def queue_full_exception(error: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many research tasks are queued. Please retry later.",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+# --- Progress Streaming ---
+# One event per workflow transition is pushed to /stream (SSE) and /ws (WebSocket) subscribers,
+# so clients no longer need to poll /status.
+# In pool mode events go through a shared log that every API process tails into its own broker.
+progress_broker = ProgressBroker(subscriber_buffer=int(os.getenv("PROGRESS_STREAM_BUFFER_SIZE", "16")))
+progress_event_log: Optional[ProgressEventLog] = create_progress_event_log() if WORKFLOW_EXECUTION == "pool" else None
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_STREAM_HEARTBEAT_SECONDS", "15"))
+PROGRESS_RELAY_INTERVAL_SECONDS = float(os.getenv("PROGRESS_RELAY_INTERVAL_SECONDS", "0.25"))
+# Text streamed by the synthesis and document LLM calls is written to the task record (as
+# "partial_text") and published at most once per PARTIAL_TEXT_PUBLISH_INTERVAL_SECONDS.
+PARTIAL_TEXT_PUBLISH_INTERVAL_SECONDS = float(os.getenv("PARTIAL_TEXT_PUBLISH_INTERVAL_SECONDS", "0.25"))
+
+def publish_task_progress(task_id: str, task: Optional[Dict[str, Any]] = None, flush: bool = True) -> None:
+    """
+    Publishes the task's current status. In pool mode the task record is first flushed to the shared
+    store (so other processes see the write before the event) unless `flush` is False.
+    """
+    task = task if task is not None else active_tasks.get(task_id)
+    if not task:
+        return
+    status = jsonable_encoder(build_research_status(task_id, task))
+    terminal = task.get("status") in TERMINAL_STATUSES
+    if progress_event_log is not None:
+        if flush:
+            # Make the write visible to other processes before they see the event.
+            active_tasks.flush()
+        progress_event_log.append(task_id, status, terminal=terminal)
+    else:
+        progress_broker.publish(task_id, status, terminal=terminal)
+
+def update_task_and_publish(task_id: str, fields: Dict[str, Any]) -> None:
+    task = active_tasks.update_task(task_id, fields)
+    # Only status changes wait for the task store's writer; per-node and partial-text updates are
+    # persisted by its background thread without blocking the event loop.
+    publish_task_progress(task_id, task, flush="status" in fields)
+
+async def apublish_task_progress(task_id: str, task: Optional[Dict[str, Any]] = None, flush: bool = True) -> None:
+    """publish_task_progress for async callers; the pool mode flush and event log append run in a thread."""
+    if progress_event_log is not None:
+        await asyncio.to_thread(publish_task_progress, task_id, task, flush)
+    else:
+        # The in-process broker hands events to subscribers on the event loop.
+        publish_task_progress(task_id, task, flush)
+
+async def aupdate_task_and_publish(task_id: str, fields: Dict[str, Any]) -> None:
+    """update_task_and_publish for async callers; see apublish_task_progress."""
+    if progress_event_log is not None:
+        await asyncio.to_thread(update_task_and_publish, task_id, fields)
+    else:
+        update_task_and_publish(task_id, fields)
+
+# --- Metrics ---
+# GET /metrics serves the process's metrics in the Prometheus text format (services/metrics.py).
+# Queue depth, active tasks and stream subscribers are read from their owners when scraped.
+# In pool mode the workflow nodes and provider calls run in the workers, so their timings and
+# counters are recorded there and each worker serves them on its own port (worker.py --metrics-port);
+# the API process reports the shared queue and its own caches.
+REGISTRY.gauge("knowledge_nexus_workflow_queue_depth", "Workflow runs waiting for a worker.",
+               function=lambda: workflow_backlog().queue_depth)
+REGISTRY.gauge("knowledge_nexus_workflow_active_tasks", "Workflow runs currently executing.",
+               function=lambda: workflow_backlog().running_count)
+REGISTRY.gauge("knowledge_nexus_progress_subscribers", "Open progress streams (SSE and WebSocket) of this process.",
+               function=progress_broker.subscriber_count)
+
+def build_initial_graph_input(task_id: str, topic: str, bypass_cache: bool = False, tenant: Optional[str] = None) -> KnowledgeNexusState:
+    return KnowledgeNexusState(
+        topic=topic,
+        task_id=task_id,
+        bypass_cache=bypass_cache,
+        tenant=tenant,
+        research_data=[], verified_data=[], synthesized_content="",
+        detected_conflicts=[], final_document="",
+        human_in_loop_needed=False, current_verification_request=None,
+        messages=[], error_message=None, human_feedback=None # Ensure all fields are initialized
+    )
+
+@app.on_event("startup")
+async def resume_interrupted_tasks():
+    """
+    Re-schedules tasks that were queued or running when the previous process stopped.
+    Tasks paused for human verification need nothing: their state is already persisted.
+    In pool mode the shared queue is durable and the worker pool recovers its own runs.
+    """
+    if not knowledge_nexus_graph or task_queue is not None:
+        return
+    for status in ("queued", "running", "resuming_after_verification"):
+        for task in active_tasks.list_tasks(status=status, limit=1000):
+            task_id, topic = task["task_id"], task.get("topic", "Unknown Topic")
+            if status == "resuming_after_verification":
+                graph_input = task.get("graph_state") or build_initial_graph_input(task_id, topic, tenant=task.get("tenant"))
+            elif await _checkpoint_next_nodes(task_id):
+                # The run stopped between nodes; continue from its last checkpoint.
+                graph_input = None
+            else:
+                # Without a checkpoint the partial run cannot be continued; start it over.
+                graph_input = build_initial_graph_input(task_id, topic, tenant=task.get("tenant"))
+                active_tasks.update_task(task_id, {"status": "queued", "current_stage": "queued", "graph_state": graph_input})
+            print(f"Task {task_id}: Re-scheduling task interrupted by a restart (was '{status}').")
+            schedule_workflow(task_id, topic, graph_input, force=True)
+
+@app.on_event("startup")
+async def start_progress_relay():
+    """Pool mode: tails the shared progress event log into this process's broker."""
+    if progress_event_log is None:
+        return
+    # Seed the replay history so clients can reconnect here with a Last-Event-ID issued by another process.
+    for event_id, task_id, data, terminal in await asyncio.to_thread(progress_event_log.read_recent, 300):
+        progress_broker.publish(task_id, data, terminal=terminal, event_id=event_id)
+    asyncio.get_running_loop().create_task(_relay_progress_events(await asyncio.to_thread(progress_event_log.last_id)))
+
+async def _relay_progress_events(last_id: int) -> None:
+    last_prune = time.monotonic()
+    while True:
+        events = []
+        try:
+            events = await asyncio.to_thread(progress_event_log.read_after, last_id)
+            for event_id, task_id, data, terminal in events:
+                progress_broker.publish(task_id, data, terminal=terminal, event_id=event_id)
+                last_id = event_id
+            if time.monotonic() - last_prune > 600:
+                last_prune = time.monotonic()
+                await asyncio.to_thread(progress_event_log.prune)
+        except Exception as e:
+            print(f"Progress relay: Failed to read shared progress events: {e}")
+        if not events:
+            await asyncio.sleep(PROGRESS_RELAY_INTERVAL_SECONDS)
+
+# --- Workflow Checkpoints ---
+async def _checkpoint_next_nodes(task_id: str) -> tuple:
+    """Returns the nodes the task's checkpointed run would execute next (empty if there is no resumable checkpoint)."""
+    if not knowledge_nexus_graph:
+        return ()
+    try:
+        snapshot = await knowledge_nexus_graph.aget_state({"configurable": {"thread_id": task_id}})
+    except Exception as e:  # e.g. graph compiled without a checkpointer
+        print(f"Task {task_id}: Could not read workflow checkpoint: {e}")
+        return ()
+    return tuple(snapshot.next or ())
+
+async def _prepare_resume_after_verification(task_id: str, config: Dict[str, Any], stored_state: KnowledgeNexusState) -> Optional[KnowledgeNexusState]:
+    """
+    Writes the submitted human feedback into the task's checkpoint so the graph resumes at
+    "await_human_input" rather than re-running research and verification.
+    Returns the input for astream: None to resume from the checkpoint, or the stored state to
+    replay from the entry point if the checkpoint cannot be used.
+    """
+    try:
+        if "await_human_input" in await _checkpoint_next_nodes(task_id):
+            await knowledge_nexus_graph.aupdate_state(config, {"human_feedback": stored_state.get("human_feedback")})
+        else:
+            # No paused checkpoint (e.g. in-memory checkpoints lost on restart): seed one from the
+            # persisted task state as if "verify" had just produced it.
+            await knowledge_nexus_graph.aupdate_state(config, dict(stored_state), as_node="verify")
+        print(f"Task {task_id}: Resuming workflow from checkpoint at 'await_human_input'.")
+        return None
+    except Exception as e:
+        print(f"Task {task_id}: Could not resume from checkpoint ({e}). Replaying workflow with stored state.")
+        return stored_state
+
+async def _discard_checkpoint(task_id: str) -> None:
+    checkpointer = getattr(knowledge_nexus_graph, "checkpointer", None)
+    if checkpointer is None or not hasattr(checkpointer, "adelete_thread"):
+        return
+    try:
+        await checkpointer.adelete_thread(task_id)
+    except Exception as e:
+        print(f"Task {task_id}: Failed to delete workflow checkpoints: {e}")
 
 # --- Background Workflow Execution ---
-async def run_research_workflow_async(task_id: str, topic: str, initial_graph_input: KnowledgeNexusState):
+async def run_research_workflow_async(task_id: str, topic: str, initial_graph_input: Optional[KnowledgeNexusState]):
+    """
+    Runs (or resumes) the workflow for a task. `initial_graph_input` is None when the task should
+    continue from its last checkpoint.
+    """
+    # The LLM tokens of this run are added to the task's totals (a task can run several times:
+    # it pauses for human verification and resumes).
+    with track_task_tokens() as run_tokens:
+        try:
+            await _run_research_workflow(task_id, topic, initial_graph_input)
+        finally:
+            task = active_tasks.get(task_id)
+            if task is not None and any(run_tokens.values()):
+                task_tokens = dict(task.get("llm_tokens") or {})
+                for kind, count in run_tokens.items():
+                    task_tokens[kind] = task_tokens.get(kind, 0) + count
+                task = active_tasks.update_task(task_id, {"llm_tokens": task_tokens})
+            if task is not None and task.get("status") in TERMINAL_STATUSES:
+                # Completed or failed for good: the final state lives in the task store, so the
+                # checkpoints are no longer needed.
+                await _discard_checkpoint(task_id)
+
+async def _run_research_workflow(task_id: str, topic: str, initial_graph_input: Optional[KnowledgeNexusState]):
     if not knowledge_nexus_graph:
-        active_tasks[task_id].update({"status": "failed", "error_message": "Workflow engine not available."})
+        await aupdate_task_and_publish(task_id, {"status": "failed", "error_message": "Workflow engine not available."})
         print(f"Task {task_id}: Failed - Workflow engine not initialized.")
         return
 
     print(f"Task {task_id}: Background research process evaluation for topic '{topic}'.")
 
+    config = {"configurable": {"thread_id": task_id}}
+    resuming_after_verification = active_tasks[task_id].get("status") == "resuming_after_verification"
+
     # Determine the input state for the workflow
     # If resuming, use the already modified state from active_tasks which includes human_feedback
-    if active_tasks[task_id].get("status") == "resuming_after_verification":
+    if resuming_after_verification:
         print(f"Task {task_id}: Attempting to resume workflow with stored state.")
         current_input_state = active_tasks[task_id].get('graph_state', initial_graph_input)
         # Ensure human_feedback is correctly placed in current_input_state if not already
         # (it should have been placed there by /submit-verification)
+    elif initial_graph_input is None:
+        print(f"Task {task_id}: Continuing workflow from its last checkpoint.")
+        current_input_state = active_tasks[task_id].get('graph_state', {})
     else: # Starting fresh
         print(f"Task {task_id}: Starting fresh workflow run.")
         current_input_state = initial_graph_input
 
-    active_tasks[task_id]["status"] = "running" # Set status to running (either fresh or resuming)
+    await aupdate_task_and_publish(task_id, {"status": "running"}) # Set status to running (either fresh or resuming)
 
 
     try:
-        config = {"configurable": {"thread_id": task_id}}
+        stream_input = current_input_state if initial_graph_input is not None else None
+        if resuming_after_verification:
+            stream_input = await _prepare_resume_after_verification(task_id, config, current_input_state)
         final_event_state = None # Keep track of the very last state from the stream
         # --- Logging addition: Before astream loop ---
         print(f"Task {task_id}: Starting/Resuming workflow. Initial/Current input state for graph: {{'current_stage': {current_input_state.get('current_stage')}, 'human_in_loop_needed': {current_input_state.get('human_in_loop_needed')}, 'current_verification_request_id': {current_input_state.get('current_verification_request', {}).get('data_id') if current_input_state.get('current_verification_request') else None}, 'human_feedback_approved': {current_input_state.get('human_feedback', {}).get('approved') if current_input_state.get('human_feedback') else None}}}")
 
-        async for event in knowledge_nexus_graph.astream(current_input_state, config=config):
+        # Streamed LLM text arrives as "custom" events between the per-node "updates".
+        partial_chunks: Dict[str, List[str]] = {}
+        last_partial_publish = 0.0
+        node_started = time.perf_counter()
+        async for mode, event in knowledge_nexus_graph.astream(stream_input, config=config, stream_mode=["updates", "custom"]):
             if not event: continue
+            if mode == "custom":
+                partial = event.get(PARTIAL_TEXT_EVENT) if isinstance(event, dict) else None
+                if partial:
+                    partial_chunks.setdefault(partial["field"], []).append(partial["delta"])
+                    if time.monotonic() - last_partial_publish >= PARTIAL_TEXT_PUBLISH_INTERVAL_SECONDS:
+                        last_partial_publish = time.monotonic()
+                        await aupdate_task_and_publish(task_id, {"partial_text": {field: "".join(chunks) for field, chunks in partial_chunks.items()}})
+                continue
 
             latest_node_name = list(event.keys())[-1]
+            if latest_node_name == "__interrupt__":
+                # Emitted by the checkpointer when the graph stops before "await_human_input";
+                # the pause itself is handled below from the preceding node's state.
+                continue
+            WORKFLOW_NODE_SECONDS.observe(time.perf_counter() - node_started, node=latest_node_name)
             current_state_after_node = event[latest_node_name]
             final_event_state = current_state_after_node # Update with the latest state
 
             # Persist the full state after each node
-            active_tasks[task_id]['graph_state'] = current_state_after_node
-            active_tasks[task_id]['last_event_node'] = latest_node_name
+            node_update = {'graph_state': current_state_after_node, 'last_event_node': latest_node_name}
+            if partial_chunks:
+                # The node's state now holds the complete text.
+                partial_chunks.clear()
+                node_update['partial_text'] = None
             # ---- MODIFICATION START: Store current_stage ----
             current_stage_from_node = current_state_after_node.get('current_stage')
             if current_stage_from_node:
-                active_tasks[task_id]['current_stage'] = current_stage_from_node
+                node_update['current_stage'] = current_stage_from_node
             # ---- MODIFICATION END ----
+            await aupdate_task_and_publish(task_id, node_update)
 
             # --- Logging addition: Inside astream loop, after processing node ---
             print(f"Task {task_id}: Node '{latest_node_name}' processed. State after node: {{'current_stage': {current_state_after_node.get('current_stage')}, 'human_in_loop_needed': {current_state_after_node.get('human_in_loop_needed')}, 'current_verification_request_id': {current_state_after_node.get('current_verification_request', {}).get('data_id') if current_state_after_node.get('current_verification_request') else None}, 'human_feedback_approved': {current_state_after_node.get('human_feedback', {}).get('approved') if current_state_after_node.get('human_feedback') else None}, 'error': {current_state_after_node.get('error_message')}}}")
             # Original print statement follows, now enhanced by the one above.
             print(f"Task {task_id}: Processed node '{latest_node_name}'. Current stage: {current_stage_from_node}")
+            node_started = time.perf_counter() # The next node starts once this update is handled
 
             if current_state_after_node.get('error_message'):
-                active_tasks[task_id].update({"status": "error_in_workflow", "error_message": current_state_after_node['error_message'], "current_stage": "failed"}) # Also set stage to failed
+                await aupdate_task_and_publish(task_id, {"status": "error_in_workflow", "error_message": current_state_after_node['error_message'], "current_stage": "failed"}) # Also set stage to failed
                 print(f"Task {task_id}: Error reported by workflow: {current_state_after_node['error_message']}")
                 return # Stop processing on error
 
@@ -168,7 +472,7 @@ async def run_research_workflow_async(task_id: str, topic: str, initial_graph_in
                current_state_after_node.get('current_verification_request'):
                 # --- Logging modification: Enhanced pausing print ---
                 print(f"Task {task_id}: Pausing for human input at node '{latest_node_name}'. Verification request for data ID: {current_state_after_node['current_verification_request']['data_id']}. Current stage: {current_state_after_node.get('current_stage')}")
-                active_tasks[task_id]['status'] = "awaiting_human_verification"
+                await aupdate_task_and_publish(task_id, {"status": "awaiting_human_verification"})
                 # Workflow effectively pauses here for this task_id.
                 # The current run_research_workflow_async will exit.
                 # The /submit-verification endpoint will update the state in active_tasks
@@ -178,31 +482,35 @@ async def run_research_workflow_async(task_id: str, topic: str, initial_graph_in
         # If the stream completes without pausing for human input or erroring out:
         # This means the graph ran to an END node.
         if final_event_state:
-             active_tasks[task_id].update({
+             await aupdate_task_and_publish(task_id, {
                 "status": "completed", # This is the overall status
                 "current_stage": "completed", # Explicitly set current_stage
+                "completed_at": time.time(), # Start of the result cache freshness window
                 # Use final_event_state which is the state after the last node that led to END
                 "final_document_preview": final_event_state.get('final_document', '')[:250] + "...",
                 "final_graph_state": final_event_state
             })
-             active_tasks[task_id]['current_stage'] = "completed" # <--- Explicitly ensure it's set
              # Ensure the print statement reflects the update made to active_tasks[task_id]['current_stage']
              print(f"Task {task_id}: Workflow completed successfully. Final stage set to: {active_tasks[task_id]['current_stage']}")
         else:
             # This case might occur if the stream somehow ends without any event after resumption,
             # or if initial_graph_input was already a terminal state.
             if active_tasks[task_id]["status"] == "running": # If it was running and just finished without specific end state
-                 active_tasks[task_id].update({"status": "unknown_completion", "current_stage": "unknown", "error_message": "Workflow stream ended without a definitive final state but was running."})
+                 await aupdate_task_and_publish(task_id, {"status": "unknown_completion", "current_stage": "unknown", "error_message": "Workflow stream ended without a definitive final state but was running."})
                  # --- Logging modification: Enhanced unknown completion print ---
                  print(f"Task {task_id}: Workflow stream ended without explicit completion or error, after being in 'running' state. Last known stage: {active_tasks[task_id].get('current_stage')}")
 
 
     except Exception as e:
         # --- Logging modification: Enhanced critical error print ---
-        print(f"Task {task_id}: Critical error during workflow execution: {e}. Last known stage: {active_tasks[task_id].get('current_stage')}", exc_info=True)
-        active_tasks[task_id].update({"status": "failed", "current_stage": "failed", "error_message": str(e)})
+        print(f"Task {task_id}: Critical error during workflow execution: {e}. Last known stage: {active_tasks[task_id].get('current_stage')}")
+        await aupdate_task_and_publish(task_id, {"status": "failed", "current_stage": "failed", "error_message": str(e)})
 
 # --- API Endpoints ---
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus Metrics", tags=["General"])
+async def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health", summary="Health Check", tags=["General"])
 async def health_check():
     return {
@@ -213,46 +521,124 @@ async def health_check():
         }
     }
 
+# --- Topic De-duplication and Result Cache ---
+# Requests for a topic that is already being researched are attached to the in-flight task, and
+# finished documents are reused for RESEARCH_CACHE_TTL_SECONDS (0 disables the result cache).
+# ResearchRequest.bypass_cache forces a fresh run.
+RESEARCH_CACHE_TTL_SECONDS = float(os.getenv("RESEARCH_CACHE_TTL_SECONDS", "86400"))
+IN_FLIGHT_STATUSES = ("queued", "running", "awaiting_human_verification", "resuming_after_verification")
+
+def normalize_topic(topic: str, tenant: Optional[str] = None) -> str:
+    """Case- and whitespace-insensitive key for a research topic, scoped to the tenant if one is given."""
+    key = re.sub(r"\s+", " ", topic).strip().casefold()
+    return f"{tenant}\x1f{key}" if tenant else key
+
+def attached_task_status(task: Dict[str, Any]) -> ResearchStatus:
+    status = build_research_status(task["task_id"], task)
+    status.message = f"An identical research task is already in progress. Attached to task '{task['task_id']}'. {status.message}"
+    return status
+
+def find_reusable_task(topic_key: str) -> Optional[ResearchStatus]:
+    """Returns the status of an in-flight or freshly completed task for the topic, if there is one."""
+    task = active_tasks.find_by_topic_key(topic_key, IN_FLIGHT_STATUSES)
+    if task is not None:
+        CACHE_LOOKUPS.inc(cache="research_result", result="in_flight")
+        return attached_task_status(task)
+    if RESEARCH_CACHE_TTL_SECONDS <= 0:
+        return None
+    task = active_tasks.find_by_topic_key(topic_key, ("completed",))
+    if task is not None and time.time() - task.get("completed_at", 0.0) <= RESEARCH_CACHE_TTL_SECONDS:
+        CACHE_LOOKUPS.inc(cache="research_result", result="hit")
+        status = build_research_status(task["task_id"], task)
+        status.message = f"Served from the result cache: topic '{task.get('topic')}' was researched recently. Fetch the document from /results/{task['task_id']}."
+        return status
+    CACHE_LOOKUPS.inc(cache="research_result", result="miss")
+    return None
+
 @app.post("/research", response_model=ResearchStatus, status_code=202, summary="Start Research Task", tags=["Research"])
-async def start_research_task_endpoint(request: ResearchRequest, background_tasks: BackgroundTasks):
+async def start_research_task_endpoint(request: ResearchRequest):
     if not knowledge_nexus_graph or not chroma_service_instance:
         raise HTTPException(status_code=503, detail="Research service is currently unavailable.")
 
+    topic_key = normalize_topic(request.topic, request.tenant)
+    if not request.bypass_cache:
+        existing = await asyncio.to_thread(find_reusable_task, topic_key)
+        if existing is not None:
+            return existing
+
+    if workflow_backlog().is_full():
+        raise queue_full_exception(QueueFullError(workflow_backlog().retry_after_seconds()))
+
     task_id = str(uuid.uuid4())
 
-    initial_graph_input = KnowledgeNexusState(
-        topic=request.topic,
-        task_id=task_id,
-        research_data=[], verified_data=[], synthesized_content="",
-        detected_conflicts=[], final_document="",
-        human_in_loop_needed=False, current_verification_request=None,
-        messages=[], error_message=None, human_feedback=None # Ensure all fields are initialized
-    )
+    initial_graph_input = build_initial_graph_input(task_id, request.topic, bypass_cache=request.bypass_cache, tenant=request.tenant)
 
-    active_tasks[task_id] = {
+    record = {
         "task_id": task_id, "topic": request.topic, "status": "queued", # Overall status
+        "topic_key": topic_key, # Normalized topic used for de-duplication and the result cache
+        "tenant": request.tenant,
         "current_stage": "queued", # Initial stage
         "graph_state": initial_graph_input, # Store the whole initial state
         "resuming_after_verification": False
     }
+    if request.bypass_cache:
+        active_tasks[task_id] = record
+    else:
+        # The lookup above and this insert are not atomic across API processes (pool mode), so the
+        # store only creates the task if no identical one is in flight by now.
+        in_flight = await asyncio.to_thread(active_tasks.claim_topic, task_id, record, IN_FLIGHT_STATUSES)
+        if in_flight is not None:
+            return attached_task_status(in_flight)
 
-    background_tasks.add_task(run_research_workflow_async, task_id, request.topic, initial_graph_input)
+    try:
+        queue_position = await aschedule_workflow(task_id, request.topic, initial_graph_input)
+    except QueueFullError as e:
+        # Another API process filled the shared queue after the check above. The task must not stay
+        # "queued" without a run: requests for the same topic would attach to it forever.
+        await aupdate_task_and_publish(task_id, {"status": "failed", "current_stage": "failed",
+                                                 "error_message": "The workflow queue was full. Please retry later."})
+        raise queue_full_exception(e)
+    await apublish_task_progress(task_id)
 
     return ResearchStatus(
         task_id=task_id, status="queued", # This will be updated by get_task_status_endpoint using current_stage
         message=f"Research task for topic '{request.topic}' has been queued.",
-        timestamp=datetime.utcnow()
+        timestamp=datetime.utcnow(),
+        queue_position=queue_position
     )
 
-@app.get("/status/{task_id}", response_model=ResearchStatus, summary="Get Task Status", tags=["Research"])
-async def get_task_status_endpoint(task_id: str):
-    task = active_tasks.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task with ID '{task_id}' not found.")
-
+# --- Task Status ---
+STAGE_PROGRESS = {
+    "queued": 0.05,
+    "researching": 0.20,
+    "verifying": 0.35,
+    "awaiting_human_verification": 0.40, # This is a task_overall_status, but also a valid stage
+    "processing_human_feedback": 0.45,
+    "synthesizing": 0.60,
+    "detecting_conflicts": 0.75,
+    "generating_document": 0.90,
+    "completed": 1.0,
+    "failed": 0.0,
+    "unknown": 0.0
+}
+
+STAGE_MESSAGES = {
+    "queued": "Research task for topic '{topic}' is queued.",
+    "researching": "Researching information for topic: {topic}.",
+    "verifying": "Verifying collected data for topic: {topic}.",
+    "awaiting_human_verification": "Awaiting human verification for a data point related to topic: {topic}.",
+    "processing_human_feedback": "Processing human feedback for topic: {topic}.",
+    "synthesizing": "Synthesizing research data for topic: {topic}.",
+    "detecting_conflicts": "Detecting conflicts in research data for topic: {topic}.",
+    "generating_document": "Generating final document for topic: {topic}.",
+    "completed": "Research completed successfully for topic: {topic}.",
+    "failed": "Research failed for topic: {topic}.",
+}
+
+def build_research_status(task_id: str, task: Dict[str, Any]) -> ResearchStatus:
+    """Builds the user-facing ResearchStatus for a task record (shared by /status and the progress streams)."""
     # current_graph_state is the state of the workflow, an instance of KnowledgeNexusState (as a dict)
-    current_graph_state = task.get("graph_state", {})
-    # ---- MODIFICATION START: Use current_stage for status, progress, and message ----
+    current_graph_state = task.get("graph_state") or {}
     # The overall 'status' from active_tasks (like "running", "completed", "failed", "awaiting_human_verification")
     # is still useful for high-level flow control, but current_stage is for user-facing status.
     task_overall_status = task.get("status", "unknown") # e.g. "running", "completed", "awaiting_human_verification"
@@ -272,71 +658,105 @@ async def get_task_status_endpoint(task_id: str):
         except Exception as e:
             print(f"Error parsing current_verification_request for task {task_id}: {e}")
 
-    progress_map = {
-        "queued": 0.05,
-        "researching": 0.20,
-        "verifying": 0.35,
-        "awaiting_human_verification": 0.40, # This is a task_overall_status, but also a valid stage
-        "processing_human_feedback": 0.45,
-        "synthesizing": 0.60,
-        "detecting_conflicts": 0.75,
-        "generating_document": 0.90,
-        "completed": 1.0,
-        "failed": 0.0,
-        "unknown": 0.0
-    }
     # If current_stage_from_task is "awaiting_human_verification", use that.
     # Otherwise, if task_overall_status is "awaiting_human_verification", that takes precedence for progress and message.
     effective_stage_for_status = current_stage_from_task
     if task_overall_status == "awaiting_human_verification":
         effective_stage_for_status = "awaiting_human_verification"
 
-
-    current_progress = progress_map.get(effective_stage_for_status, 0.0)
-
     topic = task.get('topic', 'N/A')
-    error_message_from_task = task.get("error_message")
-    message = f"Task for topic '{topic}' is currently {effective_stage_for_status}."
-
-    if effective_stage_for_status == "queued":
-        message = f"Research task for topic '{topic}' is queued."
-    elif effective_stage_for_status == "researching":
-        message = f"Researching information for topic: {topic}."
-    elif effective_stage_for_status == "verifying":
-        message = f"Verifying collected data for topic: {topic}."
-    elif effective_stage_for_status == "awaiting_human_verification":
-        message = f"Awaiting human verification for a data point related to topic: {topic}."
-    elif effective_stage_for_status == "processing_human_feedback":
-        message = f"Processing human feedback for topic: {topic}."
-    elif effective_stage_for_status == "synthesizing":
-        message = f"Synthesizing research data for topic: {topic}."
-    elif effective_stage_for_status == "detecting_conflicts":
-        message = f"Detecting conflicts in research data for topic: {topic}."
-    elif effective_stage_for_status == "generating_document":
-        message = f"Generating final document for topic: {topic}."
-    elif effective_stage_for_status == "completed":
-        message = f"Research completed successfully for topic: {topic}."
-    elif effective_stage_for_status == "failed":
-        message = error_message_from_task or f"Research failed for topic: {topic}."
-    # else, the generic message `Task for topic '{topic}' is currently {effective_stage_for_status}.` will be used.
-
-    sources_explored = current_graph_state.get("sources_explored", 0)
-    data_collected = current_graph_state.get("data_collected", 0)
+    if effective_stage_for_status == "failed" and task.get("error_message"):
+        message = task["error_message"]
+    else:
+        # Stages without a specific template get the generic message.
+        template = STAGE_MESSAGES.get(effective_stage_for_status, "Task for topic '{topic}' is currently {stage}.")
+        message = template.format(topic=topic, stage=effective_stage_for_status)
 
     return ResearchStatus(
         task_id=task_id,
         status=effective_stage_for_status, # Use the granular stage here
         message=message,
-        progress=current_progress,
-        sources_explored=sources_explored,
-        data_collected=data_collected,
+        progress=STAGE_PROGRESS.get(effective_stage_for_status, 0.0),
+        sources_explored=current_graph_state.get("sources_explored", 0),
+        data_collected=current_graph_state.get("data_collected", 0),
+        sources_reused=current_graph_state.get("sources_reused", 0),
+        search_calls_saved=current_graph_state.get("search_calls_saved", 0),
+        llm_tokens=task.get("llm_tokens"),
         timestamp=datetime.utcnow(),
-        verification_request=verification_req_data
+        verification_request=verification_req_data,
+        queue_position=workflow_backlog().position(task_id)
     )
-    # ---- MODIFICATION END ----
+
+@app.get("/status/{task_id}", response_model=ResearchStatus, summary="Get Task Status", tags=["Research"])
+async def get_task_status_endpoint(task_id: str):
+    task = active_tasks.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task with ID '{task_id}' not found.")
+    return build_research_status(task_id, task)
+
+# --- Progress Streams ---
+def _parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+async def _task_progress_events(task_id: str, last_event_id: Optional[int], heartbeat: Optional[float] = None):
+    """
+    Yields progress events for a task until it reaches a terminal status. A fresh subscriber first
+    gets the current status; a reconnecting one (Last-Event-ID) gets the buffered events it missed.
+    Yields None when `heartbeat` seconds pass without an event.
+    """
+    with progress_broker.subscribe(task_id, last_event_id) as subscription:
+        if last_event_id is None:
+            task = active_tasks.get(task_id)
+            if not task:
+                return
+            last_event = progress_broker.last_event(task_id)
+            terminal = task.get("status") in TERMINAL_STATUSES
+            yield ProgressEvent(id=last_event.id if last_event else 0, task_id=task_id, event="status",
+                                data=jsonable_encoder(build_research_status(task_id, task)), terminal=terminal)
+            if terminal:
+                return
+        while True:
+            event = await subscription.next_event(timeout=heartbeat)
+            yield event
+            if event is not None and event.terminal:
+                return
+
+@app.get("/stream/{task_id}", summary="Stream Task Progress (Server-Sent Events)", tags=["Research"])
+async def stream_task_progress_endpoint(task_id: str, last_event_id: Optional[str] = None,
+                                        last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    if task_id not in active_tasks:
+        raise HTTPException(status_code=404, detail=f"Task with ID '{task_id}' not found.")
+    # Browsers' EventSource resends Last-Event-ID as a header; the query parameter is for other clients.
+    resume_from = _parse_last_event_id(last_event_id_header or last_event_id)
+
+    async def event_generator():
+        async for event in _task_progress_events(task_id, resume_from):
+            yield {"id": str(event.id), "event": event.event, "data": json.dumps(event.data)}
+
+    # sse-starlette sends comment pings as heartbeats; clients reconnect with the Last-Event-ID header.
+    return EventSourceResponse(event_generator(), ping=STREAM_HEARTBEAT_SECONDS)
+
+@app.websocket("/ws/{task_id}")
+async def task_progress_websocket(websocket: WebSocket, task_id: str, last_event_id: Optional[str] = None):
+    if task_id not in active_tasks:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    try:
+        async for event in _task_progress_events(task_id, _parse_last_event_id(last_event_id), heartbeat=STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                await websocket.send_json({"event": "heartbeat"})
+            else:
+                await websocket.send_json({"id": event.id, "event": event.event, "data": event.data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 @app.post("/submit-verification/{task_id}", status_code=200, summary="Submit Human Verification for a Task", tags=["Research"])
-async def submit_human_verification_endpoint(task_id: str, approval_input: HumanApproval, background_tasks: BackgroundTasks):
+async def submit_human_verification_endpoint(task_id: str, approval_input: HumanApproval):
     """
     Allows a human to submit their verification/correction for a piece of data
     that the workflow has flagged for human review.
@@ -357,6 +777,9 @@ async def submit_human_verification_endpoint(task_id: str, approval_input: Human
         print(f"Error: Task {task_id} has missing or corrupted state for graph_state.")
         raise HTTPException(status_code=500, detail="Task state is missing or corrupted. Cannot process verification.")
 
+    if workflow_backlog().is_full():
+        raise queue_full_exception(QueueFullError(workflow_backlog().retry_after_seconds()))
+
     # Inject human feedback into the current_graph_state.
     # The 'human_feedback' key is what await_human_input_node in the workflow expects.
     current_graph_state['human_feedback'] = approval_input.dict() # approval_input is Pydantic, convert to dict
@@ -364,18 +787,24 @@ async def submit_human_verification_endpoint(task_id: str, approval_input: Human
     # Update task properties to signal resumption
     task["graph_state"] = current_graph_state # Persist the modified state (now including human_feedback)
     task["status"] = "resuming_after_verification" # Custom status to indicate it's about to be re-queued
+    active_tasks.save(task_id, task)
+    await apublish_task_progress(task_id, task)
 
-    # Re-trigger the workflow execution by adding run_research_workflow_async to background tasks.
+    # Re-trigger the workflow execution by queuing run_research_workflow_async on the scheduler.
     # It will use the updated current_graph_state (which now contains human_feedback).
     print(f"Task {task_id}: Queuing workflow for resumption after human verification. Topic: {current_graph_state.get('topic')}")
-    background_tasks.add_task(run_research_workflow_async,
-                              task_id,
-                              current_graph_state.get('topic', "Unknown Topic"), # Get topic from state
-                              current_graph_state) # Pass the entire modified state as initial_graph_input for resumption
+    await aschedule_workflow(task_id,
+                             current_graph_state.get('topic', "Unknown Topic"), # Get topic from state
+                             current_graph_state, # Pass the entire modified state as initial_graph_input for resumption
+                             force=True) # Capacity was checked above, before the task state was changed
 
     return {"message": f"Verification submitted for task '{task_id}'. Workflow is scheduled to resume."}
 
 
+def _final_document(task: Dict[str, Any]) -> Optional[str]:
+    final_graph_state = task.get("final_graph_state", task.get("graph_state", {}))
+    return final_graph_state.get("final_document")
+
 @app.get("/results/{task_id}", response_model=Optional[DocumentOutput], summary="Get Task Results", tags=["Research"])
 async def get_task_results_endpoint(task_id: str):
     task = active_tasks.get(task_id)
@@ -384,8 +813,7 @@ async def get_task_results_endpoint(task_id: str):
 
     status = task.get("status")
     if status == "completed":
-        final_graph_state = task.get("final_graph_state", task.get("graph_state", {}))
-        final_document_content = final_graph_state.get("final_document")
+        final_document_content = _final_document(task)
         if final_document_content is not None:
             return DocumentOutput(
                 task_id=task_id,
@@ -399,7 +827,42 @@ async def get_task_results_endpoint(task_id: str):
     else:
         raise HTTPException(status_code=202, detail=f"Task '{task_id}' is not yet completed. Current status: {status}.")
 
+@app.get("/results/{task_id}/stream", summary="Stream Task Results (Server-Sent Events)", tags=["Research"])
+async def stream_task_results_endpoint(task_id: str):
+    """
+    Delivers the final document while it is being generated. "delta" events carry text to append;
+    a "reset" event replaces everything received so far (e.g. when LLM formatting failed and the
+    basic document was used instead). The stream ends with a "done" event holding the task status.
+    A reconnecting client starts over: its first delta is the whole document generated so far.
+    """
+    task = active_tasks.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task with ID '{task_id}' not found.")
+    if task.get("status") in ["failed", "error_in_workflow", "unknown_completion"]:
+        raise HTTPException(status_code=422, detail=f"Task ended inconclusively. Status: {task.get('status')}. Error: {task.get('error_message', 'No specific error message.')}")
+
+    async def event_generator():
+        sent = ""
+        async for event in _task_progress_events(task_id, None):
+            task = active_tasks.get(task_id) or {}
+            if task.get("status") == "completed":
+                text = _final_document(task) or ""
+            else:
+                text = (task.get("partial_text") or {}).get("final_document", "")
+            if text and text != sent:
+                if text.startswith(sent):
+                    yield {"event": "delta", "data": json.dumps({"text": text[len(sent):]})}
+                else:
+                    yield {"event": "reset", "data": json.dumps({"text": text})}
+                sent = text
+            if event.terminal:
+                yield {"event": "done", "data": json.dumps({"status": task.get("status"), "error_message": task.get("error_message")})}
+
+    return EventSourceResponse(event_generator(), ping=STREAM_HEARTBEAT_SECONDS)
+
 # --- Main Execution Guard ---
 if __name__ == "__main__":
     print("Starting Knowledge Nexus API server using Uvicorn...")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, workers=1)
+    # Several API processes are only safe in pool mode, where no process holds task state of its own.
+    api_workers = int(os.getenv("API_WORKERS", "1")) if WORKFLOW_EXECUTION == "pool" else 1
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=api_workers == 1, workers=api_workers)
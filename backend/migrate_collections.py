@@ -0,0 +1,140 @@
+"""
+Moves research data from the old one-collection-per-task layout into the shared research collections.
+
+Each per-task collection (named after its task ID) is copied page by page, with its stored
+embeddings, into the tenant's shared collection. Documents get task_id and tenant metadata and
+task-scoped IDs, exactly like data written by StorageService today; documents without a stored_at
+time count as stored at the migration, so they are eligible for knowledge reuse. Copies are
+upserts, so an interrupted migration can simply be run again. Source collections are only deleted
+with --delete-source, and only after all of their documents were found in the shared collection.
+
+Usage (from the repository root, with the same environment as the API):
+    python -m backend.migrate_collections --dry-run
+    python -m backend.migrate_collections --delete-source
+"""
+import argparse
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend.agents.storage_service import (
+    DEFAULT_TENANT, RESEARCH_COLLECTION_NAME, research_data_filter, shared_collection_name, storage_document_id,
+)
+from backend.services.chroma_service import ChromaService, document_content_hash
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def is_shared_collection(name: str) -> bool:
+    return name == RESEARCH_COLLECTION_NAME or name.startswith(f"{RESEARCH_COLLECTION_NAME}_")
+
+
+def is_per_task_collection(name: str) -> bool:
+    """Task IDs are UUIDs; any other collection is left alone unless --all-collections is given."""
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+def _migrated_metadata(metadata: Dict[str, Any], doc_id: str, document: str, task_id: str, tenant: str,
+                       migrated_at: float) -> Dict[str, Any]:
+    """The metadata StorageService would have written for the document (see StorageService._prepare_documents)."""
+    return dict(
+        metadata,
+        task_id=task_id,
+        tenant=tenant,
+        original_id_from_source=metadata.get("original_id_from_source") or doc_id,
+        stored_at=metadata.get("stored_at", migrated_at),
+        content_hash=metadata.get("content_hash") or document_content_hash(document or ""),
+    )
+
+
+def migrate_collection(service: ChromaService, name: str, tenant: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                       delete_source: bool = False, dry_run: bool = False) -> int:
+    """
+    Copies one per-task collection into the shared collection and returns the number of documents
+    copied (with dry_run, the number that would be copied).
+    """
+    source = service.get_collection(name)
+    if source is None:
+        return 0
+    total = source.count()
+    target_name = shared_collection_name(service.embedding_space, tenant)
+    print(f"Collection '{name}': {total} document(s) -> '{target_name}'{' (dry run)' if dry_run else ''}.")
+    if dry_run:
+        return total
+    if total == 0:
+        if delete_source:
+            service.delete_collection(name)
+        return 0
+
+    target = service.get_or_create_collection(target_name)
+    if target is None:
+        raise RuntimeError(f"Could not open the shared collection '{target_name}'.")
+    copied = 0
+    migrated_at = time.time()
+    for offset in range(0, total, batch_size):
+        page = source.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        metadatas = [
+            _migrated_metadata(metadata or {}, doc_id, document, name, tenant, migrated_at)
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"] or [{}] * len(page["ids"]))
+        ]
+        target.upsert(
+            ids=[storage_document_id(name, doc_id) for doc_id in page["ids"]],
+            embeddings=page["embeddings"],
+            documents=page["documents"],
+            metadatas=metadatas,
+        )
+        copied += len(page["ids"])
+
+    stored = service.count_documents(target_name, where=research_data_filter(task_id=name, tenant=tenant))
+    if stored is None or stored < total:
+        raise RuntimeError(f"Only {stored} of {total} documents of '{name}' are in '{target_name}'; the source was kept.")
+    if delete_source:
+        service.delete_collection(name)
+    return copied
+
+
+def migrate(service: ChromaService, tenant: str = DEFAULT_TENANT, batch_size: int = DEFAULT_BATCH_SIZE,
+            delete_source: bool = False, dry_run: bool = False, all_collections: bool = False,
+            collections: Optional[Sequence[str]] = None) -> Dict[str, List[str]]:
+    """Migrates the selected per-task collections; returns the names of the migrated and failed ones."""
+    if collections:
+        names = [name for name in collections if not is_shared_collection(name)]
+    else:
+        names = [name for name in service.list_collection_names()
+                 if not is_shared_collection(name) and (all_collections or is_per_task_collection(name))]
+
+    summary: Dict[str, List[str]] = {"migrated": [], "failed": []}
+    documents = 0
+    for name in sorted(names):
+        try:
+            documents += migrate_collection(service, name, tenant, batch_size, delete_source, dry_run)
+            summary["migrated"].append(name)
+        except Exception as e:
+            print(f"Collection '{name}': Migration failed: {e}")
+            summary["failed"].append(name)
+    print(f"Migrated {len(summary['migrated'])} collection(s) with {documents} document(s); {len(summary['failed'])} failed.")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move per-task Chroma collections into the shared research collections.")
+    parser.add_argument("--persist-directory", default="./chroma_db_store", help="ChromaDB directory (default: ./chroma_db_store).")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help=f"Tenant the migrated data is assigned to (default: {DEFAULT_TENANT}).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Documents copied per request.")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each per-task collection once it is copied.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the collections that would be migrated.")
+    parser.add_argument("--all-collections", action="store_true", help="Also migrate collections whose name is not a task ID.")
+    parser.add_argument("--embedding-backend", help="Embedding backend for the shared collection (default: EMBEDDING_BACKEND).")
+    parser.add_argument("collections", nargs="*", help="Migrate only these collections.")
+    args = parser.parse_args()
+
+    chroma_service = ChromaService(persist_directory=args.persist_directory, embedding_backend=args.embedding_backend)
+    result = migrate(chroma_service, args.tenant, max(1, args.batch_size), args.delete_source, args.dry_run,
+                     args.all_collections, args.collections)
+    raise SystemExit(1 if result["failed"] else 0)
@@ -1,11 +1,13 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
 
 class ResearchRequest(BaseModel):
     topic: str
+    bypass_cache: bool = False # Always start a new research run instead of reusing an in-flight or cached one
+    tenant: Optional[str] = None # Tenant the research data is stored for; tasks of different tenants are never shared
 
 
 class ResearchStatus(BaseModel):
@@ -15,8 +17,12 @@ class ResearchStatus(BaseModel):
     progress: Optional[float] = None  # e.g., 0.5 for 50%
     sources_explored: Optional[int] = None
     data_collected: Optional[int] = None
+    sources_reused: Optional[int] = None # Part of sources_explored served from the knowledge base
+    search_calls_saved: Optional[int] = None # Web search calls avoided thanks to sources_reused
+    llm_tokens: Optional[Dict[str, int]] = None # LLM tokens used so far ("prompt", "completion")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     verification_request: Optional['DataVerificationRequest'] = None # Added for HITL
+    queue_position: Optional[int] = None # 1-based position while waiting for a workflow worker
 
 
 class DocumentOutput(BaseModel):
@@ -1,75 +1,341 @@
 import chromadb
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+import asyncio
+import functools
+import hashlib
 import logging
 import os
-from openai import AzureOpenAI
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from chromadb import Documents, EmbeddingFunction, Embeddings
 
+try:
+    from .stage_limits import stage_limits
+    from .executors import run_blocking
+    from .embedding_cache import EmbeddingCache, create_embedding_cache, embedding_cache_key, normalize_embedding_text
+    from .embedding_backends import create_embedding_function, embedding_space, register_embedding_backend
+    from .metrics import external_call
+except ImportError:
+    # Direct execution of this module: run without the process-wide concurrency caps.
+    from contextlib import nullcontext
+    class _NoStageLimits:
+        def limit(self, stage: str):
+            return nullcontext()
+        def alimit(self, stage: str):
+            return nullcontext()
+    stage_limits = _NoStageLimits()
+    run_blocking = asyncio.to_thread
+    from embedding_cache import EmbeddingCache, create_embedding_cache, embedding_cache_key, normalize_embedding_text
+    from embedding_backends import create_embedding_function, embedding_space, register_embedding_backend
+    from metrics import external_call
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Azure OpenAI accepts at most 2048 inputs per embeddings request; the token budget keeps requests
+# well below the per-request size limit. Sub-batches of one call are sent concurrently (all calls
+# together are still capped by EMBEDDING_CONCURRENCY), and a failed sub-batch is retried on its own.
+EMBEDDING_BATCH_MAX_INPUTS = min(2048, max(1, int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))))
+EMBEDDING_BATCH_MAX_TOKENS = max(1, int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000")))
+EMBEDDING_BATCH_CONCURRENCY = max(1, int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4")))
+EMBEDDING_BATCH_RETRIES = max(0, int(os.getenv("EMBEDDING_BATCH_RETRIES", "2")))
+EMBEDDING_RETRY_BACKOFF_SECONDS = 0.5
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding is downloaded on first use; without network access fall back to an estimate.
+        logger.warning(f"Could not load the cl100k_base tokenizer, estimating embedding batch sizes instead: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` for the OpenAI embedding models (a conservative estimate without tiktoken)."""
+    encoding = _token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 3 + 1
+
+
+def plan_embedding_batches(texts: List[str], max_tokens: Optional[int] = None, max_inputs: Optional[int] = None) -> List[List[int]]:
+    """
+    Splits `texts` into consecutive batches of indices holding at most `max_inputs` texts and
+    `max_tokens` tokens each (default: the EMBEDDING_BATCH_* settings). A single text larger than
+    the token budget gets a batch of its own.
+    """
+    max_tokens = max_tokens or EMBEDDING_BATCH_MAX_TOKENS
+    max_inputs = max_inputs or EMBEDDING_BATCH_MAX_INPUTS
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (len(current) >= max_inputs or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
 
 class AzureOpenAIEmbeddingFunction(EmbeddingFunction):
-    def __init__(self, embedding_api_key: str, azure_endpoint: str, api_version: str, azure_deployment_name: str):
+    """
+    Azure OpenAI embeddings with a persistent cache in front of the API (see services/embedding_cache.py).
+
+    Vectors are keyed by the deployment name and the hash of the normalized text; only the texts
+    missing from the cache are sent to the API, split into token-bounded batches that are requested
+    concurrently. The result keeps the order of the input.
+    """
+    backend = "azure"
+
+    def __init__(self, embedding_api_key: str, azure_endpoint: str, api_version: str, azure_deployment_name: str,
+                 cache: Optional["EmbeddingCache"] = None, dimensions: int = 1536):
         self._client = AzureOpenAI(
             api_key=embedding_api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version,
         )
+        self._async_client = AsyncAzureOpenAI(
+            api_key=embedding_api_key,
+            azure_endpoint=azure_endpoint,
+            api_version=api_version,
+        )
         self._azure_deployment_name = azure_deployment_name
+        # Output size of the deployment's model; it names the collections the vectors are stored in.
+        self.dimensions = dimensions
+        self.cache = cache if cache is not None else create_embedding_cache()
+
+    async def acall(self, texts: Documents) -> Embeddings:
+        """Async variant of __call__ using the non-blocking Azure OpenAI client."""
+        keys, embeddings, misses = await run_blocking(self._lookup, texts)
+        if misses:
+            miss_keys, miss_texts = list(misses), list(misses.values())
+            batches = plan_embedding_batches(miss_texts)
+            semaphore = asyncio.Semaphore(EMBEDDING_BATCH_CONCURRENCY)
+
+            async def embed(batch: List[int]) -> List[List[float]]:
+                async with semaphore:
+                    return await self._aembed_batch([miss_texts[i] for i in batch])
+
+            outcomes = await asyncio.gather(*(embed(batch) for batch in batches), return_exceptions=True)
+            self._collect_batches(miss_keys, batches, outcomes, embeddings)
+            await run_blocking(self._store, misses, embeddings)
+            self._raise_first_failure(outcomes)
+        return [embeddings[key] for key in keys]
 
     def __call__(self, texts: Documents) -> Embeddings:
+        keys, embeddings, misses = self._lookup(texts)
+        if misses:
+            miss_keys, miss_texts = list(misses), list(misses.values())
+            batches = plan_embedding_batches(miss_texts)
+            if len(batches) == 1:
+                outcomes = [self._try(self._embed_batch, miss_texts)]
+            else:
+                with ThreadPoolExecutor(max_workers=min(EMBEDDING_BATCH_CONCURRENCY, len(batches)), thread_name_prefix="embedding-batch") as pool:
+                    outcomes = list(pool.map(lambda batch: self._try(self._embed_batch, [miss_texts[i] for i in batch]), batches))
+            self._collect_batches(miss_keys, batches, outcomes, embeddings)
+            self._store(misses, embeddings)
+            self._raise_first_failure(outcomes)
+        return [embeddings[key] for key in keys]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """One embeddings request, retried up to EMBEDDING_BATCH_RETRIES times on failure."""
+        for attempt in range(EMBEDDING_BATCH_RETRIES + 1):
+            try:
+                with stage_limits.limit("embedding"), external_call("embedding", "azure_openai"):
+                    response = self._client.embeddings.create(model=self._azure_deployment_name, input=texts)
+                return [item.embedding for item in response.data]
+            except Exception as e:
+                if attempt == EMBEDDING_BATCH_RETRIES:
+                    logger.error(f"Azure OpenAI API call failed for a batch of {len(texts)} texts: {e}", exc_info=True)
+                    raise
+                logger.warning(f"Azure OpenAI API call failed for a batch of {len(texts)} texts (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(EMBEDDING_BATCH_RETRIES + 1):
+            try:
+                async with stage_limits.alimit("embedding"):
+                    with external_call("embedding", "azure_openai"):
+                        response = await self._async_client.embeddings.create(model=self._azure_deployment_name, input=texts)
+                return [item.embedding for item in response.data]
+            except Exception as e:
+                if attempt == EMBEDDING_BATCH_RETRIES:
+                    logger.error(f"Azure OpenAI API call failed for a batch of {len(texts)} texts: {e}", exc_info=True)
+                    raise
+                logger.warning(f"Azure OpenAI API call failed for a batch of {len(texts)} texts (attempt {attempt + 1}), retrying: {e}")
+                await asyncio.sleep(EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    @staticmethod
+    def _try(func, *args):
         try:
-            response = self._client.embeddings.create(model=self._azure_deployment_name, input=texts)
-            return [item.embedding for item in response.data]
+            return func(*args)
         except Exception as e:
-            logger.error(f"Azure OpenAI API call failed: {e}", exc_info=True)
-            # Depending on how chromadb handles errors in embedding functions,
-            # you might want to raise the exception or return empty embeddings.
-            # For now, returning empty list for each failed text or raising.
-            # Returning empty list might lead to issues if chromadb expects specific list length.
-            # Consider returning List[Optional[List[float]]] or similar if chromadb supports it,
-            # or handling this more robustly based on chromadb's error handling.
-            # For simplicity, let's re-raise for now, or return empty embeddings for all if one fails.
-            # raise # Option 1: Re-raise the exception
-            # return [[] for _ in texts] # Option 2: Return empty embeddings for all texts if API call fails for the batch
-            # Re-raise the exception to propagate the error upstream.
-            raise
+            return e
+
+    @staticmethod
+    def _collect_batches(miss_keys: List[str], batches: List[List[int]], outcomes: List[Any], embeddings: Dict[str, List[float]]) -> None:
+        """Maps the vectors of each successful batch back to the cache keys of its texts."""
+        for batch, outcome in zip(batches, outcomes):
+            if not isinstance(outcome, BaseException):
+                embeddings.update((miss_keys[i], vector) for i, vector in zip(batch, outcome))
+
+    @staticmethod
+    def _raise_first_failure(outcomes: List[Any]) -> None:
+        # Vectors of the batches that succeeded are already cached, so a repeated call only re-sends the rest.
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit/miss counters and size of the embedding cache, or None when caching is disabled."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def _lookup(self, texts: Documents) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        """
+        Returns the cache key of each text, the cached vectors by key, and the normalized text of
+        each missing key (texts that normalize to the same string are requested once).
+        """
+        keys = [embedding_cache_key(self._azure_deployment_name, text) for text in texts]
+        embeddings: Dict[str, List[float]] = {}
+        if self.cache is not None:
+            try:
+                embeddings = self.cache.get_many(keys)
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed, embedding all texts: {e}")
+        misses: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings and key not in misses:
+                misses[key] = normalize_embedding_text(text) or text
+        if self.cache is not None and texts:
+            logger.info(f"Embedding cache: {len(texts) - sum(1 for key in keys if key in misses)}/{len(texts)} texts cached, "
+                        f"hit rate {self.cache.hits / max(1, self.cache.hits + self.cache.misses):.1%} since start.")
+        return keys, embeddings, misses
+
+    def _store(self, misses: Dict[str, str], embeddings: Dict[str, List[float]]) -> None:
+        if self.cache is None:
+            return
+        try:
+            self.cache.put_many({key: embeddings[key] for key in misses if key in embeddings}, deployment=self._azure_deployment_name)
+        except Exception as e:
+            logger.warning(f"Failed to write embeddings to cache: {e}")
+
+
+def create_azure_embedding_function() -> AzureOpenAIEmbeddingFunction:
+    """Builds the Azure OpenAI embedding function from the AZURE_OPENAI_EMBEDDING_* environment variables."""
+    azure_embedding_api_key = os.getenv("AZURE_OPENAI_EMBEDDING_API_KEY")
+    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    azure_api_version = os.getenv("OPENAI_API_VERSION") # or AZURE_OPENAI_API_VERSION
+    azure_embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+
+    if not all([azure_embedding_api_key, azure_endpoint, azure_api_version, azure_embedding_deployment]):
+        logger.error("Azure OpenAI embedding environment variables are not fully set.")
+        raise ValueError("Missing one or more Azure OpenAI embedding environment variables.")
+
+    embedding_function = AzureOpenAIEmbeddingFunction(
+        embedding_api_key=azure_embedding_api_key,
+        azure_endpoint=azure_endpoint,
+        api_version=azure_api_version,
+        azure_deployment_name=azure_embedding_deployment,
+        dimensions=int(os.getenv("AZURE_OPENAI_EMBEDDING_DIMENSIONS", "1536")),
+    )
+    logger.info(f"Using Azure OpenAI embedding function with deployment: {azure_embedding_deployment}")
+    return embedding_function
+
+
+register_embedding_backend("azure", create_azure_embedding_function)
+
+
+# --- Process-wide clients and services ---
+# Every ChromaService for the same directory shares one PersistentClient, and get_chroma_service()
+# hands out one ChromaService per directory and embedding backend, so main.py, StorageService and
+# the workflow graph reuse the same client, embedding function and collection handles.
+COLLECTION_CACHE_SIZE = max(1, int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "64")))
+
+_clients: Dict[str, Any] = {}
+_services: Dict[Tuple[str, str], "ChromaService"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_persistent_client(persist_directory: str):
+    """Returns the process-wide PersistentClient for `persist_directory`, creating it on first use."""
+    path = os.path.abspath(persist_directory)
+    with _registry_lock:
+        client = _clients.get(path)
+        if client is None:
+            client = chromadb.PersistentClient(path=path)
+            _clients[path] = client
+        return client
+
+
+def get_chroma_service(persist_directory: Optional[str] = "./chroma_db_store", embedding_backend: Optional[str] = None) -> "ChromaService":
+    """Returns the process-wide ChromaService for a directory and embedding backend, creating it on first use."""
+    persist_directory = persist_directory or "./chroma_db_store"
+    backend = (embedding_backend or os.getenv("EMBEDDING_BACKEND", "azure")).lower()
+    key = (os.path.abspath(persist_directory), backend)
+    with _registry_lock:
+        service = _services.get(key)
+    if service is None:
+        service = ChromaService(persist_directory=persist_directory, embedding_backend=backend)
+        with _registry_lock:
+            service = _services.setdefault(key, service)
+    return service
+
+
+def document_content_hash(document: str) -> str:
+    """Hash of a document's normalized text, stored as "content_hash" metadata to detect unchanged documents."""
+    return hashlib.sha256(normalize_embedding_text(document).encode("utf-8")).hexdigest()
 
 
 class ChromaService:
-    def __init__(self, persist_directory: str = "./chroma_db_store"):
+    def __init__(self, persist_directory: str = "./chroma_db_store", embedding_backend: Optional[str] = None,
+                 collection_cache_size: int = COLLECTION_CACHE_SIZE):
         """
-        Initializes the ChromaDB client and Azure OpenAI embedding function.
+        Initializes the ChromaDB client and the embedding function.
 
         Args:
             persist_directory (str): Directory to store ChromaDB data.
+            embedding_backend (Optional[str]): Registered embedding backend to use ("azure" or "hashing").
+                                               Defaults to the EMBEDDING_BACKEND environment variable, then "azure".
+            collection_cache_size (int): Number of collection handles kept open (least recently used are dropped).
         """
+        self._collections: "OrderedDict[str, Any]" = OrderedDict()
+        self._collections_lock = threading.Lock()
+        self._collection_cache_size = max(1, collection_cache_size)
         try:
-            self.client = chromadb.PersistentClient(path=persist_directory)
-
-            azure_embedding_api_key = os.getenv("AZURE_OPENAI_EMBEDDING_API_KEY")
-            azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-            azure_api_version = os.getenv("OPENAI_API_VERSION") # or AZURE_OPENAI_API_VERSION
-            azure_embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
-
-            if not all([azure_embedding_api_key, azure_endpoint, azure_api_version, azure_embedding_deployment]):
-                logger.error("Azure OpenAI embedding environment variables are not fully set.")
-                raise ValueError("Missing one or more Azure OpenAI embedding environment variables.")
-
-            self.embedding_function = AzureOpenAIEmbeddingFunction(
-                embedding_api_key=azure_embedding_api_key,
-                azure_endpoint=azure_endpoint,
-                api_version=azure_api_version,
-                azure_deployment_name=azure_embedding_deployment
-            )
-            logger.info(f"Using Azure OpenAI embedding function with deployment: {azure_embedding_deployment}")
+            self.client = get_persistent_client(persist_directory)
+            self.embedding_function = create_embedding_function(embedding_backend)
             logger.info(f"ChromaDB client initialized. Data will be persisted in: {persist_directory}")
         except Exception as e:
-            logger.error(f"Failed to initialize ChromaDB client or Azure OpenAI embedding function: {e}", exc_info=True)
+            logger.error(f"Failed to initialize ChromaDB client or embedding function: {e}", exc_info=True)
             raise
 
+    @property
+    def embedding_space(self) -> str:
+        """Backend and dimensions of the embedding function, e.g. "azure_1536" (see embedding_backends.embedding_space)."""
+        return embedding_space(self.embedding_function)
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit rate and size of the embedding cache, or None when it is disabled."""
+        cache_stats = getattr(self.embedding_function, "cache_stats", None)
+        return cache_stats() if cache_stats is not None else None
+
     def get_or_create_collection(self, collection_name: str) -> Optional[chromadb.api.models.Collection.Collection]:
         """
         Gets an existing collection or creates it if it doesn't exist.
@@ -80,17 +346,40 @@ class ChromaService:
         Returns:
             Optional[chromadb.api.models.Collection.Collection]: The collection object, or None if an error occurred.
         """
+        collection = self._cached_collection(collection_name)
+        if collection is not None:
+            return collection
         try:
             collection = self.client.get_or_create_collection(
                 name=collection_name,
                 embedding_function=self.embedding_function  # type: ignore
             )
             logger.info(f"Successfully retrieved or created collection: {collection_name}")
+            self._cache_collection(collection_name, collection)
             return collection
         except Exception as e:
             logger.error(f"Failed to get or create collection '{collection_name}': {e}", exc_info=True)
             return None
 
+    def _cached_collection(self, collection_name: str) -> Optional[Any]:
+        with self._collections_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                self._collections.move_to_end(collection_name)
+            return collection
+
+    def _cache_collection(self, collection_name: str, collection: Any) -> None:
+        with self._collections_lock:
+            self._collections[collection_name] = collection
+            self._collections.move_to_end(collection_name)
+            while len(self._collections) > self._collection_cache_size:
+                self._collections.popitem(last=False)
+
+    def invalidate_collection(self, collection_name: str) -> None:
+        """Drops the cached handle of a collection, e.g. after it was deleted or an operation on it failed."""
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+
     def add_documents(self, collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> bool:
         """
         Adds documents to the specified collection.
@@ -118,9 +407,122 @@ class ChromaService:
             return True
         except Exception as e:
             logger.error(f"Failed to add documents to collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
             return False
 
-    def query_documents(self, collection_name: str, query_texts: List[str], n_results: int = 5) -> Optional[Dict[str, Any]]:
+    async def aadd_documents(self, collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> bool:
+        """
+        Async variant of add_documents. Embeddings are computed with the embedding function's async
+        API when it has one; the chromadb client itself is synchronous, so collection calls run
+        on the blocking I/O thread pool.
+
+        Returns:
+            bool: True if documents were added successfully, False otherwise.
+        """
+        collection = self._cached_collection(collection_name) or await run_blocking(self.get_or_create_collection, collection_name)
+        if not collection:
+            return False
+
+        try:
+            embed_async = getattr(self.embedding_function, "acall", None)
+            if embed_async is not None:
+                embeddings = await embed_async(documents)
+                await run_blocking(collection.add, documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+            else:
+                await run_blocking(collection.add, documents=documents, metadatas=metadatas, ids=ids)
+            logger.info(f"Successfully added {len(documents)} documents to collection: {collection_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to add documents to collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
+            return False
+
+    def upsert_documents(self, collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]],
+                         ids: List[str]) -> Optional[Dict[str, int]]:
+        """
+        Inserts new documents and replaces changed ones. Documents whose ID is already stored with the
+        same content hash are skipped before embedding (only their metadata is refreshed), as are
+        repeated IDs within the call (the first one wins), so only new or changed texts are embedded.
+
+        Returns:
+            Optional[Dict[str, int]]: The number of "new", "updated" and "skipped" documents, or None if an error occurred.
+        """
+        collection = self.get_or_create_collection(collection_name)
+        if not collection:
+            return None
+
+        try:
+            stored = collection.get(ids=list(dict.fromkeys(ids)), include=["metadatas"])
+            changed, unchanged, counts = self._changed_documents(documents, metadatas, ids, stored)
+            if changed["ids"]:
+                collection.upsert(**changed)
+            if unchanged["ids"]:
+                collection.update(**unchanged)
+            logger.info(f"Upserted documents into collection '{collection_name}': {counts}")
+            return counts
+        except Exception as e:
+            logger.error(f"Failed to upsert documents into collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
+            return None
+
+    async def aupsert_documents(self, collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]],
+                                ids: List[str]) -> Optional[Dict[str, int]]:
+        """Async variant of upsert_documents; see aadd_documents for how the work is split."""
+        collection = self._cached_collection(collection_name) or await run_blocking(self.get_or_create_collection, collection_name)
+        if not collection:
+            return None
+
+        try:
+            stored = await run_blocking(collection.get, ids=list(dict.fromkeys(ids)), include=["metadatas"])
+            changed, unchanged, counts = self._changed_documents(documents, metadatas, ids, stored)
+            if changed["ids"]:
+                embed_async = getattr(self.embedding_function, "acall", None)
+                if embed_async is not None:
+                    changed["embeddings"] = await embed_async(changed["documents"])
+                await run_blocking(collection.upsert, **changed)
+            if unchanged["ids"]:
+                await run_blocking(collection.update, **unchanged)
+            logger.info(f"Upserted documents into collection '{collection_name}': {counts}")
+            return counts
+        except Exception as e:
+            logger.error(f"Failed to upsert documents into collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
+            return None
+
+    @staticmethod
+    def _changed_documents(documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str],
+                           stored: Dict[str, Any]) -> Tuple[Dict[str, List[Any]], Dict[str, List[Any]], Dict[str, int]]:
+        """
+        Splits the documents into those to upsert (new, or content hash differs from the stored one)
+        and stored unchanged ones whose metadata is refreshed, and counts them.
+        """
+        stored_hashes = {
+            doc_id: (metadata or {}).get("content_hash")
+            for doc_id, metadata in zip(stored.get("ids") or [], stored.get("metadatas") or [])
+        }
+        counts = {"new": 0, "updated": 0, "skipped": 0}
+        changed: Dict[str, List[Any]] = {"documents": [], "metadatas": [], "ids": []}
+        unchanged: Dict[str, List[Any]] = {"metadatas": [], "ids": []}
+        seen = set()
+        for document, metadata, doc_id in zip(documents, metadatas, ids):
+            content_hash = document_content_hash(document)
+            repeated = doc_id in seen
+            seen.add(doc_id)
+            if repeated:
+                counts["skipped"] += 1
+            elif stored_hashes.get(doc_id) == content_hash:
+                counts["skipped"] += 1
+                unchanged["metadatas"].append(dict(metadata, content_hash=content_hash))
+                unchanged["ids"].append(doc_id)
+            else:
+                counts["updated" if doc_id in stored_hashes else "new"] += 1
+                changed["documents"].append(document)
+                changed["metadatas"].append(dict(metadata, content_hash=content_hash))
+                changed["ids"].append(doc_id)
+        return changed, unchanged, counts
+
+    def query_documents(self, collection_name: str, query_texts: List[str], n_results: int = 5,
+                        where: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Queries documents from the specified collection.
 
@@ -128,6 +530,7 @@ class ChromaService:
             collection_name (str): The name of the collection.
             query_texts (List[str]): A list of query texts.
             n_results (int): The number of results to return for each query.
+            where (Optional[Dict[str, Any]]): Metadata filter, e.g. {"task_id": "..."} in a shared collection.
 
         Returns:
             Optional[Dict[str, Any]]: A dictionary containing the query results, or None if an error occurred.
@@ -140,14 +543,80 @@ class ChromaService:
             results = collection.query(
                 query_texts=query_texts,
                 n_results=n_results,
+                where=where or None,
                 # include=['metadatas', 'documents'] # Optional: specify what to include in results
             )
             logger.info(f"Successfully queried collection '{collection_name}' with {len(query_texts)} queries.")
             return results
         except Exception as e:
             logger.error(f"Failed to query documents from collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
             return None
 
+    def count_documents(self, collection_name: str, where: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Counts the documents of a collection, optionally only those matching a metadata filter.
+
+        Returns:
+            Optional[int]: The number of documents (0 if the collection does not exist), or None if an error occurred.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is None:
+            return 0
+        try:
+            if not where:
+                return collection.count()
+            return len(collection.get(where=where, include=[])["ids"])
+        except Exception as e:
+            logger.error(f"Failed to count documents in collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
+            return None
+
+    def delete_documents(self, collection_name: str, where: Dict[str, Any]) -> bool:
+        """
+        Deletes the documents of a collection that match a metadata filter.
+
+        Returns:
+            bool: True if the documents were deleted or the collection does not exist, False otherwise.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is None:
+            return True
+        try:
+            collection.delete(where=where)
+            logger.info(f"Deleted documents matching {where} from collection '{collection_name}'.")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete documents matching {where} from collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
+            return False
+
+    def get_collection(self, collection_name: str) -> Optional[chromadb.api.models.Collection.Collection]:
+        """Returns an existing collection, or None if it does not exist (unlike get_or_create_collection)."""
+        collection = self._cached_collection(collection_name)
+        if collection is not None:
+            return collection
+        try:
+            collection = self.client.get_collection(name=collection_name, embedding_function=self.embedding_function)  # type: ignore
+        except Exception:
+            return None
+        self._cache_collection(collection_name, collection)
+        return collection
+
+    def list_collection_names(self) -> List[str]:
+        return [collection if isinstance(collection, str) else collection.name for collection in self.client.list_collections()]
+
+    def delete_collection(self, collection_name: str) -> None:
+        """Deletes a collection; a collection that does not exist is ignored."""
+        self.invalidate_collection(collection_name)
+        try:
+            self.client.delete_collection(name=collection_name)
+            logger.info(f"Successfully deleted collection: {collection_name}")
+        except Exception as e:
+            if collection_name in self.list_collection_names():
+                raise
+            logger.info(f"Collection '{collection_name}' did not exist, nothing to delete ({e}).")
+
     def get_document_by_id(self, collection_name: str, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieves a specific document by its ID from the collection.
@@ -179,6 +648,7 @@ class ChromaService:
                 return None
         except Exception as e:
             logger.error(f"Failed to retrieve document with ID '{doc_id}' from collection '{collection_name}': {e}", exc_info=True)
+            self.invalidate_collection(collection_name)
             return None
 
 if __name__ == '__main__':
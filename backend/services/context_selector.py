@@ -0,0 +1,145 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .chroma_service import count_tokens
+    from .executors import run_blocking
+except ImportError:
+    import asyncio
+    from chroma_service import count_tokens
+    run_blocking = asyncio.to_thread
+
+logger = logging.getLogger(__name__)
+
+# The synthesis prompt gets the verified items that fit SYNTHESIS_CONTEXT_TOKEN_BUDGET. When they do
+# not all fit, the SYNTHESIS_CONTEXT_TOP_K items most similar to the topic are ordered by maximal
+# marginal relevance (SYNTHESIS_CONTEXT_MMR_LAMBDA: 1.0 = relevance only, lower = more diversity)
+# and packed into the budget in that order.
+SYNTHESIS_CONTEXT_TOKEN_BUDGET = max(1, int(os.getenv("SYNTHESIS_CONTEXT_TOKEN_BUDGET", "6000")))
+SYNTHESIS_CONTEXT_TOP_K = max(1, int(os.getenv("SYNTHESIS_CONTEXT_TOP_K", "40")))
+SYNTHESIS_CONTEXT_MMR_LAMBDA = min(1.0, max(0.0, float(os.getenv("SYNTHESIS_CONTEXT_MMR_LAMBDA", "0.7"))))
+# "Source N (Title: ..., URL: ...):" framing and separators around each item in the prompt.
+SOURCE_OVERHEAD_TOKENS = 12
+
+
+def context_text(item: Dict[str, Any]) -> str:
+    """The content of a verified item that is quoted in prompts."""
+    return item.get('snippet', item.get('raw_content', item.get('content', 'No content available')))
+
+
+def item_tokens(item: Dict[str, Any]) -> int:
+    """Approximate prompt tokens taken by one item, framing included."""
+    return count_tokens(f"{item.get('title', '')} {item.get('url', '')}\n{context_text(item)}") + SOURCE_OVERHEAD_TOKENS
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, mmr_lambda: float, limit: Optional[int] = None) -> List[int]:
+    """
+    Maximal marginal relevance order of up to `limit` rows: each step picks the row maximizing
+    mmr_lambda * relevance - (1 - mmr_lambda) * (highest similarity to the rows already picked).
+    `vectors` must have unit-length rows; each step is one matrix-vector product.
+    """
+    count = len(relevance)
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    order: List[int] = []
+    for _ in range(min(limit or count, count)):
+        scores = np.where(available, mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy, -np.inf)
+        chosen = int(np.argmax(scores))
+        order.append(chosen)
+        available[chosen] = False
+        np.maximum(redundancy, vectors @ vectors[chosen], out=redundancy)
+    return order
+
+
+class ContextSelector:
+    """
+    Chooses which verified items go into the synthesis prompt, within a token budget.
+
+    Items are only embedded when they do not all fit; without an embedding function (or when
+    embedding fails) they are packed in their original order. The report returned with the
+    selection lists every dropped item and why it was dropped ("top_k" or "token_budget").
+    """
+    def __init__(self, embedding_function: Optional[Any] = None, token_budget: Optional[int] = None,
+                 top_k: Optional[int] = None, mmr_lambda: Optional[float] = None):
+        self.embedding_function = embedding_function
+        self.token_budget = token_budget or SYNTHESIS_CONTEXT_TOKEN_BUDGET
+        self.top_k = top_k or SYNTHESIS_CONTEXT_TOP_K
+        self.mmr_lambda = SYNTHESIS_CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+    def select(self, topic: Optional[str], items: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Returns the selected items, most relevant first, and a report of the selection."""
+        costs = [item_tokens(item) for item in items]
+        if sum(costs) <= self.token_budget or self.embedding_function is None:
+            return self._pack(items, costs, None)
+        try:
+            vectors = self.embedding_function([topic or ""] + [context_text(item) for item in items])
+        except Exception as e:
+            logger.warning(f"Could not embed the synthesis context, keeping the original item order: {e}")
+            return self._pack(items, costs, None)
+        return self._pack(items, costs, vectors)
+
+    async def aselect(self, topic: Optional[str], items: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Async variant of select(); uses the embedding function's async API when it has one."""
+        costs = [item_tokens(item) for item in items]
+        if sum(costs) <= self.token_budget or self.embedding_function is None:
+            return self._pack(items, costs, None)
+        texts = [topic or ""] + [context_text(item) for item in items]
+        try:
+            embed_async = getattr(self.embedding_function, "acall", None)
+            vectors = await embed_async(texts) if embed_async is not None else await run_blocking(self.embedding_function, texts)
+        except Exception as e:
+            logger.warning(f"Could not embed the synthesis context, keeping the original item order: {e}")
+            return self._pack(items, costs, None)
+        return self._pack(items, costs, vectors)
+
+    def _rank(self, vectors: Any) -> Tuple[List[int], np.ndarray]:
+        """MMR order of the top_k items most similar to the topic (row 0 of `vectors`), and all similarities."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        topic_vector, item_vectors = matrix[0], matrix[1:]
+        relevance = item_vectors @ topic_vector
+        candidates = np.argsort(-relevance, kind="stable")[:self.top_k]
+        order = mmr_order(relevance[candidates], item_vectors[candidates], self.mmr_lambda)
+        return [int(candidates[index]) for index in order], relevance
+
+    def _pack(self, items: Sequence[Dict[str, Any]], costs: List[int], vectors: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        if vectors is None:
+            order, relevance = list(range(len(items))), None
+        else:
+            order, relevance = self._rank(vectors)
+
+        selected: List[Dict[str, Any]] = []
+        dropped: List[Dict[str, Any]] = []
+        used = 0
+        for index in order:
+            # The best item is always kept, so a single oversized source still gets synthesized.
+            if selected and used + costs[index] > self.token_budget:
+                dropped.append(self._dropped(items[index], index, costs, relevance, "token_budget"))
+                continue
+            selected.append(items[index])
+            used += costs[index]
+        ranked = set(order)
+        dropped.extend(self._dropped(items[index], index, costs, relevance, "top_k") for index in range(len(items)) if index not in ranked)
+
+        report = {
+            "selected": len(selected),
+            "dropped": dropped,
+            "tokens": used,
+            "token_budget": self.token_budget,
+            "ranked": relevance is not None,
+        }
+        return selected, report
+
+    @staticmethod
+    def _dropped(item: Dict[str, Any], index: int, costs: List[int], relevance: Optional[np.ndarray], reason: str) -> Dict[str, Any]:
+        return {
+            "id": item.get('id'),
+            "title": item.get('title'),
+            "url": item.get('url'),
+            "tokens": costs[index],
+            "similarity": round(float(relevance[index]), 4) if relevance is not None else None,
+            "reason": reason,
+        }
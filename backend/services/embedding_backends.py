@@ -0,0 +1,141 @@
+import logging
+import math
+import multiprocessing
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+try:
+    from .executors import run_blocking
+except ImportError:
+    import asyncio
+    run_blocking = asyncio.to_thread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_BACKEND = "azure"
+DEFAULT_HASHING_DIMENSIONS = 1024
+# Batches smaller than this are vectorized in the calling thread; shipping them to worker
+# processes costs more than hashing them.
+LOCAL_EMBEDDING_PARALLEL_MIN_TEXTS = int(os.getenv("LOCAL_EMBEDDING_PARALLEL_MIN_TEXTS", "256"))
+LOCAL_EMBEDDING_PROCESSES = max(1, int(os.getenv("LOCAL_EMBEDDING_PROCESSES", str(os.cpu_count() or 1))))
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _local_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # "spawn" keeps the workers independent of the threads (uvicorn, I/O pools) of the parent.
+            _process_pool = ProcessPoolExecutor(max_workers=LOCAL_EMBEDDING_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+
+def _hash_features(text: str) -> List[str]:
+    words = _TOKEN_PATTERN.findall(text.casefold())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_embed(texts: List[str], dimensions: int) -> np.ndarray:
+    """
+    Feature-hashing vectors for `texts`: word unigrams and bigrams are hashed (CRC32) into `dimensions`
+    signed buckets, counts are dampened with log1p and each row is L2-normalized.
+    """
+    rows: List[int] = []
+    hashes: List[int] = []
+    for row, text in enumerate(texts):
+        features = _hash_features(text)
+        rows.extend([row] * len(features))
+        hashes.extend(zlib.crc32(feature.encode("utf-8")) for feature in features)
+    hash_array = np.asarray(hashes, dtype=np.int64)
+    signs = np.where((hash_array // dimensions) & 1, 1.0, -1.0)
+    flat_index = np.asarray(rows, dtype=np.int64) * dimensions + hash_array % dimensions
+    matrix = np.bincount(flat_index, weights=signs, minlength=len(texts) * dimensions).astype(np.float32).reshape(len(texts), dimensions)
+    np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1.0, norms)
+    return matrix
+
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """
+    Local, dependency-free embeddings for offline deployments and storage load tests.
+
+    Lexical only: texts sharing words and word pairs end up close, paraphrases without shared
+    vocabulary do not. Large batches are split across a process pool.
+    """
+    backend = "hashing"
+
+    def __init__(self, dimensions: int = DEFAULT_HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: Documents) -> Embeddings:
+        texts = list(texts)
+        if len(texts) < max(2, LOCAL_EMBEDDING_PARALLEL_MIN_TEXTS) or LOCAL_EMBEDDING_PROCESSES == 1:
+            return list(hash_embed(texts, self.dimensions))
+        chunk_size = math.ceil(len(texts) / LOCAL_EMBEDDING_PROCESSES)
+        chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        # Workers return float32 matrices, which pickle far more cheaply than nested lists.
+        matrices = _local_process_pool().map(hash_embed, chunks, [self.dimensions] * len(chunks))
+        return list(np.concatenate(list(matrices)))
+
+    async def acall(self, texts: Documents) -> Embeddings:
+        """Async variant of __call__; the vectorizing runs off the event loop."""
+        return await run_blocking(self.__call__, texts)
+
+    def cache_stats(self) -> None:
+        """Local embeddings are not cached."""
+        return None
+
+
+# --- Backend registry ---
+# Maps EMBEDDING_BACKEND values to factories returning a chromadb EmbeddingFunction. Backends
+# defined elsewhere (e.g. Azure OpenAI in chroma_service.py) register themselves on import.
+EMBEDDING_BACKENDS: Dict[str, Callable[[], EmbeddingFunction]] = {}
+
+
+def register_embedding_backend(name: str, factory: Callable[[], EmbeddingFunction]) -> None:
+    EMBEDDING_BACKENDS[name.lower()] = factory
+
+
+def embedding_space(embedding_function: EmbeddingFunction) -> str:
+    """
+    "<backend>_<dimensions>" of an embedding function, e.g. "azure_1536" or "hashing_1024". Vectors of
+    different spaces cannot be compared (even at equal dimensions), so each gets its own collections.
+    """
+    backend = getattr(embedding_function, "backend", None) or type(embedding_function).__name__.lower()
+    dimensions = getattr(embedding_function, "dimensions", None)
+    return f"{backend}_{dimensions}" if dimensions else backend
+
+
+def create_embedding_function(backend: Optional[str] = None) -> EmbeddingFunction:
+    """Builds the embedding function named by `backend` (default: the EMBEDDING_BACKEND environment variable)."""
+    name = (backend or os.getenv("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND)).lower()
+    factory = EMBEDDING_BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown embedding backend '{name}'. Available: {', '.join(sorted(EMBEDDING_BACKENDS))}.")
+    return factory()
+
+
+register_embedding_backend(
+    "hashing",
+    lambda: HashingEmbeddingFunction(dimensions=int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", str(DEFAULT_HASHING_DIMENSIONS)))),
+)
+
+
+def _create_simulated_embedding_function() -> EmbeddingFunction:
+    from .simulation import SimulatedEmbeddingFunction  # imported lazily: simulation.py builds on this module
+    return SimulatedEmbeddingFunction.from_env()
+
+
+register_embedding_backend("simulated", _create_simulated_embedding_function)
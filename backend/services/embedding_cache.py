@@ -0,0 +1,68 @@
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+try:
+    from .sqlite_lru_cache import SQLiteLRUCache
+except ImportError:
+    # Direct execution, next to this module.
+    from sqlite_lru_cache import SQLiteLRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_CACHE_PATH = "./embedding_cache.sqlite3"
+DEFAULT_EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Unicode-normalized (NFC) text with runs of whitespace collapsed and the ends stripped."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_cache_key(deployment: str, text: str) -> str:
+    """Stable key for one embedding: the deployment name and the hash of the normalized text."""
+    text_hash = hashlib.sha256(normalize_embedding_text(text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{deployment}\x1f{text_hash}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    On-disk cache of embedding vectors, bounded by total vector size (see SQLiteLRUCache).
+    Vectors are stored as packed float32 values, with the deployment that produced them.
+    """
+
+    table = "embeddings"
+    size_table = "embedding_cache_size"
+    value_column = ("vector", "BLOB")
+    metadata_columns = (("deployment", "TEXT"),)
+    metric_label = "embedding"
+
+    def __init__(self, path: str = DEFAULT_EMBEDDING_CACHE_PATH, max_bytes: int = DEFAULT_EMBEDDING_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes)
+
+    def _encode(self, vector: Sequence[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    def _decode(self, blob: bytes) -> List[float]:
+        return array("f", blob).tolist()
+
+    def put_many(self, entries: Dict[str, Sequence[float]], deployment: str = "") -> None:
+        self._put_many(entries, (deployment,))
+
+
+def create_embedding_cache() -> Optional[EmbeddingCache]:
+    """Builds the cache configured by EMBEDDING_CACHE_* environment variables, or None if EMBEDDING_CACHE_ENABLED is false."""
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    try:
+        return EmbeddingCache(
+            path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH),
+            max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_EMBEDDING_CACHE_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        )
+    except Exception as e:
+        logger.error(f"Failed to open embedding cache, continuing without it: {e}", exc_info=True)
+        return None
@@ -0,0 +1,18 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Dedicated pool for client libraries that only offer blocking I/O (googleapiclient, chromadb),
+# so they neither stall the event loop nor starve the loop's default executor.
+BLOCKING_IO_THREADS = int(os.getenv("BLOCKING_IO_THREADS", "32"))
+blocking_io_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_THREADS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a synchronous callable on the blocking I/O pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_io_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,58 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+try:
+    from .sqlite_lru_cache import SQLiteLRUCache
+except ImportError:
+    # Direct execution, next to this module.
+    from sqlite_lru_cache import SQLiteLRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_CACHE_PATH = "./llm_cache.sqlite3"
+DEFAULT_LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def llm_cache_key(model: str, deployment: str, temperature: float, prompt: str) -> str:
+    """Stable key for one completion request: provider model/deployment, temperature and the prompt's hash."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\x1f{deployment}\x1f{temperature!r}\x1f{prompt_hash}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(SQLiteLRUCache):
+    """
+    On-disk cache of LLM completions, bounded by total response size (see SQLiteLRUCache).
+    Each response is stored with the model, deployment and temperature that produced it.
+    """
+
+    table = "llm_responses"
+    size_table = "llm_cache_size"
+    value_column = ("content", "TEXT")
+    metadata_columns = (("model", "TEXT"), ("deployment", "TEXT"), ("temperature", "REAL"))
+    metric_label = "llm"
+
+    def __init__(self, path: str = DEFAULT_LLM_CACHE_PATH, max_bytes: int = DEFAULT_LLM_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes)
+
+    def put(self, key: str, content: str, model: str = "", deployment: str = "", temperature: float = 0.0) -> None:
+        self.put_many({key: content}, model=model, deployment=deployment, temperature=temperature)
+
+    def put_many(self, entries: Dict[str, str], model: str = "", deployment: str = "", temperature: float = 0.0) -> None:
+        """Stores several responses in one transaction; responses larger than the whole cache are skipped."""
+        self._put_many(entries, (model, deployment, temperature))
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """Builds the cache configured by LLM_CACHE_* environment variables, or None if LLM_CACHE_ENABLED is false."""
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    try:
+        return LLMResponseCache(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_LLM_CACHE_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        )
+    except Exception as e:
+        logger.error(f"Failed to open LLM response cache, continuing without it: {e}", exc_info=True)
+        return None
@@ -0,0 +1,253 @@
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import openai
+    _RETRYABLE_CLIENT_ERRORS: Tuple[type, ...] = (openai.APIConnectionError, openai.APITimeoutError)
+except ImportError:
+    _RETRYABLE_CLIENT_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+# Transient LLM errors (429, 408/409, 5xx, timeouts, connection errors) are retried up to
+# LLM_RETRY_MAX_ATTEMPTS times per provider, waiting for the server's Retry-After or else an
+# exponential backoff with full jitter (LLM_RETRY_BASE_DELAY_SECONDS * 2^n, capped at
+# LLM_RETRY_MAX_DELAY_SECONDS). After LLM_CIRCUIT_FAILURE_THRESHOLD consecutive failures a
+# provider's circuit opens: it is skipped for LLM_CIRCUIT_RESET_SECONDS, then one trial call
+# decides whether it closes again. Calls a provider cannot serve (including auth and not-found
+# errors of a revoked key or a deleted deployment) fail over to the next one; a request rejected
+# for its content (400/413/422 or a content filter) is neither retried nor failed over.
+LLM_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "20"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = max(1, int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# The request itself is at fault, so every provider would reject it the same way.
+REJECTED_REQUEST_STATUS_CODES = {400, 413, 422}
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for errors a later attempt may not hit: rate limits, server errors, timeouts, lost connections."""
+    status = error_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return isinstance(error, _RETRYABLE_CLIENT_ERRORS + (TimeoutError, ConnectionError))
+
+
+def is_rejected_request(error: BaseException) -> bool:
+    """True for errors caused by the request's shape or content: bad request, too large, unprocessable, content filter."""
+    if getattr(error, "code", None) == "content_filter" or "content filter" in str(error).lower():
+        return True
+    return error_status_code(error) in REJECTED_REQUEST_STATUS_CODES
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The delay requested by the server's retry-after-ms / Retry-After header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000.0)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base_delay: Optional[float] = None, max_delay: Optional[float] = None) -> float:
+    """Seconds to wait before retry number `attempt` (0-based): the server's Retry-After, else full jitter."""
+    base_delay = LLM_RETRY_BASE_DELAY_SECONDS if base_delay is None else base_delay
+    max_delay = LLM_RETRY_MAX_DELAY_SECONDS if max_delay is None else max_delay
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    return random.uniform(0.0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one provider ("closed" -> "open" -> "half_open").
+
+    While open, calls are refused until `reset_seconds` have passed; then a single trial call is
+    let through, and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None):
+        self.failure_threshold = failure_threshold or LLM_CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = LLM_CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Frees the half-open trial slot after a call that says nothing about the provider's health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LLMResilience:
+    """Circuit breakers per provider and retry/failover counters, shared by all calls of one LLMService."""
+    def __init__(self, max_attempts: Optional[int] = None, failure_threshold: Optional[int] = None,
+                 reset_seconds: Optional[float] = None):
+        self.max_attempts = max_attempts or LLM_RETRY_MAX_ATTEMPTS
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._counters = {"calls": 0, "retries": 0, "failovers": 0, "short_circuits": 0, "failures": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return self._breakers[provider]
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def plan(self, providers: List[Tuple[str, Any]]) -> "FailoverPlan":
+        self.count("calls")
+        return FailoverPlan(self, providers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            breakers = dict(self._breakers)
+        stats["circuits"] = {provider: breaker.state for provider, breaker in breakers.items()}
+        return stats
+
+
+class FailoverPlan:
+    """
+    One call's walk over the providers, in order, with retries. The caller loops:
+    next_attempt() gives the (name, client) to call, or None when nothing is left to try;
+    after a failure, failed(error) returns the seconds to wait before the next attempt.
+    Transient errors are retried, other provider errors fail over, and a rejected request ends the plan.
+    """
+    def __init__(self, resilience: LLMResilience, providers: List[Tuple[str, Any]]):
+        self._resilience = resilience
+        self._providers = providers
+        self._index = 0
+        self._attempt = 0
+        self.last_error: Optional[BaseException] = None
+
+    def next_attempt(self) -> Optional[Tuple[str, Any]]:
+        while self._index < len(self._providers):
+            name, client = self._providers[self._index]
+            if self._resilience.breaker(name).allow():
+                return name, client
+            if self._attempt == 0:
+                self._resilience.count("short_circuits")
+                logger.warning(f"LLM provider '{name}' skipped: its circuit is open.")
+            self._next_provider()
+        return None
+
+    def succeeded(self) -> None:
+        name, _ = self._providers[self._index]
+        self._resilience.breaker(name).record_success()
+
+    def failed(self, error: BaseException) -> float:
+        name, _ = self._providers[self._index]
+        retryable = self._record_failure(error)
+        if is_rejected_request(error):
+            # The request itself was rejected; another provider would reject it as well.
+            self._index = len(self._providers)
+            return 0.0
+        if not retryable:
+            # Provider-specific (a revoked key, a deleted deployment, an unknown error): try the next one.
+            self._next_provider()
+            return 0.0
+        self._attempt += 1
+        if self._attempt < self._resilience.max_attempts:
+            self._resilience.count("retries")
+            delay = backoff_delay(self._attempt - 1, retry_after_seconds(error))
+            logger.warning(f"LLM provider '{name}' failed ({error}); retry {self._attempt} in {delay:.2f}s.")
+            return delay
+        self._next_provider()
+        return 0.0
+
+    def interrupted(self, error: BaseException) -> None:
+        """Records a failure after output was delivered, when the call can be neither retried nor failed over."""
+        self._record_failure(error)
+        self._index = len(self._providers)
+
+    def error_message(self) -> str:
+        if self.last_error is not None:
+            return str(self.last_error)
+        return "All LLM providers are unavailable (circuit open)."
+
+    def _record_failure(self, error: BaseException) -> bool:
+        name, _ = self._providers[self._index]
+        self.last_error = error
+        self._resilience.count("failures")
+        retryable = is_retryable(error)
+        if retryable:
+            # Only transient errors count against the provider's health; other errors leave the
+            # failure streak as it is and only give back a half-open trial slot.
+            self._resilience.breaker(name).record_failure()
+        else:
+            self._resilience.breaker(name).release_trial()
+        return retryable
+
+    def _next_provider(self) -> None:
+        self._index += 1
+        self._attempt = 0
+        if self._index < len(self._providers):
+            self._resilience.count("failovers")
+            logger.warning(f"Failing over to LLM provider '{self._providers[self._index][0]}'.")
@@ -0,0 +1,305 @@
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Process-wide metrics, served in the Prometheus text format by GET /metrics.
+# Recording is a dict update under a lock (plus a bisect for histograms), cheap enough for every
+# external call and workflow node. Values that already live elsewhere (queue depth, active tasks)
+# are gauges with a callback, read only when /metrics is scraped.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], LabelValues, float]]:
+        """(sample name, label names, label values, value) of every series."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"
+                     for name, labelnames, values, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for values, value in sorted(self.values().items()):
+            yield self.name, self.labelnames, values, value
+
+
+class Gauge(_Metric):
+    """A set() value per label set, or the result of `function` at scrape time (a number, or {label values: number})."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Any]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.function is None:
+            with self._lock:
+                values = dict(self._values)
+        else:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                yield self.name, self.labelnames, label_values, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, with a last slot for +Inf; then sum and count.
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        bucket_labels = self.labelnames + ("le",)
+        for values, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", bucket_labels, values + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, values, total
+            yield f"{self.name}_count", self.labelnames, values, count
+
+
+class MetricsRegistry:
+    """Named metrics of this process; registering a name twice returns the existing metric."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # A failing gauge callback must not break the whole scrape.
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serves `registry` at GET /metrics on a daemon thread, for processes without the API's HTTP
+    server (the pool's workflow workers). Returns the server; shutdown() stops it.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # Scrapes are not worth a log line each.
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+WORKFLOW_NODE_SECONDS = REGISTRY.histogram(
+    "knowledge_nexus_workflow_node_duration_seconds", "Duration of each LangGraph workflow node.", ("node",))
+EXTERNAL_CALL_SECONDS = REGISTRY.histogram(
+    "knowledge_nexus_external_call_duration_seconds",
+    "Latency of each request to an external provider (one per attempt, failed attempts included).", ("service", "provider"))
+EXTERNAL_CALL_ERRORS = REGISTRY.counter(
+    "knowledge_nexus_external_call_errors_total",
+    "Failed requests to external providers, by HTTP status code or exception type.", ("service", "provider", "error"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "knowledge_nexus_cache_lookups_total", "Cache lookups by cache and result (hit, miss or in_flight).", ("cache", "result"))
+LLM_TOKENS = REGISTRY.counter(
+    "knowledge_nexus_llm_tokens_total",
+    "LLM tokens by provider and kind, as reported by the provider (estimated from the text length otherwise).",
+    ("provider", "kind"))
+TASK_LLM_TOKENS = REGISTRY.histogram(
+    "knowledge_nexus_task_llm_tokens", "LLM tokens used by one workflow run of a research task.", ("kind",), TOKEN_BUCKETS)
+
+
+def _cache_hit_ratios() -> Dict[LabelValues, float]:
+    lookups: Dict[str, Dict[str, float]] = {}
+    for (cache, result), count in CACHE_LOOKUPS.values().items():
+        lookups.setdefault(cache, {})[result] = count
+    return {(cache, ): results.get("hit", 0.0) / sum(results.values())
+            for cache, results in lookups.items() if sum(results.values())}
+
+
+REGISTRY.gauge("knowledge_nexus_cache_hit_ratio", "Share of cache lookups that were hits, since the process started.",
+               ("cache",), function=_cache_hit_ratios)
+
+
+def error_kind(error: BaseException) -> str:
+    """HTTP status code of a provider error if it has one, else the exception's type name."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return str(status) if isinstance(status, int) else type(error).__name__
+
+
+@contextmanager
+def external_call(service: str, provider: str) -> Iterator[None]:
+    """Times one request to an external provider and counts it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, service=service, provider=provider)
+        EXTERNAL_CALL_ERRORS.inc(service=service, provider=provider, error=error_kind(e))
+        raise
+    EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, service=service, provider=provider)
+
+
+# --- LLM tokens per task ---
+# A workflow run collects the tokens of its LLM calls in a context variable, which the graph's
+# node tasks and executor threads inherit.
+_task_tokens: ContextVar[Optional[Dict[str, int]]] = ContextVar("task_llm_tokens", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+def record_llm_tokens(provider: str, prompt: str, completion: str, usage: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Counts the tokens of one completion. `usage` is the response's usage_metadata
+    (input_tokens/output_tokens); without it the counts are estimated from the text lengths.
+    """
+    prompt_tokens = (usage or {}).get("input_tokens") or estimate_tokens(prompt)
+    completion_tokens = (usage or {}).get("output_tokens") or estimate_tokens(completion)
+    LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+    task_tokens = _task_tokens.get()
+    if task_tokens is not None:
+        task_tokens["prompt"] += prompt_tokens
+        task_tokens["completion"] += completion_tokens
+
+
+@contextmanager
+def track_task_tokens() -> Iterator[Dict[str, int]]:
+    """Collects the LLM tokens of the calls made inside the block (one workflow run) and observes them on exit."""
+    task_tokens = {"prompt": 0, "completion": 0}
+    token = _task_tokens.set(task_tokens)
+    try:
+        yield task_tokens
+    finally:
+        _task_tokens.reset(token)
+        if task_tokens["prompt"] or task_tokens["completion"]:
+            for kind, count in task_tokens.items():
+                TASK_LLM_TOKENS.observe(count, kind=kind)
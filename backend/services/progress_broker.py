@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_SIZE = 32
+DEFAULT_SUBSCRIBER_BUFFER = 16
+DEFAULT_MAX_TRACKED_TASKS = 4096
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    id: int
+    task_id: str
+    event: str
+    data: Dict[str, Any]
+    terminal: bool = False
+
+
+class Subscription:
+    """
+    A single client's view of a task's progress events.
+
+    The buffer is bounded: when a slow client falls behind, the oldest undelivered events are
+    dropped. Every event carries a full status snapshot, so the client only loses intermediate
+    transitions, never the latest (or terminal) state.
+    """
+    def __init__(self, broker: "ProgressBroker", task_id: str, buffer_size: int):
+        self._broker = broker
+        self.task_id = task_id
+        self.queue: "asyncio.Queue[ProgressEvent]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event: ProgressEvent) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: Optional[float] = None) -> Optional[ProgressEvent]:
+        """Returns the next event, or None if `timeout` seconds pass without one (time for a heartbeat)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self._broker._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class _TaskChannel:
+    def __init__(self, history_size: int):
+        self.history: Deque[ProgressEvent] = deque(maxlen=history_size)
+        self.subscribers: Set[Subscription] = set()
+
+
+class ProgressBroker:
+    """
+    In-process fan-out of task progress events to SSE/WebSocket subscribers.
+
+    The workflow loop publishes one event per node transition. A short per-task history is kept
+    so reconnecting clients can resume via Last-Event-ID. Event IDs are globally increasing, so an
+    ID stays valid even if a task's history has been dropped. All methods must be called from
+    the event loop thread.
+    """
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE, subscriber_buffer: int = DEFAULT_SUBSCRIBER_BUFFER,
+                 max_tracked_tasks: int = DEFAULT_MAX_TRACKED_TASKS):
+        self.history_size = history_size
+        self.subscriber_buffer = subscriber_buffer
+        self.max_tracked_tasks = max_tracked_tasks
+        self._channels: "OrderedDict[str, _TaskChannel]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def publish(self, task_id: str, data: Dict[str, Any], event: str = "status", terminal: bool = False,
+                event_id: Optional[int] = None) -> ProgressEvent:
+        """
+        Fans an event out to the task's subscribers. `event_id` is supplied when events come from the
+        shared ProgressEventLog (worker pool mode), so IDs agree across API processes.
+        """
+        progress_event = ProgressEvent(id=event_id if event_id is not None else next(self._ids),
+                                       task_id=task_id, event=event, data=data, terminal=terminal)
+        channel = self._channel(task_id)
+        channel.history.append(progress_event)
+        for subscription in channel.subscribers:
+            subscription.offer(progress_event)
+        return progress_event
+
+    def subscribe(self, task_id: str, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Registers a subscriber. If `last_event_id` is given, buffered events newer than it are
+        replayed first.
+        """
+        channel = self._channel(task_id)
+        subscription = Subscription(self, task_id, self.subscriber_buffer)
+        if last_event_id is not None:
+            for past_event in channel.history:
+                if past_event.id > last_event_id:
+                    subscription.offer(past_event)
+        channel.subscribers.add(subscription)
+        return subscription
+
+    def last_event(self, task_id: str) -> Optional[ProgressEvent]:
+        channel = self._channels.get(task_id)
+        if channel and channel.history:
+            return channel.history[-1]
+        return None
+
+    def subscriber_count(self, task_id: Optional[str] = None) -> int:
+        if task_id is not None:
+            channel = self._channels.get(task_id)
+            return len(channel.subscribers) if channel else 0
+        return sum(len(channel.subscribers) for channel in self._channels.values())
+
+    def _channel(self, task_id: str) -> _TaskChannel:
+        channel = self._channels.get(task_id)
+        if channel is None:
+            channel = _TaskChannel(self.history_size)
+            self._channels[task_id] = channel
+            self._trim()
+        else:
+            self._channels.move_to_end(task_id)
+        return channel
+
+    def _trim(self) -> None:
+        if len(self._channels) <= self.max_tracked_tasks:
+            return
+        idle: List[str] = [task_id for task_id, channel in self._channels.items() if not channel.subscribers]
+        for task_id in idle[:len(self._channels) - self.max_tracked_tasks]:
+            del self._channels[task_id]
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        channel = self._channels.get(subscription.task_id)
+        if channel:
+            channel.subscribers.discard(subscription)
+        if subscription.dropped:
+            logger.info(f"ProgressBroker: Dropped {subscription.dropped} stale event(s) for a slow subscriber of task {subscription.task_id}.")
@@ -0,0 +1,317 @@
+"""
+Deterministic local stand-ins for the external providers, for load-testing the whole workflow offline.
+
+- LLM_BACKEND=simulated: LLMService uses SimulatedChatModel (complete, streamed and async calls).
+- SEARCH_BACKEND=simulated: SearchService queries SimulatedCustomSearch through its normal paginated path.
+- EMBEDDING_BACKEND=simulated: hashing embeddings behind simulated request latency (see embedding_backends.py).
+
+Outputs have realistic sizes and are derived from a hash of SIMULATION_SEED and the request, so the same
+request always gets the same answer. Each backend has a latency distribution, an error rate and an
+optional rate limit (SIM_<BACKEND>_LATENCY, SIM_<BACKEND>_ERROR_RATE, SIM_<BACKEND>_RATE_LIMIT_RPM);
+injected errors look like provider HTTP errors (429 with Retry-After, 503), so retries, circuit breakers
+and failover react to them as they would in production. Latency and error draws come from one seeded
+generator per backend, so a run with the same call order reproduces the same timings and failures.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .embedding_backends import DEFAULT_HASHING_DIMENSIONS, HashingEmbeddingFunction
+from .metrics import external_call
+
+SIMULATION_SEED = int(os.getenv("SIMULATION_SEED", "0"))
+
+DEFAULT_LLM_LATENCY = "lognormal:500:0.5"      # time to first token, ms
+DEFAULT_SEARCH_LATENCY = "lognormal:300:0.4"   # per result page, ms
+DEFAULT_EMBEDDING_LATENCY = "lognormal:80:0.3"  # per request, ms
+
+# Words mixed into generated text alongside the words of the request.
+_FILLER_WORDS = (
+    "analysis market growth adoption efficiency capacity research report industry policy cost costs "
+    "performance technology deployment investment regulation demand supply impact trend trends study "
+    "survey data evidence forecast production consumption infrastructure innovation standards risk "
+    "benefits challenges global regional annual average significant increase decrease share leading "
+    "emerging sector companies governments experts estimate indicates suggests reported compared"
+).split()
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+_NUMBERED_SOURCE = re.compile(r"^\[(\d+)\]", re.MULTILINE)
+
+
+def stable_seed(*parts: Any) -> int:
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class LatencyModel:
+    """
+    A latency distribution, parsed from "fixed:MS", "uniform:MIN_MS:MAX_MS", "lognormal:MEDIAN_MS:SIGMA"
+    or "0" (no latency). sample() returns seconds.
+    """
+    def __init__(self, kind: str = "fixed", params: Optional[List[float]] = None):
+        self.kind = kind
+        self.params = params or [0.0]
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, rest = spec.strip().partition(":")
+        if not rest:
+            return cls("fixed", [float(kind)])
+        params = [float(value) for value in rest.split(":")]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if expected is None or len(params) != expected:
+            raise ValueError(f"Invalid latency '{spec}'. Use 'fixed:MS', 'uniform:MIN_MS:MAX_MS' or 'lognormal:MEDIAN_MS:SIGMA'.")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            milliseconds = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            milliseconds = self.params[0] * math.exp(rng.gauss(0.0, self.params[1])) if self.params[0] > 0 else 0.0
+        else:
+            milliseconds = self.params[0]
+        return max(0.0, milliseconds) / 1000.0
+
+
+class SimulatedAPIError(Exception):
+    """An injected provider error, shaped like an HTTP API error (status_code, response.headers)."""
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Simulated {status_code}: {message}")
+        self.status_code = status_code
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+@dataclass
+class SimulationProfile:
+    """Latency, error rate and rate limit of one simulated backend; all draws come from one seeded generator."""
+    latency: LatencyModel
+    error_rate: float = 0.0
+    rate_limit_rpm: int = 0
+    seed: int = 0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._requests: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, prefix: str, default_latency: str, seed: Optional[int] = None) -> "SimulationProfile":
+        return cls(
+            latency=LatencyModel.parse(os.getenv(f"{prefix}_LATENCY", default_latency)),
+            error_rate=float(os.getenv(f"{prefix}_ERROR_RATE", "0")),
+            rate_limit_rpm=int(os.getenv(f"{prefix}_RATE_LIMIT_RPM", "0")),
+            seed=stable_seed(SIMULATION_SEED if seed is None else seed, prefix),
+        )
+
+    def admit(self) -> float:
+        """Registers a request: returns its latency in seconds, or raises the injected error for it."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_limit_rpm > 0:
+                while self._requests and now - self._requests[0] >= 60.0:
+                    self._requests.popleft()
+                if len(self._requests) >= self.rate_limit_rpm:
+                    raise SimulatedAPIError(429, "Rate limit exceeded.", retry_after=60.0 - (now - self._requests[0]))
+                self._requests.append(now)
+            if self.error_rate > 0 and self._rng.random() < self.error_rate:
+                raise SimulatedAPIError(503, "Service temporarily unavailable.")
+            return self.latency.sample(self._rng)
+
+
+# --- Deterministic text ---
+
+def _vocabulary(text: str, limit: int = 200) -> List[str]:
+    words = list(dict.fromkeys(word.lower() for word in _WORD.findall(text)))[:limit]
+    return words + list(_FILLER_WORDS)
+
+
+def _sentence(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    chosen = [rng.choice(vocabulary) for _ in range(words)]
+    if rng.random() < 0.4:
+        chosen.insert(rng.randrange(len(chosen)), rng.choice([f"{rng.randint(2, 98)}%", str(rng.randint(1990, 2025)), f"{rng.randint(1, 900)} million"]))
+    return " ".join(chosen).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(12, 24))
+        sentences.append(_sentence(rng, vocabulary, length))
+        words -= length
+    return " ".join(sentences)
+
+
+def simulated_completion(prompt: str, seed: int, output_tokens: int) -> str:
+    """
+    A deterministic answer to `prompt`: one line per "[n]" numbered source for summary prompts,
+    otherwise a Markdown report of about `output_tokens` tokens built from the prompt's vocabulary.
+    """
+    rng = random.Random(stable_seed(seed, prompt))
+    vocabulary = _vocabulary(prompt)
+    numbers = list(dict.fromkeys(_NUMBERED_SOURCE.findall(prompt)))
+    if numbers:
+        return "\n".join(f"[{number}] {_sentence(rng, vocabulary, rng.randint(20, 40))}" for number in numbers)
+
+    words_left = max(20, int(output_tokens * 0.75))
+    parts = [f"# {_sentence(rng, vocabulary, rng.randint(4, 8))[:-1].title()}", _paragraph(rng, vocabulary, min(words_left, 80))]
+    words_left -= 80
+    while words_left > 0:
+        section_words = min(words_left, rng.randint(90, 160))
+        parts.append(f"## {_sentence(rng, vocabulary, rng.randint(2, 5))[:-1].title()}")
+        parts.append(_paragraph(rng, vocabulary, section_words))
+        words_left -= section_words
+    return "\n\n".join(parts)
+
+
+def _chunks(text: str, words_per_chunk: int = 4) -> List[str]:
+    pieces = re.findall(r"\S+\s*", text)
+    return ["".join(pieces[start:start + words_per_chunk]) for start in range(0, len(pieces), words_per_chunk)]
+
+
+# --- LLM ---
+
+class SimulatedChatModel(BaseChatModel):
+    """
+    Chat model answering with simulated_completion(). A call waits for the profile's latency (time to
+    first token) plus the generation time at `tokens_per_second`; streams deliver the text in chunks at
+    that rate.
+    """
+    model_name: str = "simulated"
+    seed: int = 0
+    output_tokens: int = 500
+    tokens_per_second: float = 50.0
+    profile: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated"
+
+    @classmethod
+    def from_env(cls, model_name: str = "simulated") -> "SimulatedChatModel":
+        return cls(
+            model_name=model_name,
+            seed=SIMULATION_SEED,
+            output_tokens=int(os.getenv("SIM_LLM_OUTPUT_TOKENS", "500")),
+            tokens_per_second=float(os.getenv("SIM_LLM_TOKENS_PER_SECOND", "50")),
+            profile=SimulationProfile.from_env("SIM_LLM", DEFAULT_LLM_LATENCY),
+        )
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(message.content if isinstance(message.content, str) else str(message.content) for message in messages)
+        return simulated_completion(prompt, self.seed, self.output_tokens)
+
+    def _first_token_delay(self) -> float:
+        return self.profile.admit() if self.profile is not None else 0.0
+
+    def _generation_time(self, text: str) -> float:
+        return (len(text.split()) / 0.75) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._answer(messages)
+        time.sleep(self._first_token_delay() + self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._answer(messages)
+        await asyncio.sleep(self._first_token_delay() + self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._answer(messages)
+        time.sleep(self._first_token_delay())
+        for chunk in _chunks(text):
+            time.sleep(self._generation_time(chunk))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._answer(messages)
+        await asyncio.sleep(self._first_token_delay())
+        for chunk in _chunks(text):
+            await asyncio.sleep(self._generation_time(chunk))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+# --- Search ---
+
+class SimulatedCustomSearch:
+    """
+    Stand-in for the Google Custom Search client (`service.cse().list(...).execute()`), returning up to
+    `total_results` deterministic results per query, with Google-sized titles and snippets.
+    """
+    def __init__(self, profile: Optional[SimulationProfile] = None, seed: int = 0, total_results: int = 100):
+        self.profile = profile
+        self.seed = seed
+        self.total_results = total_results
+
+    @classmethod
+    def from_env(cls) -> "SimulatedCustomSearch":
+        return cls(profile=SimulationProfile.from_env("SIM_SEARCH", DEFAULT_SEARCH_LATENCY), seed=SIMULATION_SEED,
+                   total_results=int(os.getenv("SIM_SEARCH_TOTAL_RESULTS", "100")))
+
+    def cse(self) -> "SimulatedCustomSearch":
+        return self
+
+    def list(self, q: str, cx: Optional[str] = None, num: int = 10, start: int = 1, **kwargs: Any) -> "_SimulatedRequest":
+        return _SimulatedRequest(self, q, num, start)
+
+    def results(self, query: str, num: int, start: int) -> Dict[str, Any]:
+        vocabulary = _vocabulary(query)
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") or "query"
+        items = []
+        for rank in range(start, min(start + num, self.total_results + 1)):
+            rng = random.Random(stable_seed(self.seed, query, rank))
+            items.append({
+                "link": f"https://site{rng.randint(1, 400)}.example.com/{slug}/{rank}",
+                "title": _sentence(rng, vocabulary, rng.randint(5, 10))[:-1].title(),
+                "snippet": _sentence(rng, vocabulary, rng.randint(25, 40)),
+            })
+        return {"items": items}
+
+
+class _SimulatedRequest:
+    def __init__(self, search: SimulatedCustomSearch, query: str, num: int, start: int):
+        self._search, self._query, self._num, self._start = search, query, num, start
+
+    def execute(self, http: Any = None) -> Dict[str, Any]:
+        if self._search.profile is not None:
+            time.sleep(self._search.profile.admit())
+        return self._search.results(self._query, self._num, self._start)
+
+
+# --- Embeddings ---
+
+class SimulatedEmbeddingFunction(HashingEmbeddingFunction):
+    """Hashing embeddings behind simulated request latency (plus `per_text_seconds` per input), errors and rate limits."""
+    backend = "simulated"
+
+    def __init__(self, profile: Optional[SimulationProfile] = None, dimensions: int = DEFAULT_HASHING_DIMENSIONS,
+                 per_text_seconds: float = 0.0):
+        super().__init__(dimensions=dimensions)
+        self.profile = profile
+        self.per_text_seconds = per_text_seconds
+
+    @classmethod
+    def from_env(cls) -> "SimulatedEmbeddingFunction":
+        return cls(profile=SimulationProfile.from_env("SIM_EMBEDDING", DEFAULT_EMBEDDING_LATENCY),
+                   dimensions=int(os.getenv("SIM_EMBEDDING_DIMENSIONS", "1536")),
+                   per_text_seconds=float(os.getenv("SIM_EMBEDDING_PER_TEXT_MS", "0.5")) / 1000.0)
+
+    def __call__(self, input: Any) -> Any:
+        texts = list(input)
+        with external_call("embedding", "simulated"):
+            delay = self.profile.admit() if self.profile is not None else 0.0
+            time.sleep(delay + self.per_text_seconds * len(texts))
+        return super().__call__(texts)
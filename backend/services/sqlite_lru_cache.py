@@ -0,0 +1,178 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+try:
+    from .metrics import CACHE_LOOKUPS
+except ImportError:
+    # Direct execution, next to this module.
+    from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLRUCache:
+    """
+    On-disk key/value cache (SQLite/WAL), bounded by the total size of the stored values.
+
+    When the stored values exceed `max_bytes`, the least recently used entries are evicted. The
+    total size is kept in the database by triggers, so every process sharing the file checks the
+    budget with a one-row read instead of summing the table on each put. Hit/miss counters are
+    kept per process and reported by `stats()`.
+
+    Subclasses name the table, its value column and the metadata columns stored next to each
+    value, and override `_encode`/`_decode` for values that are not text.
+    """
+
+    table = ""
+    size_table = ""
+    value_column: Tuple[str, str] = ("value", "TEXT")
+    metadata_columns: Tuple[Tuple[str, str], ...] = ()
+    metric_label = ""
+
+    # SQLite's default limit on host parameters per statement is 999 in older builds.
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max(0, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self._schema():
+            self._conn.execute(statement)
+        logger.info(f"{type(self).__name__} initialized at {path} (max {self.max_bytes} bytes).")
+
+    def _schema(self) -> Tuple[str, ...]:
+        table, size_table = self.table, self.size_table
+        columns = "".join(f" {name} {sql_type}," for name, sql_type in self.metadata_columns)
+        return (
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f" key TEXT PRIMARY KEY,{columns}"
+            f" {self.value_column[0]} {self.value_column[1]} NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table}(last_access)",
+            f"CREATE TABLE IF NOT EXISTS {size_table} (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)",
+            # Seeds the total of a cache file written before it was tracked; a no-op afterwards.
+            f"INSERT OR IGNORE INTO {size_table} (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM {table}",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_insert AFTER INSERT ON {table} "
+            f"BEGIN UPDATE {size_table} SET bytes = bytes + NEW.size WHERE id = 0; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_update AFTER UPDATE OF size ON {table} "
+            f"BEGIN UPDATE {size_table} SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_delete AFTER DELETE ON {table} "
+            f"BEGIN UPDATE {size_table} SET bytes = bytes - OLD.size WHERE id = 0; END",
+        )
+
+    def _encode(self, value: Any) -> Any:
+        """The value as stored in the value column; its size is the length of the stored text (UTF-8) or bytes."""
+        return value
+
+    def _decode(self, stored: Any) -> Any:
+        return stored
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """Returns the cached values for the given keys; keys without an entry are left out."""
+        unique_keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        with self._lock:
+            for start in range(0, len(unique_keys), self._LOOKUP_CHUNK):
+                chunk = unique_keys[start:start + self._LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, {self.value_column[0]} FROM {self.table} WHERE key IN ({placeholders})", chunk)
+                found.update((key, self._decode(stored)) for key, stored in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        CACHE_LOOKUPS.inc(hits, cache=self.metric_label, result="hit")
+        CACHE_LOOKUPS.inc(len(keys) - hits, cache=self.metric_label, result="miss")
+        return found
+
+    def _put_many(self, entries: Dict[str, Any], metadata: Sequence[Any] = ()) -> None:
+        """
+        Stores several values, with the same `metadata` column values, in one transaction; values
+        larger than the whole cache are skipped.
+        """
+        now = time.time()
+        rows = []
+        for key, value in entries.items():
+            stored = self._encode(value)
+            size = len(stored.encode("utf-8")) if isinstance(stored, str) else len(stored)
+            if size <= self.max_bytes:
+                rows.append((key, *metadata, stored, size, now, now))
+        if not rows:
+            return
+        columns = [name for name, _ in self.metadata_columns] + [self.value_column[0], "size", "created_at", "last_access"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # An upsert rather than INSERT OR REPLACE: replacing a row does not fire the delete trigger.
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (key, {', '.join(columns)}) VALUES ({', '.join('?' * (len(columns) + 1))}) "
+                    f"ON CONFLICT(key) DO UPDATE SET {updates}",
+                    rows,
+                )
+                self._evict_over_budget()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            total_bytes = self._total_bytes()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute(f"SELECT bytes FROM {self.size_table} WHERE id = 0").fetchone()[0]
+
+    def _evict_over_budget(self) -> None:
+        total_bytes = self._total_bytes()
+        if total_bytes <= self.max_bytes:
+            return
+        excess = total_bytes - self.max_bytes
+        freed, victims = 0, []
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self.evictions += len(victims)
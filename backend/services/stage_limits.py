@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+# Default caps on concurrent calls to each external dependency, across all running workflows.
+DEFAULT_STAGE_LIMITS = {
+    "search": 4,      # Google Custom Search
+    "llm": 4,         # Azure OpenAI / OpenAI chat completions
+    "embedding": 4,   # Azure OpenAI embeddings (via ChromaService)
+}
+
+
+class _StageSlots:
+    """
+    Permits of one stage, shared by threads and by coroutines on any event loop.
+
+    A waiter is woken when a permit is released and then takes the permit itself, so a coroutine
+    cancelled while waiting never holds one; if it was cancelled right after being woken, the
+    wakeup is passed on to the next waiter. Coroutines wait on a future of their own loop and
+    do not occupy an executor thread.
+    """
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._lock = threading.Lock()
+        # Wake-up callbacks of the waiting threads and coroutines, in arrival order.
+        self._waiters: Deque[Callable[[], None]] = deque()
+
+    def _try_acquire(self) -> bool:
+        if self.in_use < self.limit:
+            self.in_use += 1
+            return True
+        return False
+
+    def _wake_next(self) -> None:
+        while self._waiters:
+            try:
+                self._waiters.popleft()()
+                return
+            except RuntimeError:
+                continue  # The waiter's event loop is closed.
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                woken = threading.Event()
+                self._waiters.append(woken.set)
+            woken.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                waiter = loop.create_future()
+                wake = functools.partial(loop.call_soon_threadsafe, _resolve, waiter)
+                self._waiters.append(wake)
+            try:
+                await waiter
+            except BaseException:
+                with self._lock:
+                    try:
+                        self._waiters.remove(wake)
+                    except ValueError:
+                        self._wake_next()  # Woken just before the cancellation.
+                raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+            self._wake_next()
+
+
+def _resolve(waiter: "asyncio.Future") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class StageLimiter:
+    """
+    Per-stage concurrency caps shared by every workflow in the process.
+
+    Workflow nodes run either on the event loop or on executor threads, so each stage's permits
+    are shared by both (see _StageSlots). `limit()` is for synchronous callers; `alimit()` is for
+    coroutines and waits without blocking the event loop or tying up a thread.
+    """
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self.limits: Dict[str, int] = dict(limits or DEFAULT_STAGE_LIMITS)
+        self._slots: Dict[str, _StageSlots] = {stage: _StageSlots(limit) for stage, limit in self.limits.items()}
+
+    def _stage(self, stage: str) -> _StageSlots:
+        try:
+            return self._slots[stage]
+        except KeyError:
+            raise ValueError(f"Unknown stage '{stage}'. Known stages: {sorted(self._slots)}") from None
+
+    @contextmanager
+    def limit(self, stage: str) -> Iterator[None]:
+        slots = self._stage(stage)
+        slots.acquire()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    @asynccontextmanager
+    async def alimit(self, stage: str) -> AsyncIterator[None]:
+        slots = self._stage(stage)
+        await slots.aacquire()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def in_flight(self, stage: str) -> int:
+        slots = self._slots.get(stage)
+        return slots.in_use if slots is not None else 0
+
+
+def _limits_from_env() -> Dict[str, int]:
+    return {
+        stage: int(os.getenv(f"{stage.upper()}_CONCURRENCY", default))
+        for stage, default in DEFAULT_STAGE_LIMITS.items()
+    }
+
+
+# Process-wide limiter used by SearchService, LLMService and the Chroma embedding function.
+stage_limits = StageLimiter(_limits_from_env())
@@ -0,0 +1,295 @@
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .workflow_scheduler import QueueFullError, DEFAULT_MAX_QUEUE_SIZE, DEFAULT_TASK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_QUEUE_PATH = "./task_queue.sqlite3"
+DEFAULT_EVENT_RETENTION_SECONDS = 3600.0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def local_worker_id(pid: Optional[int] = None) -> str:
+    """Identifies a worker process on this host; claims are tagged with it so orphans can be detected."""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SQLiteTaskQueue:
+    """
+    Durable FIFO of workflow runs shared by the API process(es) and the worker pool.
+
+    API processes `enqueue()` jobs; worker processes atomically `claim()` the oldest unclaimed job
+    and `complete()` it when the run ends. Claims are tagged with the worker's host and PID, so the
+    pool supervisor can hand the jobs of a crashed worker back to the queue (`requeue_orphaned`).
+    Exposes the same admission interface as WorkflowScheduler (is_full, retry_after_seconds, position).
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS task_queue ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " task_id TEXT NOT NULL UNIQUE,"
+        " payload TEXT NOT NULL,"
+        " enqueued_at REAL NOT NULL,"
+        " claimed_by TEXT,"
+        " claimed_at REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_task_queue_claimed ON task_queue(claimed_by, seq)",
+        "CREATE TABLE IF NOT EXISTS task_queue_stats (key TEXT PRIMARY KEY, value REAL NOT NULL)",
+    )
+
+    def __init__(self, path: str = DEFAULT_TASK_QUEUE_PATH, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 worker_count: int = 1):
+        self.path = path
+        self.max_queue_size = max(0, max_queue_size)
+        # Total concurrent runs across the pool; only used to estimate Retry-After.
+        self.worker_count = max(1, worker_count)
+        self._conn = _connect(path)
+        for statement in self._SCHEMA:
+            self._conn.execute(statement)
+        self._lock = threading.RLock()
+
+    # --- Admission (API side) ---
+
+    def enqueue(self, task_id: str, payload: Dict[str, Any], force: bool = False) -> int:
+        """
+        Adds (or replaces) the job for `task_id` and returns its 1-based queue position.
+        Raises QueueFullError when the queue is at capacity, unless `force` is set.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not force and self._waiting_count() >= self.max_queue_size:
+                    self._conn.execute("ROLLBACK")
+                    raise QueueFullError(self.retry_after_seconds())
+                self._conn.execute("DELETE FROM task_queue WHERE task_id = ?", (task_id,))
+                self._conn.execute(
+                    "INSERT INTO task_queue (task_id, payload, enqueued_at) VALUES (?, ?, ?)",
+                    (task_id, json.dumps(payload), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except QueueFullError:
+                raise
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.position(task_id) or 0
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self._waiting_count() >= self.max_queue_size
+
+    def retry_after_seconds(self) -> int:
+        with self._lock:
+            waiting = self._waiting_count()
+            row = self._conn.execute("SELECT value FROM task_queue_stats WHERE key = 'avg_task_seconds'").fetchone()
+        avg_task_seconds = row[0] if row else DEFAULT_TASK_SECONDS
+        return max(1, math.ceil((waiting + 1) / self.worker_count * avg_task_seconds))
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position among unclaimed jobs, or None if the task is not waiting."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq FROM task_queue WHERE task_id = ? AND claimed_by IS NULL", (task_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM task_queue WHERE claimed_by IS NULL AND seq <= ?", (row[0],)
+            ).fetchone()[0]
+
+    def cancel(self, task_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM task_queue WHERE task_id = ? AND claimed_by IS NULL", (task_id,))
+        return cursor.rowcount > 0
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._waiting_count()
+
+    @property
+    def running_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM task_queue WHERE claimed_by IS NOT NULL").fetchone()[0]
+
+    # --- Consumption (worker side) ---
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Atomically takes the oldest unclaimed job. Returns (task_id, payload) or None if the queue is empty."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT seq, task_id, payload FROM task_queue WHERE claimed_by IS NULL ORDER BY seq LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE task_queue SET claimed_by = ?, claimed_at = ? WHERE seq = ?",
+                        (worker_id, time.time(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[1], json.loads(row[2])
+
+    def complete(self, task_id: str, worker_id: str) -> None:
+        """Removes a finished job and folds its run time into the Retry-After estimate."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT claimed_at FROM task_queue WHERE task_id = ? AND claimed_by = ?", (task_id, worker_id)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM task_queue WHERE task_id = ? AND claimed_by = ?", (task_id, worker_id))
+                    elapsed = time.time() - row[0]
+                    self._conn.execute(
+                        "INSERT INTO task_queue_stats (key, value) VALUES ('avg_task_seconds', ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = 0.8 * value + 0.2 * excluded.value",
+                        (elapsed,),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def requeue_claimed_by(self, worker_id: str) -> int:
+        """Returns a worker's claimed jobs to the front of the queue (e.g. after the worker crashed)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE task_queue SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?", (worker_id,)
+            )
+        if cursor.rowcount:
+            logger.warning(f"SQLiteTaskQueue: Re-queued {cursor.rowcount} job(s) claimed by {worker_id}.")
+        return cursor.rowcount
+
+    def requeue_orphaned(self) -> int:
+        """Re-queues jobs claimed by worker processes on this host that are no longer running."""
+        host_prefix = f"{socket.gethostname()}:"
+        with self._lock:
+            claimants = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT claimed_by FROM task_queue WHERE claimed_by IS NOT NULL"
+            ).fetchall()]
+        requeued = 0
+        for worker_id in claimants:
+            host, _, pid = worker_id.rpartition(":")
+            if worker_id.startswith(host_prefix) and pid.isdigit() and not _pid_alive(int(pid)):
+                requeued += self.requeue_claimed_by(worker_id)
+        return requeued
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _waiting_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM task_queue WHERE claimed_by IS NULL").fetchone()[0]
+
+
+class ProgressEventLog:
+    """
+    Append-only log of task progress events shared across processes.
+
+    Workers (and API processes) `append()` status snapshots; every API process tails the log with
+    `read_after()` and feeds its local ProgressBroker. The log's row IDs are used as SSE event IDs,
+    so a client can reconnect to any API process with its Last-Event-ID.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS progress_events ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " task_id TEXT NOT NULL,"
+        " data TEXT NOT NULL,"
+        " terminal INTEGER NOT NULL,"
+        " created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_progress_events_created_at ON progress_events(created_at)",
+    )
+
+    def __init__(self, path: str = DEFAULT_TASK_QUEUE_PATH, retention_seconds: float = DEFAULT_EVENT_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._conn = _connect(path)
+        for statement in self._SCHEMA:
+            self._conn.execute(statement)
+        self._lock = threading.RLock()
+
+    def append(self, task_id: str, data: Dict[str, Any], terminal: bool = False) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO progress_events (task_id, data, terminal, created_at) VALUES (?, ?, ?, ?)",
+                (task_id, json.dumps(data), int(terminal), time.time()),
+            )
+        return cursor.lastrowid
+
+    def read_after(self, last_id: int, limit: int = 500) -> List[Tuple[int, str, Dict[str, Any], bool]]:
+        """Returns up to `limit` events with an ID greater than `last_id`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, task_id, data, terminal FROM progress_events WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit),
+            ).fetchall()
+        return [(row[0], row[1], json.loads(row[2]), bool(row[3])) for row in rows]
+
+    def read_recent(self, since_seconds: float) -> List[Tuple[int, str, Dict[str, Any], bool]]:
+        """Events from the last `since_seconds`, used to seed a new API process's replay history."""
+        cutoff = time.time() - since_seconds
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(id) FROM progress_events WHERE created_at >= ?", (cutoff,)).fetchone()
+        if row is None or row[0] is None:
+            return []
+        return self.read_after(row[0] - 1, limit=10000)
+
+    def last_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM progress_events").fetchone()
+        return row[0] or 0
+
+    def prune(self) -> int:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM progress_events WHERE created_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_task_queue() -> SQLiteTaskQueue:
+    processes = int(os.getenv("WORKFLOW_WORKER_PROCESSES", os.cpu_count() or 1))
+    return SQLiteTaskQueue(
+        path=os.getenv("TASK_QUEUE_PATH", DEFAULT_TASK_QUEUE_PATH),
+        max_queue_size=int(os.getenv("WORKFLOW_QUEUE_SIZE", DEFAULT_MAX_QUEUE_SIZE)),
+        worker_count=processes * int(os.getenv("WORKFLOW_WORKERS", "4")),
+    )
+
+
+def create_progress_event_log() -> ProgressEventLog:
+    return ProgressEventLog(path=os.getenv("TASK_QUEUE_PATH", DEFAULT_TASK_QUEUE_PATH))
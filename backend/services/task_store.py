@@ -0,0 +1,556 @@
+import abc
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a task will never run again and may be evicted by TTL.
+TERMINAL_STATUSES = ("completed", "failed", "error_in_workflow", "unknown_completion")
+
+DEFAULT_TASK_STORE_PATH = "./task_store.sqlite3"
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+def _json_default(value: Any) -> Any:
+    """Fallback encoder for objects that can end up inside a task record (pydantic models, messages)."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict"):
+        return value.dict()
+    return str(value)
+
+
+def serialize_task(record: Dict[str, Any]) -> str:
+    return json.dumps(record, default=_json_default, separators=(",", ":"))
+
+
+def deserialize_task(payload: str) -> Dict[str, Any]:
+    return json.loads(payload)
+
+
+class TaskStore(MutableMapping):
+    """
+    Base class for task stores. A task store behaves like the dict of task records that
+    main.py used to keep in memory (task_id -> record), plus a few explicit persistence hooks.
+
+    Records returned by the store are live objects: callers that mutate a record in place
+    must call `save(task_id, record)` (or use `update_task`) so the change reaches the backend.
+    Removal listeners are called with the IDs of tasks that were deleted or evicted by TTL.
+    """
+
+    def __init__(self):
+        self._removal_listeners: List[Callable[[List[str]], None]] = []
+
+    def add_removal_listener(self, listener: Callable[[List[str]], None]) -> None:
+        self._removal_listeners.append(listener)
+
+    def _notify_removed(self, task_ids: List[str]) -> None:
+        if not task_ids:
+            return
+        for listener in self._removal_listeners:
+            try:
+                listener(task_ids)
+            except Exception as e:
+                logger.error(f"TaskStore: Removal listener failed for {len(task_ids)} task(s): {e}", exc_info=True)
+
+    def save(self, task_id: str, record: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Persists `record` (by default the in-memory record) for `task_id`. Pass the record that was
+        changed: a store with a bounded cache may no longer hold it.
+        """
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Merges `fields` into the task record and persists it."""
+        record = self[task_id]
+        record.update(fields)
+        self.save(task_id, record)
+        return record
+
+    @abc.abstractmethod
+    def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Returns task records ordered by creation time (newest first), optionally filtered by status."""
+
+    @abc.abstractmethod
+    def find_by_topic_key(self, topic_key: str, statuses: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """Returns the newest task whose normalized `topic_key` matches and whose status is in `statuses`."""
+
+    def claim_topic(self, task_id: str, record: Dict[str, Any], statuses: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """
+        Stores `record` as `task_id` unless a task with the same `topic_key` and a status in `statuses`
+        exists, in which case that task is returned and nothing is stored. Returns None once stored.
+        Stores shared between processes must check and insert atomically.
+        """
+        existing = self.find_by_topic_key(record["topic_key"], statuses)
+        if existing is not None:
+            return existing
+        self[task_id] = record
+        return None
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Removes terminal tasks older than the configured TTL. Returns the number of evicted tasks."""
+        return 0
+
+    def flush(self) -> None:
+        """Blocks until all pending writes have been persisted."""
+
+    def close(self) -> None:
+        """Flushes pending writes and releases backend resources."""
+        self.flush()
+
+
+class InMemoryTaskStore(TaskStore):
+    """Process-local task store. Nothing survives a restart; useful for tests and single-shot runs."""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._created_at: Dict[str, float] = {}
+        self._updated_at: Dict[str, float] = {}
+
+    def __getitem__(self, task_id: str) -> Dict[str, Any]:
+        return self._tasks[task_id]
+
+    def __setitem__(self, task_id: str, record: Dict[str, Any]) -> None:
+        now = time.time()
+        self._tasks[task_id] = record
+        self._created_at.setdefault(task_id, now)
+        self._updated_at[task_id] = now
+
+    def __delitem__(self, task_id: str) -> None:
+        del self._tasks[task_id]
+        self._created_at.pop(task_id, None)
+        self._updated_at.pop(task_id, None)
+        self._notify_removed([task_id])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._tasks))
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def save(self, task_id: str, record: Optional[Dict[str, Any]] = None) -> None:
+        if task_id in self._tasks:
+            if record is not None:
+                self._tasks[task_id] = record
+            self._updated_at[task_id] = time.time()
+
+    def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        task_ids = sorted(self._tasks, key=lambda t: self._created_at.get(t, 0.0), reverse=True)
+        records = [self._tasks[t] for t in task_ids if status is None or self._tasks[t].get("status") == status]
+        return records[:limit]
+
+    def find_by_topic_key(self, topic_key: str, statuses: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        matches = [
+            task_id for task_id, record in self._tasks.items()
+            if record.get("topic_key") == topic_key and record.get("status") in statuses
+        ]
+        if not matches:
+            return None
+        return self._tasks[max(matches, key=lambda t: self._created_at.get(t, 0.0))]
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        cutoff = (now or time.time()) - self.ttl_seconds
+        expired = [
+            task_id for task_id, record in self._tasks.items()
+            if record.get("status") in TERMINAL_STATUSES and self._updated_at.get(task_id, 0.0) < cutoff
+        ]
+        for task_id in expired:
+            del self[task_id]
+        return len(expired)
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Durable task store backed by an embedded SQLite database in WAL mode.
+
+    - Recently used records are kept in a bounded in-memory LRU so the workflow loop and
+      /status polling never touch disk for active tasks.
+    - Writes hand a shallow copy of the record to a background writer thread, which coalesces
+      repeated writes of the same task and serializes only the latest copy, off the caller's thread.
+    - Tasks are indexed by status and creation time; terminal tasks are evicted after `ttl_seconds`.
+    - With `shared=True` the database is also written by other processes (API replicas and the
+      workflow worker pool), so a cached record is revalidated against the row's `updated_at` on
+      each read and refreshed in place when another process has changed it.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS tasks ("
+        " task_id TEXT PRIMARY KEY,"
+        " status TEXT,"
+        " topic TEXT,"
+        " created_at REAL NOT NULL,"
+        " updated_at REAL NOT NULL,"
+        " data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)",
+        # Expression index, so older databases need no migration for the topic lookup.
+        "CREATE INDEX IF NOT EXISTS idx_tasks_topic_key ON tasks(json_extract(data, '$.topic_key'), created_at)",
+    )
+
+    def __init__(self, path: str = DEFAULT_TASK_STORE_PATH, cache_size: int = DEFAULT_CACHE_SIZE,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 eviction_interval: float = 300.0, shared: bool = False):
+        super().__init__()
+        self.path = path
+        self.shared = shared
+        self.cache_size = max(1, cache_size)
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self.eviction_interval = eviction_interval
+
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # task_id -> (status, topic, updated_at, record copy) or None for a pending delete
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._created_at: Dict[str, float] = {}
+        # task_id -> updated_at of the cached copy (shared mode only)
+        self._versions: Dict[str, float] = {}
+        self._wakeup = threading.Condition(self._lock)
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self._SCHEMA:
+            self._conn.execute(statement)
+        self._db_lock = threading.Lock()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="task-store-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"SQLiteTaskStore initialized at {path} (cache_size={self.cache_size}, ttl={ttl_seconds}s).")
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, task_id: str) -> Dict[str, Any]:
+        with self._lock:
+            record = self._cache.get(task_id)
+            if record is not None and (not self.shared or task_id in self._pending):
+                self._cache.move_to_end(task_id)
+                return record
+            if record is None and task_id in self._pending:
+                pending = self._pending[task_id]
+                if pending is None:
+                    raise KeyError(task_id)
+                record = pending[3]
+                self._remember(task_id, record)
+                return record
+
+        if record is not None:
+            return self._revalidate(task_id, record)
+
+        with self._db_lock:
+            row = self._conn.execute("SELECT data, created_at, updated_at FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            raise KeyError(task_id)
+
+        record = deserialize_task(row[0])
+        with self._lock:
+            # Another thread may have loaded or written the task while we were reading.
+            if task_id in self._cache:
+                return self._cache[task_id]
+            self._created_at.setdefault(task_id, row[1])
+            self._versions[task_id] = row[2]
+            self._remember(task_id, record)
+        return record
+
+    def __setitem__(self, task_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._created_at.setdefault(task_id, time.time())
+            self._remember(task_id, record)
+            self._enqueue_write(task_id, record)
+
+    def __delitem__(self, task_id: str) -> None:
+        if task_id not in self:
+            raise KeyError(task_id)
+        with self._lock:
+            self._cache.pop(task_id, None)
+            self._created_at.pop(task_id, None)
+            self._versions.pop(task_id, None)
+            self._pending[task_id] = None
+            self._idle.clear()
+            self._wakeup.notify()
+        self._notify_removed([task_id])
+
+    def __contains__(self, task_id: object) -> bool:
+        with self._lock:
+            if task_id in self._cache and not self.shared:
+                return True
+            if task_id in self._pending:
+                return self._pending[task_id] is not None
+        with self._db_lock:
+            row = self._conn.execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def __iter__(self) -> Iterator[str]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute("SELECT task_id FROM tasks ORDER BY created_at").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    # --- Persistence hooks ---
+
+    def save(self, task_id: str, record: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            if record is None:
+                record = self._cache.get(task_id)
+                if record is None:
+                    raise KeyError(f"Task {task_id} is not cached; pass the changed record to save().")
+            elif task_id not in self._cache and task_id in self._pending and self._pending[task_id] is None:
+                return  # Deleted since the caller read it.
+            self._remember(task_id, record)
+            self._enqueue_write(task_id, record)
+
+    def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        self.flush()
+        query = "SELECT task_id FROM tasks"
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._db_lock:
+            rows = self._conn.execute(query, params + (limit,)).fetchall()
+        records = []
+        for (task_id,) in rows:
+            try:
+                records.append(self[task_id])
+            except KeyError:
+                continue
+        return records
+
+    def find_by_topic_key(self, topic_key: str, statuses: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        self.flush()
+        placeholders = ",".join("?" for _ in statuses)
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT task_id FROM tasks WHERE json_extract(data, '$.topic_key') = ? AND status IN ({placeholders}) "
+                "ORDER BY created_at DESC LIMIT 5",
+                (topic_key,) + tuple(statuses),
+            ).fetchall()
+        for (task_id,) in rows:
+            try:
+                record = self[task_id]
+            except KeyError:
+                continue
+            # The cached record may be newer than the row that matched.
+            if record.get("status") in statuses:
+                return record
+        return None
+
+    def claim_topic(self, task_id: str, record: Dict[str, Any], statuses: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        # Written synchronously with INSERT ... WHERE NOT EXISTS in one transaction, so two processes
+        # (or two stores) claiming the same topic at once cannot both start a task.
+        self.flush()
+        placeholders = ",".join("?" for _ in statuses)
+        payload = serialize_task(record)
+        while True:
+            now = time.time()
+            with self._db_lock:
+                # IMMEDIATE takes the write lock before the check, so a concurrent claim waits for it.
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    inserted = self._conn.execute(
+                        "INSERT INTO tasks (task_id, status, topic, created_at, updated_at, data) "
+                        "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS ("
+                        f" SELECT 1 FROM tasks WHERE json_extract(data, '$.topic_key') = ? AND status IN ({placeholders}))",
+                        (task_id, record.get("status"), record.get("topic"), now, now, payload, record["topic_key"]) + tuple(statuses),
+                    ).rowcount
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            if inserted:
+                with self._lock:
+                    self._created_at[task_id] = now
+                    self._versions[task_id] = now
+                    self._remember(task_id, record)
+                return None
+            existing = self.find_by_topic_key(record["topic_key"], statuses)
+            if existing is not None:
+                return existing
+            # The other task finished or was removed in between; try to claim the topic again.
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        cutoff = (now or time.time()) - self.ttl_seconds
+        placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT task_id FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                TERMINAL_STATUSES + (cutoff,),
+            ).fetchall()
+            expired = [row[0] for row in rows]
+            if expired:
+                self._conn.executemany("DELETE FROM tasks WHERE task_id = ?", [(t,) for t in expired])
+        with self._lock:
+            for task_id in expired:
+                if task_id not in self._pending:
+                    self._cache.pop(task_id, None)
+                    self._created_at.pop(task_id, None)
+                    self._versions.pop(task_id, None)
+        if expired:
+            logger.info(f"SQLiteTaskStore: Evicted {len(expired)} expired tasks.")
+            self._notify_removed(expired)
+        return len(expired)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._wakeup.notify()
+        self._idle.wait()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join(timeout=5)
+        with self._db_lock:
+            self._conn.close()
+
+    # --- Internals ---
+
+    def _revalidate(self, task_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Shared mode: refreshes a cached record in place if another process wrote a newer version."""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM tasks WHERE task_id = ? AND updated_at > ?",
+                (task_id, self._versions.get(task_id, 0.0)),
+            ).fetchone()
+            exists = row is not None or self._conn.execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        with self._lock:
+            if task_id in self._pending:
+                # Written locally while we were reading; the local version wins.
+                return record
+            if not exists:
+                # Deleted (or evicted) by another process.
+                self._cache.pop(task_id, None)
+                self._versions.pop(task_id, None)
+                raise KeyError(task_id)
+            if row is not None:
+                record.clear()
+                record.update(deserialize_task(row[0]))
+                self._versions[task_id] = row[1]
+            self._cache.move_to_end(task_id)
+        return record
+
+    def _remember(self, task_id: str, record: Dict[str, Any]) -> None:
+        self._cache[task_id] = record
+        self._cache.move_to_end(task_id)
+        while len(self._cache) > self.cache_size:
+            evicted_id, _ = self._cache.popitem(last=False)
+            if evicted_id not in self._pending:
+                self._created_at.pop(evicted_id, None)
+                self._versions.pop(evicted_id, None)
+
+    def _enqueue_write(self, task_id: str, record: Dict[str, Any]) -> None:
+        updated_at = time.time()
+        self._versions[task_id] = updated_at
+        # A shallow copy is cheap and fixes the record's top-level fields; the writer serializes it.
+        self._pending[task_id] = (record.get("status"), record.get("topic"), updated_at, dict(record))
+        self._idle.clear()
+        self._wakeup.notify()
+
+    def _writer_loop(self) -> None:
+        last_eviction = time.time()
+        while True:
+            with self._lock:
+                if not self._pending and not self._closed:
+                    self._wakeup.wait(timeout=self.flush_interval)
+                batch = self._pending
+                self._pending = {}
+                created_at = {task_id: self._created_at.get(task_id, time.time()) for task_id in batch}
+                closed = self._closed
+
+            if batch:
+                try:
+                    self._write_batch(batch, created_at)
+                except Exception as e:
+                    logger.error(f"SQLiteTaskStore: Failed to persist {len(batch)} task(s): {e}", exc_info=True)
+
+            with self._lock:
+                if not self._pending:
+                    self._idle.set()
+
+            if closed:
+                return
+
+            if time.time() - last_eviction >= self.eviction_interval:
+                last_eviction = time.time()
+                try:
+                    self.evict_expired()
+                except Exception as e:
+                    logger.error(f"SQLiteTaskStore: TTL eviction failed: {e}", exc_info=True)
+
+    def _write_batch(self, batch: Dict[str, Optional[tuple]], created_at: Dict[str, float]) -> None:
+        upserts = []
+        deletes = []
+        for task_id, entry in batch.items():
+            if entry is None:
+                deletes.append((task_id,))
+            else:
+                status, topic, updated_at, snapshot = entry
+                try:
+                    payload = serialize_task(snapshot)
+                except RuntimeError:
+                    # A nested value was changed by its owner during the dump; write it next round.
+                    with self._lock:
+                        self._pending.setdefault(task_id, entry)
+                    continue
+                upserts.append((task_id, status, topic, created_at[task_id], updated_at, payload))
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO tasks (task_id, status, topic, created_at, updated_at, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(task_id) DO UPDATE SET status = excluded.status, topic = excluded.topic, "
+                        "updated_at = excluded.updated_at, data = excluded.data",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM tasks WHERE task_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+def create_task_store(backend: Optional[str] = None, shared: bool = False) -> TaskStore:
+    """
+    Builds the task store selected by the TASK_STORE_BACKEND environment variable
+    ("sqlite" by default, or "memory"). `shared` marks a SQLite store that other processes
+    also write to (see SQLiteTaskStore).
+    """
+    backend = (backend or os.getenv("TASK_STORE_BACKEND", "sqlite")).lower()
+    ttl_seconds = float(os.getenv("TASK_STORE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    if backend == "memory":
+        if shared:
+            raise ValueError("TASK_STORE_BACKEND 'memory' cannot be shared between processes. Use 'sqlite'.")
+        return InMemoryTaskStore(ttl_seconds=ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteTaskStore(
+            path=os.getenv("TASK_STORE_PATH", DEFAULT_TASK_STORE_PATH),
+            cache_size=int(os.getenv("TASK_STORE_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+            ttl_seconds=ttl_seconds,
+            shared=shared,
+        )
+    raise ValueError(f"Unknown TASK_STORE_BACKEND '{backend}'. Expected 'sqlite' or 'memory'.")
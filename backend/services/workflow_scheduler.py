@@ -0,0 +1,130 @@
+import asyncio
+import inspect
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_COUNT = 4
+DEFAULT_MAX_QUEUE_SIZE = 100
+DEFAULT_TASK_SECONDS = 30.0
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler's queue is at capacity. `retry_after` is a suggested wait in seconds."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Workflow queue is full. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class WorkflowScheduler:
+    """
+    Bounded FIFO scheduler for workflow runs.
+
+    At most `worker_count` workflows run at once; up to `max_queue_size` more wait in line and
+    anything beyond that is rejected with QueueFullError (surfaced by the API as 429).
+    Jobs are kept in a plain ordered dict rather than an asyncio.Queue so the scheduler is not
+    tied to a particular event loop; workers are started lazily on the loop that submits work.
+    """
+    def __init__(self, worker_count: int = DEFAULT_WORKER_COUNT, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.worker_count = max(1, worker_count)
+        self.max_queue_size = max(0, max_queue_size)
+        # task_id -> (callable, args), in the order the runs were submitted
+        self._queue: "OrderedDict[str, Tuple[Callable[..., Any], tuple]]" = OrderedDict()
+        self._running: Dict[str, float] = {}
+        self._avg_task_seconds = DEFAULT_TASK_SECONDS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+
+    # --- Admission ---
+
+    def is_full(self) -> bool:
+        return len(self._queue) >= self.max_queue_size
+
+    def retry_after_seconds(self) -> int:
+        """Rough time until a queue slot frees up, based on the average workflow duration."""
+        waves = (len(self._queue) + 1) / self.worker_count
+        return max(1, math.ceil(waves * self._avg_task_seconds))
+
+    def submit(self, task_id: str, func: Callable[..., Any], *args: Any, force: bool = False) -> int:
+        """
+        Enqueues `func(*args)` (sync or async) for `task_id` and returns its 1-based queue position.
+        Raises QueueFullError when the queue is at capacity, unless `force` is set (used for
+        recovering interrupted tasks at startup). A task that is already waiting is replaced and
+        moves to the back of the queue.
+        """
+        if not force and self.is_full():
+            raise QueueFullError(self.retry_after_seconds())
+        self._queue[task_id] = (func, args)
+        self._queue.move_to_end(task_id)
+        self._ensure_workers()
+        self._wakeup.set()
+        return self.position(task_id) or 0
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position among the waiting tasks, or None if the task is not waiting."""
+        if task_id not in self._queue:
+            return None
+        # Counted over the live queue (at most max_queue_size entries, plus forced ones), so
+        # cancelled and replaced runs never leave gaps.
+        for position, waiting_id in enumerate(self._queue, start=1):
+            if waiting_id == task_id:
+                return position
+        return None
+
+    def cancel(self, task_id: str) -> bool:
+        return self._queue.pop(task_id, None) is not None
+
+    # --- Introspection ---
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    # --- Workers ---
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        # First use, or the previous loop is gone (e.g. a test client portal): start fresh workers.
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._workers = [loop.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"WorkflowScheduler: Started {self.worker_count} workers (max queue size {self.max_queue_size}).")
+
+    async def _worker(self, worker_index: int) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            task_id, (func, args) = self._queue.popitem(last=False)
+            started = time.monotonic()
+            self._running[task_id] = started
+            try:
+                result = func(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"WorkflowScheduler: Task {task_id} raised in worker {worker_index}: {e}", exc_info=True)
+            finally:
+                self._running.pop(task_id, None)
+                elapsed = time.monotonic() - started
+                self._avg_task_seconds = 0.8 * self._avg_task_seconds + 0.2 * elapsed
+
+
+def create_workflow_scheduler() -> WorkflowScheduler:
+    return WorkflowScheduler(
+        worker_count=int(os.getenv("WORKFLOW_WORKERS", DEFAULT_WORKER_COUNT)),
+        max_queue_size=int(os.getenv("WORKFLOW_QUEUE_SIZE", DEFAULT_MAX_QUEUE_SIZE)),
+    )
@@ -1,8 +1,15 @@
+import os
+
+# Keep task records and checkpoints in memory: with the default SQLite files, tasks left over from an
+# earlier run would be resumed at startup and found by the de-duplication tests.
+os.environ["WORKFLOW_EXECUTION"] = "inline"
+os.environ["TASK_STORE_BACKEND"] = "memory"
+os.environ["WORKFLOW_CHECKPOINTER"] = "memory"
+
 import pytest
 from fastapi.testclient import TestClient
 from backend.main import app  # Assuming your FastAPI app instance is named 'app' in main.py
 
-import os
 from unittest import mock # For patch.dict and patch
 from unittest.mock import MagicMock, patch # Explicitly import MagicMock and patch
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
@@ -13,6 +20,7 @@ client = TestClient(app)
 
 # Import active_tasks for direct manipulation in tests
 from backend.main import active_tasks
+from backend.services.workflow_scheduler import QueueFullError
 from datetime import datetime, timezone
 
 # Mock datetime globally for consistent timestamps
@@ -361,3 +369,312 @@ def test_add_documents_simulated_chroma_failure(monkeypatch):
     # Clean up test directory
     if os.path.exists("./test_chroma_db_add_fail"):
         shutil.rmtree("./test_chroma_db_add_fail")
+
+
+# Progress stream tests (/stream SSE and /ws WebSocket)
+def test_stream_task_progress_completed_task():
+    task_id = "test_stream_task_completed"
+    active_tasks[task_id] = {
+        "task_id": task_id,
+        "topic": "topic_for_stream",
+        "status": "completed",
+        "current_stage": "completed",
+        "graph_state": {"sources_explored": 3, "data_collected": 3},
+    }
+
+    with client.stream("GET", f"/stream/{task_id}") as response:
+        assert response.status_code == 200
+        body = "".join(response.iter_text())
+
+    assert "event: status" in body
+    assert '"status": "completed"' in body
+    assert '"progress": 1.0' in body
+    del active_tasks[task_id]
+
+def test_stream_task_progress_not_found():
+    response = client.get("/stream/non_existent_stream_task")
+    assert response.status_code == 404
+
+def test_websocket_replays_missed_events():
+    from backend.main import progress_broker
+    task_id = "test_ws_task_replay"
+    active_tasks[task_id] = {
+        "task_id": task_id,
+        "topic": "topic_for_ws",
+        "status": "running",
+        "current_stage": "researching",
+        "graph_state": {},
+    }
+    seen = progress_broker.publish(task_id, {"status": "researching"})
+    progress_broker.publish(task_id, {"status": "synthesizing"})
+    progress_broker.publish(task_id, {"status": "completed"}, terminal=True)
+
+    with client.websocket_connect(f"/ws/{task_id}?last_event_id={seen.id}") as websocket:
+        first = websocket.receive_json()
+        second = websocket.receive_json()
+
+    assert [first["data"]["status"], second["data"]["status"]] == ["synthesizing", "completed"]
+    assert second["id"] > first["id"] > seen.id
+    del active_tasks[task_id]
+
+def test_start_research_task_queue_full_returns_429():
+    from backend.services.workflow_scheduler import WorkflowScheduler
+    full_scheduler = WorkflowScheduler(worker_count=1, max_queue_size=0)
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.workflow_scheduler', full_scheduler):
+        response = client.post("/research", json={"topic": "burst topic"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_task_whose_run_cannot_be_queued_is_failed_and_not_reused():
+    import uuid
+    from backend.main import IN_FLIGHT_STATUSES, normalize_topic
+    topic = f"Crowded Topic {uuid.uuid4()}"
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.schedule_workflow', side_effect=QueueFullError(5)):
+        response = client.post("/research", json={"topic": topic})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert active_tasks.find_by_topic_key(normalize_topic(topic), IN_FLIGHT_STATUSES) is None
+    failed = active_tasks.find_by_topic_key(normalize_topic(topic), ("failed",))
+    assert failed is not None and "queue was full" in failed["error_message"]
+    del active_tasks[failed["task_id"]]
+
+def test_identical_topic_attaches_to_in_flight_task():
+    import uuid
+    topic = f"Dedup Topic {uuid.uuid4()}"
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.schedule_workflow', return_value=1) as schedule:
+        first = client.post("/research", json={"topic": topic})
+        second = client.post("/research", json={"topic": f"  {topic.upper()} "})
+        bypassed = client.post("/research", json={"topic": topic, "bypass_cache": True})
+
+    task_id = first.json()["task_id"]
+    assert second.status_code == 202
+    assert second.json()["task_id"] == task_id
+    assert "Attached to task" in second.json()["message"]
+    assert bypassed.json()["task_id"] != task_id
+    assert schedule.call_count == 2
+    del active_tasks[task_id]
+    del active_tasks[bypassed.json()["task_id"]]
+
+def test_topic_claimed_after_the_lookup_attaches_instead_of_starting_a_task():
+    import uuid
+    from backend.main import normalize_topic
+    topic = f"Raced Topic {uuid.uuid4()}"
+    task_id = f"test_raced_{uuid.uuid4()}"
+    # Created by another API process between this request's lookup and its insert.
+    active_tasks[task_id] = {"task_id": task_id, "topic": topic, "topic_key": normalize_topic(topic),
+                             "status": "queued", "current_stage": "queued", "graph_state": {}}
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.find_reusable_task', return_value=None), \
+         patch('backend.main.schedule_workflow', return_value=1) as schedule:
+        response = client.post("/research", json={"topic": topic})
+
+    assert response.status_code == 202
+    assert response.json()["task_id"] == task_id
+    assert "Attached to task" in response.json()["message"]
+    schedule.assert_not_called()
+    del active_tasks[task_id]
+
+def test_identical_topic_is_not_shared_between_tenants():
+    import uuid
+    topic = f"Tenant Topic {uuid.uuid4()}"
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.schedule_workflow', return_value=1) as schedule:
+        acme = client.post("/research", json={"topic": topic, "tenant": "acme"})
+        globex = client.post("/research", json={"topic": topic, "tenant": "globex"})
+        acme_again = client.post("/research", json={"topic": topic, "tenant": "acme"})
+
+    assert globex.json()["task_id"] != acme.json()["task_id"]
+    assert acme_again.json()["task_id"] == acme.json()["task_id"]
+    assert schedule.call_count == 2
+    assert active_tasks[acme.json()["task_id"]]["graph_state"]["tenant"] == "acme"
+    del active_tasks[acme.json()["task_id"]]
+    del active_tasks[globex.json()["task_id"]]
+
+def test_completed_topic_is_served_from_result_cache():
+    import time
+    import uuid
+    topic = f"Cached Topic {uuid.uuid4()}"
+    task_id = f"test_cached_{uuid.uuid4()}"
+    from backend.main import normalize_topic
+    active_tasks[task_id] = {
+        "task_id": task_id, "topic": topic, "topic_key": normalize_topic(topic),
+        "status": "completed", "current_stage": "completed", "completed_at": time.time(),
+        "graph_state": {}, "final_graph_state": {"final_document": "Cached report"},
+    }
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.schedule_workflow', return_value=1) as schedule:
+        cached = client.post("/research", json={"topic": topic})
+        with patch('backend.main.RESEARCH_CACHE_TTL_SECONDS', 0):
+            fresh = client.post("/research", json={"topic": topic})
+
+    assert cached.json()["task_id"] == task_id
+    assert cached.json()["status"] == "completed"
+    assert fresh.json()["task_id"] != task_id
+    assert schedule.call_count == 1
+    del active_tasks[task_id]
+    del active_tasks[fresh.json()["task_id"]]
+
+def test_document_is_streamed_into_the_task_and_results_stream():
+    import asyncio
+    import json
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.graph import StateGraph, END
+    from backend import main
+    from backend.agents.llm_service import LLMService
+    from backend.agents.types import KnowledgeNexusState
+    from backend.agents.workflow_agents.document_generation_agent import DocumentGenerationAgent
+
+    llm_service = LLMService()
+    llm_service.llm, llm_service.llm_type = FakeListChatModel(responses=["# Report\nSolar is cheap."]), "openai"
+    agent = DocumentGenerationAgent(llm_service=llm_service)
+    workflow = StateGraph(KnowledgeNexusState)
+    workflow.add_node("generate_document", RunnableLambda(agent.execute, afunc=agent.aexecute, name="generate_document"))
+    workflow.set_entry_point("generate_document")
+    workflow.add_edge("generate_document", END)
+
+    task_id = "test_streamed_document_task"
+    active_tasks[task_id] = {"task_id": task_id, "topic": "Solar", "status": "queued", "graph_state": {}}
+    graph_input = main.build_initial_graph_input(task_id, "Solar", bypass_cache=True)
+    graph_input["synthesized_content"] = "Solar panels got cheaper."
+    with patch('backend.main.knowledge_nexus_graph', workflow.compile(checkpointer=MemorySaver())), \
+         patch('backend.main.PARTIAL_TEXT_PUBLISH_INTERVAL_SECONDS', 0), \
+         patch('backend.main.update_task_and_publish', wraps=main.update_task_and_publish) as update:
+        asyncio.run(main.run_research_workflow_async(task_id, "Solar", graph_input))
+
+    partials = [call.args[1]["partial_text"]["final_document"] for call in update.call_args_list if call.args[1].get("partial_text")]
+    assert len(partials) > 1
+    assert partials[-1] == "# Report\nSolar is cheap."
+    assert active_tasks[task_id]["status"] == "completed"
+    assert active_tasks[task_id]["partial_text"] is None
+
+    with client.stream("GET", f"/results/{task_id}/stream") as response:
+        assert response.status_code == 200
+        body = "".join(response.iter_text())
+    data_lines = [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+    assert "event: delta" in body and "event: done" in body
+    assert data_lines[0] == {"text": "# Report\nSolar is cheap."}
+    assert data_lines[-1]["status"] == "completed"
+    del active_tasks[task_id]
+
+def test_stream_task_results_not_found():
+    response = client.get("/results/non_existent_results_stream_task/stream")
+    assert response.status_code == 404
+
+def test_metrics_endpoint_reports_workflow_nodes_and_llm_tokens():
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.graph import StateGraph, END
+    from backend import main
+    from backend.agents.llm_service import LLMService
+    from backend.agents.types import KnowledgeNexusState
+    from backend.agents.workflow_agents.document_generation_agent import DocumentGenerationAgent
+    from backend.services.metrics import WORKFLOW_NODE_SECONDS
+
+    llm_service = LLMService()
+    llm_service.llm, llm_service.llm_type = FakeListChatModel(responses=["# Report\nWind is cheap."]), "openai"
+    llm_service.cache = None # every run must call the model
+    agent = DocumentGenerationAgent(llm_service=llm_service)
+    workflow = StateGraph(KnowledgeNexusState)
+    workflow.add_node("generate_document", RunnableLambda(agent.execute, afunc=agent.aexecute, name="generate_document"))
+    workflow.set_entry_point("generate_document")
+    workflow.add_edge("generate_document", END)
+
+    task_id = "test_metrics_task"
+    active_tasks[task_id] = {"task_id": task_id, "topic": "Wind", "status": "queued", "graph_state": {}}
+    graph_input = main.build_initial_graph_input(task_id, "Wind", bypass_cache=True)
+    graph_input["synthesized_content"] = "Wind turbines got cheaper."
+    node_runs = WORKFLOW_NODE_SECONDS.count(node="generate_document")
+    with patch('backend.main.knowledge_nexus_graph', workflow.compile(checkpointer=MemorySaver())):
+        asyncio.run(main.run_research_workflow_async(task_id, "Wind", graph_input))
+
+    assert active_tasks[task_id]["status"] == "completed"
+    assert WORKFLOW_NODE_SECONDS.count(node="generate_document") == node_runs + 1
+    assert active_tasks[task_id]["llm_tokens"]["completion"] > 0
+    assert client.get(f"/status/{task_id}").json()["llm_tokens"] == active_tasks[task_id]["llm_tokens"]
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'knowledge_nexus_workflow_node_duration_seconds_count{node="generate_document"}' in response.text
+    assert 'knowledge_nexus_external_call_duration_seconds_count{service="chat",provider="openai"}' in response.text
+    assert "knowledge_nexus_workflow_queue_depth 0" in response.text
+    assert "# TYPE knowledge_nexus_task_llm_tokens histogram" in response.text
+    del active_tasks[task_id]
+
+def test_pool_mode_commits_the_task_record_before_enqueueing_its_run():
+    from backend import main
+    calls = []
+    queue = MagicMock()
+    queue.enqueue.side_effect = lambda *args, **kwargs: calls.append("enqueue") or 1
+    with patch('backend.main.task_queue', queue), \
+         patch.object(main.active_tasks, 'flush', side_effect=lambda: calls.append("flush")):
+        assert main.schedule_workflow("test_pool_task", "Tides", None) == 1
+    assert calls == ["flush", "enqueue"]
+
+def test_pool_mode_waits_on_the_store_and_queue_outside_the_event_loop():
+    import threading
+    import uuid
+    from backend import main
+    threads = {}
+    queue = MagicMock()
+    # The capacity check runs on the event loop's thread.
+    queue.is_full.side_effect = lambda: threads.setdefault("loop", threading.current_thread()) is None
+    queue.enqueue.side_effect = lambda *args, **kwargs: threads.setdefault("enqueue", threading.current_thread()) and 1
+    event_log = MagicMock()
+    event_log.append.side_effect = lambda *args, **kwargs: threads.setdefault("append", threading.current_thread())
+    claim_topic = main.active_tasks.claim_topic
+    with patch('backend.main.knowledge_nexus_graph', MagicMock()), \
+         patch('backend.main.chroma_service_instance', MagicMock()), \
+         patch('backend.main.task_queue', queue), \
+         patch('backend.main.progress_event_log', event_log), \
+         patch.object(main.active_tasks, 'claim_topic',
+                      side_effect=lambda *args: threads.setdefault("claim", threading.current_thread()) and claim_topic(*args)):
+        response = client.post("/research", json={"topic": f"Pool Topic {uuid.uuid4()}"})
+
+    assert response.status_code == 202
+    loop_thread = threads.pop("loop")
+    assert set(threads) == {"claim", "enqueue", "append"}
+    assert loop_thread not in threads.values()
+    del active_tasks[response.json()["task_id"]]
+
+def test_checkpoints_are_discarded_when_a_run_fails():
+    import asyncio
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.graph import StateGraph, END
+    from backend import main
+    from backend.agents.types import KnowledgeNexusState
+
+    workflow = StateGraph(KnowledgeNexusState)
+    workflow.add_node("research", lambda state: {"error_message": "Search quota exhausted.", "current_stage": "researching"})
+    workflow.set_entry_point("research")
+    workflow.add_edge("research", END)
+    graph = workflow.compile(checkpointer=MemorySaver())
+
+    task_id = "test_failed_run_checkpoints"
+    config = {"configurable": {"thread_id": task_id}}
+    active_tasks[task_id] = {"task_id": task_id, "topic": "Tides", "status": "queued", "graph_state": {}}
+    with patch('backend.main.knowledge_nexus_graph', graph):
+        asyncio.run(main.run_research_workflow_async(task_id, "Tides", main.build_initial_graph_input(task_id, "Tides")))
+        assert active_tasks[task_id]["status"] == "error_in_workflow"
+        assert list(graph.checkpointer.list(config)) == []
+
+        # Deleting (or TTL-evicting) a task drops the checkpoints of a run that never finished.
+        graph.invoke(main.build_initial_graph_input(task_id, "Tides"), config)
+        assert list(graph.checkpointer.list(config)) != []
+        del active_tasks[task_id]
+        assert list(graph.checkpointer.list(config)) == []
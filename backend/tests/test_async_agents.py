@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+
+from backend.agents.workflow_agents.document_generation_agent import DocumentGenerationAgent
+from backend.agents.workflow_agents.research_agent import ResearchAgent
+from backend.agents.workflow_agents.synthesis_agent import SynthesisAgent
+
+
+class _AsyncOnlySearch:
+    def search(self, topic, num_results=10):
+        raise AssertionError("sync search should not be used by aexecute")
+
+    async def asearch(self, topic, num_results=10):
+        return [{"id": "r1", "url": "http://example.com/1", "title": "One", "snippet": f"About {topic}"}], None
+
+
+class _AsyncOnlyStorage:
+    def __init__(self):
+        self.stored = []
+
+    def is_initialized(self):
+        return True
+
+    def add_research_data(self, task_id, research_items, topic, tenant=None):
+        raise AssertionError("sync storage should not be used by aexecute")
+
+    async def aadd_research_data(self, task_id, research_items, topic, tenant=None):
+        self.stored.extend(research_items)
+        return True, None
+
+
+class _AsyncOnlyLLM:
+    def __init__(self, error=None):
+        self.prompts = []
+        self.error = error
+
+    def is_initialized(self):
+        return True
+
+    def invoke(self, prompt, use_cache=True):
+        raise AssertionError("sync invoke should not be used by aexecute")
+
+    async def ainvoke(self, prompt, use_cache=True):
+        self.prompts.append(prompt)
+        if self.error:
+            return None, self.error
+        return f"LLM output #{len(self.prompts)}", None
+
+
+class TestAsyncAgents(unittest.TestCase):
+
+    def test_research_aexecute_uses_async_services(self):
+        storage = _AsyncOnlyStorage()
+        agent = ResearchAgent(search_service=_AsyncOnlySearch(), storage_service=storage)
+        state = asyncio.run(agent.aexecute({"topic": "solar", "task_id": "t1", "research_data": [], "sources_explored": 0}))
+
+        self.assertIsNone(state["error_message"])
+        self.assertEqual(state["data_collected"], 1)
+        self.assertEqual(state["sources_explored"], 1)
+        self.assertEqual([item["id"] for item in storage.stored], ["r1"])
+
+    def test_research_aexecute_stores_each_streamed_page(self):
+        class _PagedSearch(_AsyncOnlySearch):
+            async def astream_search(self, topic, num_results=10):
+                yield [{"id": "p1", "url": "http://example.com/1", "snippet": "one"}], None
+                yield [], "page 2 failed"
+                yield [{"id": "p3", "url": "http://example.com/3", "snippet": "three"}], None
+
+        storage = _AsyncOnlyStorage()
+        agent = ResearchAgent(search_service=_PagedSearch(), storage_service=storage)
+        state = asyncio.run(agent.aexecute({"topic": "solar", "task_id": "t1", "research_data": [], "sources_explored": 0}))
+
+        self.assertIsNone(state["error_message"])
+        self.assertEqual([item["id"] for item in state["research_data"]], ["p1", "p3"])
+        self.assertEqual([item["id"] for item in storage.stored], ["p1", "p3"])
+        self.assertEqual(state["storage_counts"], {"new": 2, "updated": 0, "skipped": 0})
+
+    def test_research_aexecute_reports_upsert_counts(self):
+        class _UpsertStorage(_AsyncOnlyStorage):
+            async def aupsert_research_data(self, task_id, research_items, topic, tenant=None):
+                return {"new": 0, "updated": 1, "skipped": len(research_items) - 1}, None
+
+        agent = ResearchAgent(search_service=_AsyncOnlySearch(), storage_service=_UpsertStorage())
+        state = asyncio.run(agent.aexecute({"topic": "solar", "task_id": "t1", "research_data": [], "sources_explored": 0}))
+
+        self.assertIsNone(state["error_message"])
+        self.assertEqual(state["storage_counts"], {"new": 0, "updated": 1, "skipped": 0})
+
+    def test_research_searches_only_for_what_the_knowledge_base_lacks(self):
+        class _RecordingSearch(_AsyncOnlySearch):
+            requested = []
+
+            async def asearch(self, topic, num_results=10):
+                self.requested.append(num_results)
+                return [{"id": "kb1", "url": "http://example.com/kb1", "snippet": "known"},
+                        {"id": "web1", "url": "http://example.com/web1", "snippet": "new"}], None
+
+        class _KnowledgeBaseStorage(_AsyncOnlyStorage):
+            async def afind_reusable_research(self, topic, n_results=10, tenant=None):
+                return [{"id": f"kb{i}", "url": f"http://example.com/kb{i}", "snippet": "known"} for i in range(1, 16)], None
+
+        search, storage = _RecordingSearch(), _KnowledgeBaseStorage()
+        agent = ResearchAgent(search_service=search, storage_service=storage)
+        state = asyncio.run(agent.aexecute({"topic": "solar", "task_id": "t1", "research_data": [], "sources_explored": 0,
+                                            "num_search_results": 20}))
+
+        self.assertEqual(search.requested, [5])
+        self.assertEqual([item["id"] for item in storage.stored], ["web1"])
+        self.assertEqual((state["sources_explored"], state["data_collected"]), (16, 16))
+        self.assertEqual((state["sources_reused"], state["search_calls_saved"]), (15, 1))
+
+        search.requested.clear()
+        state = asyncio.run(agent.aexecute({"topic": "solar", "task_id": "t2", "research_data": [], "sources_explored": 0,
+                                            "num_search_results": 20, "bypass_cache": True}))
+        self.assertEqual(search.requested, [20])
+        self.assertNotIn("sources_reused", state)
+
+    def test_synthesis_and_document_aexecute(self):
+        llm = _AsyncOnlyLLM()
+        state = {"task_id": "t1", "topic": "solar", "verified_data": [{"snippet": "Solar is growing."}], "detected_conflicts": []}
+        state = asyncio.run(SynthesisAgent(llm_service=llm).aexecute(state))
+        state = asyncio.run(DocumentGenerationAgent(llm_service=llm).aexecute(state))
+
+        self.assertEqual(state["synthesized_content"], "LLM output #1")
+        self.assertEqual(state["final_document"], "LLM output #2")
+        self.assertIn("LLM output #1", llm.prompts[1])
+
+    def test_document_aexecute_falls_back_on_llm_error(self):
+        llm = _AsyncOnlyLLM(error="timeout")
+        state = {"task_id": "t1", "topic": "solar", "synthesized_content": "Solar summary.", "detected_conflicts": []}
+        state = asyncio.run(DocumentGenerationAgent(llm_service=llm).aexecute(state))
+
+        self.assertEqual(state["error_message"], "LLM formatting error: timeout")
+        self.assertTrue(state["final_document"].startswith("## Final Report on: solar"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from backend.benchmarks import agents as agent_benchmarks
+from backend.benchmarks.metrics import HIGHER_IS_BETTER, LOWER_IS_BETTER, EventLoopLagMonitor, compare_to_baseline, summarize
+from backend.benchmarks.pipeline import default_topics, stage_durations
+
+
+class TestBenchmarkMetrics(unittest.TestCase):
+
+    def test_summary_percentiles(self):
+        summary = summarize([float(value) for value in range(1, 101)])
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50"], 50.5)
+        self.assertAlmostEqual(summary["p99"], 99.01)
+        self.assertEqual(summary["max"], 100.0)
+        self.assertEqual(summarize([])["p95"], 0.0)
+
+    def test_baseline_comparison_uses_direction_tolerance_and_slack(self):
+        gates = {"tasks_per_second": (HIGHER_IS_BETTER, 0.0), "latency.*.p95": (LOWER_IS_BETTER, 0.01)}
+        baseline = {"tasks_per_second": 10.0, "latency": {"research": {"p95": 1.0}, "verify": {"p95": 0.001}}, "peak_rss_mb": 100}
+        current = {"tasks_per_second": 8.5, "latency": {"research": {"p95": 1.05}, "verify": {"p95": 0.004}}, "peak_rss_mb": 500}
+
+        regressions = compare_to_baseline(current, baseline, gates, tolerance=0.10)
+        # Throughput fell 15%; research latency is within tolerance, verify within the slack; RSS is not gated.
+        self.assertEqual([regression["metric"] for regression in regressions], ["tasks_per_second"])
+        self.assertAlmostEqual(regressions[0]["change"], -0.15)
+        self.assertEqual(compare_to_baseline(baseline, baseline, gates, tolerance=0.0), [])
+
+    def test_event_loop_lag_shows_blocking_work(self):
+        async def blocked_loop():
+            monitor = EventLoopLagMonitor(interval=0.01)
+            monitor.start()
+            await asyncio.sleep(0.02)
+            time.sleep(0.1)  # blocks the loop
+            await asyncio.sleep(0.02)
+            await monitor.stop()
+            return monitor.samples_ms
+
+        self.assertGreater(max(asyncio.run(blocked_loop())), 50)
+
+
+class TestPipelineBenchmark(unittest.TestCase):
+
+    def test_stage_durations_from_progress_events(self):
+        start = datetime(2026, 1, 1)
+        at = lambda seconds: start + timedelta(seconds=seconds)
+        timeline = [(at(0.01), "queued", 1), (at(0.5), "queued", None), (at(2.5), "researching", None),
+                    (at(3.0), "verifying", None), (at(4.0), "verifying", None),  # streamed synthesis text
+                    (at(6.0), "synthesizing", None), (at(6.1), "completed", None)]
+        durations = stage_durations(start, timeline)
+        self.assertEqual(list(durations), ["queued", "researching", "verifying", "synthesizing", "completed"])
+        self.assertAlmostEqual(durations["queued"], 0.5)
+        self.assertAlmostEqual(durations["researching"], 2.0)
+        self.assertAlmostEqual(durations["synthesizing"], 3.0)
+
+    def test_default_topics_are_distinct(self):
+        topics = default_topics(250)
+        self.assertEqual(len(set(topics)), 250)
+        self.assertEqual(topics, default_topics(250))
+
+
+class TestAgentBenchmarks(unittest.TestCase):
+
+    def test_every_case_runs_on_small_states(self):
+        metrics = agent_benchmarks.run(list(agent_benchmarks.CASES), [10, 50], min_time=0.0, min_rounds=2, max_rounds=2)
+        self.assertEqual(set(metrics), set(agent_benchmarks.CASES))
+        for rows in metrics.values():
+            self.assertEqual(rows["50"]["rounds"], 2)
+            self.assertGreater(rows["50"]["median_ms"], 0)
+
+    def test_cases_do_the_measured_work(self):
+        items = agent_benchmarks.synthetic_items(20)
+        setup, run = agent_benchmarks.human_input_case(items)
+        state = run(setup())
+        self.assertEqual(state["verified_data"][-1]["status"], "verified_by_human")
+        self.assertNotIn("status", items[-1])  # the shared items are left untouched
+
+        setup, run = agent_benchmarks.research_case(items)
+        self.assertEqual(run(setup())["data_collected"], 20)
+
+    def test_scaling_exponent(self):
+        sizes = [10, 1000, 10000, 100000]
+        self.assertAlmostEqual(agent_benchmarks.scaling_exponent(sizes, [1e-9 * size ** 2 for size in sizes]), 2.0)
+        self.assertAlmostEqual(agent_benchmarks.scaling_exponent([10, 100], [1.0, 10.0]), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Optional, TypedDict
+
+from langgraph.graph import StateGraph, END
+
+from backend.agents.checkpointing import CompactStateSerializer, SqliteCheckpointSaver
+
+
+class _State(TypedDict, total=False):
+    research_runs: int
+    human_in_loop_needed: bool
+    human_feedback: Optional[dict]
+    synthesized: bool
+
+
+class TestCompactStateSerializer(unittest.TestCase):
+
+    def test_roundtrip_small_and_large_values(self):
+        serde = CompactStateSerializer(compress_threshold=256)
+        small = {"current_stage": "verifying"}
+        large = {"research_data": [{"id": str(i), "snippet": "lorem ipsum " * 10} for i in range(50)]}
+
+        small_type, _ = serde.dumps_typed(small)
+        large_type, large_bytes = serde.dumps_typed(large)
+
+        self.assertFalse(small_type.endswith("+zlib"))
+        self.assertTrue(large_type.endswith("+zlib"))
+        self.assertEqual(serde.loads_typed(serde.dumps_typed(small)), small)
+        self.assertEqual(serde.loads_typed((large_type, large_bytes)), large)
+
+
+class TestSqliteCheckpointResume(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _build_graph(self, saver):
+        def research(state):
+            self.calls.append("research")
+            state["research_runs"] = state.get("research_runs", 0) + 1
+            state["human_in_loop_needed"] = True
+            return state
+
+        def await_human_input(state):
+            self.calls.append(f"await_human_input:{(state.get('human_feedback') or {}).get('approved')}")
+            state["human_in_loop_needed"] = False
+            state["human_feedback"] = None
+            return state
+
+        def synthesize(state):
+            self.calls.append("synthesize")
+            state["synthesized"] = True
+            return state
+
+        workflow = StateGraph(_State)
+        workflow.add_node("research", research)
+        workflow.add_node("await_human_input", await_human_input)
+        workflow.add_node("synthesize", synthesize)
+        workflow.set_entry_point("research")
+        workflow.add_conditional_edges("research", lambda s: "hitl" if s.get("human_in_loop_needed") else "go",
+                                       {"hitl": "await_human_input", "go": "synthesize"})
+        workflow.add_edge("await_human_input", "synthesize")
+        workflow.add_edge("synthesize", END)
+        return workflow.compile(checkpointer=saver, interrupt_before=["await_human_input"])
+
+    def test_resume_skips_already_executed_nodes_across_saver_instances(self):
+        path = os.path.join(self.tmp_dir, "checkpoints.sqlite3")
+        config = {"configurable": {"thread_id": "task-1"}}
+
+        async def first_run():
+            graph = self._build_graph(SqliteCheckpointSaver(path=path))
+            async for _ in graph.astream({"research_runs": 0}, config=config):
+                pass
+            return (await graph.aget_state(config)).next
+
+        async def resume():
+            graph = self._build_graph(SqliteCheckpointSaver(path=path))  # simulates a process restart
+            await graph.aupdate_state(config, {"human_feedback": {"approved": True}})
+            final = None
+            async for event in graph.astream(None, config=config):
+                final = event
+            return final
+
+        self.assertEqual(asyncio.run(first_run()), ("await_human_input",))
+        final = asyncio.run(resume())
+
+        self.assertEqual(self.calls, ["research", "await_human_input:True", "synthesize"])
+        self.assertEqual(final["synthesize"]["research_runs"], 1)
+        self.assertTrue(final["synthesize"]["synthesized"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from backend.agents.storage_service import StorageService
+from backend.services.chroma_service import ChromaService, get_chroma_service
+
+
+class TestCollectionHandleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = ChromaService(persist_directory=self.tmp_dir, embedding_backend="hashing", collection_cache_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_handles_are_reused_and_least_recently_used_are_dropped(self):
+        with patch.object(self.service.client, "get_or_create_collection", wraps=self.service.client.get_or_create_collection) as open_collection:
+            self.service.add_documents("coll_a", ["apples"], [{"k": "a"}], ["a1"])
+            self.service.query_documents("coll_a", ["apples"], n_results=1)
+            self.service.get_document_by_id("coll_a", "a1")
+            self.assertEqual(open_collection.call_count, 1)
+
+            self.service.get_or_create_collection("coll_b")
+            self.service.get_or_create_collection("coll_c")  # evicts coll_a
+            self.service.get_or_create_collection("coll_a")
+            self.assertEqual(open_collection.call_count, 4)
+
+    def test_deleted_collection_is_not_served_from_cache(self):
+        self.service.add_documents("coll_a", ["apples"], [{"k": "a"}], ["a1"])
+        self.service.delete_collection("coll_a")
+
+        self.assertIsNone(self.service.get_collection("coll_a"))
+        self.assertTrue(self.service.add_documents("coll_a", ["pears"], [{"k": "p"}], ["p1"]))
+        self.assertEqual(self.service.count_documents("coll_a"), 1)
+
+
+class TestUpsertDocuments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = ChromaService(persist_directory=self.tmp_dir, embedding_backend="hashing")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_only_new_and_changed_documents_are_embedded(self):
+        embedding_class = type(self.service.embedding_function)
+        embed_texts = embedding_class.__call__
+        embedded = []
+
+        def recording_call(self, input):  # chromadb checks this exact signature
+            embedded.append(list(input))
+            return embed_texts(self, input)
+
+        with patch.object(embedding_class, "__call__", recording_call):
+            counts = self.service.upsert_documents("coll_a", ["apples", "pears", "apples again"],
+                                                   [{"k": "a"}, {"k": "p"}, {"k": "a2"}], ["a", "p", "a"])
+            self.assertEqual(counts, {"new": 2, "updated": 0, "skipped": 1})
+            self.assertEqual(embedded, [["apples", "pears"]])
+
+            counts = self.service.upsert_documents("coll_a", ["apples", "ripe pears"], [{"k": "a"}, {"k": "p"}], ["a", "p"])
+            self.assertEqual(counts, {"new": 0, "updated": 1, "skipped": 1})
+            self.assertEqual(embedded[-1], ["ripe pears"])
+
+            counts = asyncio.run(self.service.aupsert_documents("coll_a", ["apples", "ripe pears"], [{"k": "a2"}, {"k": "p"}], ["a", "p"]))
+            self.assertEqual(counts, {"new": 0, "updated": 0, "skipped": 2})
+            self.assertEqual(len(embedded), 2)
+
+        self.assertEqual(self.service.count_documents("coll_a"), 2)
+        self.assertEqual(self.service.get_document_by_id("coll_a", "p")["document"], "ripe pears")
+        self.assertEqual(self.service.get_document_by_id("coll_a", "a")["metadata"]["k"], "a2")  # metadata of skipped documents is refreshed
+
+
+class TestSharedChromaService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_one_client_and_service_per_directory(self):
+        service = get_chroma_service(self.tmp_dir, embedding_backend="hashing")
+        self.assertIs(get_chroma_service(self.tmp_dir, embedding_backend="hashing"), service)
+        self.assertIs(ChromaService(self.tmp_dir, embedding_backend="hashing").client, service.client)
+
+        storage = StorageService(chroma_service=service)
+        self.assertIs(storage.chroma_service, service)
+        self.assertTrue(storage.is_initialized())
+        with patch.dict(os.environ, {"EMBEDDING_BACKEND": "hashing"}):
+            self.assertIs(StorageService(persist_directory=self.tmp_dir).chroma_service, service)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from backend.agents.workflow_agents.synthesis_agent import SynthesisAgent
+from backend.services.context_selector import ContextSelector, item_tokens, mmr_order
+from backend.services.embedding_backends import HashingEmbeddingFunction
+
+
+def verified_items():
+    return [
+        {"id": "solar-1", "title": "Solar", "snippet": "solar panels convert sunlight into electricity on rooftops"},
+        {"id": "solar-2", "title": "Solar", "snippet": "solar panels convert sunlight into electricity on rooftops today"},
+        {"id": "storage", "title": "Storage", "snippet": "solar panels paired with home batteries store electricity for the night"},
+        {"id": "cooking", "title": "Cooking", "snippet": "a recipe for lemon cake with butter and flour"},
+    ]
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def is_initialized(self):
+        return True
+
+    def invoke(self, prompt, use_cache=True):
+        self.prompts.append(prompt)
+        return "summary", None
+
+    async def ainvoke(self, prompt, use_cache=True):
+        return self.invoke(prompt, use_cache)
+
+
+class TestMMROrder(unittest.TestCase):
+
+    def test_near_duplicates_are_pushed_down(self):
+        vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.6, 0.8]], dtype=np.float32)
+        relevance = np.array([0.9, 0.89, 0.7], dtype=np.float32)
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=1.0), [0, 1, 2])
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=0.5), [0, 2, 1])
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=0.5, limit=2), [0, 2])
+
+
+class TestContextSelector(unittest.TestCase):
+
+    def test_everything_is_kept_when_it_fits(self):
+        embedding_function = HashingEmbeddingFunction(dimensions=256)
+        items = verified_items()
+        selected, report = ContextSelector(embedding_function, token_budget=10000).select("solar panels", items)
+        self.assertEqual(selected, items)
+        self.assertEqual(report["dropped"], [])
+        self.assertFalse(report["ranked"])
+
+    def test_relevant_diverse_items_fill_the_budget(self):
+        items = verified_items()
+        budget = item_tokens(items[0]) + item_tokens(items[2]) + 1
+        selector = ContextSelector(HashingEmbeddingFunction(dimensions=256), token_budget=budget, top_k=3, mmr_lambda=0.5)
+
+        selected, report = selector.select("solar panels electricity", items)
+        self.assertEqual([item["id"] for item in selected], ["solar-1", "storage"])
+        self.assertEqual({entry["id"]: entry["reason"] for entry in report["dropped"]}, {"solar-2": "token_budget", "cooking": "top_k"})
+        self.assertLessEqual(report["tokens"], budget)
+        self.assertTrue(report["ranked"])
+
+        self.assertEqual(asyncio.run(selector.aselect("solar panels electricity", items)), (selected, report))
+
+    def test_original_order_without_embeddings(self):
+        items = verified_items()
+        selected, report = ContextSelector(token_budget=item_tokens(items[0])).select("solar", items)
+        self.assertEqual([item["id"] for item in selected], ["solar-1"])
+        self.assertEqual([entry["reason"] for entry in report["dropped"]], ["token_budget"] * 3)
+
+    def test_synthesis_prompt_only_quotes_selected_items(self):
+        items = verified_items()
+        llm = _FakeLLM()
+        selector = ContextSelector(HashingEmbeddingFunction(dimensions=256), token_budget=item_tokens(items[3]) + 1)
+        state = SynthesisAgent(llm_service=llm, context_selector=selector).execute({"task_id": "t1", "topic": "lemon cake", "verified_data": items})
+
+        self.assertEqual(state["synthesized_content"], "summary")
+        self.assertIn("lemon cake", llm.prompts[0])
+        self.assertNotIn("rooftops", llm.prompts[0])
+        self.assertEqual(state["synthesis_context"]["selected"], 1)
+        self.assertEqual(len(state["synthesis_context"]["dropped"]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from backend.benchmarks.embedding_backends import noisy_queries, recall_at_k, synthetic_corpus
+from backend.services import embedding_backends
+from backend.services.chroma_service import ChromaService
+from backend.services.embedding_backends import HashingEmbeddingFunction, create_embedding_function, hash_embed
+
+
+class TestHashingEmbeddingFunction(unittest.TestCase):
+
+    def test_vectors_are_normalized_deterministic_and_lexically_close(self):
+        function = HashingEmbeddingFunction(dimensions=256)
+        vectors = np.asarray(function(["The red apple is sweet.", "A sweet red apple.", "Qubits in quantum computers.", ""]))
+
+        self.assertEqual(vectors.shape, (4, 256))
+        np.testing.assert_allclose(np.linalg.norm(vectors[:3], axis=1), 1.0, rtol=1e-5)
+        self.assertFalse(vectors[3].any())
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+        np.testing.assert_array_equal(vectors, np.asarray(function(["The red apple is sweet.", "A sweet red apple.", "Qubits in quantum computers.", ""])))
+
+    def test_process_pool_path_matches_inline_vectors(self):
+        texts = [f"snippet {i} about topic {i % 7}" for i in range(40)]
+        with patch.object(embedding_backends, "LOCAL_EMBEDDING_PARALLEL_MIN_TEXTS", 10), \
+             patch.object(embedding_backends, "LOCAL_EMBEDDING_PROCESSES", 2):
+            pooled = HashingEmbeddingFunction(dimensions=64)(texts)
+        np.testing.assert_allclose(np.asarray(pooled), hash_embed(texts, 64))
+
+    def test_recall_on_noisy_copies(self):
+        corpus = synthetic_corpus(300)
+        queries = noisy_queries(corpus, 50)
+        function = HashingEmbeddingFunction()
+        recall = recall_at_k(np.asarray(function(corpus)), np.asarray(function([q for q, _ in queries])),
+                             [target for _, target in queries], [5])
+        self.assertGreaterEqual(recall[5], 0.9)
+
+
+class TestEmbeddingBackendSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_embedding_function("does-not-exist")
+
+    def test_chroma_service_runs_offline_with_hashing_backend(self):
+        azure_vars = ("AZURE_OPENAI_EMBEDDING_API_KEY", "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+        environment = {key: value for key, value in os.environ.items() if key not in azure_vars}
+        environment["EMBEDDING_BACKEND"] = "hashing"
+        with patch.dict(os.environ, environment, clear=True):
+            service = ChromaService(persist_directory=self.tmp_dir)
+
+        self.assertIsInstance(service.embedding_function, HashingEmbeddingFunction)
+        self.assertTrue(service.add_documents("offline_test", ["red apples and pears", "clouds in the blue sky"],
+                                              [{"source": "a"}, {"source": "b"}], ["a", "b"]))
+        results = service.query_documents("offline_test", ["apples"], n_results=1)
+        self.assertEqual(results["ids"], [["a"]])
+        self.assertIsNone(service.embedding_cache_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import chroma_service
+from backend.services.chroma_service import AzureOpenAIEmbeddingFunction, plan_embedding_batches
+from backend.services.embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+def fake_embeddings_response(texts):
+    return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 0.5]) for text in texts])
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "embedding_cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_key_covers_deployment_and_normalized_text(self):
+        base = embedding_cache_key("text-embedding-3-small", "Apples are red.")
+        self.assertEqual(base, embedding_cache_key("text-embedding-3-small", "  Apples   are\nred. "))
+        self.assertNotEqual(base, embedding_cache_key("text-embedding-3-large", "Apples are red."))
+        self.assertNotEqual(base, embedding_cache_key("text-embedding-3-small", "apples are red."))
+
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = EmbeddingCache(self.path, max_bytes=24)  # three 2-dimensional float32 vectors
+        cache.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0], "c": [5.0, 6.0]})
+        self.assertEqual(cache.get_many(["a"]), {"a": [1.0, 2.0]})  # "a" is now the most recently used
+        cache.put_many({"d": [7.0, 8.0]})
+
+        self.assertEqual(cache.get_many(["a", "b", "d"]), {"a": [1.0, 2.0], "d": [7.0, 8.0]})
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (3, 1, 1))
+        cache.close()
+
+    def test_size_total_is_tracked_without_summing_the_table(self):
+        cache = EmbeddingCache(self.path, max_bytes=32)
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        cache.put_many({"a": [1.0, 2.0, 3.0], "b": [4.0, 5.0]})
+        cache.put_many({"a": [1.0]})  # replaced with a shorter vector
+        cache.put_many({"c": [6.0, 7.0, 8.0, 9.0], "d": [1.0, 2.0]})  # evicts "b", the least recently used
+        cache._conn.set_trace_callback(None)
+
+        self.assertFalse([statement for statement in statements if "SUM(" in statement])
+        stored = cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        self.assertEqual(cache.stats()["bytes"], stored)
+        self.assertEqual(stored, 28)
+        cache.close()
+
+
+class TestCachedEmbeddingFunction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = EmbeddingCache(os.path.join(self.tmp_dir, "embedding_cache.sqlite3"))
+        self.function = AzureOpenAIEmbeddingFunction("key", "https://example.openai.azure.com", "2024-02-01",
+                                                     "text-embedding-3-small", cache=self.cache)
+        self.function._client = MagicMock()
+        self.function._client.embeddings.create.side_effect = lambda model, input: fake_embeddings_response(input)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_only_misses_are_sent_and_order_is_kept(self):
+        self.function(["aa", "bbbb"])
+        create = self.function._client.embeddings.create
+        create.reset_mock()
+
+        vectors = self.function(["c", "bbbb", "aa", " c ", "ddd"])
+
+        create.assert_called_once_with(model="text-embedding-3-small", input=["c", "ddd"])
+        self.assertEqual([list(vector) for vector in vectors],
+                         [[1.0, 0.5], [4.0, 0.5], [2.0, 0.5], [1.0, 0.5], [3.0, 0.5]])
+        self.assertEqual(self.function.cache_stats()["hits"], 2)
+
+    def test_fully_cached_batch_skips_the_api(self):
+        self.function(["aa"])
+        self.function._client.embeddings.create.reset_mock()
+        self.assertEqual([list(vector) for vector in self.function(["aa"])], [[2.0, 0.5]])
+        self.function._client.embeddings.create.assert_not_called()
+
+    def test_async_call_shares_the_cache(self):
+        self.function(["aa"])
+        self.function._async_client = MagicMock()
+        self.function._async_client.embeddings.create = AsyncMock(side_effect=lambda model, input: fake_embeddings_response(input))
+
+        vectors = asyncio.run(self.function.acall(["aa", "eeeee"]))
+
+        self.function._async_client.embeddings.create.assert_awaited_once_with(model="text-embedding-3-small", input=["eeeee"])
+        self.assertEqual([list(vector) for vector in vectors], [[2.0, 0.5], [5.0, 0.5]])
+
+
+class TestEmbeddingBatches(unittest.TestCase):
+
+    def setUp(self):
+        self.count_patch = patch.object(chroma_service, "count_tokens", side_effect=len)
+        self.count_patch.start()
+        with patch.dict(os.environ, {"EMBEDDING_CACHE_ENABLED": "false"}):
+            self.function = AzureOpenAIEmbeddingFunction("key", "https://example.openai.azure.com", "2024-02-01",
+                                                         "text-embedding-3-small")
+
+    def tearDown(self):
+        self.count_patch.stop()
+
+    def test_batches_respect_token_and_input_limits(self):
+        texts = ["aaaa", "bbbb", "cc", "dddddddddd", "e", "f", "g"]
+        self.assertEqual(plan_embedding_batches(texts, max_tokens=8, max_inputs=3),
+                         [[0, 1], [2], [3], [4, 5, 6]])
+
+    def test_only_the_failed_batch_is_retried_and_order_is_kept(self):
+        calls = []
+        failures = {"bbbb": 1}
+
+        def create(model, input):
+            calls.append(list(input))
+            if failures.get(input[0]):
+                failures[input[0]] -= 1
+                raise RuntimeError("rate limited")
+            return fake_embeddings_response(input)
+
+        self.function._client = MagicMock()
+        self.function._client.embeddings.create.side_effect = create
+        texts = ["aaaa", "bbbb", "cc", "dddddd"]
+        with patch.object(chroma_service, "EMBEDDING_BATCH_MAX_TOKENS", 6), \
+             patch.object(chroma_service, "EMBEDDING_RETRY_BACKOFF_SECONDS", 0):
+            vectors = self.function(texts)
+
+        self.assertEqual([list(vector)[0] for vector in vectors], [4.0, 4.0, 2.0, 6.0])
+        self.assertEqual(sorted(map(tuple, calls)), [("aaaa",), ("bbbb", "cc"), ("bbbb", "cc"), ("dddddd",)])
+
+    def test_async_batches_raise_after_retries_are_exhausted(self):
+        self.function._async_client = MagicMock()
+        self.function._async_client.embeddings.create = AsyncMock(side_effect=RuntimeError("unavailable"))
+        with patch.object(chroma_service, "EMBEDDING_BATCH_RETRIES", 1), \
+             patch.object(chroma_service, "EMBEDDING_RETRY_BACKOFF_SECONDS", 0):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(self.function.acall(["aaaa"]))
+        self.assertEqual(self.function._async_client.embeddings.create.await_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from backend.agents.llm_service import LLMService
+from backend.services.llm_cache import LLMResponseCache, llm_cache_key
+
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "llm_cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_key_covers_model_deployment_temperature_and_prompt(self):
+        base = llm_cache_key("azure", "gpt-4o", 0.2, "prompt")
+        self.assertEqual(base, llm_cache_key("azure", "gpt-4o", 0.2, "prompt"))
+        self.assertNotEqual(base, llm_cache_key("azure", "gpt-4o-mini", 0.2, "prompt"))
+        self.assertNotEqual(base, llm_cache_key("azure", "gpt-4o", 0.7, "prompt"))
+        self.assertNotEqual(base, llm_cache_key("openai", "gpt-4o", 0.2, "prompt"))
+        self.assertNotEqual(base, llm_cache_key("azure", "gpt-4o", 0.2, "prompt "))
+
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = LLMResponseCache(self.path, max_bytes=30)
+        cache.put("a", "x" * 10)
+        cache.put("b", "y" * 10)
+        cache.put("c", "z" * 10)
+        self.assertEqual(cache.get("a"), "x" * 10)  # "a" is now the most recently used
+        cache.put("d", "w" * 10)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "x" * 10)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+        self.assertLessEqual(stats["bytes"], 30)
+        cache.close()
+
+    def test_size_total_is_tracked_without_summing_the_table(self):
+        cache = LLMResponseCache(self.path, max_bytes=100)
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        cache.put_many({"a": "x" * 30, "b": "y" * 30})
+        cache.put("a", "x" * 10)  # replaced with a smaller response
+        cache.put_many({"c": "z" * 40, "d": "w" * 40})  # evicts "b", the least recently used
+        cache._conn.set_trace_callback(None)
+
+        self.assertFalse([statement for statement in statements if "SUM(" in statement])
+        stored = cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        self.assertEqual(cache.stats()["bytes"], stored)
+        self.assertEqual(stored, 90)
+        cache.clear()
+        self.assertEqual(cache.stats()["bytes"], 0)
+        cache.close()
+
+    def test_entries_survive_reopen(self):
+        cache = LLMResponseCache(self.path)
+        cache.put("k", "cached answer")
+        cache.close()
+        reopened = LLMResponseCache(self.path)
+        self.assertEqual(reopened.get("k"), "cached answer")
+        reopened.close()
+
+
+class TestLLMServiceCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = LLMResponseCache(os.path.join(self.tmp_dir, "llm_cache.sqlite3"))
+        self.service = LLMService(cache=self.cache)
+        self.service.llm = FakeListChatModel(responses=["first", "second", "third"])
+        self.service.llm_type = "openai"
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_identical_prompt_is_served_from_cache(self):
+        self.assertEqual(self.service.invoke("summarize"), ("first", None))
+        self.assertEqual(self.service.invoke("summarize"), ("first", None))
+        self.assertEqual(asyncio.run(self.service.ainvoke("summarize")), ("first", None))
+        self.assertEqual(self.service.cache_stats()["hits"], 2)
+
+    def test_bypass_skips_cache(self):
+        self.service.invoke("summarize")
+        self.assertEqual(self.service.invoke("summarize", use_cache=False), ("second", None))
+        self.assertEqual(self.service.cache_stats()["hits"], 0)
+
+
+    def test_derived_results_are_keyed_by_kind_and_content_hash(self):
+        self.service.put_cached_result("source_summary_v1", "abc", "short summary")
+        self.assertEqual(self.service.get_cached_result("source_summary_v1", "abc"), "short summary")
+        self.assertIsNone(self.service.get_cached_result("source_summary_v2", "abc"))
+        self.service.llm_type, self.service.model_name = "openai", "another-model"
+        self.service.llm = FakeListChatModel(responses=["x"])
+        self.assertIsNone(self.service.get_cached_result("source_summary_v1", "abc"))
+
+    def test_derived_results_are_read_and_written_in_batches(self):
+        self.service.put_cached_results("source_summary_v1", {"a": "summary a", "b": "summary b"})
+        self.assertEqual(self.service.get_cached_results("source_summary_v1", ["a", "b", "c"]), {"a": "summary a", "b": "summary b"})
+        self.assertEqual(self.service.get_cached_result("source_summary_v1", "b"), "summary b")
+        stats = self.service.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+
+    def test_streamed_response_is_cached_once_complete(self):
+        chunks = list(self.service.stream("summarize"))
+        self.assertEqual(chunks, list("first"))
+        self.assertEqual(self.service.invoke("summarize"), ("first", None))
+
+        received = []
+        self.assertEqual(asyncio.run(self.service.ainvoke("summarize", on_chunk=received.append)), ("first", None))
+        self.assertEqual(received, ["first"])  # a cached response arrives as one chunk
+        self.assertEqual(self.service.invoke("summarize", use_cache=False, on_chunk=received.append), ("second", None))
+        self.assertEqual("".join(received[1:]), "second")
+
+    def test_stream_without_llm_reports_an_error(self):
+        self.service.llm = None
+        with self.assertRaises(RuntimeError):
+            list(self.service.stream("summarize"))
+        self.assertEqual(self.service.invoke("summarize", on_chunk=print)[0], None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+
+from backend.agents.llm_service import LLMService
+from backend.services import llm_resilience
+from backend.services.llm_resilience import CircuitBreaker, LLMResilience, backoff_delay, is_rejected_request, is_retryable, \
+    retry_after_seconds
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class _FailingLLM:
+    """Raises the given errors in turn, then answers."""
+
+    def __init__(self, *errors, answer="primary answer"):
+        self.errors = list(errors)
+        self.answer = answer
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content=self.answer)
+
+    def invoke(self, prompt):
+        return self._next()
+
+    async def ainvoke(self, prompt):
+        return self._next()
+
+    def stream(self, prompt):
+        yield self._next()
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable(_StatusError(429)))
+        self.assertTrue(is_retryable(_StatusError(503)))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(_StatusError(400)))
+        self.assertFalse(is_retryable(ValueError("bad prompt")))
+
+    def test_only_request_shape_errors_are_rejections(self):
+        for status in (400, 413, 422):
+            self.assertTrue(is_rejected_request(_StatusError(status)))
+        self.assertTrue(is_rejected_request(ValueError("Azure has not provided the response due to a content filter being triggered")))
+        for error in (_StatusError(401), _StatusError(403), _StatusError(404), _StatusError(503), RuntimeError("boom")):
+            self.assertFalse(is_rejected_request(error))
+
+    def test_retry_after_is_respected_and_capped(self):
+        self.assertEqual(retry_after_seconds(_StatusError(429, {"retry-after": "7"})), 7.0)
+        self.assertEqual(retry_after_seconds(_StatusError(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertIsNone(retry_after_seconds(_StatusError(503)))
+        self.assertEqual(backoff_delay(0, retry_after=7.0, max_delay=20), 7.0)
+        self.assertEqual(backoff_delay(0, retry_after=60.0, max_delay=20), 20)
+        for attempt in range(5):
+            self.assertLessEqual(backoff_delay(attempt, base_delay=0.5, max_delay=4), min(4, 0.5 * 2 ** attempt))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures_and_closes_after_a_good_trial(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        with patch.object(llm_resilience.time, "monotonic", return_value=llm_resilience.time.monotonic() + 31):
+            self.assertEqual(breaker.state, "half_open")
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())  # one trial call at a time
+            breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_non_retryable_errors_leave_the_circuit_alone(self):
+        resilience = LLMResilience(max_attempts=1, failure_threshold=1, reset_seconds=30)
+        breaker = resilience.breaker("azure")
+        breaker.record_failure()
+        with patch.object(llm_resilience.time, "monotonic", return_value=llm_resilience.time.monotonic() + 31):
+            plan = resilience.plan([("azure", None)])
+            self.assertIsNotNone(plan.next_attempt())  # the half-open trial
+            plan.failed(_StatusError(400))
+            self.assertEqual(breaker.state, "half_open")
+            self.assertTrue(breaker.allow())  # the trial slot was given back
+
+
+@patch.object(llm_resilience, "LLM_RETRY_BASE_DELAY_SECONDS", 0.0)
+class TestLLMServiceFailover(unittest.TestCase):
+
+    def service(self, primary, fallback_answers=("fallback answer",)):
+        service = LLMService(resilience=LLMResilience(max_attempts=2, failure_threshold=2, reset_seconds=60))
+        service.llm, service.llm_type = primary, "azure"
+        service.fallback_llms = {"openai": FakeListChatModel(responses=list(fallback_answers))}
+        return service
+
+    def test_transient_error_is_retried_on_the_same_provider(self):
+        primary = _FailingLLM(_StatusError(429, {"retry-after": "0"}))
+        service = self.service(primary)
+        self.assertEqual(service.invoke("prompt", use_cache=False), ("primary answer", None))
+        self.assertEqual(primary.calls, 2)
+        stats = service.resilience_stats()
+        self.assertEqual((stats["retries"], stats["failovers"]), (1, 0))
+        self.assertEqual(stats["circuits"]["azure"], "closed")
+
+    def test_failing_provider_fails_over_and_its_circuit_opens(self):
+        primary = _FailingLLM(_StatusError(503), _StatusError(503), _StatusError(503))
+        service = self.service(primary, fallback_answers=["fallback answer", "second fallback answer"])
+        self.assertEqual(service.invoke("prompt", use_cache=False), ("fallback answer", None))
+        self.assertEqual(asyncio.run(service.ainvoke("prompt", use_cache=False)), ("second fallback answer", None))
+
+        self.assertEqual(primary.calls, 2)  # the open circuit kept the second call away from the primary
+        stats = service.resilience_stats()
+        self.assertEqual((stats["retries"], stats["failovers"], stats["short_circuits"]), (1, 2, 1))
+        self.assertEqual(stats["circuits"]["azure"], "open")
+
+    def test_non_retryable_error_is_neither_retried_nor_failed_over(self):
+        primary = _FailingLLM(_StatusError(400))
+        service = self.service(primary)
+        content, error = service.invoke("prompt", use_cache=False)
+        self.assertIsNone(content)
+        self.assertIn("HTTP 400", error)
+        self.assertEqual(primary.calls, 1)
+        stats = service.resilience_stats()
+        self.assertEqual((stats["retries"], stats["failovers"]), (0, 0))
+
+        with self.assertRaises(RuntimeError):
+            "".join(self.service(_FailingLLM(_StatusError(400))).stream("prompt", use_cache=False))
+
+    def test_provider_specific_errors_fail_over_without_retries(self):
+        for error in (_StatusError(401), _StatusError(404), RuntimeError("unexpected")):
+            primary = _FailingLLM(error)
+            service = self.service(primary)
+            self.assertEqual(service.invoke("prompt", use_cache=False), ("fallback answer", None))
+            self.assertEqual(primary.calls, 1)
+            stats = service.resilience_stats()
+            self.assertEqual((stats["retries"], stats["failovers"]), (0, 1))
+            self.assertEqual(stats["circuits"]["azure"], "closed")
+
+    def test_stream_fails_over_before_the_first_chunk(self):
+        service = self.service(_FailingLLM(_StatusError(502), _StatusError(502)))
+        self.assertEqual("".join(service.stream("prompt", use_cache=False)), "fallback answer")
+
+    def test_stream_failing_after_output_is_not_retried(self):
+        class _BrokenStream:
+            def stream(self, prompt):
+                yield AIMessage(content="partial ")
+                raise _StatusError(502)
+
+            async def astream(self, prompt):
+                yield AIMessage(content="partial ")
+                raise _StatusError(502)
+
+        service = self.service(_BrokenStream())
+        received = []
+        with self.assertRaises(_StatusError):
+            for chunk in service.stream("prompt", use_cache=False):
+                received.append(chunk)
+
+        async def consume():
+            async for chunk in service.astream("prompt", use_cache=False):
+                received.append(chunk)
+
+        with self.assertRaises(_StatusError):
+            asyncio.run(consume())
+        self.assertEqual(received, ["partial ", "partial "])
+        stats = service.resilience_stats()
+        self.assertEqual((stats["failures"], stats["retries"], stats["failovers"]), (2, 0, 0))
+        self.assertEqual(stats["circuits"]["azure"], "open")  # the failures still count against its health
+
+    def test_error_is_returned_when_every_provider_fails(self):
+        service = self.service(_FailingLLM(_StatusError(503), _StatusError(503)))
+        service.fallback_llms = {}
+        content, error = service.invoke("prompt", use_cache=False)
+        self.assertIsNone(content)
+        self.assertIn("HTTP 503", error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from backend.agents.llm_service import LLMService, create_stage_llm_services, stage_llm_settings
+from backend.agents.workflow_agents import synthesis_agent as synthesis_module
+from backend.agents.workflow_agents.document_generation_agent import DocumentGenerationAgent
+from backend.agents.workflow_agents.synthesis_agent import SynthesisAgent
+from backend.services.llm_cache import LLMResponseCache
+
+
+class _RecordingLLM:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def is_initialized(self):
+        return True
+
+    def invoke(self, prompt, use_cache=True):
+        self.prompts.append(prompt)
+        return self.answer, None
+
+    async def ainvoke(self, prompt, use_cache=True):
+        return self.invoke(prompt, use_cache)
+
+
+class TestStageRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = LLMResponseCache(os.path.join(self.tmp_dir, "llm_cache.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_only_configured_stages_get_their_own_service(self):
+        env = {"SUMMARY_LLM_DEPLOYMENT": "gpt-4o-mini", "SUMMARY_LLM_TEMPERATURE": "0", "DOCUMENT_LLM_MODEL": "gpt-4o-mini"}
+        with patch.dict(os.environ, env):
+            self.assertEqual(stage_llm_settings("summary"), {"deployment_name": "gpt-4o-mini", "temperature": 0.0})
+            default = LLMService(cache=self.cache)
+            services = create_stage_llm_services(default)
+
+        self.assertIs(services["synthesis"], default)
+        self.assertIsNot(services["summary"], default)
+        self.assertEqual((services["summary"].deployment_name, services["summary"].temperature), ("gpt-4o-mini", 0.0))
+        self.assertEqual(services["document"].model_name, "gpt-4o-mini")
+        self.assertIs(services["document"].cache, self.cache)
+
+    @patch.object(synthesis_module, "SYNTHESIS_MAP_REDUCE_MIN_SOURCES", 2)
+    def test_map_step_uses_the_summary_service(self):
+        synthesis_llm, summary_llm = _RecordingLLM("synthesis"), _RecordingLLM("[1] first\n[2] second")
+        items = [{"id": f"s{i}", "title": f"source {i}", "snippet": f"text {i}"} for i in range(2)]
+        agent = SynthesisAgent(llm_service=synthesis_llm, summary_llm_service=summary_llm)
+        state = agent.execute({"task_id": "t1", "topic": "solar", "verified_data": items, "bypass_cache": True})
+
+        self.assertEqual(state["synthesized_content"], "synthesis")
+        self.assertEqual(len(summary_llm.prompts), 1)
+        self.assertEqual(len(synthesis_llm.prompts), 1)
+        self.assertIn("second", synthesis_llm.prompts[0])
+
+
+class TestSingleCallPipeline(unittest.TestCase):
+
+    def test_report_is_written_once_and_rendered_locally(self):
+        report = "# Solar\n\nSolar panels got cheaper [Source 1]."
+        synthesis_llm, document_llm = _RecordingLLM(report), _RecordingLLM("formatted")
+        state = {"task_id": "t1", "topic": "solar", "verified_data": [{"id": "s1", "title": "Solar", "snippet": "cheaper panels"}]}
+
+        state = SynthesisAgent(llm_service=synthesis_llm, report_mode=True).execute(state)
+        self.assertIn("Final Report:", synthesis_llm.prompts[0])
+        self.assertTrue(state["synthesis_is_report"])
+
+        state["detected_conflicts"] = [{"type": "numeric", "details": "prices differ"}]
+        state = DocumentGenerationAgent(llm_service=document_llm).execute(state)
+        self.assertEqual(document_llm.prompts, [])
+        self.assertTrue(state["final_document"].startswith(report))
+        self.assertIn("- numeric: prices differ", state["final_document"])
+
+    def test_two_pass_pipeline_still_formats_with_the_llm(self):
+        state = SynthesisAgent(llm_service=_RecordingLLM("summary")).execute(
+            {"task_id": "t1", "topic": "solar", "verified_data": [{"id": "s1", "snippet": "cheaper panels"}]})
+        self.assertFalse(state["synthesis_is_report"])
+        state = DocumentGenerationAgent(llm_service=_RecordingLLM("formatted")).execute(state)
+        self.assertEqual(state["final_document"], "formatted")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import re
+import threading
+import unittest
+from unittest.mock import patch
+
+from backend.agents.workflow_agents import synthesis_agent as synthesis_module
+from backend.agents.workflow_agents.synthesis_agent import SynthesisAgent
+
+
+class _SummarizingLLM:
+    """Answers map prompts with one numbered line per source and records every prompt."""
+
+    def __init__(self, fail_chunks_containing=None):
+        self.prompts = []
+        self.results = {}
+        self.cache_threads = set()
+        self.fail_chunks_containing = fail_chunks_containing
+        self._lock = threading.Lock()
+
+    def is_initialized(self):
+        return True
+
+    def invoke(self, prompt, use_cache=True):
+        with self._lock:
+            self.prompts.append(prompt)
+        if not prompt.startswith("Summarize each"):
+            return "final synthesis", None
+        if self.fail_chunks_containing and self.fail_chunks_containing in prompt:
+            return None, "rate limited"
+        titles = re.findall(r"^\[(\d+)\] \(Title: (.+?)\)$", prompt, re.MULTILINE)
+        return "\n".join(f"[{number}] summary of {title}" for number, title in titles), None
+
+    async def ainvoke(self, prompt, use_cache=True):
+        return self.invoke(prompt, use_cache)
+
+    def get_cached_results(self, kind, content_hashes):
+        self.cache_threads.add(threading.current_thread().name)
+        return {content_hash: self.results[(kind, content_hash)] for content_hash in content_hashes if (kind, content_hash) in self.results}
+
+    def put_cached_results(self, kind, contents):
+        self.cache_threads.add(threading.current_thread().name)
+        self.results.update({(kind, content_hash): content for content_hash, content in contents.items()})
+
+
+def sources(count):
+    return [{"id": f"s{i}", "title": f"source {i}", "snippet": f"full text of source {i}"} for i in range(count)]
+
+
+@patch.object(synthesis_module, "SYNTHESIS_MAP_CHUNK_SIZE", 4)
+@patch.object(synthesis_module, "SYNTHESIS_MAP_REDUCE_MIN_SOURCES", 10)
+class TestMapReduceSynthesis(unittest.TestCase):
+
+    def test_small_source_sets_use_a_single_call(self):
+        llm = _SummarizingLLM()
+        state = SynthesisAgent(llm_service=llm).execute({"task_id": "t1", "topic": "solar", "verified_data": sources(9)})
+        self.assertEqual(len(llm.prompts), 1)
+        self.assertNotIn("synthesis_map_reduce", state)
+
+    def test_sources_are_summarized_in_chunks_then_reduced(self):
+        llm = _SummarizingLLM()
+        state = SynthesisAgent(llm_service=llm).execute({"task_id": "t1", "topic": "solar", "verified_data": sources(10)})
+
+        self.assertEqual(state["synthesized_content"], "final synthesis")
+        self.assertEqual(len(llm.prompts), 4)  # 3 chunks + reduce
+        self.assertIn("summary of source 9", llm.prompts[-1])
+        self.assertNotIn("full text of source", llm.prompts[-1])
+        self.assertEqual(state["synthesis_map_reduce"], {"sources": 10, "summarized": 10, "cached": 0, "chunks": 3})
+
+    def test_cached_summaries_are_reused_by_other_tasks(self):
+        llm = _SummarizingLLM()
+        agent = SynthesisAgent(llm_service=llm)
+        agent.execute({"task_id": "t1", "topic": "solar", "verified_data": sources(10)})
+        llm.prompts.clear()
+
+        llm.cache_threads.clear()
+        state = asyncio.run(agent.aexecute({"task_id": "t2", "topic": "wind", "verified_data": sources(12)}))
+        self.assertEqual(state["synthesis_map_reduce"], {"sources": 12, "summarized": 12, "cached": 10, "chunks": 1})
+        self.assertEqual(len(llm.prompts), 2)
+        # The async path reads and writes the summary cache off the event loop.
+        self.assertTrue(llm.cache_threads)
+        self.assertTrue(all(name.startswith("blocking-io") for name in llm.cache_threads), llm.cache_threads)
+
+        state = agent.execute({"task_id": "t3", "topic": "wind", "verified_data": sources(10), "bypass_cache": True})
+        self.assertEqual(state["synthesis_map_reduce"]["cached"], 0)
+
+    def test_failed_chunk_keeps_the_full_source_text(self):
+        llm = _SummarizingLLM(fail_chunks_containing="source 9")
+        state = SynthesisAgent(llm_service=llm).execute({"task_id": "t1", "topic": "solar", "verified_data": sources(10)})
+
+        self.assertEqual(state["synthesis_map_reduce"]["summarized"], 8)
+        self.assertIn("full text of source 9", llm.prompts[-1])
+        self.assertIn("summary of source 0", llm.prompts[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+from backend.services.metrics import MetricsRegistry, error_kind, estimate_tokens, external_call, record_llm_tokens, \
+    serve_metrics, track_task_tokens, EXTERNAL_CALL_ERRORS, EXTERNAL_CALL_SECONDS, LLM_TOKENS
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_renders_the_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests.", ("path",))
+        requests.inc(path="/a")
+        requests.inc(2, path='/b"c')
+        registry.gauge("queue_depth", "Waiting runs.", function=lambda: 3)
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP requests_total Requests.", "# TYPE requests_total counter"])
+        self.assertIn('requests_total{path="/a"} 1.0', lines)
+        self.assertIn('requests_total{path="/b\\"c"} 2.0', lines)
+        self.assertIn("queue_depth 3.0", lines)
+        self.assertIs(registry.counter("requests_total", "Requests.", ("path",)), requests)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latency.", ("node",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, node="research")
+
+        lines = registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{node="research",le="0.1"} 2.0', lines)
+        self.assertIn('latency_seconds_bucket{node="research",le="1.0"} 3.0', lines)
+        self.assertIn('latency_seconds_bucket{node="research",le="+Inf"} 4.0', lines)
+        self.assertIn('latency_seconds_sum{node="research"} 3.65', lines)
+        self.assertEqual(latency.count(node="research"), 4)
+
+    def test_failing_gauge_does_not_break_the_scrape(self):
+        registry = MetricsRegistry()
+        registry.gauge("broken", "Fails.", function=lambda: 1 / 0)
+        registry.counter("ok_total", "Works.").inc()
+        self.assertIn("ok_total 1.0", registry.render())
+
+    def test_serve_metrics_exposes_the_registry_over_http(self):
+        registry = MetricsRegistry()
+        registry.counter("worker_runs_total", "Runs.").inc(3)
+        server = serve_metrics(0, host="127.0.0.1", registry=registry)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            self.assertIn("worker_runs_total 3.0", response.read().decode())
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/other", timeout=5)
+
+
+class TestExternalCallMetrics(unittest.TestCase):
+
+    def test_external_call_times_attempts_and_counts_errors_by_status(self):
+        calls = EXTERNAL_CALL_SECONDS.count(service="search", provider="test")
+        with external_call("search", "test"):
+            pass
+        with self.assertRaises(_StatusError):
+            with external_call("search", "test"):
+                raise _StatusError(429)
+
+        self.assertEqual(EXTERNAL_CALL_SECONDS.count(service="search", provider="test"), calls + 2)
+        self.assertEqual(EXTERNAL_CALL_ERRORS.value(service="search", provider="test", error="429"), 1)
+        self.assertEqual(error_kind(TimeoutError()), "TimeoutError")
+
+
+class TestTokenMetrics(unittest.TestCase):
+
+    def test_tokens_are_added_to_the_current_task(self):
+        before = LLM_TOKENS.value(provider="tokens-test", kind="prompt")
+        with track_task_tokens() as task_tokens:
+            record_llm_tokens("tokens-test", "x" * 400, "y" * 40)
+            record_llm_tokens("tokens-test", "ignored", "ignored", {"input_tokens": 1000, "output_tokens": 200})
+        record_llm_tokens("tokens-test", "x" * 400, "")  # outside of a task
+
+        self.assertEqual(task_tokens, {"prompt": 1101, "completion": 211})
+        self.assertEqual(LLM_TOKENS.value(provider="tokens-test", kind="prompt"), before + 1202)
+        self.assertEqual(estimate_tokens(""), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+
+from backend.services.progress_broker import ProgressBroker
+
+
+class TestProgressBroker(unittest.TestCase):
+
+    def test_fan_out_to_subscribers(self):
+        async def scenario():
+            broker = ProgressBroker()
+            first = broker.subscribe("t1")
+            second = broker.subscribe("t1")
+            other_task = broker.subscribe("t2")
+            broker.publish("t1", {"status": "researching"})
+            events = [await first.next_event(timeout=1), await second.next_event(timeout=1)]
+            missing = await other_task.next_event(timeout=0.01)
+            return events, missing
+
+        events, missing = asyncio.run(scenario())
+        self.assertEqual([e.data["status"] for e in events], ["researching", "researching"])
+        self.assertIsNone(missing)
+
+    def test_replay_after_last_event_id(self):
+        async def scenario():
+            broker = ProgressBroker()
+            seen = broker.publish("t1", {"status": "researching"})
+            broker.publish("t1", {"status": "verifying"})
+            broker.publish("t1", {"status": "completed"}, terminal=True)
+            with broker.subscribe("t1", last_event_id=seen.id) as subscription:
+                return [await subscription.next_event(timeout=1) for _ in range(2)], broker.subscriber_count("t1")
+
+        events, count_inside = asyncio.run(scenario())
+        self.assertEqual([e.data["status"] for e in events], ["verifying", "completed"])
+        self.assertTrue(events[-1].terminal)
+        self.assertEqual(count_inside, 1)
+
+    def test_slow_subscriber_buffer_is_bounded(self):
+        async def scenario():
+            broker = ProgressBroker(subscriber_buffer=3)
+            subscription = broker.subscribe("t1")
+            for i in range(10):
+                broker.publish("t1", {"step": i})
+            return subscription, [(await subscription.next_event(timeout=1)).data["step"] for _ in range(3)]
+
+        subscription, steps = asyncio.run(scenario())
+        self.assertEqual(steps, [7, 8, 9])
+        self.assertEqual(subscription.dropped, 7)
+
+    def test_idle_task_channels_are_trimmed(self):
+        broker = ProgressBroker(max_tracked_tasks=2)
+        for i in range(5):
+            broker.publish(f"t{i}", {"status": "queued"})
+        self.assertIsNone(broker.last_event("t0"))
+        self.assertIsNotNone(broker.last_event("t4"))
+
+
+if __name__ == '__main__':
+    unittest.main()
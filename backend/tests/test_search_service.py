@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from backend.agents.search_service import SearchService, canonicalize_url, research_item_id
+
+
+def _fake_cse(pages, delays=None, failing_starts=()):
+    """A stand-in for service.cse() serving `pages` (start -> list of links)."""
+    calls = []
+    lock = threading.Lock()
+
+    def list_(q, cx, num, start):
+        request = MagicMock()
+
+        def execute(http=None):
+            with lock:
+                calls.append((start, num))
+            time.sleep((delays or {}).get(start, 0))
+            if start in failing_starts:
+                raise RuntimeError("backend error")
+            return {"items": [{"link": link, "title": link, "snippet": f"snippet {link}"} for link in pages.get(start, [])]}
+
+        request.execute.side_effect = execute
+        return request
+
+    cse = MagicMock()
+    cse.list.side_effect = list_
+    return cse, calls
+
+
+def _service(cse):
+    service = SearchService()
+    service.simulated_search = False
+    service.service = MagicMock()
+    service.service.cse.return_value = cse
+    return service
+
+
+class TestCanonicalizeUrl(unittest.TestCase):
+
+    def test_equivalent_urls_share_a_key(self):
+        self.assertEqual(
+            canonicalize_url("HTTPS://www.Example.com/a/b/?utm_source=x&b=2&a=1#section"),
+            canonicalize_url("https://example.com/a/b?a=1&b=2"),
+        )
+        self.assertNotEqual(canonicalize_url("https://example.com/a?id=1"), canonicalize_url("https://example.com/a?id=2"))
+
+    def test_item_ids_are_derived_from_the_canonical_url(self):
+        self.assertEqual(research_item_id("https://www.example.com/a/?utm_medium=x", "old text"),
+                         research_item_id("https://example.com/a", "new text"))
+        self.assertNotEqual(research_item_id("https://example.com/a"), research_item_id("https://example.com/b"))
+        self.assertEqual(research_item_id(None, "same text"), research_item_id("", "same text"))
+        self.assertNotEqual(research_item_id(None, "one text"), research_item_id(None, "another text"))
+
+    def test_simulated_results_have_distinct_ids(self):
+        service = SearchService()
+        service.simulated_search = True
+        results, error = service.search("solar power", num_results=5)
+        self.assertIsNone(error)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len({result["id"] for result in results}), 5)
+        self.assertEqual(len(service.search("solar power", num_results=1)[0]), 1)
+
+
+class TestPaginatedSearch(unittest.TestCase):
+
+    def test_pages_are_merged_in_rank_order_and_deduplicated(self):
+        pages = {
+            1: [f"https://site.com/{i}" for i in range(10)],
+            11: [f"https://site.com/{i}" for i in range(10, 20)],
+            21: ["https://www.site.com/3/", "https://other.com/x?utm_medium=y", "https://other.com/x"],
+        }
+        # The first page is slowest, so later pages arrive before it.
+        cse, calls = _fake_cse(pages, delays={1: 0.05})
+        results, error = _service(cse).search("topic", num_results=25)
+
+        self.assertIsNone(error)
+        self.assertEqual(sorted(calls), [(1, 10), (11, 10), (21, 5)])
+        urls = [r["url"] for r in results]
+        self.assertEqual(urls[:20], [f"https://site.com/{i}" for i in range(20)])
+        self.assertEqual(urls[20:], ["https://other.com/x?utm_medium=y"])
+        self.assertEqual([r["rank"] for r in results[:3]], [1, 2, 3])
+
+    def test_failed_page_does_not_fail_the_search(self):
+        pages = {1: ["https://a.com/1"], 11: ["https://a.com/2"]}
+        cse, _ = _fake_cse(pages, failing_starts=(11,))
+        results, error = _service(cse).search("topic", num_results=20)
+        self.assertIsNone(error)
+        self.assertEqual([r["url"] for r in results], ["https://a.com/1"])
+
+        cse, _ = _fake_cse({}, failing_starts=(1,))
+        results, error = _service(cse).search("topic", num_results=5)
+        self.assertEqual(results, [])
+        self.assertIn("backend error", error)
+
+    def test_stream_yields_pages_before_the_last_one_completes(self):
+        pages = {1: ["https://a.com/1"], 11: ["https://a.com/2"], 21: ["https://a.com/3"]}
+        cse, _ = _fake_cse(pages, delays={21: 0.3})
+        service = _service(cse)
+
+        async def scenario():
+            started = time.monotonic()
+            arrivals = []
+            async for page_results, _ in service.astream_search("topic", num_results=30):
+                arrivals.append((time.monotonic() - started, [r["url"] for r in page_results]))
+            return arrivals
+
+        arrivals = asyncio.run(scenario())
+        self.assertEqual([urls for _, urls in arrivals], [["https://a.com/1"], ["https://a.com/2"], ["https://a.com/3"]])
+        self.assertLess(arrivals[0][0], 0.25)
+        self.assertGreaterEqual(arrivals[-1][0], 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from unittest.mock import patch
+
+from backend.agents import storage_service as storage_module
+from backend.agents.storage_service import StorageService, shared_collection_name
+from backend.migrate_collections import migrate
+from backend.services.chroma_service import ChromaService
+
+
+def research_items(prefix, count):
+    return [{"id": f"{prefix}-{i}", "snippet": f"{prefix} snippet number {i} about solar panels",
+             "url": f"https://example.com/{prefix}/{i}", "title": f"{prefix} {i}"} for i in range(count)]
+
+
+class TestSharedResearchCollections(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.env_patch = patch.dict(os.environ, {"EMBEDDING_BACKEND": "hashing"})
+        self.env_patch.start()
+        self.storage = StorageService(persist_directory=self.tmp_dir)
+
+    def tearDown(self):
+        self.env_patch.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_tasks_share_one_collection_and_are_filtered_by_metadata(self):
+        self.assertTrue(self.storage.add_research_data("task-a", research_items("a", 3), "Solar power")[0])
+        self.assertTrue(self.storage.add_research_data("task-b", research_items("b", 2), "Solar power")[0])
+        self.assertTrue(self.storage.add_research_data("task-c", research_items("c", 4), "Solar power", tenant="acme")[0])
+
+        self.assertEqual(self.storage.chroma_service.list_collection_names(), [shared_collection_name("hashing_1024")])
+        self.assertEqual(self.storage.get_collection_item_count("task-a"), (3, None))
+        self.assertEqual(self.storage.get_collection_item_count("task-c"), (0, None))
+        self.assertEqual(self.storage.get_collection_item_count("task-c", tenant="acme"), (4, None))
+
+        results, error = self.storage.query_research_data(["solar panels"], n_results=10)
+        self.assertIsNone(error)
+        self.assertEqual({metadata["task_id"] for metadata in results["metadatas"][0]}, {"task-a", "task-b"})
+
+        self.assertEqual(self.storage.clear_storage_for_task("task-a"), (True, None))
+        self.assertEqual(self.storage.get_collection_item_count("task-a"), (0, None))
+        self.assertEqual(self.storage.get_collection_item_count("task-b"), (2, None))
+
+    def test_embedding_spaces_get_separate_collections(self):
+        self.storage.add_research_data("task-a", research_items("a", 2), "Solar power")
+        with patch.dict(os.environ, {"LOCAL_EMBEDDING_DIMENSIONS": "256"}):
+            other = StorageService(chroma_service=ChromaService(persist_directory=self.tmp_dir, embedding_backend="hashing"))
+        self.assertTrue(other.add_research_data("task-b", research_items("b", 3), "Solar power")[0])
+
+        self.assertEqual(sorted(self.storage.chroma_service.list_collection_names()),
+                         [shared_collection_name("hashing_1024"), shared_collection_name("hashing_256")])
+        self.assertEqual(other.get_collection_item_count("task-a"), (0, None))
+        self.assertEqual(other.get_collection_item_count("task-b"), (3, None))
+
+    def test_repeated_items_are_not_stored_twice(self):
+        items = research_items("a", 3)
+        self.assertEqual(self.storage.upsert_research_data("task-a", items, "Solar power"), ({"new": 3, "updated": 0, "skipped": 0}, None))
+
+        items[0] = dict(items[0], snippet="a revised snippet about wind turbines")
+        counts, error = asyncio.run(self.storage.aupsert_research_data("task-a", items + items[1:2], "Solar power"))
+        self.assertIsNone(error)
+        self.assertEqual(counts, {"new": 0, "updated": 1, "skipped": 3})
+        self.assertEqual(self.storage.get_collection_item_count("task-a"), (3, None))
+
+    def test_fresh_similar_items_of_other_tasks_are_reusable(self):
+        self.storage.add_research_data("task-a", research_items("a", 2), "Solar power")
+        self.storage.add_research_data("task-b", research_items("a", 2) + [
+            {"id": "wind", "snippet": "offshore wind turbines", "url": "https://example.com/wind", "title": "Wind"}], "Wind power")
+        self.storage.add_research_data("task-c", research_items("c", 2), "Solar power", tenant="acme")
+
+        items, error = self.storage.find_reusable_research("solar panels", n_results=10, min_similarity=0.3)
+        self.assertIsNone(error)
+        self.assertEqual(sorted(item["id"] for item in items), ["a-0", "a-1"])
+        self.assertTrue(all(item["source_name"] == "Knowledge Base" and item["score"] >= 0.3 for item in items))
+
+        self.assertEqual(len(self.storage.find_reusable_research("solar panels", n_results=1, min_similarity=0.3)[0]), 1)
+        with patch.object(storage_module.time, "time", return_value=storage_module.time.time() + 2 * 3600):
+            self.assertEqual(self.storage.find_reusable_research("solar panels", min_similarity=0.3, max_age_hours=1), ([], None))
+
+    def test_reuse_widens_the_query_when_tasks_stored_the_same_sources(self):
+        snippets = ["solar panels", "solar panels on roofs", "rooftop solar panels and home batteries"]
+        sources = [{"id": f"s{i}", "snippet": snippet, "url": f"https://example.com/{i}", "title": snippet}
+                   for i, snippet in enumerate(snippets)]
+        for task in ("task-a", "task-b", "task-c", "task-d"):
+            self.storage.add_research_data(task, sources, "Solar power")
+
+        items, error = self.storage.find_reusable_research("solar panels", n_results=3, min_similarity=0.0)
+        self.assertIsNone(error)
+        self.assertEqual([item["id"] for item in items], ["s0", "s1", "s2"])
+
+    def test_tenants_are_spread_over_shards(self):
+        with patch.object(storage_module, "RESEARCH_COLLECTION_SHARDS", 4):
+            names = {shared_collection_name("hashing_1024", f"tenant-{i}") for i in range(20)}
+            self.assertEqual(shared_collection_name("hashing_1024", "tenant-1"), shared_collection_name("hashing_1024", "tenant-1"))
+        self.assertLessEqual(len(names), 4)
+        self.assertGreater(len(names), 1)
+
+
+class TestMigrateCollections(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = ChromaService(persist_directory=self.tmp_dir, embedding_backend="hashing")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_per_task_collections_are_copied_with_their_embeddings(self):
+        task_id = str(uuid.uuid4())
+        items = research_items("old", 5)
+        self.service.add_documents(task_id, [item["snippet"] for item in items],
+                                   [{"source_url": item["url"], "research_topic": "Solar power"} for item in items],
+                                   [item["id"] for item in items])
+        self.service.get_or_create_collection("unrelated_collection")
+
+        self.assertEqual(migrate(self.service, dry_run=True), {"migrated": [task_id], "failed": []})
+        self.assertIn(task_id, self.service.list_collection_names())
+
+        self.assertEqual(migrate(self.service, delete_source=True), {"migrated": [task_id], "failed": []})
+        self.assertEqual(sorted(self.service.list_collection_names()), sorted([shared_collection_name("hashing_1024"), "unrelated_collection"]))
+
+        storage = StorageService.__new__(StorageService)
+        storage.chroma_service, storage.initialization_error = self.service, None
+        self.assertEqual(storage.get_collection_item_count(task_id), (5, None))
+        copied = self.service.get_document_by_id(shared_collection_name("hashing_1024"), f"{task_id}:old-0")
+        self.assertEqual(copied["metadata"]["research_topic"], "Solar power")
+        self.assertEqual(copied["metadata"]["tenant"], "default")
+        # Migrated documents are eligible for knowledge reuse.
+        reusable, error = storage.find_reusable_research("solar panels", min_similarity=0.0)
+        self.assertIsNone(error)
+        self.assertEqual(sorted(item["id"] for item in reusable), sorted(item["id"] for item in items))
+        self.assertTrue(all(item["reused_from_task"] == task_id for item in reusable))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from backend.agents import llm_service as llm_module
+from backend.agents import search_service as search_module
+from backend.agents.llm_service import LLMService
+from backend.agents.search_service import SearchService
+from backend.services.embedding_backends import create_embedding_function
+from backend.services.llm_cache import LLMResponseCache
+from backend.services.llm_resilience import is_retryable, retry_after_seconds
+from backend.services.simulation import LatencyModel, SimulatedAPIError, SimulationProfile, simulated_completion
+
+NO_LATENCY = {"SIM_LLM_LATENCY": "0", "SIM_LLM_TOKENS_PER_SECOND": "0", "SIM_SEARCH_LATENCY": "0",
+              "SIM_EMBEDDING_LATENCY": "0", "SIM_EMBEDDING_PER_TEXT_MS": "0"}
+
+
+class TestSimulationProfile(unittest.TestCase):
+
+    def test_latency_specs(self):
+        rng = random.Random(1)
+        self.assertEqual(LatencyModel.parse("250").sample(rng), 0.25)
+        self.assertEqual(LatencyModel.parse("fixed:40").sample(rng), 0.04)
+        self.assertTrue(all(0.1 <= LatencyModel.parse("uniform:100:200").sample(rng) <= 0.2 for _ in range(50)))
+        self.assertGreater(LatencyModel.parse("lognormal:500:0.5").sample(rng), 0)
+        with self.assertRaises(ValueError):
+            LatencyModel.parse("gamma:1:2")
+
+    def test_injected_errors_look_like_provider_errors(self):
+        limited = SimulationProfile(LatencyModel.parse("0"), rate_limit_rpm=2)
+        limited.admit()
+        limited.admit()
+        with self.assertRaises(SimulatedAPIError) as raised:
+            limited.admit()
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertTrue(is_retryable(raised.exception))
+        self.assertGreater(retry_after_seconds(raised.exception), 59)
+
+        failing = SimulationProfile(LatencyModel.parse("0"), error_rate=1.0)
+        with self.assertRaises(SimulatedAPIError):
+            failing.admit()
+
+    def test_same_seed_same_draws(self):
+        draws = [[SimulationProfile(LatencyModel.parse("lognormal:100:1"), seed=seed).admit() for _ in range(3)] for seed in (7, 7, 8)]
+        self.assertEqual(draws[0], draws[1])
+        self.assertNotEqual(draws[0], draws[2])
+
+
+class TestSimulatedCompletions(unittest.TestCase):
+
+    def test_reports_are_deterministic_and_sized(self):
+        prompt = "Write the final research report on solar panels and rooftop batteries."
+        report = simulated_completion(prompt, seed=0, output_tokens=800)
+        self.assertEqual(report, simulated_completion(prompt, seed=0, output_tokens=800))
+        self.assertNotEqual(report, simulated_completion(prompt, seed=1, output_tokens=800))
+        self.assertTrue(report.startswith("# "))
+        self.assertIn("\n## ", report)
+        self.assertAlmostEqual(len(report.split()), 600, delta=150)
+
+    def test_summary_prompts_get_one_line_per_source(self):
+        prompt = "Summarize each of the following 3 sources.\n\n[1] (Title: a)\nx\n\n[2] (Title: b)\ny\n\n[3] (Title: c)\nz"
+        lines = simulated_completion(prompt, seed=0, output_tokens=500).splitlines()
+        self.assertEqual([line[:3] for line in lines], ["[1]", "[2]", "[3]"])
+
+
+@patch.dict(os.environ, NO_LATENCY)
+class TestSimulatedBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = LLMResponseCache(os.path.join(self.tmp_dir, "llm_cache.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_llm_service_on_the_simulated_backend(self):
+        with patch.object(llm_module, "LLM_BACKEND", "simulated"):
+            service = LLMService(cache=self.cache)
+        self.assertEqual(service.llm_type, "simulated")
+
+        content, error = service.invoke("Report on offshore wind farms.", use_cache=False)
+        self.assertIsNone(error)
+        self.assertEqual("".join(service.stream("Report on offshore wind farms.", use_cache=False)), content)
+        self.assertEqual(asyncio.run(service.ainvoke("Report on offshore wind farms.", use_cache=False)), (content, None))
+
+    def test_search_service_pages_through_simulated_results(self):
+        with patch.object(search_module, "SEARCH_BACKEND", "simulated"):
+            service = SearchService()
+        results, error = service.search("solar panels", num_results=25)
+        self.assertIsNone(error)
+        self.assertEqual(len(results), 25)
+        self.assertEqual(len({item["url"] for item in results}), 25)
+        self.assertEqual([item["rank"] for item in results], list(range(1, 26)))
+        self.assertEqual(asyncio.run(service.asearch("solar panels", num_results=25))[0], results)
+
+    def test_simulated_embedding_backend(self):
+        with patch.dict(os.environ, {"SIM_EMBEDDING_DIMENSIONS": "64"}):
+            embedding_function = create_embedding_function("simulated")
+        vectors = embedding_function(["solar panels", "wind turbines"])
+        self.assertEqual(len(vectors), 2)
+        self.assertEqual(len(vectors[0]), 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from backend.services.task_queue import ProgressEventLog, SQLiteTaskQueue, local_worker_id
+from backend.services.task_store import SQLiteTaskStore
+from backend.services.workflow_scheduler import QueueFullError
+
+
+class TestSQLiteTaskQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "queue.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_fifo_claims_across_connections(self):
+        api_side = SQLiteTaskQueue(self.path, max_queue_size=10)
+        worker_side = SQLiteTaskQueue(self.path)
+        for i in range(3):
+            api_side.enqueue(f"t{i}", {"topic": f"topic {i}"})
+
+        self.assertEqual(api_side.position("t2"), 3)
+        first = worker_side.claim("host:1")
+        second = worker_side.claim("host:2")
+        self.assertEqual([first[0], second[0]], ["t0", "t1"])
+        self.assertEqual(first[1], {"topic": "topic 0"})
+        self.assertEqual(api_side.position("t2"), 1)
+        self.assertIsNone(api_side.position("t0"))
+        self.assertEqual((api_side.queue_depth, api_side.running_count), (1, 2))
+
+        worker_side.complete("t0", "host:1")
+        self.assertEqual(api_side.running_count, 1)
+        api_side.close()
+        worker_side.close()
+
+    def test_admission_control_and_force(self):
+        queue = SQLiteTaskQueue(self.path, max_queue_size=1)
+        queue.enqueue("a", {})
+        self.assertTrue(queue.is_full())
+        with self.assertRaises(QueueFullError):
+            queue.enqueue("b", {})
+        self.assertEqual(queue.enqueue("recovered", {}, force=True), 2)
+        queue.close()
+
+    def test_requeue_jobs_of_dead_worker(self):
+        queue = SQLiteTaskQueue(self.path)
+        queue.enqueue("t1", {})
+        queue.enqueue("t2", {})
+        dead_worker = local_worker_id(pid=2 ** 22 + 12345)  # above the default pid_max, never alive
+        queue.claim(dead_worker)
+        queue.claim(local_worker_id())
+
+        self.assertEqual(queue.requeue_orphaned(), 1)
+        self.assertEqual(queue.position("t1"), 1)
+        self.assertIsNone(queue.position("t2"))
+        queue.close()
+
+
+class TestProgressEventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "queue.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_events_are_read_in_order_from_another_connection(self):
+        writer = ProgressEventLog(self.path)
+        reader = ProgressEventLog(self.path)
+        start = reader.last_id()
+        writer.append("t1", {"status": "researching"})
+        last = writer.append("t1", {"status": "completed"}, terminal=True)
+
+        events = reader.read_after(start)
+        self.assertEqual([(e[1], e[2]["status"], e[3]) for e in events],
+                         [("t1", "researching", False), ("t1", "completed", True)])
+        self.assertEqual(events[-1][0], last)
+        self.assertEqual(reader.read_after(last), [])
+        writer.close()
+        reader.close()
+
+
+class TestSharedSQLiteTaskStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "tasks.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_cached_record_is_refreshed_after_another_process_writes(self):
+        api_store = SQLiteTaskStore(self.path, shared=True)
+        worker_store = SQLiteTaskStore(self.path, shared=True)
+        api_store["t1"] = {"task_id": "t1", "status": "queued"}
+        api_store.flush()
+        cached = api_store["t1"]
+
+        worker_store.update_task("t1", {"status": "running", "current_stage": "researching"})
+        worker_store.flush()
+
+        refreshed = api_store["t1"]
+        self.assertIs(refreshed, cached)
+        self.assertEqual(refreshed["current_stage"], "researching")
+
+        del worker_store["t1"]
+        worker_store.flush()
+        self.assertNotIn("t1", api_store)
+        api_store.close()
+        worker_store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from backend.services import task_store
+from backend.services.task_store import InMemoryTaskStore, SQLiteTaskStore, TaskStore, create_task_store
+
+
+class TestSQLiteTaskStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "tasks.sqlite3")
+        self.store = SQLiteTaskStore(path=self.path, cache_size=2, flush_interval=0.01)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_records_survive_reopen(self):
+        self.store["t1"] = {"task_id": "t1", "topic": "a", "status": "queued", "graph_state": {"research_data": []}}
+        self.store.update_task("t1", {"status": "awaiting_human_verification"})
+        self.store.close()
+
+        reopened = SQLiteTaskStore(path=self.path, flush_interval=0.01)
+        try:
+            self.assertIn("t1", reopened)
+            self.assertEqual(reopened["t1"]["status"], "awaiting_human_verification")
+            self.assertEqual(reopened["t1"]["graph_state"], {"research_data": []})
+        finally:
+            reopened.close()
+        self.store = SQLiteTaskStore(path=self.path, flush_interval=0.01)
+
+    def test_lru_eviction_falls_back_to_disk(self):
+        for i in range(5):
+            self.store[f"t{i}"] = {"task_id": f"t{i}", "status": "running"}
+        self.store.flush()
+        self.assertLessEqual(len(self.store._cache), 2)
+        self.assertEqual(self.store["t0"]["status"], "running")
+        self.assertEqual(len(self.store), 5)
+
+    def test_save_writes_through_a_record_evicted_from_the_cache(self):
+        self.store["t0"] = {"task_id": "t0", "status": "queued"}
+        record = self.store["t0"]
+        for i in range(1, 4):
+            self.store[f"t{i}"] = {"task_id": f"t{i}", "status": "queued"}
+        self.store.flush()
+        self.assertNotIn("t0", self.store._cache)
+
+        record["status"] = "running"
+        self.store.save("t0", record)
+        self.store.flush()
+        self.store._cache.clear()
+        self.assertEqual(self.store["t0"]["status"], "running")
+        with self.assertRaises(KeyError):
+            self.store.save("t1")  # Not cached, and no record to write.
+
+    def test_records_are_serialized_on_the_writer_thread(self):
+        threads = []
+        original = task_store.serialize_task
+
+        def serialize(record):
+            threads.append(threading.current_thread().name)
+            return original(record)
+
+        with patch.object(task_store, "serialize_task", serialize):
+            self.store["t1"] = {"task_id": "t1", "status": "queued"}
+            for stage in ("search", "verify", "synthesize"):
+                self.store.update_task("t1", {"current_stage": stage})
+            self.store.flush()
+        self.assertTrue(threads)
+        self.assertEqual(set(threads), {"task-store-writer"})
+        self.store._cache.clear()
+        self.assertEqual(self.store["t1"]["current_stage"], "synthesize")
+
+    def test_delete_and_status_index(self):
+        self.store["a"] = {"task_id": "a", "status": "completed"}
+        self.store["b"] = {"task_id": "b", "status": "running"}
+        self.assertEqual([t["task_id"] for t in self.store.list_tasks(status="running")], ["b"])
+        del self.store["b"]
+        self.assertNotIn("b", self.store)
+        self.assertIsNone(self.store.get("b"))
+
+    def test_ttl_evicts_only_terminal_tasks(self):
+        self.store["done"] = {"task_id": "done", "status": "completed"}
+        self.store["paused"] = {"task_id": "paused", "status": "awaiting_human_verification"}
+        self.store.flush()
+        evicted = self.store.evict_expired(now=time.time() + self.store.ttl_seconds + 1)
+        self.assertEqual(evicted, 1)
+        self.assertNotIn("done", self.store)
+        self.assertIn("paused", self.store)
+
+    def test_removal_listeners_see_deleted_and_evicted_tasks(self):
+        removed = []
+        self.store.add_removal_listener(removed.extend)
+        self.store["done"] = {"task_id": "done", "status": "failed"}
+        self.store["gone"] = {"task_id": "gone", "status": "queued"}
+        del self.store["gone"]
+        self.store.flush()
+        self.store.evict_expired(now=time.time() + self.store.ttl_seconds + 1)
+        self.assertEqual(removed, ["gone", "done"])
+
+    def test_find_by_topic_key_returns_newest_matching_status(self):
+        self.store["old"] = {"task_id": "old", "topic_key": "solar power", "status": "completed"}
+        time.sleep(0.01)
+        self.store["new"] = {"task_id": "new", "topic_key": "solar power", "status": "running"}
+        self.store["other"] = {"task_id": "other", "topic_key": "wind power", "status": "running"}
+        self.assertEqual(self.store.find_by_topic_key("solar power", ("running", "queued"))["task_id"], "new")
+        self.assertEqual(self.store.find_by_topic_key("solar power", ("completed",))["task_id"], "old")
+        self.store.update_task("new", {"status": "failed"})
+        self.assertIsNone(self.store.find_by_topic_key("solar power", ("running",)))
+
+    def test_concurrent_claims_of_a_topic_start_one_task(self):
+        stores = [SQLiteTaskStore(path=self.path, flush_interval=0.01, shared=True) for _ in range(4)]
+        barrier = threading.Barrier(len(stores))
+        results = {}
+
+        def claim(index, store):
+            record = {"task_id": f"t{index}", "topic_key": "solar power", "status": "queued"}
+            barrier.wait()
+            results[index] = store.claim_topic(f"t{index}", record, ("queued", "running"))
+
+        threads = [threading.Thread(target=claim, args=(i, store)) for i, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for store in stores:
+            store.close()
+
+        winners = [index for index, existing in results.items() if existing is None]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual({existing["task_id"] for existing in results.values() if existing}, {f"t{winners[0]}"})
+        self.assertEqual(len(self.store), 1)
+
+        self.store.update_task(f"t{winners[0]}", {"status": "completed"})
+        self.assertIsNone(self.store.claim_topic("next", {"task_id": "next", "topic_key": "solar power", "status": "queued"},
+                                                 ("queued", "running")))
+
+
+class TestTaskStoreFactory(unittest.TestCase):
+
+    def test_task_stores_must_implement_the_queries(self):
+        class PartialStore(TaskStore):
+            __getitem__ = __setitem__ = __delitem__ = __iter__ = __len__ = None
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+        class StoreWithoutTopicLookup(PartialStore):
+            list_tasks = None
+
+        with self.assertRaises(TypeError):
+            StoreWithoutTopicLookup()
+
+    def test_memory_backend(self):
+        store = create_task_store("memory")
+        self.assertIsInstance(store, InMemoryTaskStore)
+        store["x"] = {"task_id": "x", "status": "queued"}
+        self.assertEqual(store.update_task("x", {"status": "running"})["status"], "running")
+        self.assertIs(store.claim_topic("y", {"task_id": "y", "topic_key": "k", "status": "queued"}, ("queued",)), None)
+        self.assertEqual(store.claim_topic("z", {"task_id": "z", "topic_key": "k", "status": "queued"}, ("queued",))["task_id"], "y")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_task_store("redis")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.stage_limits import StageLimiter
+from backend.services.workflow_scheduler import QueueFullError, WorkflowScheduler
+
+
+class TestWorkflowScheduler(unittest.TestCase):
+
+    def test_worker_count_bounds_concurrency_and_preserves_fifo(self):
+        async def scenario():
+            scheduler = WorkflowScheduler(worker_count=2, max_queue_size=10)
+            running, peak, order = 0, 0, []
+
+            async def job(name):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                order.append(name)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+            for i in range(6):
+                scheduler.submit(f"t{i}", job, f"t{i}")
+            while scheduler.queue_depth or scheduler.running_count:
+                await asyncio.sleep(0.005)
+            return peak, order
+
+        peak, order = asyncio.run(scenario())
+        self.assertEqual(peak, 2)
+        self.assertEqual(order, [f"t{i}" for i in range(6)])
+
+    def test_queue_positions_and_admission_control(self):
+        async def scenario():
+            scheduler = WorkflowScheduler(worker_count=1, max_queue_size=2)
+            gate = asyncio.Event()
+            scheduler.submit("running", gate.wait)
+            await asyncio.sleep(0)  # let the worker pick up the first job
+            positions = [scheduler.submit("a", gate.wait), scheduler.submit("b", gate.wait)]
+            with self.assertRaises(QueueFullError) as ctx:
+                scheduler.submit("c", gate.wait)
+            forced = scheduler.submit("recovered", gate.wait, force=True)
+            result = positions, scheduler.position("running"), forced, ctx.exception.retry_after
+            gate.set()
+            return result
+
+        positions, running_position, forced, retry_after = asyncio.run(scenario())
+        self.assertEqual(positions, [1, 2])
+        self.assertIsNone(running_position)
+        self.assertEqual(forced, 3)
+        self.assertGreaterEqual(retry_after, 1)
+
+    def test_positions_follow_cancellations_and_resubmissions(self):
+        async def scenario():
+            scheduler = WorkflowScheduler(worker_count=1, max_queue_size=10)
+            gate = asyncio.Event()
+            scheduler.submit("running", gate.wait)
+            await asyncio.sleep(0)
+            for task_id in ("a", "b", "c"):
+                scheduler.submit(task_id, gate.wait)
+            scheduler.cancel("a")
+            after_cancel = [scheduler.position(t) for t in ("a", "b", "c")]
+            resubmitted = scheduler.submit("b", gate.wait, force=True)
+            after_resubmit = [scheduler.position(t) for t in ("b", "c")]
+            gate.set()
+            return after_cancel, resubmitted, after_resubmit
+
+        after_cancel, resubmitted, after_resubmit = asyncio.run(scenario())
+        self.assertEqual(after_cancel, [None, 1, 2])
+        self.assertEqual(resubmitted, 2)
+        self.assertEqual(after_resubmit, [2, 1])
+
+
+class TestStageLimiter(unittest.TestCase):
+
+    def test_sync_limit_caps_threads(self):
+        limiter = StageLimiter({"search": 2})
+        active, peak = 0, 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal active, peak
+            with limiter.limit("search"):
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.02)
+                with lock:
+                    active -= 1
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(lambda _: call(), range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.in_flight("search"), 0)
+
+    def test_cancelled_async_waiter_does_not_keep_a_permit(self):
+        limiter = StageLimiter({"llm": 1})
+
+        async def scenario():
+            release = asyncio.Event()
+
+            async def hold():
+                async with limiter.alimit("llm"):
+                    await release.wait()
+
+            async def wait_for_permit():
+                async with limiter.alimit("llm"):
+                    pass
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(wait_for_permit())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            release.set()
+            await holder
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            # The permit is free again, for async and sync callers alike.
+            await asyncio.wait_for(wait_for_permit(), timeout=1)
+            with limiter.limit("llm"):
+                self.assertEqual(limiter.in_flight("llm"), 1)
+
+        asyncio.run(scenario())
+        self.assertEqual(limiter.in_flight("llm"), 0)
+
+    def test_async_waiters_are_woken_by_thread_releases(self):
+        limiter = StageLimiter({"embedding": 1})
+
+        async def scenario():
+            started = threading.Event()
+
+            def hold_in_thread():
+                with limiter.limit("embedding"):
+                    started.set()
+                    time.sleep(0.05)
+
+            holder = asyncio.get_running_loop().run_in_executor(None, hold_in_thread)
+            await asyncio.to_thread(started.wait)
+            waiters = [limiter.alimit("embedding") for _ in range(3)]
+
+            async def enter(context):
+                async with context:
+                    await asyncio.sleep(0.001)
+
+            await asyncio.wait_for(asyncio.gather(holder, *(enter(context) for context in waiters)), timeout=2)
+
+        asyncio.run(scenario())
+        self.assertEqual(limiter.in_flight("embedding"), 0)
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            with StageLimiter({"llm": 1}).limit("search"):
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Workflow worker pool for WORKFLOW_EXECUTION=pool.
+
+The API process(es) only accept requests and put workflow runs on the shared SQLite task queue.
+This module starts N worker processes that claim runs from that queue, execute the LangGraph
+workflow and record each state transition in the shared task store and progress event log.
+
+Workers record their own metrics (workflow nodes, provider calls, tokens); with --metrics-port
+worker i serves them at http://<host>:<port + i>/metrics, so each one is scraped like the API.
+
+Usage (from the repository root, with the same environment as the API):
+    WORKFLOW_EXECUTION=pool python -m backend.worker --processes 8 --metrics-port 9100
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import Dict, Optional, Tuple
+
+from backend.services.metrics import serve_metrics
+from backend.services.task_queue import create_task_queue, local_worker_id
+
+DEFAULT_POLL_INTERVAL = 0.2
+
+
+async def _consume(api, concurrency: int, poll_interval: float) -> None:
+    worker_id = local_worker_id()
+    queue = api.task_queue
+
+    async def run_slot() -> None:
+        while True:
+            job = await asyncio.to_thread(queue.claim, worker_id)
+            if job is None:
+                await asyncio.sleep(poll_interval)
+                continue
+            task_id, payload = job
+            try:
+                await _run_job(api, task_id, payload)
+            except Exception as e:
+                print(f"Worker {worker_id}: Task {task_id} failed outside the workflow: {e}")
+            finally:
+                await asyncio.to_thread(api.active_tasks.flush)
+                await asyncio.to_thread(queue.complete, task_id, worker_id)
+
+    print(f"Worker {worker_id}: Consuming workflow runs from {queue.path} ({concurrency} concurrent).")
+    await asyncio.gather(*(run_slot() for _ in range(concurrency)))
+
+
+async def _run_job(api, task_id: str, payload: Dict) -> None:
+    task = api.active_tasks.get(task_id)
+    if not task:
+        print(f"Task {task_id}: Queued run skipped, the task no longer exists.")
+        return
+    topic = payload.get("topic") or task.get("topic", "Unknown Topic")
+    if payload.get("from_checkpoint"):
+        graph_input = None
+    elif task.get("status") == "running" and await api._checkpoint_next_nodes(task_id):
+        # Claimed before by a worker that died mid-run; continue from its last checkpoint.
+        print(f"Task {task_id}: Continuing run interrupted in another worker from its last checkpoint.")
+        graph_input = None
+    else:
+        graph_input = task.get("graph_state") or api.build_initial_graph_input(task_id, topic, tenant=task.get("tenant"))
+    await api.run_research_workflow_async(task_id, topic, graph_input)
+
+
+def _worker_main(concurrency: int, poll_interval: float, metrics_port: Optional[int] = None) -> None:
+    os.environ["WORKFLOW_EXECUTION"] = "pool"
+    metrics_server = None
+    if metrics_port is not None:
+        try:
+            metrics_server = serve_metrics(metrics_port)
+            print(f"Worker {local_worker_id()}: Serving metrics on port {metrics_port}.")
+        except OSError as e:
+            print(f"Worker {local_worker_id()} WARNING: Cannot serve metrics on port {metrics_port}: {e}")
+    # Importing the API module builds the workflow graph and opens the shared stores in this process.
+    from backend import main as api
+    try:
+        asyncio.run(_consume(api, concurrency, poll_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.active_tasks.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+
+def run_pool(processes: int, concurrency: int, poll_interval: float = DEFAULT_POLL_INTERVAL,
+             metrics_port: Optional[int] = None) -> None:
+    """
+    Starts `processes` workers and restarts any that die, returning their claimed runs to the queue.
+    With `metrics_port`, worker slot i serves its metrics on metrics_port + i (kept across restarts).
+    """
+    if os.getenv("WORKFLOW_CHECKPOINTER", "sqlite").lower() == "memory":
+        print("Worker pool WARNING: WORKFLOW_CHECKPOINTER=memory cannot be shared between processes; "
+              "runs resumed after human verification will restart from their stored state.")
+    queue = create_task_queue()
+    requeued = queue.requeue_orphaned()
+    if requeued:
+        print(f"Worker pool: Re-queued {requeued} run(s) left behind by stopped workers.")
+
+    context = multiprocessing.get_context("spawn")
+    workers: Dict[int, Tuple[multiprocessing.Process, int]] = {}
+
+    def start_worker(slot: int) -> None:
+        port = None if metrics_port is None else metrics_port + slot
+        process = context.Process(target=_worker_main, args=(concurrency, poll_interval, port), name="workflow-worker")
+        process.start()
+        workers[process.pid] = (process, slot)
+
+    stopping = False
+
+    def request_stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for slot in range(processes):
+        start_worker(slot)
+    print(f"Worker pool: Started {processes} worker process(es), {concurrency} concurrent run(s) each.")
+
+    while not stopping:
+        for pid, (process, slot) in list(workers.items()):
+            if not process.is_alive():
+                process.join()
+                del workers[pid]
+                print(f"Worker pool: Worker {pid} exited with code {process.exitcode}. Restarting it.")
+                queue.requeue_claimed_by(local_worker_id(pid))
+                start_worker(slot)
+        time.sleep(1.0)
+
+    print("Worker pool: Shutting down.")
+    for process, _ in workers.values():
+        process.terminate()
+    for pid, (process, _) in workers.items():
+        process.join(timeout=10)
+        # Runs cut short here continue from their checkpoints when the pool starts again.
+        queue.requeue_claimed_by(local_worker_id(pid))
+    queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Knowledge Nexus workflow worker pool.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKFLOW_WORKER_PROCESSES", os.cpu_count() or 1)),
+                        help="Number of worker processes (default: WORKFLOW_WORKER_PROCESSES or the CPU count).")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKFLOW_WORKERS", "4")),
+                        help="Concurrent workflow runs per process (default: WORKFLOW_WORKERS or 4).")
+    parser.add_argument("--metrics-port", type=int,
+                        default=int(os.environ["WORKER_METRICS_PORT"]) if os.getenv("WORKER_METRICS_PORT") else None,
+                        help="Serve worker i's Prometheus metrics on this port + i (default: WORKER_METRICS_PORT, off).")
+    args = parser.parse_args()
+    run_pool(max(1, args.processes), max(1, args.concurrency), metrics_port=args.metrics_port)